@@ -5,12 +5,14 @@ Provides REST API endpoints for AI Assistant integration with frontend
 
 import os
 import sys
+import time
 from pathlib import Path
 from typing import Optional, List, Dict
 from datetime import datetime
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 import uvicorn
 
@@ -23,14 +25,22 @@ SCRIPTS_PATH = TRAINING_PATH / "scripts"
 sys.path.insert(0, str(SCRIPTS_PATH))  # Add scripts folder for fallback_responses
 sys.path.insert(0, str(TRAINING_PATH))
 
+# Dependency-free; imported as top-level modules so they share the registry with rag_pipeline
+from rag_metrics import (
+    REGISTRY, CONTENT_TYPE_LATEST,
+    CACHE_ENTRIES, CACHE_BYTES, CONVERSATION_USERS, CONVERSATION_EXCHANGES,
+)
+from tracing import RequestTrace
+
 # Will import inside startup event after path is set
 SimpleEmbeddingsWrapper = None
 build_retriever = None
 load_docs_from_embedding_file = None
 rag_answer = None
+rag_answer_batch = None
+reconcile_cache = None
 ConversationHistory = None
 SemanticCache = None
-genai = None
 api_rate_limiter = None  # Rate limiter instance
 
 # ==================== Pydantic Models ====================
@@ -47,6 +57,33 @@ class ChatResponse(BaseModel):
     cached: bool
     timestamp: str
     sources_count: int
+    tier: Optional[str] = None  # fallback / cache / llm / reject / safety / error
+    similarity: Optional[float] = None  # set on cache hits
+    doc_ids: List[str] = []
+    timings: Optional[Dict] = None  # per-stage spans, only with X-Debug-Timings header
+
+class BatchChatRequest(BaseModel):
+    """Request model for batch chat endpoint"""
+    questions: List[str]
+    user_id: Optional[str] = "default_user"
+
+class BatchAnswer(BaseModel):
+    """One answer inside a batch response"""
+    question: str
+    answer: str
+    tier: str
+    cached: bool
+    latency: float  # seconds spent on this question (batched stages count in full)
+    similarity: Optional[float] = None
+    sources_count: int = 0
+    doc_ids: List[str] = []
+    timings: Optional[Dict] = None
+
+class BatchChatResponse(BaseModel):
+    """Response model for batch chat endpoint"""
+    answers: List[BatchAnswer]
+    response_time: float
+    timestamp: str
 
 class HistoryResponse(BaseModel):
     """Response model for conversation history"""
@@ -87,6 +124,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Upper bound on questions per /api/chat/batch request
+MAX_BATCH_QUESTIONS = int(os.getenv("CHAT_MAX_BATCH_QUESTIONS", "20"))
+
 # Include Auth Router
 app.include_router(auth_router, prefix="/api/auth", tags=["Authentication"])
 
@@ -101,6 +141,14 @@ conversation_histories = {}  # Store per user_id
 ConversationHistory = None  # Will be imported at startup
 SemanticCache = None  # Will be imported at startup
 
+# Size gauges are computed at scrape time from the globals above, so the chat hot path pays nothing
+CACHE_ENTRIES.set_function(lambda: len(cache) if cache is not None else 0)
+CACHE_BYTES.set_function(lambda: cache.approx_bytes() if cache is not None else 0)
+CONVERSATION_USERS.set_function(lambda: len(conversation_histories))
+CONVERSATION_EXCHANGES.set_function(
+    lambda: sum(len(h.history) for h in list(conversation_histories.values()))
+)
+
 def get_conversation_history(user_id: str):
     """Get or create conversation history for user"""
     if user_id not in conversation_histories:
@@ -114,7 +162,7 @@ async def startup_event():
     """Initialize RAG components on server startup"""
     global retriever, genai_client, local_docs, cache, api_rate_limiter
     global SimpleEmbeddingsWrapper, build_retriever, load_docs_from_embedding_file
-    global rag_answer, ConversationHistory, SemanticCache, genai
+    global rag_answer, rag_answer_batch, reconcile_cache, ConversationHistory, SemanticCache
     
     print("[STARTUP] Initializing PregCare RAG Backend...")
     
@@ -125,20 +173,24 @@ async def startup_event():
             build_retriever as build_ret,
             load_docs_from_embedding_file as load_docs,
             rag_answer as rag_ans,
+            rag_answer_batch as rag_ans_batch,
+            reconcile_cache as reconcile,
             ConversationHistory as ConvHist,
             api_rate_limiter as rate_lim,
+            setup_logging,
         )
         from scripts.semantic_cache import SemanticCache as SemCache
-        import google.genai as genai_module
+        setup_logging()
         
         # Assign to globals
         SimpleEmbeddingsWrapper = EmbWrapper
         build_retriever = build_ret
         load_docs_from_embedding_file = load_docs
         rag_answer = rag_ans
+        rag_answer_batch = rag_ans_batch
+        reconcile_cache = reconcile
         ConversationHistory = ConvHist
         SemanticCache = SemCache
-        genai = genai_module
         api_rate_limiter = rate_lim
         
         # Load environment from training folder
@@ -171,31 +223,53 @@ async def startup_event():
         local_docs = load_docs_from_embedding_file(embeddings_file)
         print(f"[STARTUP] Loaded {len(local_docs)} local documents")
         
-        # Initialize cache
+        # Initialize cache (SEMANTIC_CACHE_BACKEND=pgvector shares it across API instances)
         cache_file = TRAINING_PATH / "data" / "semantic_cache.json"
-        cache = SemanticCache(
-            model_name="all-MiniLM-L6-v2",
-            cache_file=cache_file,
-            similarity_threshold=0.85,
-            max_cache_size=100
-        )
-        print("[STARTUP] Semantic cache initialized")
+        from scripts.cache_backends import create_cache_backend
+        from scripts.cache_thresholds import load_threshold_policy
+        threshold_policy = load_threshold_policy()  # per-topic thresholds, 0.85 as fallback
+        cache = None
+        try:
+            cache_backend = create_cache_backend()
+            if cache_backend is not None:
+                cache = SemanticCache(
+                    model_name="all-MiniLM-L6-v2",
+                    similarity_threshold=0.85,
+                    max_cache_size=int(os.getenv("SEMANTIC_CACHE_L1_SIZE", "256")),
+                    backend=cache_backend,
+                    threshold_policy=threshold_policy,
+                )
+        except Exception as e:
+            print(f"[WARNING] Shared cache backend unavailable ({e}), using local cache")
+        if cache is None:
+            cache = SemanticCache(
+                model_name="all-MiniLM-L6-v2",
+                cache_file=cache_file,
+                similarity_threshold=0.85,
+                max_cache_size=100,
+                threshold_policy=threshold_policy,
+            )
+        print(f"[STARTUP] Semantic cache initialized ({cache.get_stats()['backend']})")
         
-        # Initialize GenAI client
+        # Initialize LLM client (LLM_PROVIDER=stub for offline load testing)
+        llm_provider = os.getenv("LLM_PROVIDER", "gemini").lower()
         api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        if not api_key:
+        if llm_provider == "gemini" and not api_key:
             raise ValueError("GEMINI_API_KEY not found in environment")
         
         model_name = os.getenv("MODEL_NAME", "gemini-2.0-flash")
         
-        # Import GenAIClientWrapper from rag_pipeline
-        from scripts.rag_pipeline import GenAIClientWrapper
-        genai_client = GenAIClientWrapper(api_key=api_key, model=model_name)
+        from scripts.llm_providers import create_llm_provider
+        genai_client = create_llm_provider(llm_provider, api_key=api_key, model=model_name)
+        
+        # Drop cached answers from an older prompt/model or built on re-ingested docs
+        removed = reconcile_cache(cache, model=model_name)
+        print(f"[STARTUP] Cache reconciled: {sum(removed.values())} stale entries dropped")
         
         print(f"[SUCCESS] RAG Backend initialized successfully!")
         print(f"   - Local docs: {len(local_docs)}")
         print(f"   - Cache enabled: {cache is not None}")
-        print(f"   - Model: {model_name}")
+        print(f"   - Model: {model_name} ({llm_provider})")
         print(f"   - Database: {'Connected' if retriever else 'Using local fallback'}")
         
     except Exception as e:
@@ -228,7 +302,7 @@ async def health_check():
     )
 
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+def chat(request: ChatRequest, x_debug_timings: Optional[str] = Header(default=None)):
     """
     Main chat endpoint - send question, receive AI answer
     
@@ -236,6 +310,11 @@ async def chat(request: ChatRequest):
     - Tunggu 4-5 detik antar pertanyaan
     - Gunakan pertanyaan spesifik tentang kehamilan
     - Hindari spam request berulang
+    
+    Kirim header `X-Debug-Timings: 1` untuk menyertakan span per tahap di response.
+    
+    Plain `def`: rate limiter dan panggilan LLM bersifat blocking, jadi FastAPI
+    menjalankannya di threadpool, bukan di event loop.
     """
     if not genai_client:
         raise HTTPException(status_code=503, detail="RAG system not initialized")
@@ -243,9 +322,12 @@ async def chat(request: ChatRequest):
     if not request.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
     
+    trace = RequestTrace()
+    
     # Apply rate limiting to prevent API abuse
     if api_rate_limiter:
-        api_rate_limiter.wait_if_needed()
+        with trace.span("rate_limit_wait"):
+            api_rate_limiter.wait_if_needed()
     
     try:
         # Get user's conversation history
@@ -254,39 +336,111 @@ async def chat(request: ChatRequest):
         # Call RAG pipeline
         start_time = datetime.now()
         
-        # Check cache before calling RAG
-        cached = False
-        if cache:
-            cached_result = cache.get(request.message)
-            if cached_result:
-                cached = True
-        
-        answer = rag_answer(
+        result = rag_answer(
             question=request.message,
             retriever=retriever,
             genai_client=genai_client,
             local_docs=local_docs,
             cache=cache,
-            conversation_history=conv_history
+            conversation_history=conv_history,
+            trace=trace,
         )
         end_time = datetime.now()
+        trace.finish()
         
         response_time = (end_time - start_time).total_seconds()
         
         return ChatResponse(
-            answer=answer,
+            answer=result.answer,
             response_time=response_time,
-            cached=cached,
+            cached=result.cached,
             timestamp=end_time.isoformat(),
-            sources_count=len(local_docs) if local_docs else 0
+            sources_count=result.sources_count,
+            tier=result.tier,
+            similarity=result.similarity,
+            doc_ids=result.doc_ids,
+            timings=trace.to_dict() if x_debug_timings else None,
         )
         
     except Exception as e:
+        trace.finish()
         print(f"[ERROR] Error in chat endpoint: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
 
+@app.post("/api/chat/batch", response_model=BatchChatResponse)
+def chat_batch(request: BatchChatRequest, x_debug_timings: Optional[str] = Header(default=None)):
+    """
+    Answer several questions in one request (quick questions panel / partner integrations)
+    
+    Fallback and safety/topic gates run per question, the rest shares one batched
+    cache encode + lookup, one batched retrieval and concurrent LLM calls.
+    
+    Plain `def`: the batch blocks on the rate limiter and LLM calls for a long
+    time, so FastAPI runs it in its threadpool instead of on the event loop.
+    """
+    if not genai_client:
+        raise HTTPException(status_code=503, detail="RAG system not initialized")
+    
+    questions = [q.strip() for q in request.questions]
+    if not questions or not all(questions):
+        raise HTTPException(status_code=400, detail="Questions cannot be empty")
+    if len(questions) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUESTIONS} questions per batch")
+    
+    traces = [RequestTrace() for _ in questions]
+    
+    # Same per-request pre-wait as /api/chat; LLM calls inside the batch are spaced by the limiter too
+    if api_rate_limiter:
+        t0 = time.perf_counter()
+        api_rate_limiter.wait_if_needed()
+        waited = time.perf_counter() - t0
+        for trace in traces:
+            trace.add("rate_limit_wait", waited, started=t0)
+    
+    try:
+        conv_history = get_conversation_history(request.user_id)
+        start_time = datetime.now()
+        results = rag_answer_batch(
+            questions=questions,
+            retriever=retriever,
+            genai_client=genai_client,
+            local_docs=local_docs,
+            cache=cache,
+            conversation_history=conv_history,
+            traces=traces,
+        )
+        end_time = datetime.now()
+    except Exception as e:
+        print(f"[ERROR] Error in batch chat endpoint: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Error processing questions: {str(e)}")
+    finally:
+        for trace in traces:
+            trace.finish()
+    
+    answers = [
+        BatchAnswer(
+            question=q,
+            answer=r.answer,
+            tier=r.tier,
+            cached=r.cached,
+            latency=round(r.latency, 4),
+            similarity=r.similarity,
+            sources_count=r.sources_count,
+            doc_ids=r.doc_ids,
+            timings=t.to_dict() if x_debug_timings else None,
+        )
+        for q, r, t in zip(questions, results, traces)
+    ]
+    return BatchChatResponse(
+        answers=answers,
+        response_time=(end_time - start_time).total_seconds(),
+        timestamp=end_time.isoformat(),
+    )
+
 @app.get("/api/history/{user_id}", response_model=HistoryResponse)
 async def get_history(user_id: str = "default_user"):
     """
@@ -334,7 +488,7 @@ async def get_stats():
     """
     Get cache statistics
     """
-    if not cache:
+    if cache is None:
         raise HTTPException(status_code=503, detail="Cache not initialized")
     
     try:
@@ -353,6 +507,30 @@ async def get_stats():
         print(f"[ERROR] Error getting stats: {e}")
         raise HTTPException(status_code=500, detail=f"Error retrieving stats: {str(e)}")
 
+@app.post("/api/cache/reconcile")
+async def cache_reconcile():
+    """
+    Targeted cache invalidation, e.g. after ingest_to_pgvector.py bumped the corpus version
+    """
+    if cache is None or reconcile_cache is None:
+        raise HTTPException(status_code=503, detail="Cache not initialized")
+    
+    try:
+        removed = reconcile_cache(cache, model=getattr(genai_client, "model", None))
+        return {"status": "success", "removed": removed, "cache_size": len(cache)}
+        
+    except Exception as e:
+        print(f"[ERROR] Error reconciling cache: {e}")
+        raise HTTPException(status_code=500, detail=f"Error reconciling cache: {str(e)}")
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus text exposition: request outcomes, per-span / LLM / rate-limit latency
+    histograms, LLM 429s and errors, cache and conversation-store size
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE_LATEST)
+
 # ==================== Run Server ====================
 
 if __name__ == "__main__":
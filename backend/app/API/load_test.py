@@ -0,0 +1,426 @@
+"""
+Load-test harness for the PregCare chat API (chat_api.py)
+
+Drives /api/chat, /api/history/{user_id}, /api/stats and /health at a
+configurable concurrency and writes a JSON results file that can be diffed
+between releases.
+
+By default the app is exercised in-process (httpx ASGITransport) with the
+LLM replaced by the deterministic StubLLMProvider and no vector database
+(local docs only), so runs are offline, free and reproducible.
+
+The report includes the effective concurrency (summed latency / wall time)
+and warns when it is ~1, i.e. the clients were served one at a time (a
+blocking `async def` handler on the event loop) and the numbers do not
+reflect --concurrency.
+
+Usage:
+    python load_test.py --requests 500 --concurrency 16
+    python load_test.py --duration 60 --concurrency 32 --llm-latency-ms 1200 --llm-429-rate 0.05
+    python load_test.py --base-url http://localhost:8001 --requests 200   # against a running server
+    python load_test.py --baseline results_prev.json                      # print deltas vs previous run
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+API_DIR = Path(__file__).parent
+TRAINING_PATH = API_DIR.parent.parent.parent / "training"
+
+# ==================== Question Mix ====================
+
+# Exact "Pertanyaan Cepat" questions answered by fallback_responses (0 tokens)
+FALLBACK_QUESTIONS = [
+    "Apa saja tanda-tanda kehamilan awal?",
+    "Makanan apa yang baik untuk ibu hamil?",
+    "Apa yang menyebabkan kelahiran prematur?",
+    "Bagaimana cara meningkatkan kesuburan?",
+]
+
+# Rejected by the topic gate (no pregnancy keyword)
+OFF_TOPIC_QUESTIONS = [
+    "Siapa presiden Indonesia sekarang?",
+    "Rekomendasi film bioskop minggu ini apa?",
+    "Gimana cara main mobile legend biar menang?",
+    "Besok cuaca di Jakarta hujan tidak?",
+    "Laptop apa yang bagus untuk kuliah?",
+    "Hasil pertandingan liga kemarin berapa?",
+]
+
+# Sent once during warmup so later repeats are semantic-cache hits
+CACHE_QUESTIONS = [
+    "Bagaimana cara mengatasi kram kaki saat hamil?",
+    "Apakah aman minum kopi saat hamil trimester pertama?",
+    "Berapa kenaikan berat badan ideal selama kehamilan?",
+    "Kapan sebaiknya mulai USG pertama saat hamil?",
+]
+
+# Full RAG path: combined from parts so most requests miss the cache
+RAG_TOPICS = [
+    "anemia", "diabetes gestasional", "preeklamsia", "nyeri punggung", "susah tidur",
+    "sembelit", "bengkak kaki", "heartburn", "stretch mark", "cemas menjelang persalinan",
+    "olahraga ringan", "asupan kalsium", "zat besi", "posisi tidur", "gerakan janin",
+]
+RAG_CONTEXTS = [
+    "di trimester pertama", "di trimester kedua", "di trimester ketiga",
+    "saat hamil anak pertama", "saat hamil kembar", "setelah usia kandungan 30 minggu",
+]
+RAG_TEMPLATES = [
+    "Bagaimana cara mengatasi {topic} {ctx}?",
+    "Apa yang perlu saya ketahui tentang {topic} {ctx}?",
+    "Apakah {topic} berbahaya untuk janin {ctx}?",
+]
+
+DEFAULT_MIX = "cache=0.3,fallback=0.2,offtopic=0.2,rag=0.3"
+DEFAULT_ENDPOINT_MIX = "chat=0.85,history=0.05,stats=0.05,health=0.05"
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        key, value = part.split("=")
+        mix[key.strip()] = float(value)
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError(f"Invalid mix: {spec}")
+    return {k: v / total for k, v in mix.items()}
+
+
+def pick(rng: random.Random, mix: Dict[str, float]) -> str:
+    r = rng.random()
+    acc = 0.0
+    for key, weight in mix.items():
+        acc += weight
+        if r < acc:
+            return key
+    return key
+
+
+def make_question(rng: random.Random, category: str) -> str:
+    if category == "fallback":
+        return rng.choice(FALLBACK_QUESTIONS)
+    if category == "offtopic":
+        return rng.choice(OFF_TOPIC_QUESTIONS)
+    if category == "cache":
+        return rng.choice(CACHE_QUESTIONS)
+    return rng.choice(RAG_TEMPLATES).format(topic=rng.choice(RAG_TOPICS), ctx=rng.choice(RAG_CONTEXTS))
+
+
+def build_schedule(
+    n: int, seed: int, mix: Dict[str, float], endpoint_mix: Dict[str, float], users: int
+) -> List[Tuple[str, str, Optional[str], str]]:
+    """Pre-generate (endpoint, category, question, user_id) so runs are reproducible"""
+    rng = random.Random(seed)
+    schedule = []
+    for _ in range(n):
+        endpoint = pick(rng, endpoint_mix)
+        user_id = f"loadtest_user_{rng.randrange(users)}"
+        if endpoint == "chat":
+            category = pick(rng, mix)
+            schedule.append((endpoint, category, make_question(rng, category), user_id))
+        else:
+            schedule.append((endpoint, endpoint, None, user_id))
+    return schedule
+
+
+# ==================== In-process App Setup ====================
+
+def setup_inprocess_app(args):
+    """Import chat_api and wire it to the stub LLM + local docs (no startup event, no DB)"""
+    sys.path.insert(0, str(API_DIR))
+    import chat_api
+    from scripts import rag_pipeline
+    from scripts.llm_providers import StubLLMProvider
+
+    rag_pipeline.setup_logging()
+    if args.quiet:
+        import logging
+        logging.getLogger().setLevel(logging.WARNING)
+
+    chat_api.rag_answer = rag_pipeline.rag_answer
+    chat_api.rag_answer_batch = rag_pipeline.rag_answer_batch
+    chat_api.ConversationHistory = rag_pipeline.ConversationHistory
+    chat_api.api_rate_limiter = rag_pipeline.api_rate_limiter
+    rag_pipeline.api_rate_limiter.min_interval = args.rate_interval
+
+    chat_api.retriever = None  # DB stubbed out: local docs only
+    chat_api.local_docs = rag_pipeline.load_docs_from_embedding_file(
+        TRAINING_PATH / "data" / "embeddings" / "embeddings.jsonl"
+    )
+    chat_api.genai_client = StubLLMProvider(
+        latency_ms=args.llm_latency_ms,
+        latency_dist=args.llm_latency_dist,
+        error_rate=args.llm_error_rate,
+        rate_limit_rate=args.llm_429_rate,
+        seed=args.seed,
+        base_delay=args.llm_retry_delay,
+    )
+
+    chat_api.cache = None
+    if not args.no_cache:
+        try:
+            from scripts.semantic_cache import SemanticCache
+            from scripts.cache_thresholds import load_threshold_policy
+            chat_api.cache = SemanticCache(
+                model_name="all-MiniLM-L6-v2",
+                cache_file=None,  # never touch the real cache file
+                similarity_threshold=0.85,
+                max_cache_size=100,
+                threshold_policy=load_threshold_policy(),
+            )
+        except (ImportError, OSError) as e:  # OSError: embedding model not downloadable offline
+            print(f"[WARNING] Semantic cache unavailable ({e}); running without cache tier")
+
+    chat_api.conversation_histories.clear()
+    return chat_api.app, chat_api.cache is not None
+
+
+# ==================== Runner ====================
+
+async def send(client: httpx.AsyncClient, endpoint: str, question: Optional[str], user_id: str) -> httpx.Response:
+    if endpoint == "chat":
+        return await client.post("/api/chat", json={"message": question, "user_id": user_id})
+    if endpoint == "history":
+        return await client.get(f"/api/history/{user_id}")
+    if endpoint == "stats":
+        return await client.get("/api/stats")
+    return await client.get("/health")
+
+
+async def run_load(client: httpx.AsyncClient, schedule, concurrency: int, duration: Optional[float]):
+    records = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in schedule:
+        queue.put_nowait(item)
+    deadline = time.perf_counter() + duration if duration else None
+
+    async def worker():
+        while True:
+            if deadline and time.perf_counter() >= deadline:
+                return
+            try:
+                endpoint, category, question, user_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            t0 = time.perf_counter()
+            status, cached = 0, False
+            try:
+                response = await send(client, endpoint, question, user_id)
+                status = response.status_code
+                if endpoint == "chat" and status == 200:
+                    cached = bool(response.json().get("cached"))
+            except Exception:
+                status = -1
+            records.append({
+                "endpoint": endpoint,
+                "category": category,
+                "status": status,
+                "cached": cached,
+                "latency": time.perf_counter() - t0,
+            })
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return records, time.perf_counter() - started
+
+
+async def warmup(client: httpx.AsyncClient):
+    """Prime the cache-hit questions (not measured)"""
+    for q in CACHE_QUESTIONS:
+        await client.post("/api/chat", json={"message": q, "user_id": "loadtest_warmup"})
+
+
+# ==================== Reporting ====================
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile"""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(p * len(sorted_values) / 100.0) - 1))
+    return sorted_values[k]
+
+
+def summarize(records: List[Dict], elapsed: float) -> Dict:
+    lat = sorted(r["latency"] for r in records)
+    errors = sum(1 for r in records if r["status"] != 200)
+    summary = {
+        "requests": len(records),
+        "errors": errors,
+        "error_rate": errors / len(records) if records else 0.0,
+        "throughput_rps": len(records) / elapsed if elapsed else 0.0,
+        # Summed latency / wall time: ~1.0 means requests ran one after another
+        "effective_concurrency": sum(lat) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": (sum(lat) / len(lat) * 1000) if lat else 0.0,
+            "p50": percentile(lat, 50) * 1000,
+            "p95": percentile(lat, 95) * 1000,
+            "p99": percentile(lat, 99) * 1000,
+            "max": (lat[-1] * 1000) if lat else 0.0,
+        },
+    }
+    chat = [r for r in records if r["endpoint"] == "chat" and r["status"] == 200]
+    if chat:
+        summary["cached_ratio"] = sum(1 for r in chat if r["cached"]) / len(chat)
+    return summary
+
+
+def build_report(records: List[Dict], elapsed: float, args, cache_enabled: bool) -> Dict:
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "target": args.base_url or "in-process",
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": {
+            "requests": args.requests,
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "mix": args.mix,
+            "endpoint_mix": args.endpoint_mix,
+            "users": args.users,
+            "cache_enabled": cache_enabled,
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_latency_dist": args.llm_latency_dist,
+            "llm_error_rate": args.llm_error_rate,
+            "llm_429_rate": args.llm_429_rate,
+            "rate_interval": args.rate_interval,
+        },
+        "elapsed_seconds": elapsed,
+        "overall": summarize(records, elapsed),
+        "by_endpoint": {},
+        "by_category": {},
+    }
+    for key, field in (("by_endpoint", "endpoint"), ("by_category", "category")):
+        groups: Dict[str, List[Dict]] = {}
+        for r in records:
+            groups.setdefault(r[field], []).append(r)
+        report[key] = {name: summarize(rs, elapsed) for name, rs in sorted(groups.items())}
+    report["serialized"] = is_serialized(report["overall"], args.concurrency)
+    return report
+
+
+def is_serialized(overall: Dict, concurrency: int) -> bool:
+    """True when concurrent clients got no overlap (wall time ~ sum of latencies)"""
+    return concurrency > 1 and overall["requests"] > concurrency and overall["effective_concurrency"] < 1.2
+
+
+def print_report(report: Dict, baseline: Optional[Dict] = None):
+    def row(name, s, base=None):
+        lat = s["latency_ms"]
+        line = (f"{name:<12} {s['requests']:>6} {s['throughput_rps']:>8.1f} {s['error_rate']*100:>6.1f}% "
+                f"{lat['p50']:>8.0f} {lat['p95']:>8.0f} {lat['p99']:>8.0f}")
+        if base:
+            d95 = lat["p95"] - base["latency_ms"]["p95"]
+            drps = s["throughput_rps"] - base["throughput_rps"]
+            line += f"   Δp95={d95:+.0f}ms Δrps={drps:+.1f}"
+        print(line)
+
+    print("\n" + "="*78)
+    print(f"[LOAD TEST] {report['target']}  concurrency={report['config']['concurrency']}  "
+          f"elapsed={report['elapsed_seconds']:.1f}s")
+    print("="*78)
+    print(f"{'group':<12} {'reqs':>6} {'rps':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    row("overall", report["overall"], baseline and baseline.get("overall"))
+    for section in ("by_endpoint", "by_category"):
+        print("-"*78)
+        for name, s in report[section].items():
+            base = baseline and baseline.get(section, {}).get(name)
+            row(name, s, base)
+    if "cached_ratio" in report["overall"]:
+        print("-"*78)
+        print(f"cached responses (chat): {report['overall']['cached_ratio']*100:.1f}%")
+    print(f"effective concurrency: {report['overall']['effective_concurrency']:.1f} "
+          f"(of {report['config']['concurrency']} clients)")
+    if report.get("serialized"):
+        print("[WARNING] Elapsed time ~= summed request latency: requests were served one at a time,\n"
+              "          so rps and percentiles describe serial execution, not --concurrency. Check for\n"
+              "          blocking `async def` handlers, or run against a real server with --base-url.")
+    print("="*78 + "\n")
+
+
+# ==================== Main ====================
+
+async def main_async(args):
+    mix = parse_mix(args.mix)
+    endpoint_mix = parse_mix(args.endpoint_mix)
+
+    if args.base_url:
+        transport = None
+        base_url = args.base_url
+        cache_enabled = True
+    else:
+        app, cache_enabled = setup_inprocess_app(args)
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://loadtest"
+
+    if not cache_enabled and "stats" in endpoint_mix:
+        print("[WARNING] /api/stats needs the semantic cache; removing it from the endpoint mix")
+        endpoint_mix.pop("stats")
+        total = sum(endpoint_mix.values())
+        endpoint_mix = {k: v / total for k, v in endpoint_mix.items()}
+
+    n = args.requests if not args.duration else max(args.requests, 1_000_000)
+    schedule = build_schedule(n, args.seed, mix, endpoint_mix, args.users)
+
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout) as client:
+        if not args.no_warmup:
+            await warmup(client)
+        records, elapsed = await run_load(client, schedule, args.concurrency, args.duration)
+
+    report = build_report(records, elapsed, args, cache_enabled)
+    baseline = None
+    if args.baseline and Path(args.baseline).exists():
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"[SUCCESS] Results written to {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PregCare chat API load test")
+    parser.add_argument("--base-url", help="Target a running server instead of the in-process app")
+    parser.add_argument("--requests", type=int, default=300, help="Total requests (ignored with --duration)")
+    parser.add_argument("--duration", type=float, help="Run for N seconds instead of a fixed request count")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--users", type=int, default=20, help="Distinct user_ids to spread requests over")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Chat question mix (default: {DEFAULT_MIX})")
+    parser.add_argument("--endpoint-mix", default=DEFAULT_ENDPOINT_MIX,
+                        help=f"Endpoint mix (default: {DEFAULT_ENDPOINT_MIX})")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--no-warmup", action="store_true", help="Skip priming the cache-hit questions")
+    parser.add_argument("--no-cache", action="store_true", help="In-process: disable the semantic cache")
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--llm-latency-dist", default="lognormal", choices=["fixed", "uniform", "lognormal"])
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-429-rate", type=float, default=0.0)
+    parser.add_argument("--llm-retry-delay", type=float, default=0.1, help="Stub retry backoff base (s)")
+    parser.add_argument("--rate-interval", type=float, default=0.0,
+                        help="In-process: RateLimiter min interval between LLM calls (prod uses 8s)")
+    parser.add_argument("--quiet", action="store_true", help="Only log warnings from the pipeline")
+    parser.add_argument("--output", default="load_test_results.json")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    if args.base_url is None:
+        os.environ.setdefault("LLM_PROVIDER", "stub")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
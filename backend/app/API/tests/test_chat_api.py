@@ -0,0 +1,200 @@
+"""
+Tests for chat_api.py, served in-process with the stub LLM and local docs
+(the same wiring as load_test.py; no startup event, database or Gemini key)
+
+Run from backend/app/API/:
+    python -m unittest discover -s tests
+"""
+import pathlib
+import re
+import sys
+import types
+import unittest
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(pathlib.Path(__file__).parents[1]))
+
+import chat_api  # noqa: E402  (adds the training paths)
+import load_test  # noqa: E402
+from scripts import rag_pipeline  # noqa: E402
+
+ON_TOPIC = "Bagaimana mencegah diabetes gestasional?"
+OFF_TOPIC = "Siapa presiden Indonesia sekarang?"
+
+
+class ChatApiTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        args = types.SimpleNamespace(
+            quiet=True, rate_interval=0.0, no_cache=True, seed=42,
+            llm_latency_ms=0.0, llm_latency_dist="fixed", llm_error_rate=0.0, llm_429_rate=0.0,
+            llm_retry_delay=0.0,
+        )
+        with mock.patch.object(rag_pipeline, "setup_logging"):  # keep rag_pipeline.log untouched
+            app, _ = load_test.setup_inprocess_app(args)
+        cls.chat_api = chat_api
+        cls.client = TestClient(app)
+
+    def chat(self, message, **headers):
+        response = self.client.post("/api/chat", json={"message": message, "user_id": "test"}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def scrape(self):
+        """/metrics as {sample with labels: value}"""
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain; version=0.0.4"))
+        samples = {}
+        for line in response.text.splitlines():
+            if line and not line.startswith("#"):
+                name, value = line.rsplit(" ", 1)
+                samples[name] = float(value)
+        return response.text, samples
+
+
+class DebugTimingsTest(ChatApiTestCase):
+
+    def test_timings_only_with_debug_header(self):
+        self.assertIsNone(self.chat(ON_TOPIC)["timings"])
+
+        timings = self.chat(ON_TOPIC, **{"X-Debug-Timings": "1"})["timings"]
+
+        self.assertTrue(timings["request_id"])
+        for span in ("rate_limit_wait", "fallback", "gating", "retrieval", "prompt_build", "llm_call"):
+            self.assertIn(span, timings["spans_ms"])
+        self.assertEqual([s["name"] for s in timings["timeline"]][0], "rate_limit_wait")
+        starts = [s["start_ms"] for s in timings["timeline"]]
+        self.assertEqual(starts, sorted(starts))
+        self.assertGreaterEqual(timings["total_ms"], max(starts))
+
+    def test_rejected_question_stops_after_gating(self):
+        timings = self.chat(OFF_TOPIC, **{"X-Debug-Timings": "1"})["timings"]
+
+        self.assertIn("gating", timings["spans_ms"])
+        self.assertNotIn("retrieval", timings["spans_ms"])
+        self.assertNotIn("llm_call", timings["spans_ms"])
+
+    def test_batch_timings_per_question(self):
+        response = self.client.post(
+            "/api/chat/batch", json={"questions": [ON_TOPIC, OFF_TOPIC]}, headers={"X-Debug-Timings": "1"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        on_topic, off_topic = response.json()["answers"]
+        self.assertNotEqual(on_topic["timings"]["request_id"], off_topic["timings"]["request_id"])
+        self.assertIn("llm_call", on_topic["timings"]["spans_ms"])
+        self.assertNotIn("llm_call", off_topic["timings"]["spans_ms"])
+
+        plain = self.client.post("/api/chat/batch", json={"questions": [OFF_TOPIC]}).json()
+        self.assertIsNone(plain["answers"][0]["timings"])
+
+    def test_spans_are_exported_to_histograms(self):
+        from rag_metrics import RAG_SPAN_SECONDS
+
+        before = RAG_SPAN_SECONDS.labels("llm_call").count
+        self.chat(ON_TOPIC)
+
+        self.assertEqual(RAG_SPAN_SECONDS.labels("llm_call").count, before + 1)
+
+
+class BatchEndpointTest(ChatApiTestCase):
+
+    def batch(self, questions):
+        return self.client.post("/api/chat/batch", json={"questions": questions, "user_id": "test"})
+
+    def test_answers_follow_question_order(self):
+        fallback = "Apa saja tanda-tanda kehamilan awal?"
+        questions = [OFF_TOPIC, ON_TOPIC, fallback]
+
+        response = self.batch(questions)
+
+        self.assertEqual(response.status_code, 200)
+        answers = response.json()["answers"]
+        self.assertEqual([a["question"] for a in answers], questions)
+        self.assertEqual([a["tier"] for a in answers], ["reject", "llm", "fallback"])
+        self.assertEqual(answers[1]["answer"], self.chat(ON_TOPIC)["answer"])
+
+    def test_max_batch_questions(self):
+        with mock.patch.object(self.chat_api, "MAX_BATCH_QUESTIONS", 2):
+            self.assertEqual(self.batch([OFF_TOPIC] * 2).status_code, 200)
+            response = self.batch([OFF_TOPIC] * 3)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("At most 2 questions", response.json()["detail"])
+
+    def test_empty_questions_are_rejected(self):
+        self.assertEqual(self.batch([]).status_code, 400)
+        self.assertEqual(self.batch([ON_TOPIC, "   "]).status_code, 400)
+
+
+class MetricsEndpointTest(ChatApiTestCase):
+
+    def test_every_metric_is_documented(self):
+        text, samples = self.scrape()
+
+        documented = set(re.findall(r"^# TYPE (\S+) (?:counter|gauge|histogram)$", text, re.M))
+        self.assertEqual(set(re.findall(r"^# HELP (\S+) ", text, re.M)), documented)
+        for metric in ("pregcare_rag_requests", "pregcare_rag_span_seconds", "pregcare_llm_call_seconds",
+                       "pregcare_llm_rate_limited", "pregcare_llm_errors", "pregcare_rate_limit_wait_seconds",
+                       "pregcare_semantic_cache_entries", "pregcare_conversation_users"):
+            self.assertIn(metric, documented)
+        for sample in samples:
+            self.assertIn(re.sub(r"(_bucket|_sum|_count|_total)?(\{.*\})?$", "", sample), documented)
+
+    def test_request_outcomes(self):
+        _, before = self.scrape()
+        self.chat(ON_TOPIC)
+        self.chat(OFF_TOPIC)
+        self.chat(OFF_TOPIC)
+        _, after = self.scrape()
+
+        def delta(sample):
+            return after.get(sample, 0.0) - before.get(sample, 0.0)
+
+        self.assertEqual(delta('pregcare_rag_requests_total{outcome="llm"}'), 1)
+        self.assertEqual(delta('pregcare_rag_requests_total{outcome="reject"}'), 2)
+        self.assertEqual(delta('pregcare_llm_call_seconds_count{provider="stub"}'), 1)
+
+    def test_histogram_buckets_are_cumulative(self):
+        self.chat(ON_TOPIC)
+        _, samples = self.scrape()
+
+        buckets = [v for k, v in samples.items() if k.startswith('pregcare_rag_span_seconds_bucket{span="llm_call"')]
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(buckets[-1], samples['pregcare_rag_span_seconds_count{span="llm_call"}'])
+
+    def test_llm_rate_limits_and_errors(self):
+        from scripts.llm_providers import StubLLMProvider
+
+        self.addCleanup(setattr, self.chat_api, "genai_client", self.chat_api.genai_client)
+        _, before = self.scrape()
+        self.chat_api.genai_client = StubLLMProvider(latency_ms=0, latency_dist="fixed", rate_limit_rate=1.0, base_delay=0)
+        self.chat(ON_TOPIC + " (429)")
+        self.chat_api.genai_client = StubLLMProvider(latency_ms=0, latency_dist="fixed", error_rate=1.0, base_delay=0)
+        self.chat(ON_TOPIC + " (500)")
+        _, after = self.scrape()
+
+        retries = self.chat_api.genai_client.max_retries
+        limited = 'pregcare_llm_rate_limited_total{provider="stub"}'
+        errors = 'pregcare_llm_errors_total{provider="stub"}'
+        self.assertEqual(after[limited] - before.get(limited, 0.0), retries)
+        self.assertEqual(after[errors] - before.get(errors, 0.0), retries)
+
+    def test_store_size_gauges(self):
+        self.chat_api.conversation_histories.clear()
+        self.chat(ON_TOPIC)
+        self.client.post("/api/chat", json={"message": ON_TOPIC, "user_id": "lain"})
+
+        _, samples = self.scrape()
+
+        self.assertEqual(samples["pregcare_conversation_users"], 2)
+        self.assertEqual(samples["pregcare_conversation_exchanges"], 2)
+        self.assertEqual(samples["pregcare_semantic_cache_entries"], 0)  # no cache in this harness
+
+
+if __name__ == "__main__":
+    unittest.main()
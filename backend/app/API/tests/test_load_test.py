@@ -0,0 +1,120 @@
+"""
+Tests for load_test.py (report math and the in-process harness)
+
+Run from backend/app/API/:
+    python -m unittest discover -s tests
+"""
+import asyncio
+import pathlib
+import sys
+import types
+import unittest
+from unittest import mock
+
+import httpx
+
+sys.path.insert(0, str(pathlib.Path(__file__).parents[1]))
+
+import chat_api  # noqa: E402  (adds the training paths)
+import load_test  # noqa: E402
+from scripts import rag_pipeline  # noqa: E402
+
+
+def harness_args(**overrides):
+    """argparse-like namespace for setup_inprocess_app (stub LLM, no semantic cache)"""
+    args = dict(
+        quiet=True, rate_interval=0.0, no_cache=True, seed=42,
+        llm_latency_ms=0.0, llm_latency_dist="fixed", llm_error_rate=0.0, llm_429_rate=0.0, llm_retry_delay=0.0,
+    )
+    args.update(overrides)
+    return types.SimpleNamespace(**args)
+
+
+def record(latency, endpoint="chat", status=200, cached=False, category="rag"):
+    return {"endpoint": endpoint, "category": category, "status": status, "cached": cached, "latency": latency}
+
+
+class ReportTest(unittest.TestCase):
+
+    def test_percentile_nearest_rank(self):
+        values = [0.1 * i for i in range(1, 11)]
+        self.assertAlmostEqual(load_test.percentile(values, 50), 0.5)
+        self.assertAlmostEqual(load_test.percentile(values, 95), 1.0)
+        self.assertEqual(load_test.percentile([], 99), 0.0)
+
+    def test_summarize(self):
+        records = [record(0.5), record(0.5, cached=True), record(1.0, status=500), record(1.0, endpoint="health")]
+
+        summary = load_test.summarize(records, elapsed=1.5)
+
+        self.assertEqual(summary["requests"], 4)
+        self.assertEqual(summary["errors"], 1)
+        self.assertAlmostEqual(summary["throughput_rps"], 4 / 1.5)
+        self.assertAlmostEqual(summary["effective_concurrency"], 2.0)
+        self.assertAlmostEqual(summary["latency_ms"]["max"], 1000.0)
+        # Only successful chat responses count towards the cached ratio
+        self.assertAlmostEqual(summary["cached_ratio"], 0.5)
+
+    def test_is_serialized(self):
+        serial = load_test.summarize([record(0.1)] * 20, elapsed=2.0)
+        parallel = load_test.summarize([record(0.1)] * 20, elapsed=0.5)
+
+        self.assertTrue(load_test.is_serialized(serial, concurrency=8))
+        self.assertFalse(load_test.is_serialized(parallel, concurrency=8))
+        # One client, or fewer requests than clients, cannot show overlap
+        self.assertFalse(load_test.is_serialized(serial, concurrency=1))
+        self.assertFalse(load_test.is_serialized(serial, concurrency=32))
+
+    def test_schedule_is_reproducible(self):
+        mix = load_test.parse_mix(load_test.DEFAULT_MIX)
+        endpoint_mix = load_test.parse_mix("chat=3,health=1")
+        self.assertAlmostEqual(endpoint_mix["chat"], 0.75)
+
+        first = load_test.build_schedule(50, 7, mix, endpoint_mix, users=5)
+        self.assertEqual(first, load_test.build_schedule(50, 7, mix, endpoint_mix, users=5))
+        self.assertNotEqual(first, load_test.build_schedule(50, 8, mix, endpoint_mix, users=5))
+        with self.assertRaises(ValueError):
+            load_test.parse_mix("chat=0")
+
+
+class InProcessRunTest(unittest.TestCase):
+
+    def run_load(self, schedule, concurrency, **overrides):
+        with mock.patch.object(rag_pipeline, "setup_logging"):  # keep rag_pipeline.log untouched
+            app, cache_enabled = load_test.setup_inprocess_app(harness_args(**overrides))
+        self.assertFalse(cache_enabled)
+
+        async def go():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+                return await load_test.run_load(client, schedule, concurrency, duration=None)
+
+        return asyncio.run(go())
+
+    def test_chat_requests_overlap(self):
+        # Regression: a blocking `async def` /api/chat served every client one at a time
+        question = "Bagaimana cara mengatasi anemia di trimester kedua?"
+        schedule = [("chat", "rag", question, f"u{i}") for i in range(8)]
+
+        records, elapsed = self.run_load(schedule, concurrency=8, llm_latency_ms=200.0)
+
+        self.assertEqual([r["status"] for r in records], [200] * 8)
+        overall = load_test.summarize(records, elapsed)
+        self.assertGreater(overall["effective_concurrency"], 2.0)
+        self.assertFalse(load_test.is_serialized(overall, concurrency=8))
+
+    def test_records_every_endpoint(self):
+        schedule = [
+            ("chat", "offtopic", "Siapa presiden Indonesia sekarang?", "u1"),
+            ("history", "history", None, "u1"),
+            ("health", "health", None, "u1"),
+        ]
+
+        records, _ = self.run_load(schedule, concurrency=1)
+
+        self.assertEqual(sorted((r["endpoint"], r["status"]) for r in records),
+                         [("chat", 200), ("health", 200), ("history", 200)])
+
+
+if __name__ == "__main__":
+    unittest.main()
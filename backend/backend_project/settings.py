@@ -98,6 +98,28 @@ DATABASES = {
 }
 
 
+# Cache
+# Holds notification preferences and the reminder scheduler's minute claims.
+# Set PREGCARE_REDIS_URL (e.g. redis://127.0.0.1:6379/1, needs `pip install redis`)
+# to share it between processes; the default local-memory cache is per process.
+
+if os.environ.get('PREGCARE_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['PREGCARE_REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'pregcare',
+            'OPTIONS': {'MAX_ENTRIES': 50000},  # one preference entry per active user
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -0,0 +1,35 @@
+"""
+Settings for running the test suite without the MySQL server:
+
+    python manage.py test fertility --settings=backend_project.settings_test
+
+SQLite (in-memory test database) and the local-memory cache, so tests never
+touch PREGCARE_REDIS_URL or notification.log.
+"""
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test_db.sqlite3',
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pregcare-test',
+    }
+}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'loggers': {
+        'fertility.notifications': {'level': 'CRITICAL'},
+    },
+}
+
+TEST_RUNNER = 'fertility.tests.runner.PregCareTestRunner'
@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend_project.settings')
 
 application = get_wsgi_application()
+
+# Optional background dispatcher / reminder scheduler (PREGCARE_NOTIFICATION_DISPATCHER=inprocess,
+# PREGCARE_REMINDER_SCHEDULER=inprocess); otherwise run `manage.py dispatch_notifications`
+# and `manage.py schedule_reminders`
+from fertility.notifications.notification_dispatcher import start_in_process_dispatcher  # noqa: E402
+from fertility.notifications.scheduler import start_in_process_scheduler  # noqa: E402
+
+start_in_process_dispatcher()
+start_in_process_scheduler()
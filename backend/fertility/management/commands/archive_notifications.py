@@ -0,0 +1,68 @@
+"""
+Archive Notifications Command
+Moves old sent/read notifications to gzip JSONL archives (or purges them)
+in small batches. Run daily (cron).
+
+Usage:
+    python manage.py archive_notifications
+    python manage.py archive_notifications --days 90 --batch-size 2000
+    python manage.py archive_notifications --purge             # delete without archiving
+    python manage.py archive_notifications --dry-run
+    python manage.py archive_notifications --partition-plan    # print partitioning DDL for this DB
+"""
+from django.core.management.base import BaseCommand
+
+from fertility.notifications.retention import (
+    ARCHIVABLE_STATUSES, ARCHIVE_DIR, RETENTION_DAYS, archive_notifications, partitioning_plan,
+)
+
+
+class Command(BaseCommand):
+    help = 'Archive or purge old delivered notifications in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=RETENTION_DAYS, help='Keep notifications newer than this')
+        parser.add_argument(
+            '--status',
+            action='append',
+            choices=['sent', 'read', 'failed'],
+            help=f"Statuses to archive (repeatable, default: {', '.join(ARCHIVABLE_STATUSES)}); "
+                 "failed rows only once their retries are exhausted",
+        )
+        parser.add_argument('--archive-dir', type=str, default=str(ARCHIVE_DIR), help='Archive directory')
+        parser.add_argument('--purge', action='store_true', help='Delete without writing an archive')
+        parser.add_argument('--keep-html', action='store_true', help='Include the HTML body in the archive')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per batch')
+        parser.add_argument('--pause', type=float, default=0.1, help='Seconds to sleep between batches')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be archived')
+        parser.add_argument('--partition-plan', action='store_true',
+                            help='Print time-partitioning DDL for the current database and exit')
+
+    def handle(self, *args, **options):
+        if options['partition_plan']:
+            self.stdout.write(partitioning_plan())
+            return
+
+        stats = archive_notifications(
+            older_than_days=options['days'],
+            statuses=options['status'] or ARCHIVABLE_STATUSES,
+            archive_dir=None if options['purge'] else options['archive_dir'],
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            keep_html=options['keep_html'],
+            max_batches=options['max_batches'],
+            dry_run=options['dry_run'],
+        )
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f"🔍 {stats['archived']} notifications older than {stats['cutoff']} would be archived"
+            ))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {stats['deleted']} notifications removed in {stats['batches']} batches"
+        ))
+        if stats['file']:
+            self.stdout.write(f"📦 Archive: {stats['file']} ({stats['archived']} rows)")
@@ -0,0 +1,159 @@
+"""
+Email Dispatcher Benchmark Command
+Compares thread-per-email sending (one SMTP handshake per message) with the
+pooled EmailDispatcher and the asyncio AsyncEmailDispatcher against a local
+aiosmtpd stub server (throughput and SMTP sessions opened).
+
+Usage:
+    python manage.py bench_email_dispatcher
+    python manage.py bench_email_dispatcher --messages 2000 --workers 8 --handshake-ms 150 --data-ms 20
+    python manage.py bench_email_dispatcher --skip-baseline --workers 16
+
+Requires: pip install aiosmtpd (dev only); the async run also needs aiosmtplib
+"""
+import logging
+import socket
+import threading
+import time
+import warnings
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fertility.notifications.email_dispatcher import EmailDispatcher
+from fertility.notifications.services import EmailService
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class _CountingHandler:
+    """aiosmtpd handler: counts sessions and messages, optionally sleeps to mimic a remote server"""
+
+    def __init__(self, handshake_delay: float, data_delay: float):
+        self.handshake_delay = handshake_delay
+        self.data_delay = data_delay
+        self.sessions = set()
+        self.messages = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        import asyncio
+        # Stands in for TLS + AUTH round trips to a real provider
+        if self.handshake_delay:
+            await asyncio.sleep(self.handshake_delay)
+        session.host_name = hostname
+        self.sessions.add(id(session))
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        import asyncio
+        if self.data_delay:
+            await asyncio.sleep(self.data_delay)
+        self.messages += 1
+        return '250 Message accepted for delivery'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark thread-per-email vs pooled and async email dispatchers against a local SMTP stub'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=500, help='Emails per run')
+        parser.add_argument('--workers', type=int, default=4, help='Dispatcher workers / SMTP sessions (both dispatchers)')
+        parser.add_argument('--queue-size', type=int, default=200, help='Dispatcher queue bound')
+        parser.add_argument('--handshake-ms', type=float, default=50.0,
+                            help='Stub delay per EHLO (emulates TLS+login round trips)')
+        parser.add_argument('--data-ms', type=float, default=5.0, help='Stub delay per message')
+        parser.add_argument('--skip-baseline', action='store_true', help='Skip the thread-per-email run')
+        parser.add_argument('--skip-async', action='store_true', help='Skip the AsyncEmailDispatcher run')
+
+    def handle(self, *args, **options):
+        try:
+            from aiosmtpd.controller import Controller
+            from aiosmtpd.smtp import AuthResult
+        except ImportError:
+            raise CommandError('aiosmtpd not installed. Install with: pip install aiosmtpd')
+
+        # Per-message "[OK] Email sent" lines would dominate the run (and notification.log)
+        logging.getLogger('fertility.notifications').setLevel(logging.WARNING)
+        warnings.filterwarnings('ignore', message='Session.login_data is deprecated')
+
+        modes = (['thread-per-email'] if not options['skip_baseline'] else []) + ['dispatcher']
+        if not options['skip_async']:
+            try:
+                import aiosmtplib  # noqa: F401
+                modes.append('async')
+            except ImportError:
+                self.stdout.write(self.style.WARNING('⚠️  aiosmtplib not installed, skipping the async run'))
+
+        n = options['messages']
+        results = []
+        for name in modes:
+            handler = _CountingHandler(options['handshake_ms'] / 1000, options['data_ms'] / 1000)
+            port = _free_port()
+            controller = Controller(
+                handler,
+                hostname='127.0.0.1',
+                port=port,
+                auth_require_tls=False,
+                authenticator=lambda *a, **k: AuthResult(success=True),
+            )
+            controller.start()
+            try:
+                service = EmailService(
+                    host='127.0.0.1',
+                    port=port,
+                    username='bench@pregcare.local',
+                    password='bench',
+                    use_tls=False,
+                )
+                elapsed, ok = self._run(name, service, n, options)
+            finally:
+                controller.stop()
+            results.append((name, elapsed, ok, len(handler.sessions), handler.messages))
+
+        self.stdout.write(self.style.HTTP_INFO(
+            f"\n=== {n} emails, handshake {options['handshake_ms']:.0f}ms, data {options['data_ms']:.0f}ms ===\n"
+        ))
+        self.stdout.write(f"{'mode':<18} {'time s':>8} {'msg/s':>9} {'ok':>6} {'sessions':>9}")
+        for name, elapsed, ok, sessions, received in results:
+            self.stdout.write(f"{name:<18} {elapsed:>8.2f} {received / elapsed:>9.1f} {ok:>6} {sessions:>9}")
+        if len(results) > 1:
+            for name, elapsed, *_ in results[1:]:
+                speedup = results[0][1] / elapsed
+                self.stdout.write(self.style.SUCCESS(f"\n{name} vs {results[0][0]}: {speedup:.1f}x"))
+
+    def _run(self, name, service, n, options):
+        done = threading.Semaphore(0)
+        ok = []
+
+        def callback(result):
+            if result['success']:
+                ok.append(1)
+            done.release()
+
+        body = '<p>Benchmark</p>'
+        t0 = time.perf_counter()
+        if name == 'thread-per-email':
+            # The previous send_email_async: one thread and one fresh session per email
+            for i in range(n):
+                threading.Thread(
+                    target=lambda i=i: callback(service.send_email(f'user{i}@example.com', 'Bench', body)),
+                    daemon=True,
+                ).start()
+            for _ in range(n):
+                done.acquire()
+            return time.perf_counter() - t0, len(ok)
+
+        if name == 'async':
+            from fertility.notifications.async_email import AsyncEmailDispatcher
+            dispatcher = AsyncEmailDispatcher(service, workers=options['workers'], queue_size=options['queue_size'])
+        else:
+            dispatcher = EmailDispatcher(service, workers=options['workers'], queue_size=options['queue_size'])
+        for i in range(n):
+            dispatcher.submit(f'user{i}@example.com', 'Bench', body, callback=callback, timeout=60)
+        dispatcher.join()
+        elapsed = time.perf_counter() - t0
+        dispatcher.shutdown()
+        return elapsed, len(ok)
@@ -0,0 +1,71 @@
+"""
+Dispatch Notifications Command
+Long-running worker that sends scheduled notifications and retries failed ones.
+Any number of replicas can run side by side (rows are claimed with SKIP LOCKED).
+
+Usage:
+    python manage.py dispatch_notifications
+    python manage.py dispatch_notifications --batch-size 200 --interval 2
+    python manage.py dispatch_notifications --once    # drain what is due, then exit (cron)
+"""
+import os
+import signal
+
+from django.core.management.base import BaseCommand
+
+from fertility.notifications.notification_dispatcher import NotificationDispatcher
+
+
+class Command(BaseCommand):
+    help = 'Send due scheduled notifications and retry failed ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=int(os.environ.get('PREGCARE_DISPATCH_BATCH_SIZE', '100')),
+            help='Notifications claimed per batch',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=float(os.environ.get('PREGCARE_DISPATCH_INTERVAL', '5')),
+            help='Seconds to sleep when nothing is due',
+        )
+        parser.add_argument(
+            '--lease',
+            type=float,
+            default=float(os.environ.get('PREGCARE_DISPATCH_LEASE', '300')),
+            help='Seconds a claimed notification is hidden from other dispatchers',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once nothing is due instead of polling',
+        )
+
+    def handle(self, *args, **options):
+        dispatcher = NotificationDispatcher(
+            batch_size=options['batch_size'],
+            interval=options['interval'],
+            lease_seconds=options['lease'],
+        )
+
+        def _graceful_stop(signum, frame):
+            self.stdout.write(self.style.WARNING('\n⏹️  Stopping after the current batch...'))
+            dispatcher.stop()
+
+        signal.signal(signal.SIGTERM, _graceful_stop)
+        signal.signal(signal.SIGINT, _graceful_stop)
+
+        self.stdout.write(self.style.HTTP_INFO(
+            f"\n=== Notification Dispatcher (batch {options['batch_size']}, lease {options['lease']:.0f}s) ===\n"
+        ))
+        dispatcher.run(once=options['once'])
+        dispatcher.email_dispatcher.shutdown(wait=True, timeout=30)
+
+        stats = dispatcher.stats
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {stats['claimed']} claimed in {stats['batches']} batches: "
+            f"{stats['sent']} sent, {stats['failed']} failed"
+        ))
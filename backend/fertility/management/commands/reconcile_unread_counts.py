@@ -0,0 +1,27 @@
+"""
+Reconcile Unread Counts Command
+Recounts unread notifications for users with a counter row and fixes any
+drift. Run periodically (e.g. cron every 15 minutes).
+
+Usage:
+    python manage.py reconcile_unread_counts
+    python manage.py reconcile_unread_counts --user-id 5
+"""
+from django.core.management.base import BaseCommand
+
+from fertility.notifications.unread import reconcile_unread_counts
+
+
+class Command(BaseCommand):
+    help = 'Fix drifted per-user unread notification counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', type=int, help='Only this user')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Users recounted per query')
+
+    def handle(self, *args, **options):
+        user_ids = [options['user_id']] if options['user_id'] else None
+        stats = reconcile_unread_counts(user_ids, chunk_size=options['chunk_size'])
+
+        style = self.style.WARNING if stats['fixed'] else self.style.SUCCESS
+        self.stdout.write(style(f"✅ {stats['checked']} counters checked, {stats['fixed']} fixed"))
@@ -0,0 +1,60 @@
+"""
+Schedule Reminders Command
+Creates the daily reminder each minute for users whose preferred_time (in
+their own timezone) is that minute. The notification dispatcher sends them.
+
+Usage:
+    python manage.py schedule_reminders
+    python manage.py schedule_reminders --once                   # single tick (cron every minute)
+    python manage.py schedule_reminders --preview 2025-01-01T02:00Z   # who is due at a UTC minute
+"""
+import signal
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fertility.notifications.scheduler import ReminderScheduler
+
+
+class Command(BaseCommand):
+    help = 'Create daily reminders at each user\'s preferred local time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run one tick and exit')
+        parser.add_argument(
+            '--catch-up',
+            type=int,
+            default=15,
+            help='Max missed minutes to process after downtime',
+        )
+        parser.add_argument(
+            '--preview',
+            type=str,
+            help='Show the windows and due-user count for a UTC minute (ISO format) without creating anything',
+        )
+
+    def handle(self, *args, **options):
+        scheduler = ReminderScheduler(max_catch_up_minutes=options['catch_up'])
+
+        if options['preview']:
+            try:
+                minute = datetime.fromisoformat(options['preview'].replace('Z', '+00:00'))
+            except ValueError:
+                raise CommandError(f"Invalid --preview time: {options['preview']}")
+            if minute.tzinfo is None:
+                raise CommandError('--preview needs a timezone, e.g. 2025-01-01T02:00Z')
+            for name, local in scheduler.windows(minute):
+                self.stdout.write(f"🕘 {name:<24} {local:%H:%M}")
+            self.stdout.write(self.style.SUCCESS(f"✅ {scheduler.users_due(minute).count()} users due"))
+            return
+
+        def _graceful_stop(signum, frame):
+            self.stdout.write(self.style.WARNING('\n⏹️  Stopping scheduler...'))
+            scheduler.stop()
+
+        signal.signal(signal.SIGTERM, _graceful_stop)
+        signal.signal(signal.SIGINT, _graceful_stop)
+
+        self.stdout.write(self.style.HTTP_INFO('\n=== Reminder Scheduler ===\n'))
+        scheduler.run(once=options['once'])
+        self.stdout.write(self.style.SUCCESS(f"✅ {scheduler.stats['created']} reminders scheduled"))
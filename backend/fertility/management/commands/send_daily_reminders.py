@@ -0,0 +1,49 @@
+"""
+Send Daily Reminders Command
+Fans the daily cycle-data reminder out to every eligible user in bulk
+(streamed users, chunked bulk_create). Sending is left to the notification
+dispatcher unless --dispatch is given.
+
+Usage:
+    python manage.py send_daily_reminders
+    python manage.py send_daily_reminders --chunk-size 2000 --dispatch
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from fertility.notifications.services import notification_triggers
+
+
+class Command(BaseCommand):
+    help = 'Create the daily cycle reminder for all eligible users'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Users fetched / notifications inserted per round trip',
+        )
+        parser.add_argument(
+            '--dispatch',
+            action='store_true',
+            help='Drain the created notifications now instead of leaving them to dispatch_notifications',
+        )
+
+    def handle(self, *args, **options):
+        t0 = time.perf_counter()
+        created = notification_triggers.bulk_cycle_data_reminder(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {created} reminders queued in {time.perf_counter() - t0:.1f}s"
+        ))
+
+        if options['dispatch'] and created:
+            from fertility.notifications.notification_dispatcher import NotificationDispatcher
+
+            dispatcher = NotificationDispatcher()
+            dispatcher.run(once=True)
+            dispatcher.email_dispatcher.shutdown(wait=True, timeout=30)
+            self.stdout.write(self.style.SUCCESS(
+                f"📧 {dispatcher.stats['sent']} sent, {dispatcher.stats['failed']} failed"
+            ))
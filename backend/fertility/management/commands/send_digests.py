@@ -0,0 +1,36 @@
+"""
+Send Digests Command
+Sends one digest email per digest-mode user covering all held notifications.
+The reminder scheduler already does this at each user's preferred time; use
+this command for a manual or cron-driven flush.
+
+Usage:
+    python manage.py send_digests
+    python manage.py send_digests --user-id 5
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from fertility.notifications.digest import DigestSender
+
+
+class Command(BaseCommand):
+    help = 'Send digest emails for held notifications of digest-mode users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', type=int, help='Only this user')
+        parser.add_argument('--chunk-size', type=int, default=200, help='Users claimed per batch')
+
+    def handle(self, *args, **options):
+        sender = DigestSender(user_chunk_size=options['chunk_size'])
+        users = User.objects.filter(id=options['user_id']) if options['user_id'] else None
+
+        self.stdout.write(self.style.HTTP_INFO('\n=== Notification Digests ===\n'))
+        sender.send(users=users)
+        sender.email_dispatcher.shutdown(wait=True, timeout=30)
+
+        stats = sender.stats
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {stats['digests']} digests sent covering {stats['notifications']} notifications "
+            f"({stats['failed']} failed)"
+        ))
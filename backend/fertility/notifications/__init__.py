@@ -3,10 +3,18 @@
 
 from .models import Notification, NotificationType
 from .services import EmailService, NotificationService
+from .email_dispatcher import EmailDispatcher, get_email_dispatcher
+from .notification_dispatcher import NotificationDispatcher, get_notification_dispatcher
+from .scheduler import ReminderScheduler
 
 __all__ = [
     'Notification',
     'NotificationType',
     'EmailService',
     'NotificationService',
+    'EmailDispatcher',
+    'get_email_dispatcher',
+    'NotificationDispatcher',
+    'get_notification_dispatcher',
+    'ReminderScheduler',
 ]
@@ -0,0 +1,331 @@
+"""
+Async Email Dispatcher for PregCare
+asyncio/aiosmtplib variant of EmailDispatcher. One event-loop thread owns a
+few persistent SMTP sessions and multiplexes every queued send over them, so
+raising the number of sessions costs a coroutine instead of a thread, and
+thousands of queued emails wait as cheap coroutine state.
+
+Outcomes are not reported from the event loop (the ORM would block it): a
+reporter thread collects them and writes notification statuses back in
+batches (one bulk UPDATE per batch via record_results), then runs callbacks.
+
+Enable with PREGCARE_EMAIL_BACKEND=async (see email_dispatcher.get_email_dispatcher);
+the other PREGCARE_EMAIL_* settings apply as for EmailDispatcher, with
+PREGCARE_EMAIL_WORKERS as the number of SMTP sessions.
+
+Requires: pip install aiosmtplib
+"""
+import asyncio
+import logging
+import queue
+import socket
+import ssl
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import aiosmtplib
+from django.db import close_old_connections
+
+from .email_dispatcher import EmailJob
+
+logger = logging.getLogger(__name__)
+
+# Session-level failures: drop the connection and retry the message on a fresh one.
+# Listed explicitly (no bare OSError) so SMTP replies never trigger a resend.
+_CONNECTION_ERRORS = (
+    aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError, aiosmtplib.SMTPTimeoutError,
+    asyncio.TimeoutError, ConnectionError, TimeoutError, socket.gaierror, ssl.SSLError,
+)
+_MESSAGE_ERRORS = (
+    aiosmtplib.SMTPRecipientsRefused, aiosmtplib.SMTPRecipientRefused,
+    aiosmtplib.SMTPSenderRefused, aiosmtplib.SMTPDataError,
+)
+
+_STOP = object()
+
+
+class AsyncEmailDispatcher:
+    """
+    Event-loop thread with `workers` persistent aiosmtplib sessions, plus a
+    reporter thread that applies outcomes in batches.
+
+    Same interface as EmailDispatcher: submit() blocks while `queue_size`
+    emails are unfinished (backpressure) and gives up after `submit_timeout`.
+    """
+
+    def __init__(
+        self,
+        email_service,
+        workers: int = 4,
+        queue_size: int = 1000,
+        max_messages_per_connection: int = 100,
+        idle_timeout: float = 30.0,
+        submit_timeout: float = 5.0,
+        connect_timeout: float = 30.0,
+        report_batch_size: int = 200,
+        report_interval: float = 0.1,
+    ):
+        self.email_service = email_service
+        self.workers = max(1, workers)
+        self.max_messages_per_connection = max(1, max_messages_per_connection)
+        self.idle_timeout = idle_timeout
+        self.submit_timeout = submit_timeout
+        self.connect_timeout = connect_timeout
+        self.report_batch_size = max(1, report_batch_size)
+        self.report_interval = report_interval
+        self._slots = threading.Semaphore(max(1, queue_size))
+        self._results: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._jobs: Optional[asyncio.Queue] = None
+        self._threads: List[threading.Thread] = []
+        self._started = False
+        self.stats = {
+            'queued': 0,
+            'sent': 0,
+            'failed': 0,
+            'rejected': 0,      # queue full after submit_timeout
+            'connections': 0,   # SMTP sessions opened
+            'reconnects': 0,    # sessions dropped mid-use
+            'reports': 0,       # batched status updates written
+        }
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            ready = threading.Event()
+            self._loop = asyncio.new_event_loop()
+            loop_thread = threading.Thread(target=self._run_loop, args=(ready,), name='email-async-loop', daemon=True)
+            reporter = threading.Thread(target=self._reporter, name='email-async-reporter', daemon=True)
+            loop_thread.start()
+            reporter.start()
+            self._threads = [loop_thread, reporter]
+        ready.wait()
+        logger.info(f"[OK] Async email dispatcher started ({self.workers} SMTP sessions)")
+
+    def submit(
+        self,
+        to_email: str,
+        subject: str,
+        html_body: str,
+        plain_text_body: Optional[str] = None,
+        callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        timeout: Optional[float] = None,
+        notification=None,
+    ) -> bool:
+        """
+        Queue one email; returns False if `queue_size` emails stayed unfinished for `timeout` seconds.
+        With `notification`, the outcome is written to that Notification row in the next status batch.
+        """
+        self.start()
+        job = EmailJob(to_email, subject, html_body, plain_text_body, callback, notification)
+        if not self._slots.acquire(timeout=self.submit_timeout if timeout is None else timeout):
+            self._bump('rejected')
+            logger.error(f"[ERROR] Email queue full, dropping email to {to_email}")
+            self._report([(job, {
+                'success': False,
+                'message': 'Email queue full',
+                'error': 'Email dispatcher queue full',
+            })])
+            return False
+        with self._lock:
+            self._pending += 1
+            self.stats['queued'] += 1
+        self._loop.call_soon_threadsafe(self._jobs.put_nowait, job)
+        return True
+
+    def join(self):
+        """Block until every queued email has been sent and its outcome reported"""
+        with self._idle:
+            self._idle.wait_for(lambda: self._pending == 0)
+
+    def shutdown(self, wait: bool = True, timeout: Optional[float] = None):
+        """Stop after the queue drains (queued emails are still sent and reported)"""
+        with self._lock:
+            if not self._started:
+                return
+            self._started = False
+            loop_thread, reporter = self._threads
+            self._threads = []
+        for _ in range(self.workers):
+            self._loop.call_soon_threadsafe(self._jobs.put_nowait, _STOP)
+        if not wait:
+            return
+        deadline = None if timeout is None else time.monotonic() + timeout
+        loop_thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        reporter.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def qsize(self) -> int:
+        return self._pending
+
+    def _bump(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+    # ------------------------------------------------------------------
+    # Event loop thread
+    # ------------------------------------------------------------------
+
+    def _run_loop(self, ready: threading.Event):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._main(ready))
+        finally:
+            self._loop.close()
+
+    async def _main(self, ready: threading.Event):
+        self._jobs = asyncio.Queue()
+        ready.set()
+        await asyncio.gather(*(self._worker() for _ in range(self.workers)))
+        self._results.put(_STOP)  # everything sent: let the reporter finish
+
+    async def _worker(self):
+        conn: Optional[aiosmtplib.SMTP] = None
+        sent_on_conn = 0
+        while True:
+            try:
+                job = await asyncio.wait_for(self._jobs.get(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                # Idle: don't hold the server's session slot open
+                conn = await self._close(conn)
+                continue
+
+            if job is _STOP:
+                await self._close(conn)
+                return
+
+            if conn is not None and sent_on_conn >= self.max_messages_per_connection:
+                conn = await self._close(conn)  # providers cap messages per session
+            if conn is None:
+                sent_on_conn = 0
+            conn, result = await self._deliver(conn, job)
+            if result['success']:
+                sent_on_conn += 1
+                self._bump('sent')
+            else:
+                self._bump('failed')
+            self._results.put((job, result))
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        """EHLO, STARTTLS (if enabled) and login on a new session"""
+        service = self.email_service
+        conn = aiosmtplib.SMTP(
+            hostname=service.host,
+            port=service.port,
+            timeout=self.connect_timeout,
+            start_tls=service.use_tls,
+        )
+        await conn.connect()
+        try:
+            await conn.login(service.username, service.password)
+        except Exception:
+            conn.close()
+            raise
+        self._bump('connections')
+        return conn
+
+    async def _deliver(self, conn: Optional[aiosmtplib.SMTP], job: EmailJob):
+        """Send over `conn`, reconnecting once if the session was dropped"""
+        service = self.email_service
+        for attempt in range(2):
+            try:
+                payload = service._create_message(job.to_email, job.subject, job.html_body, job.plain_text_body).as_string()
+                if conn is None:
+                    conn = await self._connect()
+                await conn.sendmail(service.username, [job.to_email], payload)
+                logger.info(f"[OK] Email sent successfully to {job.to_email}")
+                return conn, {'success': True, 'message': f'Email sent to {job.to_email}'}
+
+            except aiosmtplib.SMTPAuthenticationError as e:
+                error_msg = "SMTP authentication failed. Check Gmail App Password."
+                logger.error(f"[ERROR] {error_msg}: {e}")
+                return await self._close(conn), {'success': False, 'message': 'Authentication failed', 'error': error_msg}
+            except _MESSAGE_ERRORS as e:
+                # Message-level rejection; the session itself is still usable
+                error_msg = f"SMTP error: {str(e)}"
+                logger.error(f"[ERROR] {error_msg}")
+                return conn, {'success': False, 'message': 'SMTP error occurred', 'error': error_msg}
+            except _CONNECTION_ERRORS as e:
+                conn = await self._close(conn)
+                if attempt == 0:
+                    self._bump('reconnects')
+                    logger.warning(f"[WARN] SMTP session lost ({e}), reconnecting")
+                    continue
+                error_msg = f"SMTP error: {str(e)}"
+                logger.error(f"[ERROR] {error_msg}")
+                return None, {'success': False, 'message': 'SMTP error occurred', 'error': error_msg}
+            except aiosmtplib.SMTPException as e:
+                # Any other SMTP reply: session state unknown, start a fresh one for the next email
+                error_msg = f"SMTP error: {str(e)}"
+                logger.error(f"[ERROR] {error_msg}")
+                return await self._close(conn), {'success': False, 'message': 'SMTP error occurred', 'error': error_msg}
+            except Exception as e:
+                error_msg = f"Unexpected error: {str(e)}"
+                logger.error(f"[ERROR] {error_msg}")
+                return await self._close(conn), {'success': False, 'message': 'Failed to send email', 'error': error_msg}
+
+    @staticmethod
+    async def _close(conn: Optional[aiosmtplib.SMTP]) -> None:
+        if conn is not None:
+            try:
+                await conn.quit()
+            except Exception:
+                conn.close()
+        return None
+
+    # ------------------------------------------------------------------
+    # Reporter thread
+    # ------------------------------------------------------------------
+
+    def _reporter(self):
+        while True:
+            item = self._results.get()
+            batch = [item]
+            deadline = time.monotonic() + self.report_interval
+            while item is not _STOP and len(batch) < self.report_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._results.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+
+            done = [entry for entry in batch if entry is not _STOP]
+            try:
+                self._report(done)
+            finally:
+                for _ in done:
+                    self._slots.release()
+                with self._idle:
+                    self._pending -= len(done)
+                    self._idle.notify_all()
+            if item is _STOP:
+                return
+
+    def _report(self, done: List[Tuple[EmailJob, Dict[str, Any]]]):
+        """Apply a batch of outcomes: one status UPDATE for the notifications, then callbacks"""
+        if not done:
+            return
+        # Long-lived thread using the ORM: drop DB connections past CONN_MAX_AGE or broken
+        close_old_connections()
+        tracked = [(job.notification, result) for job, result in done if job.notification is not None]
+        if tracked:
+            try:
+                from .notification_dispatcher import record_results
+                record_results([n for n, _ in tracked], {n.id: result for n, result in tracked})
+                self._bump('reports')
+            except Exception as e:
+                logger.error(f"[ERROR] Email status update failed for {len(tracked)} notifications: {e}")
+        for job, result in done:
+            if job.callback:
+                try:
+                    job.callback(result)
+                except Exception as e:
+                    logger.error(f"[ERROR] Email callback failed: {e}")
@@ -0,0 +1,21 @@
+"""
+Cache helpers for the notification module.
+
+Cached preference entries and unread counts are invalidated by the
+process that writes them. That only reaches other processes (gunicorn
+workers, dispatch_notifications, schedule_reminders) when the cache itself
+is shared, i.e. PREGCARE_REDIS_URL (or another cross-process backend) is
+configured rather than the default per-process LocMemCache.
+"""
+from django.conf import settings
+
+_PER_PROCESS_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def is_shared_cache(alias: str = 'default') -> bool:
+    """True when writes to cache `alias` are visible to every process"""
+    backend = settings.CACHES.get(alias, {}).get('BACKEND', '')
+    return backend not in _PER_PROCESS_BACKENDS
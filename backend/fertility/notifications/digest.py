@@ -0,0 +1,232 @@
+"""
+Digest Sender for PregCare
+Users with digest_mode get one email per period (daily, at their preferred
+time) that lists every notification accumulated since the last digest,
+instead of one email and SMTP session per notification.
+
+Held notifications are pending rows with scheduled_at NULL (see
+NotificationService.create_notification / bulk_create_notifications).
+A digest run claims them with SKIP LOCKED, leases them like the
+NotificationDispatcher does, sends one email per user through the pooled
+EmailDispatcher and marks all constituent rows sent in a single UPDATE.
+If a run dies mid-way, the lease expires and the rows go out individually.
+A failed digest counts as an attempt on each constituent row (retry_count);
+rows out of retries become 'failed' instead of being held again.
+
+Turning digest_mode off releases the user's held rows to the
+NotificationDispatcher (release_held, called from the preference post_save
+signal). QuerySet.update() bypasses the signal: call release_held() after it.
+
+Run:
+    python manage.py send_digests              # every digest user with pending items
+or automatically from the ReminderScheduler at each user's preferred time.
+"""
+import html
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Notification
+from .notification_dispatcher import _Batch
+from .unread import adjust_unread_many
+
+logger = logging.getLogger(__name__)
+
+
+def release_held(user_ids: Iterable[int]) -> int:
+    """Hand held notifications of `user_ids` to the dispatcher (e.g. digest_mode turned off)"""
+    released = Notification.objects.filter(
+        user_id__in=list(user_ids), status='pending', scheduled_at__isnull=True,
+    ).update(scheduled_at=timezone.now())
+    if released:
+        logger.info(f"[INFO] Released {released} held notifications for individual delivery")
+    return released
+
+
+class DigestSender:
+    """Aggregates held notifications into one email per digest user"""
+
+    def __init__(
+        self,
+        email_dispatcher=None,
+        triggers=None,
+        user_chunk_size: int = 200,
+        max_items: int = 50,
+        lease_seconds: float = 300.0,
+        send_timeout: Optional[float] = None,
+    ):
+        if email_dispatcher is None:
+            from .email_dispatcher import get_email_dispatcher
+            email_dispatcher = get_email_dispatcher()
+        if triggers is None:
+            from .services import notification_triggers
+            triggers = notification_triggers
+        self.email_dispatcher = email_dispatcher
+        self.triggers = triggers
+        self.user_chunk_size = max(1, user_chunk_size)
+        self.max_items = max_items
+        self.lease = timedelta(seconds=lease_seconds)
+        self.send_timeout = send_timeout if send_timeout is not None else lease_seconds * 0.8
+        self.stats = {'digests': 0, 'notifications': 0, 'failed': 0}
+
+    def digest_users(self, users=None):
+        """Digest-mode users (optionally restricted to `users`) that have an email address"""
+        queryset = users if users is not None else User.objects.all()
+        return (
+            queryset
+            .filter(is_active=True, notification_preferences__digest_mode=True)
+            .exclude(email='')
+            .order_by()
+        )
+
+    def send(self, users=None) -> int:
+        """Send digests to every digest user with held notifications; returns digests sent"""
+        sent_before = self.stats['digests']
+        recipients = self.digest_users(users).only('id', 'username', 'first_name', 'email')
+        chunk: List[User] = []
+        for user in recipients.iterator(chunk_size=self.user_chunk_size):
+            chunk.append(user)
+            if len(chunk) >= self.user_chunk_size:
+                self._send_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._send_chunk(chunk)
+        return self.stats['digests'] - sent_before
+
+    # ------------------------------------------------------------------
+
+    def _claim(self, user_ids: List[int]) -> Dict[int, List[Notification]]:
+        """Lock and lease the held notifications of `user_ids`, grouped per user"""
+        now = timezone.now()
+        with transaction.atomic():
+            ids = list(
+                Notification.objects
+                .select_for_update(skip_locked=True)
+                .filter(user_id__in=user_ids, status='pending', scheduled_at__isnull=True)
+                .exclude(priority='urgent')  # urgent ones are being sent right now
+                .values_list('id', flat=True)
+            )
+            if ids:
+                Notification.objects.filter(id__in=ids).update(scheduled_at=now + self.lease)
+
+        grouped: Dict[int, List[Notification]] = defaultdict(list)
+        rows = (
+            Notification.objects
+            .filter(id__in=ids)
+            .only('id', 'user_id', 'subject', 'plain_text_body', 'created_at')
+            .order_by('user_id', 'created_at')
+        )
+        for notification in rows:
+            grouped[notification.user_id].append(notification)
+        return grouped
+
+    def _send_chunk(self, users: List[User]):
+        grouped = self._claim([u.id for u in users])
+        if not grouped:
+            return
+
+        batch = _Batch(len(grouped))
+        for user in users:
+            items = grouped.get(user.id)
+            if not items:
+                continue
+            subject, body, plain_text = self.render(user, items)
+            self.email_dispatcher.submit(
+                to_email=user.email,
+                subject=subject,
+                html_body=body,
+                plain_text_body=plain_text,
+                callback=lambda result, uid=user.id: self._collect(batch, uid, result, grouped),
+            )
+
+        if not batch.done.wait(self.send_timeout):
+            logger.warning(f"[WARN] {batch.size - len(batch.results)} digests still in flight after "
+                           f"{self.send_timeout:.0f}s; recording them as they finish")
+        with batch.lock:
+            batch.closed = True
+            results = dict(batch.results)
+        self._record(results, grouped)
+
+    def _collect(self, batch: _Batch, user_id: int, result: Dict[str, Any], grouped):
+        with batch.lock:
+            if not batch.closed:
+                batch.results[user_id] = result
+                if len(batch.results) >= batch.size:
+                    batch.done.set()
+                return
+        self._record({user_id: result}, grouped)
+
+    def _record(self, results: Dict[int, Dict[str, Any]], grouped: Dict[int, List[Notification]]):
+        sent_ids = [n.id for uid, r in results.items() if r['success'] for n in grouped[uid]]
+        failed_ids = [n.id for uid, r in results.items() if not r['success'] for n in grouped[uid]]
+        if sent_ids:
+            # Every constituent notification in one UPDATE
+            Notification.objects.filter(id__in=sent_ids).update(
+                status='sent', sent_at=timezone.now(), scheduled_at=None,
+            )
+        if failed_ids:
+            # Back to held: the next digest retries them, as long as they have retries left
+            errors = {r.get('error', 'Unknown error') for r in results.values() if not r['success']}
+            with transaction.atomic():
+                Notification.objects.filter(id__in=failed_ids).update(
+                    scheduled_at=None, error_message='; '.join(sorted(errors))[:1000],
+                    retry_count=F('retry_count') + 1,
+                )
+                exhausted = list(
+                    Notification.objects
+                    .filter(id__in=failed_ids, status='pending', retry_count__gte=F('max_retries'))
+                    .values_list('id', 'user_id')
+                )
+                if exhausted:
+                    Notification.objects.filter(id__in=[nid for nid, _ in exhausted]).update(status='failed')
+                unread_deltas: Dict[int, int] = defaultdict(int)
+                for _, uid in exhausted:
+                    unread_deltas[uid] -= 1
+                adjust_unread_many(unread_deltas)
+            if exhausted:
+                logger.error(f"[ERROR] {len(exhausted)} digest notifications failed after max retries")
+        digests = sum(1 for r in results.values() if r['success'])
+        self.stats['digests'] += digests
+        self.stats['notifications'] += len(sent_ids)
+        self.stats['failed'] += len(results) - digests
+        if results:
+            logger.info(f"[OK] Digests sent: {digests} emails covering {len(sent_ids)} notifications")
+
+    def render(self, user: User, items: List[Notification]):
+        """Subject, HTML and plain text for one user's digest"""
+        name = user.first_name or user.username
+        shown = items[:self.max_items]
+        more = len(items) - len(shown)
+        subject = f"Ringkasan {len(items)} Notifikasi PregCare"
+
+        sections = ''
+        for item in shown:
+            text = item.plain_text_body.strip()
+            detail = f'<p style="margin: 0; color: #555; white-space: pre-line;">{html.escape(text)}</p>' if text else ''
+            sections += f"""
+            <div style="border-left: 4px solid #FF69B4; padding: 10px 15px; margin: 15px 0; background: #fdf5fa;">
+                <h3 style="margin: 0 0 8px 0; color: #333; font-size: 16px;">{html.escape(item.subject)}</h3>
+                {detail}
+            </div>"""
+        if more:
+            sections += f"<p>... dan {more} notifikasi lainnya di aplikasi PregCare.</p>"
+        body = self.triggers._get_email_template(
+            title="Ringkasan Notifikasi Anda",
+            content=f"<p>Halo {html.escape(name)},</p><p>Berikut notifikasi Anda sejak ringkasan terakhir:</p>{sections}",
+            footer="Anda menerima ringkasan karena mode digest aktif di preferensi notifikasi.",
+        )
+
+        lines = [f"Halo {name},", "", "Berikut notifikasi Anda sejak ringkasan terakhir:", ""]
+        for item in shown:
+            text = item.plain_text_body.strip()
+            lines += [f"* {item.subject}"] + ([text, ""] if text else [])
+        if more:
+            lines.append(f"... dan {more} notifikasi lainnya di aplikasi PregCare.")
+        lines += ["", "- Tim PregCare"]
+        return subject, body, "\n".join(lines)
@@ -0,0 +1,298 @@
+"""
+Email Dispatcher for PregCare
+Bounded worker pool for outgoing email: each worker keeps one authenticated
+SMTP session open and sends many messages over it, instead of one thread and
+one EHLO/STARTTLS/login handshake per email.
+
+Configuration (environment):
+- PREGCARE_EMAIL_WORKERS: worker threads / concurrent SMTP sessions (default: 4)
+- PREGCARE_EMAIL_QUEUE_SIZE: max queued emails before submit() blocks (default: 1000)
+- PREGCARE_EMAIL_MAX_PER_CONNECTION: messages per session before reconnecting (default: 100)
+- PREGCARE_EMAIL_SUBMIT_TIMEOUT: seconds submit() waits for queue space (default: 5)
+- PREGCARE_EMAIL_BACKEND: 'threads' (this pool) or 'async' (AsyncEmailDispatcher, aiosmtplib) (default: threads)
+"""
+import atexit
+import logging
+import os
+import queue
+import smtplib
+import socket
+import ssl
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# Session-level failures: drop the connection and retry the message on a fresh one.
+# Listed explicitly: smtplib.SMTPException subclasses OSError, and SMTP replies
+# (HELO, not supported, other response codes) must not trigger a resend.
+_CONNECTION_ERRORS = (
+    smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError,
+    ConnectionError, TimeoutError, socket.gaierror, ssl.SSLError,
+)
+
+
+@dataclass
+class EmailJob:
+    to_email: str
+    subject: str
+    html_body: str
+    plain_text_body: Optional[str] = None
+    callback: Optional[Callable[[Dict[str, Any]], None]] = None
+    notification: Optional[Any] = None  # Notification whose status the result is written to
+
+
+_STOP = object()
+
+
+class EmailDispatcher:
+    """
+    Fixed pool of SMTP workers fed by a bounded queue.
+
+    submit() blocks while the queue is full (backpressure) and gives up after
+    `submit_timeout`, reporting the failure through the callback.
+    """
+
+    def __init__(
+        self,
+        email_service,
+        workers: int = 4,
+        queue_size: int = 1000,
+        max_messages_per_connection: int = 100,
+        idle_timeout: float = 30.0,
+        submit_timeout: float = 5.0,
+    ):
+        self.email_service = email_service
+        self.workers = max(1, workers)
+        self.max_messages_per_connection = max(1, max_messages_per_connection)
+        self.idle_timeout = idle_timeout
+        self.submit_timeout = submit_timeout
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+        self._threads = []
+        self._lock = threading.Lock()
+        self._started = False
+        self.stats = {
+            'queued': 0,
+            'sent': 0,
+            'failed': 0,
+            'rejected': 0,      # queue full after submit_timeout
+            'connections': 0,   # SMTP sessions opened
+            'reconnects': 0,    # sessions dropped mid-use
+        }
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f'email-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"[OK] Email dispatcher started ({self.workers} workers)")
+
+    def submit(
+        self,
+        to_email: str,
+        subject: str,
+        html_body: str,
+        plain_text_body: Optional[str] = None,
+        callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        timeout: Optional[float] = None,
+        notification=None,
+    ) -> bool:
+        """
+        Queue one email; returns False if the queue stayed full for `timeout` seconds.
+        With `notification`, the outcome is also written to that Notification row.
+        """
+        self.start()
+        job = EmailJob(to_email, subject, html_body, plain_text_body, callback, notification)
+        try:
+            self._queue.put(job, timeout=self.submit_timeout if timeout is None else timeout)
+        except queue.Full:
+            self._bump('rejected')
+            logger.error(f"[ERROR] Email queue full, dropping email to {to_email}")
+            self._notify(job, {
+                'success': False,
+                'message': 'Email queue full',
+                'error': 'Email dispatcher queue full',
+            })
+            return False
+        self._bump('queued')
+        return True
+
+    def join(self):
+        """Block until every queued email has been processed"""
+        self._queue.join()
+
+    def shutdown(self, wait: bool = True, timeout: Optional[float] = None):
+        """Stop workers after the queue drains (queued emails are still sent)"""
+        with self._lock:
+            if not self._started:
+                return
+            self._started = False
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        if wait:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            for thread in threads:
+                thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def _bump(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _notify(self, job: EmailJob, result: Dict[str, Any]):
+        if job.callback or job.notification is not None:
+            try:
+                # Workers are long-lived and callbacks use the ORM (mark_as_sent):
+                # drop DB connections past CONN_MAX_AGE or broken, like a request would
+                close_old_connections()
+                if job.notification is not None:
+                    from .notification_dispatcher import record_results
+                    record_results([job.notification], {job.notification.id: result})
+                if job.callback:
+                    job.callback(result)
+            except Exception as e:
+                logger.error(f"[ERROR] Email callback failed: {e}")
+
+    def _worker(self):
+        conn: Optional[smtplib.SMTP] = None
+        sent_on_conn = 0
+        while True:
+            try:
+                job = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                # Idle: don't hold the server's session slot open
+                conn = self._close(conn)
+                continue
+
+            if job is _STOP:
+                self._close(conn)
+                self._queue.task_done()
+                return
+
+            try:
+                if conn is not None and sent_on_conn >= self.max_messages_per_connection:
+                    conn = self._close(conn)  # providers cap messages per session
+                if conn is None:
+                    sent_on_conn = 0
+                conn, result = self._deliver(conn, job)
+                if result['success']:
+                    sent_on_conn += 1
+                    self._bump('sent')
+                else:
+                    self._bump('failed')
+                self._notify(job, result)
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, conn: Optional[smtplib.SMTP], job: EmailJob):
+        """Send over `conn`, reconnecting once if the session was dropped"""
+        service = self.email_service
+        for attempt in range(2):
+            try:
+                # Inside the try: a message that fails to render is reported, not fatal to the worker
+                payload = service._create_message(job.to_email, job.subject, job.html_body, job.plain_text_body).as_string()
+                if conn is None:
+                    conn = service.open_connection()
+                    self._bump('connections')
+                conn.sendmail(service.username, job.to_email, payload)
+                logger.info(f"[OK] Email sent successfully to {job.to_email}")
+                return conn, {'success': True, 'message': f'Email sent to {job.to_email}'}
+
+            except smtplib.SMTPAuthenticationError as e:
+                error_msg = "SMTP authentication failed. Check Gmail App Password."
+                logger.error(f"[ERROR] {error_msg}: {e}")
+                return self._close(conn), {'success': False, 'message': 'Authentication failed', 'error': error_msg}
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                # Message-level rejection; the session itself is still usable
+                error_msg = f"SMTP error: {str(e)}"
+                logger.error(f"[ERROR] {error_msg}")
+                return conn, {'success': False, 'message': 'SMTP error occurred', 'error': error_msg}
+            except _CONNECTION_ERRORS as e:
+                conn = self._close(conn)
+                if attempt == 0:
+                    self._bump('reconnects')
+                    logger.warning(f"[WARN] SMTP session lost ({e}), reconnecting")
+                    continue
+                error_msg = f"SMTP error: {str(e)}"
+                logger.error(f"[ERROR] {error_msg}")
+                return None, {'success': False, 'message': 'SMTP error occurred', 'error': error_msg}
+            except smtplib.SMTPException as e:
+                # Any other SMTP reply: session state unknown, start a fresh one for the next email
+                error_msg = f"SMTP error: {str(e)}"
+                logger.error(f"[ERROR] {error_msg}")
+                return self._close(conn), {'success': False, 'message': 'SMTP error occurred', 'error': error_msg}
+            except Exception as e:
+                error_msg = f"Unexpected error: {str(e)}"
+                logger.error(f"[ERROR] {error_msg}")
+                return self._close(conn), {'success': False, 'message': 'Failed to send email', 'error': error_msg}
+
+    @staticmethod
+    def _close(conn: Optional[smtplib.SMTP]) -> None:
+        if conn is not None:
+            try:
+                conn.quit()
+            except Exception:
+                conn.close()
+        return None
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def _smtp_target(email_service) -> tuple:
+    return (email_service.host, email_service.port, email_service.username, email_service.use_tls)
+
+
+def get_email_dispatcher(email_service=None):
+    """
+    Process-wide dispatcher (created on first use from the environment).
+    EmailDispatcher and AsyncEmailDispatcher share the submit/join/shutdown interface.
+
+    `email_service` only configures the dispatcher on the first call; later
+    calls reuse it. Passing a service for another SMTP server/account after
+    that raises ValueError (build a dedicated EmailDispatcher instead, as
+    bench_email_dispatcher does).
+    """
+    global _dispatcher
+    if _dispatcher is not None and email_service is not None:
+        if _smtp_target(email_service) != _smtp_target(_dispatcher.email_service):
+            raise ValueError(
+                "get_email_dispatcher() already configured for "
+                f"{_dispatcher.email_service.username}@{_dispatcher.email_service.host}; "
+                "create an EmailDispatcher for a different SMTP account"
+            )
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                if email_service is None:
+                    from .services import EmailService
+                    email_service = EmailService()
+                dispatcher_class = EmailDispatcher
+                if os.environ.get('PREGCARE_EMAIL_BACKEND', 'threads').lower() == 'async':
+                    try:
+                        from .async_email import AsyncEmailDispatcher
+                        dispatcher_class = AsyncEmailDispatcher
+                    except ImportError:
+                        logger.warning("[WARN] aiosmtplib not installed, using the threaded email dispatcher")
+                _dispatcher = dispatcher_class(
+                    email_service,
+                    workers=int(os.environ.get('PREGCARE_EMAIL_WORKERS', '4')),
+                    queue_size=int(os.environ.get('PREGCARE_EMAIL_QUEUE_SIZE', '1000')),
+                    max_messages_per_connection=int(os.environ.get('PREGCARE_EMAIL_MAX_PER_CONNECTION', '100')),
+                    submit_timeout=float(os.environ.get('PREGCARE_EMAIL_SUBMIT_TIMEOUT', '5')),
+                )
+                # Flush queued emails on interpreter exit instead of losing them with the daemon threads
+                atexit.register(_dispatcher.shutdown, True, 30.0)
+    return _dispatcher
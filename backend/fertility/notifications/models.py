@@ -2,9 +2,10 @@
 Notification Models for PregCare
 Stores notification history and templates
 """
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
+from datetime import timedelta
 
 
 class NotificationType(models.Model):
@@ -54,6 +55,13 @@ class Notification(models.Model):
         ('urgent', 'Urgent'),
     ]
     
+    # Statuses counted as unread (see unread.py)
+    UNREAD_STATUSES = ('sent', 'pending')
+    
+    # Exponential retry backoff: 1m, 2m, 4m, ... capped at 6h
+    RETRY_BASE_DELAY = timedelta(minutes=1)
+    RETRY_MAX_DELAY = timedelta(hours=6)
+    
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
     notification_type = models.ForeignKey(
         NotificationType, 
@@ -95,6 +103,8 @@ class Notification(models.Model):
             models.Index(fields=['user', 'status']),
             models.Index(fields=['status', 'scheduled_at']),
             models.Index(fields=['-created_at']),
+            # Keyset pagination of a user's history (NotificationListView)
+            models.Index(fields=['user', '-created_at', '-id']),
         ]
     
     def __str__(self):
@@ -102,22 +112,56 @@ class Notification(models.Model):
     
     def mark_as_sent(self):
         """Mark notification as sent"""
+        was_unread = self.status in self.UNREAD_STATUSES
         self.status = 'sent'
         self.sent_at = timezone.now()
-        self.save(update_fields=['status', 'sent_at'])
+        with transaction.atomic():
+            self.save(update_fields=['status', 'sent_at'])
+            if not was_unread:
+                self._adjust_unread(1)
     
     def mark_as_failed(self, error_message: str):
-        """Mark notification as failed with error"""
+        """Mark notification as failed with error and schedule the next retry"""
+        was_unread = self.status in self.UNREAD_STATUSES
+        self.set_failed(error_message)
+        with transaction.atomic():
+            self.save(update_fields=['status', 'error_message', 'retry_count', 'scheduled_at'])
+            if was_unread:
+                self._adjust_unread(-1)
+    
+    def set_failed(self, error_message: str, now=None):
+        """
+        Apply a failed attempt without saving (used by bulk_update in the dispatcher).
+        scheduled_at becomes the next retry time, or None once retries are exhausted
+        so the row drops out of the (status, scheduled_at) range the dispatcher scans.
+        """
         self.status = 'failed'
         self.error_message = error_message
         self.retry_count += 1
-        self.save(update_fields=['status', 'error_message', 'retry_count'])
+        self.scheduled_at = self.next_retry_at(now) if self.retry_count < self.max_retries else None
+    
+    def next_retry_at(self, now=None):
+        """Next attempt time after `retry_count` failures"""
+        delay = min(self.RETRY_BASE_DELAY * (2 ** min(max(self.retry_count - 1, 0), 16)), self.RETRY_MAX_DELAY)
+        return (now or timezone.now()) + delay
     
     def mark_as_read(self):
         """Mark notification as read"""
         self.status = 'read'
         self.read_at = timezone.now()
-        self.save(update_fields=['status', 'read_at'])
+        with transaction.atomic():
+            # Conditional UPDATE: a second read of the same row (stale instance, double click) counts once
+            was_unread = Notification.objects.filter(pk=self.pk, status__in=self.UNREAD_STATUSES).update(
+                status=self.status, read_at=self.read_at,
+            )
+            if was_unread:
+                self._adjust_unread(-1)
+            else:
+                self.save(update_fields=['status', 'read_at'])
+    
+    def _adjust_unread(self, delta: int):
+        from .unread import adjust_unread
+        adjust_unread(self.user_id, delta)
     
     def can_retry(self) -> bool:
         """Check if notification can be retried"""
@@ -152,23 +196,59 @@ class UserNotificationPreference(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Notification category -> opt-in field (also used to filter users in bulk queries)
+    CATEGORY_FIELDS = {
+        'cycle_reminder': 'email_cycle_reminders',
+        'fertile_window': 'email_fertile_alerts',
+        'period_prediction': 'email_period_predictions',
+        'ai_analysis': 'email_ai_analysis',
+        'daily_checkin': 'email_daily_checkin',
+        'partner_mission': 'email_partner_missions',
+    }
+    
     class Meta:
         db_table = 'user_notification_preferences'
         verbose_name = 'User Notification Preference'
         verbose_name_plural = 'User Notification Preferences'
+        # No migration covers these models yet (see fertility/tests/runner.py); on an
+        # existing database create the index by hand:
+        #   CREATE INDEX user_notif_tz_time_idx
+        #       ON user_notification_preferences (timezone, preferred_time);
+        indexes = [
+            # ReminderScheduler: users due at a local minute
+            models.Index(fields=['timezone', 'preferred_time'], name='user_notif_tz_time_idx'),
+        ]
     
     def __str__(self):
         return f"Notification Preferences - {self.user.username}"
     
     def is_category_enabled(self, category: str) -> bool:
         """Check if a notification category is enabled for this user"""
-        category_map = {
-            'cycle_reminder': self.email_cycle_reminders,
-            'fertile_window': self.email_fertile_alerts,
-            'period_prediction': self.email_period_predictions,
-            'ai_analysis': self.email_ai_analysis,
-            'daily_checkin': self.email_daily_checkin,
-            'partner_mission': self.email_partner_missions,
-            'system': True,  # System notifications always enabled
-        }
-        return self.email_enabled and category_map.get(category, True)
+        field = self.CATEGORY_FIELDS.get(category)
+        # System (and unknown) categories are always enabled
+        return self.email_enabled and (getattr(self, field) if field else True)
+
+
+class UnreadNotificationCounter(models.Model):
+    """
+    Per-user count of unread notifications (status pending/sent), see unread.py.
+    Adjusted with F() in the same transaction as the status changes it reflects.
+    """
+    
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='unread_notification_counter'
+    )
+    # Not PositiveIntegerField: drift is corrected by reconcile_unread_counts, not by a failing write
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        # No migration yet, like the other notification models (see fertility/tests/runner.py)
+        db_table = 'notification_unread_counters'
+        verbose_name = 'Unread Notification Counter'
+        verbose_name_plural = 'Unread Notification Counters'
+    
+    def __str__(self):
+        return f"Unread notifications - {self.user_id}: {self.count}"
@@ -0,0 +1,276 @@
+"""
+Notification Dispatcher for PregCare
+Drains due notifications from the `notifications` table: scheduled ones
+(scheduled_at <= now) and failed ones whose retry backoff has elapsed.
+
+Rows are claimed in batches with SELECT ... FOR UPDATE SKIP LOCKED and leased by
+pushing scheduled_at forward, so several dispatchers (management command
+replicas, or the in-process thread in several web workers) never pick the same
+row. A dispatcher that dies mid-batch loses nothing: its rows become due again
+when the lease expires. Emails go through the pooled EmailDispatcher and
+statuses are written back with one bulk_update per batch.
+
+Run:
+    python manage.py dispatch_notifications
+or in-process (started from wsgi.py):
+    PREGCARE_NOTIFICATION_DISPATCHER=inprocess
+
+Configuration (environment):
+- PREGCARE_DISPATCH_BATCH_SIZE: rows claimed per batch (default: 100)
+- PREGCARE_DISPATCH_INTERVAL: seconds to sleep when nothing is due (default: 5)
+- PREGCARE_DISPATCH_LEASE: seconds a claimed row stays invisible to other dispatchers (default: 300)
+"""
+import logging
+import os
+import threading
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Notification
+from .unread import adjust_unread_many
+
+logger = logging.getLogger(__name__)
+
+_RESULT_FIELDS = ['status', 'sent_at', 'error_message', 'retry_count', 'scheduled_at']
+
+
+def record_results(notifications: List[Notification], results: Dict[int, Dict[str, Any]]) -> Tuple[int, int]:
+    """
+    Write email outcomes back for many notifications at once: one bulk UPDATE
+    and one round of unread-counter adjustments. Returns (sent, failed).
+    """
+    if not notifications:
+        return 0, 0
+    now = timezone.now()
+    sent = failed = 0
+    unread_deltas: Dict[int, int] = {}
+    for notification in notifications:
+        result = results[notification.id]
+        was_unread = notification.status in Notification.UNREAD_STATUSES
+        if result['success']:
+            notification.status = 'sent'
+            notification.sent_at = now
+            notification.error_message = ''
+            sent += 1
+        else:
+            notification.set_failed(result.get('error', 'Unknown error'), now)
+            failed += 1
+        is_unread = notification.status in Notification.UNREAD_STATUSES
+        if was_unread != is_unread:
+            uid = notification.user_id
+            unread_deltas[uid] = unread_deltas.get(uid, 0) + (1 if is_unread else -1)
+    # One CASE ... WHEN UPDATE for the whole batch instead of a save() per row
+    with transaction.atomic():
+        Notification.objects.bulk_update(notifications, _RESULT_FIELDS, batch_size=500)
+        adjust_unread_many(unread_deltas)
+    return sent, failed
+
+
+class _Batch:
+    """Collects email callbacks for one claimed batch"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.results: Dict[int, Dict[str, Any]] = {}
+        self.closed = False
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        if size == 0:
+            self.done.set()
+
+
+class NotificationDispatcher:
+    """
+    Batch claim -> send -> bulk status update loop over due notifications.
+
+    Safe to run in parallel: claiming happens in a short transaction with
+    SKIP LOCKED, and the lease keeps a claimed row out of other dispatchers'
+    queries after that transaction commits.
+    """
+
+    def __init__(
+        self,
+        email_dispatcher=None,
+        batch_size: int = 100,
+        interval: float = 5.0,
+        lease_seconds: float = 300.0,
+        send_timeout: Optional[float] = None,
+    ):
+        if email_dispatcher is None:
+            from .email_dispatcher import get_email_dispatcher
+            email_dispatcher = get_email_dispatcher()
+        self.email_dispatcher = email_dispatcher
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self.lease = timedelta(seconds=lease_seconds)
+        # Stop waiting well before the lease runs out, or another replica could resend
+        self.send_timeout = send_timeout if send_timeout is not None else lease_seconds * 0.8
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {
+            'batches': 0,
+            'claimed': 0,
+            'sent': 0,
+            'failed': 0,
+            'late': 0,  # results that arrived after send_timeout
+        }
+
+    # ------------------------------------------------------------------
+    # Claim
+    # ------------------------------------------------------------------
+
+    def claim_batch(self) -> Dict[int, Any]:
+        """
+        Lock up to batch_size due rows (skipping rows other dispatchers hold) and
+        lease them. Returns {id: scheduled_at before the lease}.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            claimed = dict(
+                Notification.objects
+                .select_for_update(skip_locked=True)
+                .filter(
+                    status__in=('pending', 'failed'),
+                    scheduled_at__lte=now,
+                    retry_count__lt=F('max_retries'),
+                )
+                .order_by('scheduled_at')
+                .values_list('id', 'scheduled_at')[:self.batch_size]
+            )
+            if claimed:
+                Notification.objects.filter(id__in=list(claimed)).update(scheduled_at=now + self.lease)
+        return claimed
+
+    # ------------------------------------------------------------------
+    # Send + record
+    # ------------------------------------------------------------------
+
+    def dispatch_batch(self) -> int:
+        """Claim, send and record one batch; returns the number of rows claimed"""
+        claimed = self.claim_batch()
+        if not claimed:
+            return 0
+
+        rows = {
+            n.id: n for n in Notification.objects
+            .filter(id__in=list(claimed))
+            .select_related('user')
+            .only('id', 'subject', 'body', 'plain_text_body', 'status', 'sent_at', 'error_message',
+                  'retry_count', 'max_retries', 'scheduled_at', 'user__email')
+        }
+        batch = _Batch(len(rows))
+
+        for notification in rows.values():
+            # Sent rows keep their original schedule rather than the lease time
+            notification.scheduled_at = claimed[notification.id]
+            email = notification.user.email
+            if not email:
+                # Retrying won't help; exhaust the retries right away
+                notification.retry_count = notification.max_retries - 1
+                self._collect(batch, notification.id, {'success': False, 'error': 'User has no email address'})
+                continue
+            self.email_dispatcher.submit(
+                to_email=email,
+                subject=notification.subject,
+                html_body=notification.body,
+                plain_text_body=notification.plain_text_body,
+                callback=lambda result, nid=notification.id: self._collect(batch, nid, result, rows),
+            )
+
+        if not batch.done.wait(self.send_timeout):
+            logger.warning(
+                f"[WARN] {batch.size - len(batch.results)} emails still in flight after "
+                f"{self.send_timeout:.0f}s; recording them as they finish"
+            )
+        with batch.lock:
+            batch.closed = True
+            results = dict(batch.results)
+
+        self._record([rows[nid] for nid in results], results)
+        self.stats['batches'] += 1
+        self.stats['claimed'] += len(claimed)
+        return len(claimed)
+
+    def _collect(self, batch: _Batch, notification_id: int, result: Dict[str, Any], rows=None):
+        with batch.lock:
+            if not batch.closed:
+                batch.results[notification_id] = result
+                if len(batch.results) >= batch.size:
+                    batch.done.set()
+                return
+        # Batch already recorded without this row: write it on its own
+        self.stats['late'] += 1
+        self._record([rows[notification_id]], {notification_id: result})
+
+    def _record(self, notifications: List[Notification], results: Dict[int, Dict[str, Any]]):
+        sent, failed = record_results(notifications, results)
+        self.stats['sent'] += sent
+        self.stats['failed'] += failed
+        if notifications:
+            logger.info(f"[OK] Dispatched {len(notifications)} notifications ({sent} sent, {failed} failed)")
+
+    # ------------------------------------------------------------------
+    # Loop
+    # ------------------------------------------------------------------
+
+    def run(self, once: bool = False):
+        """Dispatch until stop() (or, with once=True, until nothing is due)"""
+        logger.info(f"[OK] Notification dispatcher running (batch {self.batch_size}, lease {self.lease})")
+        while not self._stop.is_set():
+            close_old_connections()
+            try:
+                claimed = self.dispatch_batch()
+            except Exception as e:
+                logger.error(f"[ERROR] Notification dispatch failed: {e}")
+                claimed = 0
+            if claimed >= self.batch_size:
+                continue  # probably more due; don't sleep
+            if once:
+                break
+            self._stop.wait(self.interval)
+        close_old_connections()
+
+    def start(self):
+        """Run in a daemon thread (in-process mode)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='notification-dispatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+_dispatcher: Optional[NotificationDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_notification_dispatcher() -> NotificationDispatcher:
+    """Process-wide dispatcher configured from the environment"""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = NotificationDispatcher(
+                    batch_size=int(os.environ.get('PREGCARE_DISPATCH_BATCH_SIZE', '100')),
+                    interval=float(os.environ.get('PREGCARE_DISPATCH_INTERVAL', '5')),
+                    lease_seconds=float(os.environ.get('PREGCARE_DISPATCH_LEASE', '300')),
+                )
+    return _dispatcher
+
+
+def start_in_process_dispatcher() -> Optional[NotificationDispatcher]:
+    """Start the background dispatcher if PREGCARE_NOTIFICATION_DISPATCHER=inprocess"""
+    if os.environ.get('PREGCARE_NOTIFICATION_DISPATCHER', '').lower() != 'inprocess':
+        return None
+    dispatcher = get_notification_dispatcher()
+    dispatcher.start()
+    return dispatcher
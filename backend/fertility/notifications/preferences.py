@@ -0,0 +1,120 @@
+"""
+Notification Preference Cache for PregCare
+Per-user UserNotificationPreference rows cached in Django's cache framework
+(local memory by default, Redis when PREGCARE_REDIS_URL is set), so checking
+preferences doesn't cost a get_or_create per notification.
+
+Entries hold field values only (no related User) and are dropped by
+post_save/post_delete signals, e.g. when NotificationPreferencesView.put saves.
+QuerySet.update() bypasses signals: call invalidate_preferences() after it.
+
+Limitation: the signal only clears the cache of the process that saved.
+With the default per-process LocMemCache, other web workers and the
+dispatcher/scheduler processes keep their copy until it expires, so entries
+then live PREGCARE_PREFS_LOCAL_CACHE_TTL (short) instead of the full TTL.
+Set PREGCARE_REDIS_URL in production so an opt-out applies everywhere at once.
+
+Configuration (environment):
+- PREGCARE_PREFS_CACHE_TTL: seconds an entry lives in a shared cache (default: 3600)
+- PREGCARE_PREFS_LOCAL_CACHE_TTL: seconds an entry lives in a per-process cache (default: 30)
+"""
+import os
+from typing import Dict, Iterable, Optional
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import is_shared_cache
+from .models import UserNotificationPreference
+
+PREFS_CACHE_TTL = int(os.environ.get('PREGCARE_PREFS_CACHE_TTL', '3600'))
+PREFS_LOCAL_CACHE_TTL = int(os.environ.get('PREGCARE_PREFS_LOCAL_CACHE_TTL', '30'))
+_KEY = 'notification-prefs:{}'
+_NO_ROW = 'defaults'  # cached "user has no preference row yet"
+
+_FIELD_NAMES = [f.attname for f in UserNotificationPreference._meta.concrete_fields]
+_PREFERRED_TIME = UserNotificationPreference._meta.get_field('preferred_time')
+
+
+def _ttl() -> int:
+    return PREFS_CACHE_TTL if is_shared_cache() else min(PREFS_CACHE_TTL, PREFS_LOCAL_CACHE_TTL)
+
+
+def _normalise(prefs: UserNotificationPreference) -> UserNotificationPreference:
+    """Defaults on new/unsaved rows are the raw field default ('09:00'), not a time"""
+    prefs.preferred_time = _PREFERRED_TIME.to_python(prefs.preferred_time)
+    return prefs
+
+
+def _dump(prefs: UserNotificationPreference) -> tuple:
+    return tuple(getattr(prefs, name) for name in _FIELD_NAMES)
+
+
+def _load(values: tuple) -> UserNotificationPreference:
+    # from_db marks the instance as saved, so .save() is an UPDATE
+    return UserNotificationPreference.from_db('default', _FIELD_NAMES, values)
+
+
+def get_preferences(user) -> UserNotificationPreference:
+    """Cached preferences for `user` (row created with defaults on first use)"""
+    key = _KEY.format(user.pk)
+    values = cache.get(key)
+    if values is not None and values != _NO_ROW:
+        prefs = _load(values)
+        prefs.user = user
+        return prefs
+    prefs, _ = UserNotificationPreference.objects.get_or_create(user=user)
+    _normalise(prefs)
+    cache.set(key, _dump(prefs), _ttl())
+    return prefs
+
+
+def get_preferences_bulk(user_ids: Iterable[int]) -> Dict[int, UserNotificationPreference]:
+    """
+    Preferences for many users: one cache get_many plus at most one query for
+    the misses. Users without a row get unsaved default instances (no rows are
+    created, so fan-out jobs don't insert thousands of defaults).
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    cached = cache.get_many([_KEY.format(uid) for uid in user_ids])
+    result: Dict[int, UserNotificationPreference] = {}
+    missing = []
+    for uid in user_ids:
+        values = cached.get(_KEY.format(uid))
+        if values == _NO_ROW:
+            result[uid] = _normalise(UserNotificationPreference(user_id=uid))
+        elif values is not None:
+            result[uid] = _load(values)
+        else:
+            missing.append(uid)
+
+    if missing:
+        fetched = {}
+        for prefs in UserNotificationPreference.objects.filter(user_id__in=missing):
+            result[prefs.user_id] = prefs
+            fetched[_KEY.format(prefs.user_id)] = _dump(prefs)
+        for uid in missing:
+            if uid not in result:
+                result[uid] = _normalise(UserNotificationPreference(user_id=uid))
+                fetched[_KEY.format(uid)] = _NO_ROW
+        cache.set_many(fetched, _ttl())
+    return result
+
+
+def invalidate_preferences(user_id: Optional[int]):
+    if user_id is not None:
+        cache.delete(_KEY.format(user_id))
+
+
+@receiver([post_save, post_delete], sender=UserNotificationPreference, dispatch_uid='notification_prefs_invalidate')
+def _invalidate_on_change(sender, instance, **kwargs):
+    invalidate_preferences(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=UserNotificationPreference, dispatch_uid='notification_prefs_release_held')
+def _release_held_on_digest_off(sender, instance, **kwargs):
+    # Without digest_mode nothing collects held rows any more (deleted row = defaults, digest off)
+    if kwargs.get('signal') is post_delete or not instance.digest_mode:
+        from .digest import release_held
+        release_held([instance.user_id])
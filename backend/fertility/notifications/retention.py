@@ -0,0 +1,179 @@
+"""
+Notification Retention for PregCare
+Moves old delivered notifications (sent/read) out of the `notifications`
+table into gzip-compressed JSONL archive files, in small batches so no
+statement holds locks for long and the table stops growing without bound.
+
+Each batch is re-read under SELECT ... FOR UPDATE, written and flushed to
+the archive, then deleted in the same short transaction, so exactly the
+deleted rows are archived. A crash between flush and commit can at worst
+archive a batch twice, never lose it.
+Archived rows keep the plain-text body; the HTML body is dropped unless
+keep_html=True (it is the plain text wrapped in the standard template).
+Failed rows are only archived once their retries are exhausted; a failed row
+with retries left is still queued for the NotificationDispatcher.
+
+Configuration (environment):
+- PREGCARE_NOTIFICATION_RETENTION_DAYS: age after which rows are archived (default: 180)
+- PREGCARE_NOTIFICATION_ARCHIVE_DIR: where archive files go (default: <backend>/archive/notifications)
+"""
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Notification
+from .unread import adjust_unread_many
+
+logger = logging.getLogger(__name__)
+
+RETENTION_DAYS = int(os.environ.get('PREGCARE_NOTIFICATION_RETENTION_DAYS', '180'))
+ARCHIVE_DIR = Path(os.environ.get(
+    'PREGCARE_NOTIFICATION_ARCHIVE_DIR',
+    Path(settings.BASE_DIR) / 'archive' / 'notifications',
+))
+ARCHIVABLE_STATUSES = ('sent', 'read')
+
+_ARCHIVE_FIELDS = [
+    'id', 'user_id', 'notification_type_id', 'subject', 'plain_text_body', 'status', 'priority',
+    'scheduled_at', 'sent_at', 'read_at', 'created_at', 'retry_count', 'metadata',
+]
+
+
+def archive_notifications(
+    older_than_days: int = RETENTION_DAYS,
+    statuses: Iterable[str] = ARCHIVABLE_STATUSES,
+    archive_dir: Optional[Path] = ARCHIVE_DIR,
+    batch_size: int = 1000,
+    pause: float = 0.1,
+    keep_html: bool = False,
+    max_batches: Optional[int] = None,
+    dry_run: bool = False,
+) -> Dict[str, object]:
+    """
+    Archive (archive_dir set) or purge (archive_dir None) old notifications.
+
+    Batches walk the table by id, so each SELECT/DELETE touches (and locks)
+    at most batch_size rows and no batch rescans rows already handled. `pause`
+    seconds between batches leaves room for foreground writes and replicas.
+    """
+    statuses = tuple(statuses)
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    fields = _ARCHIVE_FIELDS + (['body'] if keep_html else [])
+    # Failed rows with retries left are still due for another attempt
+    archivable = Q(status__in=statuses, created_at__lt=cutoff) & ~Q(status='failed', retry_count__lt=F('max_retries'))
+    base = Notification.objects.filter(archivable).order_by('id')
+
+    stats = {'batches': 0, 'archived': 0, 'deleted': 0, 'file': None, 'cutoff': cutoff.isoformat()}
+    if dry_run:
+        stats['archived'] = base.count()
+        return stats
+
+    archive = None
+    if archive_dir is not None:
+        archive_dir = Path(archive_dir)
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        path = archive_dir / f"notifications-{timezone.now():%Y%m%d-%H%M%S}.jsonl.gz"
+        archive = gzip.open(path, 'at', encoding='utf-8')
+        stats['file'] = str(path)
+
+    last_id = 0
+    try:
+        while max_batches is None or stats['batches'] < max_batches:
+            ids = list(base.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+
+            with transaction.atomic():
+                # Re-read the candidates locked: a row whose status changed since the id scan
+                # stays in the table and is neither archived nor counted
+                rows = list(
+                    Notification.objects
+                    .select_for_update()
+                    .filter(archivable, id__in=ids)
+                    .order_by('id')
+                    .values(*fields)
+                )
+                if archive is not None and rows:
+                    for row in rows:
+                        archive.write(json.dumps(row, default=str, ensure_ascii=False) + '\n')
+                    archive.flush()  # the batch is on disk before its rows go
+                    stats['archived'] += len(rows)
+                deleted, _ = Notification.objects.filter(id__in=[row['id'] for row in rows]).delete()
+
+                # Archived "sent" rows no longer count as unread
+                unread: Dict[int, int] = {}
+                for row in rows:
+                    if row['status'] in Notification.UNREAD_STATUSES:
+                        unread[row['user_id']] = unread.get(row['user_id'], 0) - 1
+                adjust_unread_many(unread)
+            stats['deleted'] += deleted
+
+            stats['batches'] += 1
+            if pause:
+                time.sleep(pause)
+    finally:
+        if archive is not None:
+            archive.close()
+
+    logger.info(
+        f"[OK] Notification retention: {stats['deleted']} rows older than {older_than_days} days removed"
+        + (f", archived to {stats['file']}" if stats['file'] else '')
+    )
+    return stats
+
+
+def partitioning_plan(months_ahead: int = 3) -> str:
+    """
+    DDL for monthly time partitioning of `notifications`, where the database allows it.
+
+    MySQL cannot partition tables that have foreign keys (notifications
+    references auth_user and notification_types), and requires the partition
+    column in every unique key. It therefore gets an explanation instead of DDL.
+    PostgreSQL gets a declarative RANGE (created_at) layout, to be reviewed
+    and applied manually during a maintenance window.
+    """
+    vendor = connection.vendor
+    if vendor == 'mysql':
+        return (
+            "-- MySQL/InnoDB does not support partitioning tables with foreign keys.\n"
+            "-- `notifications` has FKs to auth_user and notification_types, so time partitioning\n"
+            "-- would mean dropping them and widening the primary key to (id, created_at).\n"
+            "-- Use `manage.py archive_notifications` (batched archive + delete) instead."
+        )
+    if vendor != 'postgresql':
+        return f"-- Partitioning is not supported on {vendor}; use batched archival instead."
+
+    start = timezone.now().date().replace(day=1)
+    lines = [
+        "-- Monthly RANGE partitioning for notifications (PostgreSQL). Review before applying.",
+        "ALTER TABLE notifications RENAME TO notifications_old;",
+        "CREATE TABLE notifications (LIKE notifications_old INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+        "    PARTITION BY RANGE (created_at);",
+        "ALTER TABLE notifications DROP CONSTRAINT IF EXISTS notifications_old_pkey;",
+        "ALTER TABLE notifications ADD PRIMARY KEY (id, created_at);",
+    ]
+    month = start
+    for _ in range(months_ahead + 1):
+        nxt = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+        lines.append(
+            f"CREATE TABLE notifications_{month:%Y_%m} PARTITION OF notifications "
+            f"FOR VALUES FROM ('{month}') TO ('{nxt}');"
+        )
+        month = nxt
+    lines += [
+        "CREATE TABLE notifications_history PARTITION OF notifications DEFAULT;",
+        "INSERT INTO notifications SELECT * FROM notifications_old;",
+        "-- Old months can then be archived and dropped with DETACH PARTITION instead of DELETE.",
+    ]
+    return "\n".join(lines)
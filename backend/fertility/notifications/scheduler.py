@@ -0,0 +1,228 @@
+"""
+Reminder Scheduler for PregCare
+Sends the daily reminder (and, for digest-mode users, the daily digest) at
+each user's preferred_time in their own timezone.
+
+Every tick handles one UTC minute. The minute is mapped to a local wall-clock
+time for each timezone in use (a few dozen at most). Only users whose
+(timezone, preferred_time) matches that window are selected, via the
+(timezone, preferred_time) index on user_notification_preferences, so a tick
+touches the users due now instead of scanning every preference row. The load
+spreads across the day the same way preferred times do.
+
+Daylight saving: a preferred_time that does not exist on a spring-forward day
+fires at the first valid minute after the gap; one that occurs twice on a
+fall-back day fires only on its first occurrence.
+
+Each minute is claimed with cache.add(). With a shared cache backend (Redis or
+Memcached in CACHES) several schedulers can run at once; with the default
+local-memory cache, run a single scheduler (one process, not every web worker).
+The in-process mode starts one scheduler per web worker, so it refuses to
+start without a shared cache.
+
+The (timezone, preferred_time) index is declared on UserNotificationPreference,
+but the notification models have no migration yet: on an existing database
+create it by hand (see UserNotificationPreference.Meta).
+
+Run:
+    python manage.py schedule_reminders
+or in-process (started from wsgi.py):
+    PREGCARE_REMINDER_SCHEDULER=inprocess
+"""
+import logging
+import os
+import threading
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+from typing import List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .caching import is_shared_cache
+from .models import UserNotificationPreference
+
+logger = logging.getLogger(__name__)
+
+_CLAIM_KEY = 'notification-scheduler:minute:{}'
+_LAST_KEY = 'notification-scheduler:last-minute'
+
+
+class ReminderScheduler:
+    """Per-minute fan-out of the daily reminder to users whose local send time is now"""
+
+    def __init__(
+        self,
+        triggers=None,
+        digests=None,
+        max_catch_up_minutes: int = 15,
+        timezone_cache_seconds: float = 600.0,
+        chunk_size: int = 1000,
+    ):
+        if triggers is None:
+            from .services import notification_triggers
+            triggers = notification_triggers
+        self.triggers = triggers
+        if digests is None:
+            from .digest import DigestSender
+            digests = DigestSender(triggers=triggers)
+        self.digests = digests
+        self.max_catch_up = timedelta(minutes=max_catch_up_minutes)
+        self.timezone_cache_seconds = timezone_cache_seconds
+        self.chunk_size = chunk_size
+        self._zones: List[Tuple[str, ZoneInfo]] = []
+        self._zones_loaded_at: Optional[datetime] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'ticks': 0, 'created': 0}
+
+    # ------------------------------------------------------------------
+    # Windows
+    # ------------------------------------------------------------------
+
+    def zones(self) -> List[Tuple[str, ZoneInfo]]:
+        """Distinct timezones in use (refreshed every timezone_cache_seconds)"""
+        now = timezone.now()
+        if self._zones_loaded_at is None or (now - self._zones_loaded_at).total_seconds() > self.timezone_cache_seconds:
+            names = set(
+                UserNotificationPreference.objects.order_by().values_list('timezone', flat=True).distinct()
+            )
+            names.add(self._default('timezone'))  # users without a preference row
+            zones = []
+            for name in sorted(names):
+                try:
+                    zones.append((name, ZoneInfo(name)))
+                except (ZoneInfoNotFoundError, ValueError):
+                    logger.warning(f"[WARN] Unknown timezone in notification preferences: {name!r}")
+            self._zones, self._zones_loaded_at = zones, now
+        return self._zones
+
+    def windows(self, minute: datetime) -> List[Tuple[str, dt_time, dt_time]]:
+        """
+        (timezone, first, last) local wall-clock ranges due at UTC `minute`.
+
+        Normally one minute per zone. Right after a DST gap the range also
+        covers the skipped local times; during the repeated hour of a fall-back
+        transition (fold=1) the zone has no window, so nothing fires twice.
+        """
+        windows = []
+        for name, zone in self.zones():
+            local = minute.astimezone(zone)
+            if local.fold:
+                continue
+            # First local minute not covered by the previous UTC minute
+            first = ((minute - timedelta(minutes=1)).astimezone(zone) + timedelta(minutes=1)).time()
+            first = first.replace(second=0, microsecond=0, tzinfo=None, fold=0)
+            # preferred_time may carry seconds; match the whole local minute
+            last = local.time().replace(second=59, microsecond=999999, tzinfo=None, fold=0)
+            if first <= last:
+                windows.append((name, first, last))
+            else:  # gap across midnight
+                windows.append((name, first, dt_time.max))
+                windows.append((name, dt_time.min, last))
+        return windows
+
+    def users_due(self, minute: datetime):
+        """Users whose preferred send minute is `minute` (UTC), as one indexed OR query"""
+        due = Q()
+        default_tz, default_time = self._default('timezone'), self._default('preferred_time')
+        for name, first, last in self.windows(minute):
+            due |= Q(notification_preferences__timezone=name,
+                     notification_preferences__preferred_time__range=(first, last))
+            if name == default_tz and first <= default_time <= last:
+                due |= Q(notification_preferences__isnull=True)
+        return User.objects.filter(due) if due else User.objects.none()
+
+    @staticmethod
+    def _default(field: str):
+        value = UserNotificationPreference._meta.get_field(field).default
+        if field == 'preferred_time' and isinstance(value, str):
+            value = dt_time.fromisoformat(value)
+        return value
+
+    # ------------------------------------------------------------------
+    # Tick
+    # ------------------------------------------------------------------
+
+    def tick(self, now: Optional[datetime] = None) -> int:
+        """
+        Create reminders for every unprocessed minute up to `now` (catching up
+        at most max_catch_up after downtime). Returns notifications created.
+        """
+        current = (now or timezone.now()).astimezone(dt_timezone.utc).replace(second=0, microsecond=0)
+        last = cache.get(_LAST_KEY)
+        start = current if last is None else max(last + timedelta(minutes=1), current - self.max_catch_up)
+
+        created = 0
+        minute = start
+        while minute <= current:
+            # Only one scheduler handles a given minute
+            key = _CLAIM_KEY.format(minute.isoformat())
+            if cache.add(key, 1, timeout=2 * 24 * 3600):
+                try:
+                    created += self.triggers.bulk_cycle_data_reminder(
+                        users=self.users_due(minute),
+                        scheduled_at=minute,
+                        chunk_size=self.chunk_size,
+                    )
+                    # Digest users get today's reminder (just held above) inside their digest
+                    self.digests.send(users=self.users_due(minute))
+                except Exception:
+                    cache.delete(key)  # let the next tick retry this minute
+                    raise
+            minute += timedelta(minutes=1)
+        cache.set(_LAST_KEY, current, timeout=2 * 24 * 3600)
+
+        self.stats['ticks'] += 1
+        self.stats['created'] += created
+        if created:
+            logger.info(f"[OK] Scheduled {created} reminders up to {current:%H:%M} UTC")
+        return created
+
+    def run(self, once: bool = False):
+        """Tick at the start of every minute until stop()"""
+        logger.info("[OK] Reminder scheduler running")
+        while not self._stop.is_set():
+            close_old_connections()
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"[ERROR] Reminder scheduler tick failed: {e}")
+            if once:
+                break
+            now = timezone.now()
+            self._stop.wait(60 - now.second - now.microsecond / 1e6 + 0.5)
+        close_old_connections()
+
+    def start(self):
+        """Run in a daemon thread (in-process mode)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='reminder-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def start_in_process_scheduler() -> Optional[ReminderScheduler]:
+    """Start the background scheduler if PREGCARE_REMINDER_SCHEDULER=inprocess"""
+    if os.environ.get('PREGCARE_REMINDER_SCHEDULER', '').lower() != 'inprocess':
+        return None
+    if not is_shared_cache():
+        # Every web worker would claim the same minute in its own cache and send duplicates
+        logger.warning(
+            "[WARN] PREGCARE_REMINDER_SCHEDULER=inprocess needs a shared cache (set PREGCARE_REDIS_URL); "
+            "run `manage.py schedule_reminders` as a single process instead"
+        )
+        return None
+    scheduler = ReminderScheduler()
+    scheduler.start()
+    return scheduler
@@ -3,14 +3,15 @@ Email and Notification Services for PregCare
 Handles email sending via Gmail SMTP and notification management
 """
 import os
+import base64
 import smtplib
 import ssl
 import logging
-import threading
+from collections import Counter
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.utils import formataddr
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable, Tuple
 from datetime import datetime, timedelta
 
 from django.conf import settings
@@ -18,6 +19,13 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 from django.template import Template, Context
 from django.db import transaction
+from django.db.models import Case, F, Q, When
+from django.db.models.functions import Substr
+from django.utils.html import format_html_join
+
+from .preferences import get_preferences, get_preferences_bulk
+from .template_engine import render_layout, template_registry
+from .unread import adjust_unread, adjust_unread_many, get_unread_count
 
 logger = logging.getLogger(__name__)
 
@@ -32,15 +40,27 @@ class EmailService:
     - PREGCARE_EMAIL_USER: Gmail address
     - PREGCARE_EMAIL_PASSWORD: Gmail App Password (not regular password!)
     - PREGCARE_EMAIL_FROM_NAME: Display name (default: PregCare)
+    - PREGCARE_EMAIL_USE_TLS: STARTTLS on connect (default: true)
+    
+    Constructor arguments override the environment (e.g. a local SMTP stub).
     """
     
-    def __init__(self):
-        self.host = os.environ.get('PREGCARE_EMAIL_HOST', 'smtp.gmail.com')
-        self.port = int(os.environ.get('PREGCARE_EMAIL_PORT', '587'))
-        self.username = os.environ.get('PREGCARE_EMAIL_USER', '')
-        self.password = os.environ.get('PREGCARE_EMAIL_PASSWORD', '')
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        use_tls: Optional[bool] = None,
+    ):
+        self.host = host or os.environ.get('PREGCARE_EMAIL_HOST', 'smtp.gmail.com')
+        self.port = port or int(os.environ.get('PREGCARE_EMAIL_PORT', '587'))
+        self.username = username if username is not None else os.environ.get('PREGCARE_EMAIL_USER', '')
+        self.password = password if password is not None else os.environ.get('PREGCARE_EMAIL_PASSWORD', '')
         self.from_name = os.environ.get('PREGCARE_EMAIL_FROM_NAME', 'PregCare')
-        self.use_tls = True
+        if use_tls is None:
+            use_tls = os.environ.get('PREGCARE_EMAIL_USE_TLS', 'true').lower() not in ('0', 'false', 'no')
+        self.use_tls = use_tls
         
         # Validate configuration
         if not self.username or not self.password:
@@ -77,6 +97,23 @@ class EmailService:
         
         return message
     
+    def open_connection(self, timeout: float = 30.0) -> smtplib.SMTP:
+        """
+        Open an SMTP session: EHLO, STARTTLS (if enabled) and login.
+        The caller owns the connection and may send many messages over it.
+        """
+        server = smtplib.SMTP(self.host, self.port, timeout=timeout)
+        try:
+            server.ehlo()
+            if self.use_tls:
+                server.starttls(context=ssl.create_default_context())
+                server.ehlo()
+            server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        return server
+    
     def send_email(
         self,
         to_email: str,
@@ -100,14 +137,8 @@ class EmailService:
         try:
             message = self._create_message(to_email, subject, html_body, plain_text_body)
             
-            # Create secure SSL/TLS context
-            context = ssl.create_default_context()
-            
-            with smtplib.SMTP(self.host, self.port) as server:
-                server.ehlo()
-                server.starttls(context=context)
-                server.ehlo()
-                server.login(self.username, self.password)
+            # One-off session; bulk sending goes through EmailDispatcher instead
+            with self.open_connection() as server:
                 server.sendmail(self.username, to_email, message.as_string())
             
             logger.info(f"[OK] Email sent successfully to {to_email}")
@@ -147,22 +178,48 @@ class EmailService:
         subject: str,
         html_body: str,
         plain_text_body: Optional[str] = None,
-        callback: Optional[callable] = None
+        callback: Optional[callable] = None,
+        notification=None
     ) -> None:
         """
-        Send email asynchronously using threading
+        Send email asynchronously via the shared email dispatcher
+        (persistent SMTP sessions, bounded queue; threads or asyncio per PREGCARE_EMAIL_BACKEND)
         
         Args:
-            callback: Optional function to call with result dict
+            callback: Optional function to call with result dict (runs on a worker thread)
+            notification: Optional Notification whose status is updated with the result
         """
-        def _send():
+        from .email_dispatcher import get_email_dispatcher
+        
+        if not self.is_configured():
             result = self.send_email(to_email, subject, html_body, plain_text_body)
+            if notification is not None:
+                from .notification_dispatcher import record_results
+                record_results([notification], {notification.id: result})
             if callback:
                 callback(result)
+            return
         
-        thread = threading.Thread(target=_send, daemon=True)
-        thread.start()
-        logger.info(f"[INFO] Async email queued for {to_email}")
+        queued = get_email_dispatcher(self).submit(
+            to_email, subject, html_body, plain_text_body, callback=callback, notification=notification
+        )
+        if queued:
+            logger.info(f"[INFO] Async email queued for {to_email}")
+
+
+def encode_cursor(notification) -> str:
+    """Opaque pagination cursor for the (created_at, id) position of a notification"""
+    raw = f"{notification.created_at.isoformat()}|{notification.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, last_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(last_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
 
 
 class NotificationService:
@@ -173,6 +230,8 @@ class NotificationService:
     with database persistence for history tracking.
     """
     
+    MAX_PAGE_SIZE = 100  # hard cap for notification list pages
+    
     def __init__(self):
         self.email_service = EmailService()
     
@@ -181,11 +240,17 @@ class NotificationService:
         return user.email if user.email else None
     
     def get_user_preferences(self, user: User):
-        """Get or create user notification preferences"""
-        from .models import UserNotificationPreference
+        """Get or create user notification preferences (cached, see preferences.py)"""
+        return get_preferences(user)
+    
+    def get_preferences_bulk(self, users) -> Dict[int, Any]:
+        """
+        Preferences for many users at once (User objects or ids) for fan-out jobs
         
-        prefs, _ = UserNotificationPreference.objects.get_or_create(user=user)
-        return prefs
+        Returns:
+            {user_id: UserNotificationPreference}; users without a row get unsaved defaults
+        """
+        return get_preferences_bulk(u if isinstance(u, int) else u.pk for u in users)
     
     def can_send_notification(self, user: User, category: str) -> bool:
         """Check if user should receive notification of this category"""
@@ -218,42 +283,136 @@ class NotificationService:
             scheduled_at: When to send (None for immediate)
             send_immediately: Send now if scheduled_at is None
         
+        Digest-mode users don't get unscheduled, non-urgent notifications right
+        away: they stay pending for their next digest email (see digest.py).
+        
         Returns:
             Notification instance
         """
-        from .models import Notification, NotificationType
+        from .models import Notification
         
         # Check user preferences
-        if not self.can_send_notification(user, category):
+        prefs = self.get_user_preferences(user)
+        if not prefs.is_category_enabled(category):
             logger.info(f"[INFO] Notification blocked by user preferences: {user.username} - {category}")
             return None
         
         # Get notification type if exists
-        notification_type = NotificationType.objects.filter(
-            category=category, 
-            is_active=True
-        ).first()
-        
-        # Create notification record
-        notification = Notification.objects.create(
-            user=user,
-            notification_type=notification_type,
-            subject=subject,
-            body=body,
-            plain_text_body=plain_text_body or '',
-            priority=priority,
-            scheduled_at=scheduled_at,
-            metadata=metadata or {}
-        )
-        
+        notification_type = template_registry.notification_type(category)
+        
+        # Create notification record (and count it as unread in the same transaction)
+        with transaction.atomic():
+            notification = Notification.objects.create(
+                user=user,
+                notification_type=notification_type,
+                subject=subject,
+                body=body,
+                plain_text_body=plain_text_body or '',
+                priority=priority,
+                scheduled_at=scheduled_at,
+                metadata=metadata or {}
+            )
+            adjust_unread(user.id, 1)
         logger.info(f"[OK] Notification created: {notification.id} for {user.username}")
         
         # Send immediately if requested and not scheduled
         if send_immediately and not scheduled_at:
-            self.send_notification(notification)
+            if prefs.digest_mode and priority != 'urgent':
+                logger.info(f"[INFO] Notification {notification.id} held for digest: {user.username}")
+            else:
+                self.send_notification(notification)
         
         return notification
     
+    def eligible_users(self, category: str, users=None):
+        """
+        Users that should receive `category`, resolved in one query with a join on
+        preferences (users without a preference row get the defaults: all enabled)
+        """
+        from .models import UserNotificationPreference
+        
+        queryset = users if users is not None else User.objects.all()
+        opted_in = Q(notification_preferences__email_enabled=True)
+        field = UserNotificationPreference.CATEGORY_FIELDS.get(category)
+        if field:
+            opted_in &= Q(**{f'notification_preferences__{field}': True})
+        return (
+            queryset
+            .filter(is_active=True)
+            .exclude(email='')
+            .filter(Q(notification_preferences__isnull=True) | opted_in)
+        )
+    
+    def bulk_create_notifications(
+        self,
+        category: str,
+        render: Callable[[User], Tuple[str, str, str]],
+        users=None,
+        priority: str = 'normal',
+        metadata: Optional[Dict] = None,
+        scheduled_at: Optional[datetime] = None,
+        chunk_size: int = 1000,
+    ) -> int:
+        """
+        Fan out one notification per eligible user
+        
+        Users are streamed with .iterator() and rows inserted with bulk_create per
+        chunk, so memory stays bounded by chunk_size. Nothing is sent here: rows are
+        due at `scheduled_at` (default now) and the NotificationDispatcher sends them.
+        Rows for digest-mode users are left unscheduled for their next digest.
+        
+        Args:
+            category: Notification category (for preference filtering)
+            render: user -> (subject, html_body, plain_text_body)
+            users: Optional User queryset to restrict the audience
+            chunk_size: Users fetched / rows inserted per round trip
+        
+        Returns:
+            Number of notifications created
+        """
+        from .models import Notification
+        
+        notification_type = template_registry.notification_type(category)
+        due = scheduled_at or timezone.now()
+        recipients = (
+            self.eligible_users(category, users)
+            .order_by()
+            .only('id', 'username', 'first_name', 'email')
+            .annotate(digest_mode=F('notification_preferences__digest_mode'))
+        )
+        digest_ok = priority != 'urgent'
+        
+        total = 0
+        batch = []
+        
+        def flush():
+            with transaction.atomic():
+                Notification.objects.bulk_create(batch)
+                # New rows are pending (unread): one counter UPDATE per chunk, not per user
+                adjust_unread_many(Counter(n.user_id for n in batch))
+            return len(batch)
+        
+        for user in recipients.iterator(chunk_size=chunk_size):
+            subject, body, plain_text_body = render(user)
+            batch.append(Notification(
+                user_id=user.id,
+                notification_type=notification_type,
+                subject=subject,
+                body=body,
+                plain_text_body=plain_text_body or '',
+                priority=priority,
+                scheduled_at=None if user.digest_mode and digest_ok else due,
+                metadata=dict(metadata or {}),
+            ))
+            if len(batch) >= chunk_size:
+                total += flush()
+                batch = []
+        if batch:
+            total += flush()
+        
+        logger.info(f"[OK] Bulk notifications created: {total} x {category}")
+        return total
+    
     def send_notification(self, notification) -> bool:
         """
         Send a notification via email
@@ -267,20 +426,14 @@ class NotificationService:
             notification.mark_as_failed("User has no email address")
             return False
         
-        def on_email_sent(result: Dict):
-            """Callback for async email sending"""
-            if result['success']:
-                notification.mark_as_sent()
-            else:
-                notification.mark_as_failed(result.get('error', 'Unknown error'))
-        
-        # Send email asynchronously
+        # Send email asynchronously; the dispatcher writes the status back
+        # (batched with other outcomes on the async backend)
         self.email_service.send_email_async(
             to_email=user_email,
             subject=notification.subject,
             html_body=notification.body,
             plain_text_body=notification.plain_text_body,
-            callback=on_email_sent
+            notification=notification
         )
         
         return True
@@ -289,17 +442,66 @@ class NotificationService:
         self,
         user: User,
         status: Optional[str] = None,
-        limit: int = 50
+        limit: int = 50,
+        cursor: Optional[str] = None
     ) -> List:
-        """Get notifications for a user"""
+        """Get notifications for a user (newest first, one page)"""
+        return self.get_notifications_page(user, status, limit, cursor)[0]
+    
+    def get_notifications_page(
+        self,
+        user: User,
+        status: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Tuple[List, Optional[str]]:
+        """
+        Keyset-paginated notifications, newest first
+        
+        Pages continue from the (created_at, id) of the previous page's last row,
+        so every page is an index range scan no matter how deep, unlike OFFSET.
+        Only list fields are loaded; `preview` is the first 200 characters of the
+        plain text (HTML body only when there is no plain text), cut by the DB.
+        
+        Args:
+            limit: Page size, clamped to 1..MAX_PAGE_SIZE
+            cursor: next_cursor from the previous page (None for the first page)
+        
+        Returns:
+            (notifications, next_cursor or None on the last page)
+        
+        Raises:
+            ValueError: invalid cursor
+        """
         from .models import Notification
         
-        queryset = Notification.objects.filter(user=user)
+        limit = max(1, min(limit, self.MAX_PAGE_SIZE))
+        queryset = (
+            Notification.objects
+            .filter(user=user)
+            .select_related('notification_type')
+            .only(
+                'id', 'subject', 'status', 'priority', 'created_at', 'sent_at', 'read_at',
+                'notification_type__category',
+            )
+            .annotate(preview=Case(
+                When(plain_text_body='', then=Substr('body', 1, 200)),
+                default=Substr('plain_text_body', 1, 200),
+            ))
+            .order_by('-created_at', '-id')
+        )
         
         if status:
             queryset = queryset.filter(status=status)
         
-        return list(queryset[:limit])
+        if cursor:
+            created_at, last_id = decode_cursor(cursor)
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=last_id))
+        
+        rows = list(queryset[:limit + 1])
+        if len(rows) > limit:
+            return rows[:limit], encode_cursor(rows[limit - 1])
+        return rows, None
     
     def mark_as_read(self, notification_id: int, user: User) -> bool:
         """Mark a notification as read"""
@@ -313,13 +515,8 @@ class NotificationService:
             return False
     
     def get_unread_count(self, user: User) -> int:
-        """Get count of unread notifications for user"""
-        from .models import Notification
-        
-        return Notification.objects.filter(
-            user=user,
-            status__in=['sent', 'pending']
-        ).count()
+        """Get count of unread notifications for user (O(1) counter, see unread.py)"""
+        return get_unread_count(user.id)
 
 
 # =========================================
@@ -332,10 +529,22 @@ class NotificationTriggers:
     
     Call these methods when specific events occur in the system
     to automatically send appropriate notifications to users.
+    
+    Emails are rendered from compiled templates (template_engine.py):
+    an active NotificationType overrides the built-in template of its category.
     """
     
     def __init__(self):
         self.service = NotificationService()
+        self.templates = template_registry
+    
+    def _context(self, user: User, **values) -> Dict[str, Any]:
+        """Template variables shared by every notification"""
+        return {
+            'name': user.first_name or user.username,
+            'app_url': os.environ.get('PREGCARE_APP_URL', 'http://localhost:5173'),
+            **values,
+        }
     
     def on_cycle_data_reminder(self, user: User) -> Optional[Any]:
         """
@@ -343,39 +552,7 @@ class NotificationTriggers:
         
         Called by: Scheduled task (daily at user's preferred time)
         """
-        subject = "Pengingat Input Data Siklus - PregCare"
-        
-        body = self._get_email_template(
-            title="Jangan Lupa Catat Siklus Hari Ini",
-            content="""
-            <p>Halo {name},</p>
-            <p>Ini pengingat harian untuk mencatat kondisi siklus Anda hari ini.</p>
-            <p>Pencatatan rutin membantu kami memberikan prediksi dan analisis yang lebih akurat untuk perjalanan kehamilan Anda.</p>
-            <div style="text-align: center; margin: 30px 0;">
-                <a href="{app_url}/daily-checkin" style="background: linear-gradient(135deg, #FF69B4, #9B59B6); color: white; padding: 15px 30px; text-decoration: none; border-radius: 25px; font-weight: bold;">
-                    Catat Sekarang
-                </a>
-            </div>
-            <p>Tetap semangat dan jaga kesehatan!</p>
-            """.format(
-                name=user.first_name or user.username,
-                app_url=os.environ.get('PREGCARE_APP_URL', 'http://localhost:5173')
-            ),
-            footer="Pengingat ini dikirim sesuai preferensi notifikasi Anda."
-        )
-        
-        plain_text = f"""
-Halo {user.first_name or user.username},
-
-Ini pengingat harian untuk mencatat kondisi siklus Anda hari ini.
-Pencatatan rutin membantu kami memberikan prediksi dan analisis yang lebih akurat.
-
-Kunjungi aplikasi PregCare untuk mencatat sekarang.
-
-Tetap semangat dan jaga kesehatan!
-
-- Tim PregCare
-        """
+        subject, body, plain_text = self.templates.render('cycle_reminder', self._context(user))
         
         return self.service.create_notification(
             user=user,
@@ -387,6 +564,29 @@ Tetap semangat dan jaga kesehatan!
             metadata={'trigger': 'daily_cycle_reminder'}
         )
     
+    def bulk_cycle_data_reminder(self, users=None, scheduled_at: Optional[datetime] = None, chunk_size: int = 1000) -> int:
+        """
+        Trigger: Daily reminder untuk semua user yang eligible sekaligus
+        
+        Template di-compile sekali; per user hanya variabel yang disisipkan.
+        Called by: ReminderScheduler / manage.py send_daily_reminders
+        """
+        template = self.templates.get('cycle_reminder')
+        app_url = os.environ.get('PREGCARE_APP_URL', 'http://localhost:5173')
+        
+        def render(user):
+            return template.render({'name': user.first_name or user.username, 'app_url': app_url})
+        
+        return self.service.bulk_create_notifications(
+            category='cycle_reminder',
+            render=render,
+            users=users,
+            priority='normal',
+            metadata={'trigger': 'daily_cycle_reminder'},
+            scheduled_at=scheduled_at,
+            chunk_size=chunk_size,
+        )
+    
     def on_fertile_window_approaching(self, user: User, fertile_start: datetime, ovulation_date: datetime) -> Optional[Any]:
         """
         Trigger: Fertile window is approaching
@@ -395,25 +595,12 @@ Tetap semangat dan jaga kesehatan!
         """
         days_until = (fertile_start.date() - timezone.now().date()).days
         
-        subject = f"Masa Subur Dimulai dalam {days_until} Hari - PregCare"
-        
-        body = self._get_email_template(
-            title="Masa Subur Anda Segera Tiba!",
-            content=f"""
-            <p>Halo {user.first_name or user.username},</p>
-            <p>Berdasarkan analisis siklus Anda, kami memprediksi:</p>
-            <div style="background: #FFF5F8; padding: 20px; border-radius: 15px; margin: 20px 0;">
-                <p style="margin: 5px 0;"><strong>Masa Subur Dimulai:</strong> {fertile_start.strftime('%d %B %Y')}</p>
-                <p style="margin: 5px 0;"><strong>Prediksi Ovulasi:</strong> {ovulation_date.strftime('%d %B %Y')}</p>
-            </div>
-            <p>Ini adalah waktu optimal untuk program kehamilan Anda.</p>
-            <div style="text-align: center; margin: 30px 0;">
-                <a href="{os.environ.get('PREGCARE_APP_URL', 'http://localhost:5173')}/fertility-tracker" style="background: linear-gradient(135deg, #FF69B4, #9B59B6); color: white; padding: 15px 30px; text-decoration: none; border-radius: 25px; font-weight: bold;">
-                    Lihat Detail Siklus
-                </a>
-            </div>
-            """
-        )
+        subject, body, plain_text = self.templates.render('fertile_window', self._context(
+            user,
+            days_until=days_until,
+            fertile_start=fertile_start,
+            ovulation_date=ovulation_date,
+        ))
         
         return self.service.create_notification(
             user=user,
@@ -421,6 +608,7 @@ Tetap semangat dan jaga kesehatan!
             body=body,
             category='fertile_window',
             priority='high',
+            plain_text_body=plain_text,
             metadata={
                 'trigger': 'fertile_window_approaching',
                 'fertile_start': str(fertile_start.date()),
@@ -436,22 +624,11 @@ Tetap semangat dan jaga kesehatan!
         """
         days_until = (predicted_date.date() - timezone.now().date()).days
         
-        subject = f"Prediksi Menstruasi dalam {days_until} Hari - PregCare"
-        
-        body = self._get_email_template(
-            title="Persiapkan Diri untuk Siklus Berikutnya",
-            content=f"""
-            <p>Halo {user.first_name or user.username},</p>
-            <p>Berdasarkan pola siklus Anda, menstruasi diprediksi akan dimulai pada:</p>
-            <div style="background: #FFF5F8; padding: 20px; border-radius: 15px; margin: 20px 0; text-align: center;">
-                <p style="font-size: 24px; font-weight: bold; color: #FF69B4; margin: 0;">
-                    {predicted_date.strftime('%d %B %Y')}
-                </p>
-                <p style="color: #888; margin-top: 10px;">({days_until} hari lagi)</p>
-            </div>
-            <p>Pastikan Anda sudah mempersiapkan keperluan dan menjaga kesehatan.</p>
-            """
-        )
+        subject, body, plain_text = self.templates.render('period_prediction', self._context(
+            user,
+            days_until=days_until,
+            predicted_date=predicted_date,
+        ))
         
         return self.service.create_notification(
             user=user,
@@ -459,6 +636,7 @@ Tetap semangat dan jaga kesehatan!
             body=body,
             category='period_prediction',
             priority='normal',
+            plain_text_body=plain_text,
             metadata={
                 'trigger': 'period_prediction',
                 'predicted_date': str(predicted_date.date()),
@@ -477,7 +655,7 @@ Tetap semangat dan jaga kesehatan!
         recommendations = analysis_result.get('recommendations', [])
         
         # Format recommendations as HTML list
-        recommendations_html = ''.join([f'<li>{rec}</li>' for rec in recommendations[:4]])
+        recommendations_html = format_html_join('', '<li>{}</li>', ((rec,) for rec in recommendations[:4]))
         
         # Determine alert level based on analysis type
         alert_colors = {
@@ -489,33 +667,13 @@ Tetap semangat dan jaga kesehatan!
         }
         alert_color = alert_colors.get(analysis_type, '#9E9E9E')
         
-        subject = f"Hasil Analisis Siklus Anda - PregCare"
-        
-        body = self._get_email_template(
-            title="Hasil Analisis AI untuk Siklus Anda",
-            content=f"""
-            <p>Halo {user.first_name or user.username},</p>
-            <p>AI kami telah menyelesaikan analisis siklus menstruasi Anda.</p>
-            
-            <div style="background: {alert_color}20; border-left: 4px solid {alert_color}; padding: 15px 20px; border-radius: 0 10px 10px 0; margin: 20px 0;">
-                <p style="font-weight: bold; color: {alert_color}; margin: 0 0 10px 0;">
-                    Status: {analysis_type.replace('_', ' ').title()}
-                </p>
-                <p style="margin: 0; color: #333;">{message}</p>
-            </div>
-            
-            <h3 style="color: #333; margin-top: 25px;">Rekomendasi:</h3>
-            <ul style="color: #555;">
-                {recommendations_html}
-            </ul>
-            
-            <div style="text-align: center; margin: 30px 0;">
-                <a href="{os.environ.get('PREGCARE_APP_URL', 'http://localhost:5173')}/dashboard" style="background: linear-gradient(135deg, #FF69B4, #9B59B6); color: white; padding: 15px 30px; text-decoration: none; border-radius: 25px; font-weight: bold;">
-                    Lihat Detail Lengkap
-                </a>
-            </div>
-            """
-        )
+        subject, body, plain_text = self.templates.render('ai_analysis', self._context(
+            user,
+            alert_color=alert_color,
+            status=analysis_type.replace('_', ' ').title(),
+            message=message,
+            recommendations_html=recommendations_html,
+        ))
         
         return self.service.create_notification(
             user=user,
@@ -523,6 +681,7 @@ Tetap semangat dan jaga kesehatan!
             body=body,
             category='ai_analysis',
             priority='high' if analysis_type in ['irregular', 'short', 'long'] else 'normal',
+            plain_text_body=plain_text,
             metadata={
                 'trigger': 'ai_analysis_complete',
                 'analysis_type': analysis_type,
@@ -536,29 +695,10 @@ Tetap semangat dan jaga kesehatan!
         
         Called by: Scheduled task for partner missions
         """
-        subject = f"Misi Pasangan Hari Ini - PregCare"
-        
-        body = self._get_email_template(
-            title="Misi Pasangan Menunggu!",
-            content=f"""
-            <p>Halo {user.first_name or user.username},</p>
-            <p>Ada misi pasangan yang menunggu untuk dikerjakan bersama:</p>
-            
-            <div style="background: linear-gradient(135deg, #FFE5EC, #E8D5F2); padding: 25px; border-radius: 15px; margin: 20px 0; text-align: center;">
-                <p style="font-size: 20px; font-weight: bold; color: #9B59B6; margin: 0;">
-                    {mission_title}
-                </p>
-            </div>
-            
-            <p>Misi pasangan membantu mempererat hubungan dan mendukung perjalanan program kehamilan Anda berdua.</p>
-            
-            <div style="text-align: center; margin: 30px 0;">
-                <a href="{os.environ.get('PREGCARE_APP_URL', 'http://localhost:5173')}/misi-pasangan" style="background: linear-gradient(135deg, #FF69B4, #9B59B6); color: white; padding: 15px 30px; text-decoration: none; border-radius: 25px; font-weight: bold;">
-                    Kerjakan Misi
-                </a>
-            </div>
-            """
-        )
+        subject, body, plain_text = self.templates.render('partner_mission', self._context(
+            user,
+            mission_title=mission_title,
+        ))
         
         return self.service.create_notification(
             user=user,
@@ -566,6 +706,7 @@ Tetap semangat dan jaga kesehatan!
             body=body,
             category='partner_mission',
             priority='normal',
+            plain_text_body=plain_text,
             metadata={
                 'trigger': 'partner_mission_reminder',
                 'mission_title': mission_title
@@ -574,37 +715,7 @@ Tetap semangat dan jaga kesehatan!
     
     def _get_email_template(self, title: str, content: str, footer: str = "") -> str:
         """Generate consistent email HTML template"""
-        return f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        </head>
-        <body style="margin: 0; padding: 0; font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background-color: #f5f5f5;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                <!-- Header -->
-                <div style="background: linear-gradient(135deg, #FF69B4, #9B59B6); padding: 30px; border-radius: 20px 20px 0 0; text-align: center;">
-                    <h1 style="color: white; margin: 0; font-size: 28px;">PregCare</h1>
-                    <p style="color: rgba(255,255,255,0.9); margin: 10px 0 0 0; font-size: 14px;">Pendamping Perjalanan Kehamilan Anda</p>
-                </div>
-                
-                <!-- Content -->
-                <div style="background: white; padding: 40px 30px; border-radius: 0 0 20px 20px; box-shadow: 0 4px 20px rgba(0,0,0,0.1);">
-                    <h2 style="color: #333; margin-top: 0; font-size: 22px;">{title}</h2>
-                    {content}
-                </div>
-                
-                <!-- Footer -->
-                <div style="text-align: center; padding: 20px; color: #888; font-size: 12px;">
-                    <p>{footer if footer else "Email ini dikirim otomatis oleh sistem PregCare."}</p>
-                    <p>Untuk berhenti menerima email ini, atur preferensi notifikasi Anda di aplikasi.</p>
-                    <p style="margin-top: 15px;">&copy; 2025 PregCare. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        return render_layout(title, content, footer)
 
 
 # Singleton instances for easy access
@@ -0,0 +1,347 @@
+"""
+Notification Template Engine for PregCare
+Email templates are parsed once into literal/field segments and cached per
+category, so rendering for a user is a single join (no str.format parsing, no
+DB lookup). Bulk sends render thousands of emails from the same compiled
+template.
+
+Templates use {placeholder} syntax (with optional format specs, e.g.
+{fertile_start:%d %B %Y}). Values are HTML-escaped in the email body unless
+they are marked safe (django.utils.safestring.mark_safe).
+
+An active NotificationType for a category overrides the built-in template:
+subject_template is the subject and body_template is the content block placed
+inside the standard PregCare layout. The cache is cleared whenever a
+NotificationType is saved or deleted in this process and reloaded at most every
+PREGCARE_TEMPLATE_CACHE_TTL seconds (default: 300) to pick up edits made by
+other processes.
+"""
+import html
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from string import Formatter
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.html import conditional_escape, strip_tags
+from django.utils.safestring import mark_safe
+
+from .models import NotificationType
+
+logger = logging.getLogger(__name__)
+
+_formatter = Formatter()
+
+
+class CompiledTemplate:
+    """A {placeholder} template parsed once into (literal, field, conversion, spec) segments"""
+
+    __slots__ = ('source', 'escape', '_parts', '_missing_logged')
+
+    def __init__(self, source: str, escape: bool = False):
+        self.source = source
+        self.escape = escape
+        self._missing_logged = set()
+        self._parts: List[Tuple[str, Optional[str], Optional[str], str]] = [
+            (literal, field, conversion, spec or '')
+            for literal, field, spec, conversion in _formatter.parse(source)
+        ]  # raises ValueError on unbalanced braces
+
+    def render(self, context: Dict[str, Any]) -> str:
+        out = []
+        for literal, field, conversion, spec in self._parts:
+            out.append(literal)
+            if field is None:
+                continue
+            try:
+                value = _formatter.get_field(field, (), context)[0]
+            except (KeyError, AttributeError, IndexError):
+                if field not in self._missing_logged:
+                    self._missing_logged.add(field)
+                    logger.warning(f"[WARN] Template placeholder '{{{field}}}' has no value")
+                continue
+            if conversion:
+                value = _formatter.convert_field(value, conversion)
+            if spec:
+                value = format(value, spec)
+            out.append(conditional_escape(value) if self.escape else str(value))
+        return ''.join(out)
+
+
+def _plain_source(html_source: str) -> str:
+    """Plain-text template derived from an HTML template (tags stripped, placeholders kept)"""
+    text = html.unescape(strip_tags(html_source))
+    lines = [line.strip() for line in text.splitlines()]
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip()
+
+
+LAYOUT = CompiledTemplate("""
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="utf-8">
+            <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        </head>
+        <body style="margin: 0; padding: 0; font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background-color: #f5f5f5;">
+            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                <!-- Header -->
+                <div style="background: linear-gradient(135deg, #FF69B4, #9B59B6); padding: 30px; border-radius: 20px 20px 0 0; text-align: center;">
+                    <h1 style="color: white; margin: 0; font-size: 28px;">PregCare</h1>
+                    <p style="color: rgba(255,255,255,0.9); margin: 10px 0 0 0; font-size: 14px;">Pendamping Perjalanan Kehamilan Anda</p>
+                </div>
+
+                <!-- Content -->
+                <div style="background: white; padding: 40px 30px; border-radius: 0 0 20px 20px; box-shadow: 0 4px 20px rgba(0,0,0,0.1);">
+                    <h2 style="color: #333; margin-top: 0; font-size: 22px;">{title}</h2>
+                    {content}
+                </div>
+
+                <!-- Footer -->
+                <div style="text-align: center; padding: 20px; color: #888; font-size: 12px;">
+                    <p>{footer}</p>
+                    <p>Untuk berhenti menerima email ini, atur preferensi notifikasi Anda di aplikasi.</p>
+                    <p style="margin-top: 15px;">&copy; 2025 PregCare. All rights reserved.</p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """, escape=True)
+
+DEFAULT_FOOTER = "Email ini dikirim otomatis oleh sistem PregCare."
+
+
+def render_layout(title: str, content: str, footer: str = "") -> str:
+    """Wrap an HTML content block (already rendered, trusted) in the PregCare layout"""
+    return LAYOUT.render({'title': title, 'content': mark_safe(content), 'footer': footer or DEFAULT_FOOTER})
+
+
+@dataclass
+class NotificationTemplate:
+    subject: CompiledTemplate
+    content: CompiledTemplate
+    plain: CompiledTemplate
+    title: Optional[CompiledTemplate] = None   # layout heading; defaults to the subject
+    footer: str = ""
+    notification_type: Optional[NotificationType] = None
+
+    @classmethod
+    def compile(cls, subject: str, content: str, title: Optional[str] = None, plain: Optional[str] = None,
+                footer: str = "", notification_type: Optional[NotificationType] = None) -> "NotificationTemplate":
+        return cls(
+            subject=CompiledTemplate(subject),
+            content=CompiledTemplate(content, escape=True),
+            plain=CompiledTemplate(plain if plain is not None else _plain_source(content)),
+            title=CompiledTemplate(title, escape=True) if title else None,
+            footer=footer,
+            notification_type=notification_type,
+        )
+
+    def render(self, context: Dict[str, Any]) -> Tuple[str, str, str]:
+        """(subject, html_body, plain_text_body) for one recipient"""
+        subject = self.subject.render(context)
+        body = LAYOUT.render({
+            'title': mark_safe(self.title.render(context)) if self.title else subject,
+            'content': mark_safe(self.content.render(context)),
+            'footer': self.footer or DEFAULT_FOOTER,
+        })
+        return subject, body, self.plain.render(context)
+
+
+_BUTTON_STYLE = (
+    "background: linear-gradient(135deg, #FF69B4, #9B59B6); color: white; padding: 15px 30px; "
+    "text-decoration: none; border-radius: 25px; font-weight: bold;"
+)
+
+# Built-in templates per category (used when no active NotificationType overrides them)
+DEFAULT_TEMPLATES: Dict[str, Dict[str, str]] = {
+    'cycle_reminder': {
+        'subject': "Pengingat Input Data Siklus - PregCare",
+        'title': "Jangan Lupa Catat Siklus Hari Ini",
+        'content': f"""
+            <p>Halo {{name}},</p>
+            <p>Ini pengingat harian untuk mencatat kondisi siklus Anda hari ini.</p>
+            <p>Pencatatan rutin membantu kami memberikan prediksi dan analisis yang lebih akurat untuk perjalanan kehamilan Anda.</p>
+            <div style="text-align: center; margin: 30px 0;">
+                <a href="{{app_url}}/daily-checkin" style="{_BUTTON_STYLE}">
+                    Catat Sekarang
+                </a>
+            </div>
+            <p>Tetap semangat dan jaga kesehatan!</p>
+            """,
+        'plain': """
+Halo {name},
+
+Ini pengingat harian untuk mencatat kondisi siklus Anda hari ini.
+Pencatatan rutin membantu kami memberikan prediksi dan analisis yang lebih akurat.
+
+Kunjungi aplikasi PregCare untuk mencatat sekarang.
+
+Tetap semangat dan jaga kesehatan!
+
+- Tim PregCare
+        """,
+        'footer': "Pengingat ini dikirim sesuai preferensi notifikasi Anda.",
+    },
+    'fertile_window': {
+        'subject': "Masa Subur Dimulai dalam {days_until} Hari - PregCare",
+        'title': "Masa Subur Anda Segera Tiba!",
+        'content': f"""
+            <p>Halo {{name}},</p>
+            <p>Berdasarkan analisis siklus Anda, kami memprediksi:</p>
+            <div style="background: #FFF5F8; padding: 20px; border-radius: 15px; margin: 20px 0;">
+                <p style="margin: 5px 0;"><strong>Masa Subur Dimulai:</strong> {{fertile_start:%d %B %Y}}</p>
+                <p style="margin: 5px 0;"><strong>Prediksi Ovulasi:</strong> {{ovulation_date:%d %B %Y}}</p>
+            </div>
+            <p>Ini adalah waktu optimal untuk program kehamilan Anda.</p>
+            <div style="text-align: center; margin: 30px 0;">
+                <a href="{{app_url}}/fertility-tracker" style="{_BUTTON_STYLE}">
+                    Lihat Detail Siklus
+                </a>
+            </div>
+            """,
+    },
+    'period_prediction': {
+        'subject': "Prediksi Menstruasi dalam {days_until} Hari - PregCare",
+        'title': "Persiapkan Diri untuk Siklus Berikutnya",
+        'content': """
+            <p>Halo {name},</p>
+            <p>Berdasarkan pola siklus Anda, menstruasi diprediksi akan dimulai pada:</p>
+            <div style="background: #FFF5F8; padding: 20px; border-radius: 15px; margin: 20px 0; text-align: center;">
+                <p style="font-size: 24px; font-weight: bold; color: #FF69B4; margin: 0;">
+                    {predicted_date:%d %B %Y}
+                </p>
+                <p style="color: #888; margin-top: 10px;">({days_until} hari lagi)</p>
+            </div>
+            <p>Pastikan Anda sudah mempersiapkan keperluan dan menjaga kesehatan.</p>
+            """,
+    },
+    'ai_analysis': {
+        'subject': "Hasil Analisis Siklus Anda - PregCare",
+        'title': "Hasil Analisis AI untuk Siklus Anda",
+        'content': f"""
+            <p>Halo {{name}},</p>
+            <p>AI kami telah menyelesaikan analisis siklus menstruasi Anda.</p>
+
+            <div style="background: {{alert_color}}20; border-left: 4px solid {{alert_color}}; padding: 15px 20px; border-radius: 0 10px 10px 0; margin: 20px 0;">
+                <p style="font-weight: bold; color: {{alert_color}}; margin: 0 0 10px 0;">
+                    Status: {{status}}
+                </p>
+                <p style="margin: 0; color: #333;">{{message}}</p>
+            </div>
+
+            <h3 style="color: #333; margin-top: 25px;">Rekomendasi:</h3>
+            <ul style="color: #555;">
+                {{recommendations_html}}
+            </ul>
+
+            <div style="text-align: center; margin: 30px 0;">
+                <a href="{{app_url}}/dashboard" style="{_BUTTON_STYLE}">
+                    Lihat Detail Lengkap
+                </a>
+            </div>
+            """,
+    },
+    'partner_mission': {
+        'subject': "Misi Pasangan Hari Ini - PregCare",
+        'title': "Misi Pasangan Menunggu!",
+        'content': f"""
+            <p>Halo {{name}},</p>
+            <p>Ada misi pasangan yang menunggu untuk dikerjakan bersama:</p>
+
+            <div style="background: linear-gradient(135deg, #FFE5EC, #E8D5F2); padding: 25px; border-radius: 15px; margin: 20px 0; text-align: center;">
+                <p style="font-size: 20px; font-weight: bold; color: #9B59B6; margin: 0;">
+                    {{mission_title}}
+                </p>
+            </div>
+
+            <p>Misi pasangan membantu mempererat hubungan dan mendukung perjalanan program kehamilan Anda berdua.</p>
+
+            <div style="text-align: center; margin: 30px 0;">
+                <a href="{{app_url}}/misi-pasangan" style="{_BUTTON_STYLE}">
+                    Kerjakan Misi
+                </a>
+            </div>
+            """,
+    },
+}
+
+
+class TemplateRegistry:
+    """Per-category compiled templates: active NotificationType rows over built-in defaults"""
+
+    def __init__(self, defaults: Optional[Dict[str, Dict[str, str]]] = None, ttl_seconds: float = 300.0):
+        self._defaults = {
+            category: NotificationTemplate.compile(**spec)
+            for category, spec in (DEFAULT_TEMPLATES if defaults is None else defaults).items()
+        }
+        self.ttl_seconds = ttl_seconds
+        self._templates: Optional[Dict[str, NotificationTemplate]] = None
+        self._types: Dict[str, NotificationType] = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, category: str) -> Optional[NotificationTemplate]:
+        """Compiled template for `category` (None if there is neither an override nor a default)"""
+        return self._current()[0].get(category)
+
+    def notification_type(self, category: str) -> Optional[NotificationType]:
+        """First active NotificationType of `category`, from the same cached load"""
+        return self._current()[1].get(category)
+
+    def render(self, category: str, context: Dict[str, Any]) -> Tuple[str, str, str]:
+        template = self.get(category)
+        if template is None:
+            raise KeyError(f"No notification template for category '{category}'")
+        return template.render(context)
+
+    def invalidate(self):
+        with self._lock:
+            self._templates = None
+
+    def _current(self):
+        templates, types = self._templates, self._types
+        if templates is None or time.monotonic() - self._loaded_at > self.ttl_seconds:
+            with self._lock:
+                if self._templates is None or time.monotonic() - self._loaded_at > self.ttl_seconds:
+                    self._load()
+                templates, types = self._templates, self._types
+        return templates, types
+
+    def _load(self):
+        templates = dict(self._defaults)
+        types: Dict[str, NotificationType] = {}
+        for notification_type in NotificationType.objects.filter(is_active=True).order_by('pk'):
+            if notification_type.category in types:
+                continue
+            types[notification_type.category] = notification_type
+            try:
+                templates[notification_type.category] = NotificationTemplate.compile(
+                    subject=notification_type.subject_template,
+                    content=notification_type.body_template,
+                    notification_type=notification_type,
+                )
+            except ValueError as e:
+                logger.error(f"[ERROR] Invalid template in NotificationType '{notification_type.name}': {e}")
+        # Defaults still need their type attached for Notification.notification_type
+        for category, notification_type in types.items():
+            if templates[category].notification_type is None:
+                default = templates[category]
+                templates[category] = NotificationTemplate(
+                    default.subject, default.content, default.plain, default.title, default.footer, notification_type,
+                )
+        self._types = types
+        self._templates = templates
+        self._loaded_at = time.monotonic()
+
+
+template_registry = TemplateRegistry(ttl_seconds=float(os.environ.get('PREGCARE_TEMPLATE_CACHE_TTL', '300')))
+
+
+@receiver([post_save, post_delete], sender=NotificationType, dispatch_uid='notification_template_invalidate')
+def _invalidate_templates(sender, **kwargs):
+    template_registry.invalidate()
@@ -0,0 +1,175 @@
+"""
+Unread Notification Counter for PregCare
+The unread count (status pending/sent) of each user is kept in one
+UnreadNotificationCounter row. Every write that changes a notification's
+unread state adjusts that row with an F() UPDATE inside the same transaction,
+so the counter commits or rolls back together with the status change, and the
+polled unread-count endpoint is a primary-key read instead of a COUNT over
+notifications.
+
+A missing counter row is created from one indexed count, either by the first
+write (inside its transaction, so the count already includes that write) or by
+the first read. Races around that creation, or updates that bypass these
+helpers, can leave small drift, which `manage.py reconcile_unread_counts`
+corrects periodically.
+
+With a shared cache (PREGCARE_REDIS_URL), reads go through the cache
+(read-through only): the count is cached on a miss, and the entry is deleted
+once an adjustment commits. Adjustments never write the cache. With the
+default per-process LocMemCache, other processes' deletes would not reach it,
+so reads go to the counter row directly.
+
+Configuration (environment):
+- PREGCARE_UNREAD_CACHE_TTL: seconds a cached count lives at most (default: 60)
+"""
+import logging
+import os
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .caching import is_shared_cache
+from .models import Notification, UnreadNotificationCounter
+
+logger = logging.getLogger(__name__)
+
+UNREAD_CACHE_TTL = int(os.environ.get('PREGCARE_UNREAD_CACHE_TTL', '60'))
+_KEY = 'notification-unread:{}'
+
+
+def _counts(user_ids: List[int]) -> Dict[int, int]:
+    """Unread rows per user, one GROUP BY on the (user, status) index"""
+    counts = dict.fromkeys(user_ids, 0)
+    counts.update(
+        Notification.objects
+        .filter(user_id__in=user_ids, status__in=Notification.UNREAD_STATUSES)
+        .order_by()
+        .values('user_id')
+        .annotate(n=Count('id'))
+        .values_list('user_id', 'n')
+    )
+    return counts
+
+
+def _counter_value(user_id: int) -> Optional[int]:
+    return UnreadNotificationCounter.objects.filter(user_id=user_id).values_list('count', flat=True).first()
+
+
+def _create_counters(user_ids: List[int]) -> bool:
+    """Create counters from the current counts; False (nothing created) if any already exists"""
+    try:
+        with transaction.atomic():
+            UnreadNotificationCounter.objects.bulk_create(
+                UnreadNotificationCounter(user_id=uid, count=n) for uid, n in _counts(user_ids).items()
+            )
+        return True
+    except IntegrityError:
+        return False
+
+
+def _drop_cached(user_ids: List[int]):
+    if is_shared_cache():
+        cache.delete_many([_KEY.format(uid) for uid in user_ids])
+
+
+def get_unread_count(user_id: int) -> int:
+    """Unread notifications of a user, from the counter row (cached with a shared cache)"""
+    key = _KEY.format(user_id)
+    shared = is_shared_cache()
+    if shared:
+        value = cache.get(key)
+        if value is not None:
+            return value
+    value = _counter_value(user_id)
+    if value is None:
+        _create_counters([user_id])
+        value = _counter_value(user_id) or 0
+    if shared:
+        cache.set(key, value, UNREAD_CACHE_TTL)
+    return value
+
+
+def adjust_unread(user_id: Optional[int], delta: int):
+    """Apply +/- delta to one user's counter (see adjust_unread_many)"""
+    adjust_unread_many({user_id: delta})
+
+
+def adjust_unread_many(deltas: Dict[int, int]):
+    """
+    Apply per-user deltas to the counter rows: one UPDATE per distinct delta.
+
+    Call it inside the transaction that changed the statuses, after the
+    change, so both commit together; cached counts are dropped on commit.
+    """
+    deltas = {uid: delta for uid, delta in deltas.items() if uid and delta}
+    if not deltas:
+        return
+    with transaction.atomic():
+        existing = set(
+            UnreadNotificationCounter.objects.filter(user_id__in=list(deltas)).values_list('user_id', flat=True)
+        )
+        # New counters count the rows as they are now, this transaction's changes included
+        missing = [uid for uid in deltas if uid not in existing]
+        if missing and not _create_counters(missing):
+            # Some were created concurrently: one at a time, adjusting the ones that exist
+            existing.update(uid for uid in missing if not _create_counters([uid]))
+        by_delta: Dict[int, List[int]] = defaultdict(list)
+        for uid, delta in deltas.items():
+            if uid in existing:
+                by_delta[delta].append(uid)
+        for delta, user_ids in by_delta.items():
+            UnreadNotificationCounter.objects.filter(user_id__in=user_ids).update(count=F('count') + delta)
+        transaction.on_commit(lambda: _drop_cached(list(deltas)))
+
+
+def reconcile_unread_counts(user_ids: Optional[Iterable[int]] = None, chunk_size: int = 1000) -> Dict[str, int]:
+    """
+    Compare counter rows with the table and fix drifted ones.
+
+    Only users that have a counter are recounted (one GROUP BY query per
+    chunk); users without one get it on their next read or write. Each chunk's
+    counters are locked while counting, so concurrent adjustments wait and
+    then apply on top of the corrected value.
+    """
+    if user_ids is None:
+        user_ids = (
+            UnreadNotificationCounter.objects.order_by('user_id')
+            .values_list('user_id', flat=True).iterator(chunk_size=chunk_size)
+        )
+
+    stats = {'checked': 0, 'fixed': 0}
+
+    def _reconcile(chunk):
+        with transaction.atomic():
+            counters = dict(
+                UnreadNotificationCounter.objects
+                .select_for_update()
+                .filter(user_id__in=chunk)
+                .values_list('user_id', 'count')
+            )
+            if not counters:
+                return
+            actual = _counts(list(counters))
+            fixed = [uid for uid, n in actual.items() if counters[uid] != n]
+            for uid in fixed:
+                UnreadNotificationCounter.objects.filter(user_id=uid).update(count=actual[uid])
+            if fixed:
+                transaction.on_commit(lambda: _drop_cached(fixed))
+        stats['checked'] += len(counters)
+        stats['fixed'] += len(fixed)
+
+    chunk = []
+    for uid in user_ids:
+        chunk.append(uid)
+        if len(chunk) >= chunk_size:
+            _reconcile(chunk)
+            chunk = []
+    if chunk:
+        _reconcile(chunk)
+
+    if stats['fixed']:
+        logger.warning(f"[WARN] Unread counters drifted for {stats['fixed']} of {stats['checked']} users; fixed")
+    return stats
@@ -7,15 +7,22 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import api_view, permission_classes
+from django.db import transaction
 from django.utils import timezone
 
 from .models import Notification, UserNotificationPreference
 from .services import notification_service, notification_triggers
+from .unread import adjust_unread
 
 
 class NotificationListView(APIView):
     """
     GET: List user notifications
+    
+    Query params:
+        status: Filter by status
+        limit: Page size (max NotificationService.MAX_PAGE_SIZE)
+        cursor: `next_cursor` from the previous page
     """
     permission_classes = [IsAuthenticated]
     
@@ -23,18 +30,24 @@ class NotificationListView(APIView):
         """Get user's notification history"""
         user = request.user
         status_filter = request.query_params.get('status', None)
-        limit = int(request.query_params.get('limit', 50))
-        
-        notifications = notification_service.get_user_notifications(
-            user=user,
-            status=status_filter,
-            limit=limit
-        )
+        try:
+            limit = int(request.query_params.get('limit', 50))
+            notifications, next_cursor = notification_service.get_notifications_page(
+                user=user,
+                status=status_filter,
+                limit=limit,
+                cursor=request.query_params.get('cursor') or None
+            )
+        except ValueError as e:
+            return Response({
+                'success': False,
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
         
         data = [{
             'id': n.id,
             'subject': n.subject,
-            'body': n.plain_text_body or n.body[:200],
+            'body': n.preview,
             'status': n.status,
             'priority': n.priority,
             'created_at': n.created_at.isoformat(),
@@ -47,7 +60,9 @@ class NotificationListView(APIView):
             'success': True,
             'count': len(data),
             'unread_count': notification_service.get_unread_count(user),
-            'notifications': data
+            'notifications': data,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
         })
 
 
@@ -187,13 +202,15 @@ class MarkAllReadView(APIView):
     permission_classes = [IsAuthenticated]
     
     def post(self, request):
-        updated = Notification.objects.filter(
-            user=request.user,
-            status__in=['sent', 'pending']
-        ).update(
-            status='read',
-            read_at=timezone.now()
-        )
+        with transaction.atomic():
+            updated = Notification.objects.filter(
+                user=request.user,
+                status__in=Notification.UNREAD_STATUSES
+            ).update(
+                status='read',
+                read_at=timezone.now()
+            )
+            adjust_unread(request.user.id, -updated)
         
         return Response({
             'success': True,
@@ -0,0 +1,25 @@
+"""
+Test runner for the fertility app.
+
+The notification models (fertility.notifications.models) have no migration
+yet, so their tables are created right after the test database is migrated.
+"""
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+
+class PregCareTestRunner(DiscoverRunner):
+
+    def setup_databases(self, **kwargs):
+        old_config = super().setup_databases(**kwargs)
+        from fertility.notifications.models import (
+            Notification, NotificationType, UnreadNotificationCounter, UserNotificationPreference,
+        )
+
+        for connection in connections.all():
+            existing = connection.introspection.table_names()
+            with connection.schema_editor() as editor:
+                for model in (NotificationType, Notification, UserNotificationPreference, UnreadNotificationCounter):
+                    if model._meta.db_table not in existing:
+                        editor.create_model(model)
+        return old_config
@@ -0,0 +1,194 @@
+import asyncio
+import threading
+import types
+from unittest import mock
+
+import aiosmtplib
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+
+from fertility.notifications import async_email
+from fertility.notifications.async_email import AsyncEmailDispatcher
+from fertility.notifications.models import Notification
+from fertility.notifications.services import NotificationService
+
+
+class FakeSession:
+    """Stand-in for aiosmtplib.SMTP, reporting to the test's FakeAsyncService"""
+
+    server = None  # set per test
+
+    def __init__(self, hostname, port, timeout, start_tls):
+        self.server.connections += 1
+
+    async def connect(self):
+        pass
+
+    async def login(self, username, password):
+        pass
+
+    async def sendmail(self, from_addr, to_addrs, payload):
+        while self.server.hold.is_set():
+            await asyncio.sleep(0.005)
+        failure = self.server.failures.pop(0) if self.server.failures else None
+        if failure is not None:
+            raise failure
+        self.server.sent.append((self, to_addrs[0], payload))
+
+    async def quit(self):
+        self.server.closed += 1
+
+    def close(self):
+        self.server.closed += 1
+
+
+class FakeAsyncService:
+    """The slice of EmailService AsyncEmailDispatcher uses"""
+
+    host, port, username, password, use_tls = 'smtp.example.com', 587, 'pregcare@example.com', 'x', True
+
+    def __init__(self):
+        self.sent = []
+        self.failures = []  # exceptions for the next sendmail calls (None = succeed)
+        self.connections = 0
+        self.closed = 0
+        self.hold = threading.Event()  # set: sendmail waits until cleared
+
+    def _create_message(self, to_email, subject, html_body, plain_text_body=None):
+        return types.SimpleNamespace(as_string=lambda: f'Subject: {subject}')
+
+
+class AsyncEmailDispatcherTests(SimpleTestCase):
+
+    def setUp(self):
+        self.service = FakeAsyncService()
+        patcher = mock.patch.object(async_email.aiosmtplib, 'SMTP', FakeSession)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        FakeSession.server = self.service
+        self.record_results = mock.Mock(return_value=(0, 0))
+        patcher = mock.patch('fertility.notifications.notification_dispatcher.record_results', self.record_results)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def dispatcher(self, **kwargs):
+        kwargs.setdefault('workers', 1)
+        dispatcher = AsyncEmailDispatcher(self.service, **kwargs)
+        self.addCleanup(self.service.hold.clear)
+        self.addCleanup(dispatcher.shutdown, True, 5.0)
+        return dispatcher
+
+    def send(self, dispatcher, subject, to_email='ibu@example.com', **kwargs):
+        def callback(result):
+            with self.lock:
+                self.results[subject] = result
+        return dispatcher.submit(to_email, subject, '<p>b</p>', callback=callback, **kwargs)
+
+    def drain(self, dispatcher, timeout=5.0):
+        """dispatcher.join() that fails instead of hanging"""
+        joiner = threading.Thread(target=dispatcher.join, daemon=True)
+        joiner.start()
+        joiner.join(timeout)
+        self.assertFalse(joiner.is_alive(), 'email queue did not drain')
+
+    def test_message_error_keeps_the_session(self):
+        dispatcher = self.dispatcher()
+        self.service.failures.append(aiosmtplib.SMTPRecipientsRefused([]))
+        self.send(dispatcher, 'ditolak')
+        self.send(dispatcher, 'lanjut')
+        self.drain(dispatcher)
+
+        self.assertFalse(self.results['ditolak']['success'])
+        self.assertTrue(self.results['lanjut']['success'])
+        self.assertEqual(self.service.connections, 1)
+        self.assertEqual(dispatcher.stats['reconnects'], 0)
+
+    def test_connection_error_reconnects_once(self):
+        dispatcher = self.dispatcher()
+        self.service.failures.append(aiosmtplib.SMTPServerDisconnected('dropped'))
+        self.send(dispatcher, 'satu')
+        self.drain(dispatcher)
+
+        self.assertTrue(self.results['satu']['success'])
+        self.assertEqual((self.service.connections, dispatcher.stats['reconnects']), (2, 1))
+
+        # Dropped again on the fresh session: reported, not retried forever
+        self.service.failures.extend([aiosmtplib.SMTPServerDisconnected('dropped')] * 2)
+        self.send(dispatcher, 'dua')
+        self.send(dispatcher, 'tiga')
+        self.drain(dispatcher)
+
+        self.assertFalse(self.results['dua']['success'])
+        self.assertTrue(self.results['tiga']['success'])
+        self.assertEqual(len(self.service.sent), 2)
+
+    def test_other_smtp_reply_is_not_resent(self):
+        dispatcher = self.dispatcher()
+        self.service.failures.append(aiosmtplib.SMTPResponseException(451, 'try later'))
+        self.send(dispatcher, 'gagal')
+        self.drain(dispatcher)
+
+        self.assertFalse(self.results['gagal']['success'])
+        self.assertEqual(self.service.sent, [])
+        self.assertEqual(dispatcher.stats['reconnects'], 0)
+
+    def test_outcomes_are_written_back_in_batches(self):
+        dispatcher = self.dispatcher(workers=2, report_interval=0.5)
+        notifications = [types.SimpleNamespace(id=i) for i in range(20)]
+        self.service.hold.set()
+        for notification in notifications:
+            dispatcher.submit('ibu@example.com', f's{notification.id}', '<p>b</p>', notification=notification)
+        self.service.hold.clear()
+        self.drain(dispatcher)
+
+        written = [n for call in self.record_results.call_args_list for n in call.args[0]]
+        self.assertEqual(sorted(n.id for n in written), list(range(20)))
+        self.assertLess(self.record_results.call_count, 20)
+        self.assertEqual(dispatcher.stats['reports'], self.record_results.call_count)
+        for call in self.record_results.call_args_list:
+            notifications, results = call.args
+            self.assertEqual(set(results), {n.id for n in notifications})
+            self.assertTrue(all(r['success'] for r in results.values()))
+
+    def test_queue_full_is_rejected(self):
+        dispatcher = self.dispatcher(queue_size=1)
+        self.service.hold.set()
+        self.assertTrue(self.send(dispatcher, 'pertama'))
+
+        self.assertFalse(self.send(dispatcher, 'kedua', timeout=0.05))
+
+        self.assertEqual(self.results['kedua']['error'], 'Email dispatcher queue full')
+        self.assertEqual(dispatcher.stats['rejected'], 1)
+        self.service.hold.clear()
+        self.drain(dispatcher)
+        self.assertTrue(self.results['pertama']['success'])
+
+    def test_shutdown_drains_the_queue(self):
+        dispatcher = self.dispatcher(workers=2)
+        for i in range(10):
+            self.send(dispatcher, f'email {i}')
+
+        dispatcher.shutdown(wait=True, timeout=5.0)
+
+        self.assertEqual(len(self.results), 10)
+        self.assertEqual(len(self.service.sent), 10)
+        self.assertEqual(dispatcher.qsize(), 0)
+        self.assertEqual(self.service.closed, self.service.connections)
+
+
+class SendNotificationTests(TestCase):
+
+    def test_notification_is_passed_to_the_dispatcher(self):
+        user = User.objects.create_user('ibu', email='ibu@example.com')
+        notification = Notification.objects.create(user=user, subject='s', body='<p>b</p>', plain_text_body='b')
+        service = NotificationService()
+
+        with mock.patch.object(service.email_service, 'send_email_async') as send:
+            self.assertTrue(service.send_notification(notification))
+
+        send.assert_called_once_with(
+            to_email='ibu@example.com', subject='s', html_body='<p>b</p>', plain_text_body='b',
+            notification=notification,
+        )
@@ -0,0 +1,144 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from fertility.notifications.digest import DigestSender
+from fertility.notifications.models import Notification, UserNotificationPreference
+from fertility.notifications.notification_dispatcher import NotificationDispatcher
+
+from .utils import FakeEmailDispatcher
+
+
+class DigestTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.digest_user = self.user('ringkasan', digest_mode=True)
+        self.other_digest_user = self.user('ringkasan2', digest_mode=True)
+        self.regular = self.user('reguler', digest_mode=False)
+
+    def user(self, username, email=None, **prefs):
+        user = User.objects.create_user(username, email=f'{username}@example.com' if email is None else email)
+        UserNotificationPreference.objects.create(user=user, **prefs)
+        return user
+
+    def held(self, user, subject='s', **fields):
+        fields.setdefault('scheduled_at', None)
+        return Notification.objects.create(user=user, subject=subject, body='<p>b</p>', plain_text_body=subject, **fields)
+
+    def test_digest_users(self):
+        self.user('tanpa-email', email='', digest_mode=True)
+        self.assertEqual(set(DigestSender(FakeEmailDispatcher()).digest_users()),
+                         {self.digest_user, self.other_digest_user})
+
+    def test_claim_leases_only_held_rows(self):
+        first = self.held(self.digest_user, 'pertama')
+        second = self.held(self.digest_user, 'kedua')
+        self.held(self.digest_user, priority='urgent')
+        self.held(self.digest_user, scheduled_at=timezone.now())  # due for the dispatcher
+        self.held(self.digest_user, status='sent')
+        other = self.held(self.other_digest_user)
+        sender = DigestSender(FakeEmailDispatcher(), lease_seconds=300)
+
+        grouped = sender._claim([self.digest_user.id])
+
+        self.assertEqual(list(grouped), [self.digest_user.id])
+        self.assertEqual([n.id for n in grouped[self.digest_user.id]], [first.id, second.id])
+        first.refresh_from_db()
+        self.assertGreater(first.scheduled_at, timezone.now() + timedelta(seconds=200))
+        other.refresh_from_db()
+        self.assertIsNone(other.scheduled_at)
+        # Leased rows are not claimed twice
+        self.assertEqual(sender._claim([self.digest_user.id]), {})
+
+    def test_one_email_per_user_marks_all_rows_sent(self):
+        rows = [self.held(self.digest_user, f'item {i}') for i in range(3)]
+        self.held(self.other_digest_user, 'lain')
+        email = FakeEmailDispatcher()
+        sender = DigestSender(email)
+
+        self.assertEqual(sender.send(), 2)
+
+        self.assertEqual(sorted(m['to_email'] for m in email.sent),
+                         ['ringkasan2@example.com', 'ringkasan@example.com'])
+        mine = next(m for m in email.sent if m['to_email'] == 'ringkasan@example.com')
+        self.assertIn('item 2', mine['plain_text_body'])
+        for row in rows:
+            row.refresh_from_db()
+            self.assertEqual(row.status, 'sent')
+            self.assertIsNotNone(row.sent_at)
+            self.assertIsNone(row.scheduled_at)
+        self.assertEqual(sender.stats, {'digests': 2, 'notifications': 4, 'failed': 0})
+
+    def test_users_without_held_rows_get_nothing(self):
+        email = FakeEmailDispatcher()
+        self.assertEqual(DigestSender(email).send(), 0)
+        self.assertEqual(email.sent, [])
+
+    def test_failed_digest_is_held_again(self):
+        row = self.held(self.digest_user)
+        sender = DigestSender(FakeEmailDispatcher({'success': False, 'error': 'SMTP error'}))
+
+        self.assertEqual(sender.send(), 0)
+
+        row.refresh_from_db()
+        self.assertEqual(row.status, 'pending')
+        self.assertIsNone(row.scheduled_at)
+        self.assertEqual(row.error_message, 'SMTP error')
+        self.assertEqual(sender.stats['failed'], 1)
+        self.assertEqual(list(sender._claim([self.digest_user.id])), [self.digest_user.id])
+
+    def test_digest_failures_count_against_max_retries(self):
+        row = self.held(self.digest_user, max_retries=2)
+        sender = DigestSender(FakeEmailDispatcher({'success': False, 'error': 'SMTP error'}))
+
+        sender.send()
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.retry_count), ('pending', 1))
+
+        sender.send()
+        row.refresh_from_db()
+        # Out of retries: given up like the dispatcher does, not held for every future digest
+        self.assertEqual((row.status, row.retry_count), ('failed', 2))
+        self.assertIsNone(row.scheduled_at)
+        self.assertEqual(sender._claim([self.digest_user.id]), {})
+        self.assertEqual(sender.stats['failed'], 2)
+
+    def test_turning_digest_mode_off_releases_held_rows(self):
+        row = self.held(self.digest_user)
+        other = self.held(self.other_digest_user)
+        prefs = self.digest_user.notification_preferences
+
+        prefs.digest_mode = False
+        prefs.save()
+
+        row.refresh_from_db()
+        self.assertEqual(row.status, 'pending')
+        self.assertIn(row.id, NotificationDispatcher(FakeEmailDispatcher()).claim_batch())
+        other.refresh_from_db()
+        self.assertIsNone(other.scheduled_at)
+
+    def test_deleting_preferences_releases_held_rows(self):
+        row = self.held(self.digest_user)
+
+        self.digest_user.notification_preferences.delete()
+
+        row.refresh_from_db()
+        self.assertIsNotNone(row.scheduled_at)
+
+    def test_late_digest_result_is_recorded(self):
+        row = self.held(self.digest_user)
+        email = FakeEmailDispatcher(hold=True)
+        sender = DigestSender(email, send_timeout=0.01)
+
+        sender.send()
+        row.refresh_from_db()
+        self.assertEqual(row.status, 'pending')
+
+        email.release()
+        row.refresh_from_db()
+        self.assertEqual(row.status, 'sent')
+        self.assertEqual(sender.stats['digests'], 1)
@@ -0,0 +1,113 @@
+import smtplib
+import threading
+
+from django.test import SimpleTestCase
+
+from fertility.notifications.email_dispatcher import EmailDispatcher
+
+
+class FakeSMTP:
+
+    def __init__(self, server):
+        self.server = server
+
+    def sendmail(self, from_addr, to_addr, payload):
+        failure = self.server.failures.pop(0) if self.server.failures else None
+        if failure is not None:
+            raise failure
+        self.server.sent.append((self, to_addr, payload))
+
+    def quit(self):
+        self.server.closed += 1
+
+    def close(self):
+        self.server.closed += 1
+
+
+class FakeMessage:
+
+    def __init__(self, subject):
+        self.subject = subject
+
+    def as_string(self):
+        if self.subject == 'rusak':
+            raise UnicodeEncodeError('ascii', self.subject, 0, 1, 'cannot encode')
+        return f'Subject: {self.subject}'
+
+
+class FakeEmailService:
+    """The slice of EmailService the dispatcher uses, with in-memory SMTP sessions"""
+
+    username = 'pregcare@example.com'
+
+    def __init__(self):
+        self.sent = []
+        self.failures = []  # exceptions for the next sendmail calls (None = succeed)
+        self.connections = 0
+        self.closed = 0
+
+    def open_connection(self):
+        self.connections += 1
+        return FakeSMTP(self)
+
+    def _create_message(self, to_email, subject, html_body, plain_text_body=None):
+        return FakeMessage(subject)
+
+
+class EmailDispatcherTests(SimpleTestCase):
+
+    def setUp(self):
+        self.service = FakeEmailService()
+        self.dispatcher = EmailDispatcher(self.service, workers=1, idle_timeout=60)
+        self.addCleanup(self.dispatcher.shutdown, True, 5.0)
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def send(self, subject, to_email='ibu@example.com'):
+        def callback(result):
+            with self.lock:
+                self.results[subject] = result
+        self.assertTrue(self.dispatcher.submit(to_email, subject, '<p>b</p>', callback=callback))
+
+    def drain(self, timeout=5.0):
+        """dispatcher.join() that fails instead of hanging when a worker died"""
+        joiner = threading.Thread(target=self.dispatcher.join, daemon=True)
+        joiner.start()
+        joiner.join(timeout)
+        self.assertFalse(joiner.is_alive(), 'email queue did not drain')
+
+    def test_message_that_fails_to_build_is_reported(self):
+        # Regression: as_string() ran outside the try and killed the worker thread
+        self.send('rusak')
+        self.send('berikutnya')
+        self.drain()
+
+        self.assertFalse(self.results['rusak']['success'])
+        self.assertIn('cannot encode', self.results['rusak']['error'])
+        self.assertTrue(self.results['berikutnya']['success'])
+        self.assertEqual([payload for _, _, payload in self.service.sent], ['Subject: berikutnya'])
+        self.assertEqual(self.dispatcher.stats['failed'], 1)
+        self.assertEqual(self.dispatcher.stats['sent'], 1)
+
+    def test_session_is_reused_and_reconnected_once(self):
+        self.send('satu')
+        self.service.failures.append(smtplib.SMTPServerDisconnected('dropped'))
+        self.send('dua')
+        self.send('tiga')
+        self.drain()
+
+        self.assertTrue(all(r['success'] for r in self.results.values()))
+        self.assertEqual(self.service.connections, 2)
+        self.assertEqual(self.dispatcher.stats['reconnects'], 1)
+        sessions = [conn for conn, _, _ in self.service.sent]
+        self.assertIs(sessions[1], sessions[2])
+
+    def test_recipient_refused_keeps_the_session(self):
+        self.service.failures.append(smtplib.SMTPRecipientsRefused({'x@example.com': (550, b'no such user')}))
+        self.send('ditolak', to_email='x@example.com')
+        self.send('lanjut')
+        self.drain()
+
+        self.assertFalse(self.results['ditolak']['success'])
+        self.assertTrue(self.results['lanjut']['success'])
+        self.assertEqual(self.service.connections, 1)
@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from fertility.notifications.models import Notification, UserNotificationPreference
+from fertility.notifications.services import NotificationService
+
+
+class BulkNotificationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.service = NotificationService()
+
+    def user(self, username, email=None, is_active=True, **prefs):
+        user = User.objects.create_user(
+            username, email=f'{username}@example.com' if email is None else email, is_active=is_active,
+        )
+        if prefs:
+            UserNotificationPreference.objects.create(user=user, **prefs)
+        return user
+
+    def test_eligible_users(self):
+        no_prefs = self.user('tanpa-preferensi')
+        opted_in = self.user('ikut', email_enabled=True)
+        self.user('email-mati', email_enabled=False)
+        reminders_off = self.user('reminder-mati', email_cycle_reminders=False)
+        self.user('nonaktif', is_active=False)
+        self.user('tanpa-email', email='')
+
+        self.assertEqual(
+            set(self.service.eligible_users('cycle_reminder')), {no_prefs, opted_in},
+        )
+        # Categories without an opt-in field only need email_enabled
+        self.assertEqual(
+            set(self.service.eligible_users('system')), {no_prefs, opted_in, reminders_off},
+        )
+        self.assertEqual(
+            list(self.service.eligible_users('cycle_reminder', User.objects.filter(username='ikut'))), [opted_in],
+        )
+
+    def test_bulk_create_one_row_per_eligible_user(self):
+        users = [self.user(f'ibu{i}') for i in range(5)]
+        self.user('email-mati', email_enabled=False)
+        due = timezone.now() + timedelta(minutes=5)
+        rendered = []
+
+        def render(user):
+            rendered.append(user.id)
+            return f'Halo {user.username}', f'<p>{user.username}</p>', user.username
+
+        created = self.service.bulk_create_notifications(
+            'cycle_reminder', render, scheduled_at=due, metadata={'trigger': 'test'}, chunk_size=2,
+        )
+
+        self.assertEqual(created, 5)
+        self.assertEqual(sorted(rendered), sorted(u.id for u in users))
+        rows = Notification.objects.order_by('user_id')
+        self.assertEqual([n.user_id for n in rows], sorted(u.id for u in users))
+        first = rows[0]
+        self.assertEqual((first.subject, first.plain_text_body), ('Halo ibu0', 'ibu0'))
+        self.assertEqual(first.status, 'pending')
+        self.assertEqual(first.scheduled_at, due)
+        self.assertEqual(first.metadata, {'trigger': 'test'})
+
+    def test_digest_users_are_held_unless_urgent(self):
+        regular = self.user('reguler')
+        digest = self.user('ringkasan', digest_mode=True)
+
+        def render(user):
+            return 's', 'b', 'p'
+
+        self.service.bulk_create_notifications('system', render)
+        held = Notification.objects.get(user=digest)
+        self.assertIsNone(held.scheduled_at)
+        self.assertIsNotNone(Notification.objects.get(user=regular).scheduled_at)
+
+        Notification.objects.all().delete()
+        self.service.bulk_create_notifications('system', render, priority='urgent')
+        self.assertIsNotNone(Notification.objects.get(user=digest).scheduled_at)
+
+    def test_no_recipients(self):
+        self.assertEqual(self.service.bulk_create_notifications('system', lambda u: ('s', 'b', 'p')), 0)
+        self.assertFalse(Notification.objects.exists())
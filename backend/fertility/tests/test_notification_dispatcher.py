@@ -0,0 +1,209 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from fertility.notifications.models import Notification
+from fertility.notifications.notification_dispatcher import NotificationDispatcher, record_results
+
+from .utils import FakeEmailDispatcher
+
+
+class DispatcherTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+        self.user = User.objects.create_user('ibu', email='ibu@example.com')
+
+    def notification(self, user=None, **fields):
+        fields.setdefault('scheduled_at', self.now - timedelta(minutes=1))
+        return Notification.objects.create(user=user or self.user, subject='s', body='<p>b</p>', **fields)
+
+
+class ClaimBatchTests(DispatcherTestCase):
+
+    def test_claims_only_due_rows_with_retries_left(self):
+        due_pending = self.notification()
+        due_failed = self.notification(status='failed', retry_count=1)
+        self.notification(scheduled_at=self.now + timedelta(hours=1))           # not due yet
+        self.notification(scheduled_at=None)                                     # held for a digest
+        self.notification(status='sent')                                         # already delivered
+        self.notification(status='failed', retry_count=3, max_retries=3)         # retries exhausted
+
+        claimed = NotificationDispatcher(FakeEmailDispatcher()).claim_batch()
+
+        self.assertEqual(set(claimed), {due_pending.id, due_failed.id})
+        self.assertEqual(claimed[due_pending.id], due_pending.scheduled_at)
+
+    def test_lease_pushes_scheduled_at_forward(self):
+        notification = self.notification()
+        dispatcher = NotificationDispatcher(FakeEmailDispatcher(), lease_seconds=300)
+
+        self.assertEqual(list(dispatcher.claim_batch()), [notification.id])
+
+        notification.refresh_from_db()
+        self.assertGreaterEqual(notification.scheduled_at, self.now + timedelta(seconds=300))
+        # Leased rows are invisible to the next claim (another replica)
+        self.assertEqual(dispatcher.claim_batch(), {})
+
+    def test_batch_size_takes_the_oldest_due_rows(self):
+        oldest = self.notification(scheduled_at=self.now - timedelta(minutes=3))
+        older = self.notification(scheduled_at=self.now - timedelta(minutes=2))
+        self.notification(scheduled_at=self.now - timedelta(minutes=1))
+
+        claimed = NotificationDispatcher(FakeEmailDispatcher(), batch_size=2).claim_batch()
+
+        self.assertEqual(set(claimed), {oldest.id, older.id})
+
+
+class RecordResultsTests(DispatcherTestCase):
+
+    def test_sent_and_failed_fields(self):
+        sent = self.notification(error_message='old error')
+        failed = self.notification()
+
+        with mock.patch('fertility.notifications.notification_dispatcher.adjust_unread_many'):
+            counts = record_results([sent, failed], {
+                sent.id: {'success': True},
+                failed.id: {'success': False, 'error': 'SMTP error: 550'},
+            })
+
+        self.assertEqual(counts, (1, 1))
+        sent.refresh_from_db()
+        self.assertEqual(sent.status, 'sent')
+        self.assertIsNotNone(sent.sent_at)
+        self.assertEqual(sent.error_message, '')
+        self.assertEqual(sent.retry_count, 0)
+
+        failed.refresh_from_db()
+        self.assertEqual(failed.status, 'failed')
+        self.assertEqual(failed.error_message, 'SMTP error: 550')
+        self.assertEqual(failed.retry_count, 1)
+        self.assertIsNone(failed.sent_at)
+        self.assertAlmostEqual(
+            (failed.scheduled_at - timezone.now()).total_seconds(), Notification.RETRY_BASE_DELAY.total_seconds(), delta=5,
+        )
+
+    def test_unread_deltas(self):
+        other = User.objects.create_user('bumil', email='bumil@example.com')
+        pending_fails = self.notification()                         # unread -> not unread
+        pending_sent = self.notification()                          # unread -> unread
+        retry_sent = self.notification(user=other, status='failed', retry_count=1)  # not unread -> unread
+
+        with mock.patch('fertility.notifications.notification_dispatcher.adjust_unread_many') as adjust:
+            record_results([pending_fails, pending_sent, retry_sent], {
+                pending_fails.id: {'success': False, 'error': 'x'},
+                pending_sent.id: {'success': True},
+                retry_sent.id: {'success': True},
+            })
+
+        adjust.assert_called_once_with({self.user.id: -1, other.id: 1})
+
+    def test_empty_batch(self):
+        with mock.patch('fertility.notifications.notification_dispatcher.adjust_unread_many') as adjust:
+            self.assertEqual(record_results([], {}), (0, 0))
+        adjust.assert_not_called()
+
+
+class RetryBackoffTests(SimpleTestCase):
+
+    def test_next_retry_at_doubles_and_caps(self):
+        now = timezone.now()
+        notification = Notification(max_retries=50)
+        delays = []
+        for retry_count in range(12):
+            notification.retry_count = retry_count
+            delays.append(notification.next_retry_at(now) - now)
+
+        minute = timedelta(minutes=1)
+        self.assertEqual(delays[:6], [minute, minute, 2 * minute, 4 * minute, 8 * minute, 16 * minute])
+        self.assertEqual(delays[-1], Notification.RETRY_MAX_DELAY)
+        notification.retry_count = 10_000
+        self.assertEqual(notification.next_retry_at(now) - now, Notification.RETRY_MAX_DELAY)
+
+    def test_set_failed_schedules_retries_until_exhausted(self):
+        now = timezone.now()
+        notification = Notification(status='pending', max_retries=3)
+
+        notification.set_failed('first', now)
+        self.assertEqual((notification.retry_count, notification.scheduled_at), (1, now + timedelta(minutes=1)))
+        self.assertTrue(notification.can_retry())
+
+        notification.set_failed('second', now)
+        self.assertEqual((notification.retry_count, notification.scheduled_at), (2, now + timedelta(minutes=2)))
+
+        notification.set_failed('third', now)
+        self.assertEqual(notification.status, 'failed')
+        self.assertEqual(notification.error_message, 'third')
+        self.assertEqual(notification.retry_count, 3)
+        self.assertIsNone(notification.scheduled_at)
+        self.assertFalse(notification.can_retry())
+
+
+class DispatchBatchTests(DispatcherTestCase):
+
+    def test_sends_and_keeps_original_schedule(self):
+        notification = self.notification()
+        email = FakeEmailDispatcher()
+        dispatcher = NotificationDispatcher(email)
+
+        self.assertEqual(dispatcher.dispatch_batch(), 1)
+
+        self.assertEqual([m['to_email'] for m in email.sent], ['ibu@example.com'])
+        scheduled_at = notification.scheduled_at
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'sent')
+        self.assertEqual(notification.scheduled_at, scheduled_at)
+        self.assertEqual(dispatcher.stats['sent'], 1)
+
+    def test_no_email_exhausts_retries(self):
+        no_email = User.objects.create_user('tanpa-email', email='')
+        notification = self.notification(user=no_email)
+        email = FakeEmailDispatcher()
+        dispatcher = NotificationDispatcher(email)
+
+        self.assertEqual(dispatcher.dispatch_batch(), 1)
+
+        self.assertEqual(email.sent, [])
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'failed')
+        self.assertEqual(notification.error_message, 'User has no email address')
+        self.assertEqual(notification.retry_count, notification.max_retries)
+        self.assertIsNone(notification.scheduled_at)
+        self.assertEqual(dispatcher.claim_batch(), {})
+
+    def test_failed_send_is_retried_later(self):
+        notification = self.notification()
+        dispatcher = NotificationDispatcher(FakeEmailDispatcher({'success': False, 'error': 'SMTP error'}))
+
+        dispatcher.dispatch_batch()
+
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.retry_count), ('failed', 1))
+        self.assertGreater(notification.scheduled_at, timezone.now())
+        self.assertEqual(dispatcher.claim_batch(), {})  # backoff not elapsed yet
+
+    def test_late_callback_after_send_timeout(self):
+        notification = self.notification()
+        email = FakeEmailDispatcher(hold=True)
+        dispatcher = NotificationDispatcher(email, send_timeout=0.01)
+
+        self.assertEqual(dispatcher.dispatch_batch(), 1)
+
+        # Nothing recorded yet: the row is still leased, not sent
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'pending')
+        self.assertGreater(notification.scheduled_at, timezone.now())
+        self.assertEqual(dispatcher.stats['sent'], 0)
+
+        email.release()
+
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'sent')
+        self.assertLess(notification.scheduled_at, timezone.now())
+        self.assertEqual(dispatcher.stats['late'], 1)
+        self.assertEqual(dispatcher.stats['sent'], 1)
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from fertility.notifications.models import Notification
+from fertility.notifications.services import NotificationService, decode_cursor, encode_cursor
+
+
+class CursorTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        created_at = datetime(2026, 3, 1, 8, 15, 30, 123456, tzinfo=dt_timezone.utc)
+        cursor = encode_cursor(Notification(id=4242, created_at=created_at))
+
+        self.assertNotIn('=', cursor)
+        self.assertEqual(decode_cursor(cursor), (created_at, 4242))
+
+    def test_invalid_cursor(self):
+        for cursor in ('!!!', 'bm8tc2VwYXJhdG9y', 'MjAyNi0wMy0wMXxhYmM', '//79'):
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+
+class NotificationPageTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ibu', email='ibu@example.com', password='rahasia123')
+        other = User.objects.create_user('lain', email='lain@example.com')
+        Notification.objects.create(user=other, subject='bukan milik ibu', body='x')
+        self.rows = [
+            Notification.objects.create(user=self.user, subject=f's{i}', body='<p>html</p>', plain_text_body=f'teks {i}')
+            for i in range(7)
+        ]
+        # Ties on created_at must be broken by id
+        base = timezone.now()
+        for i, row in enumerate(self.rows):
+            Notification.objects.filter(id=row.id).update(created_at=base - timedelta(seconds=i // 3))
+        self.service = NotificationService()
+
+    def test_pages_cover_every_row_once(self):
+        seen, cursor, pages = [], None, 0
+        while True:
+            page, cursor = self.service.get_notifications_page(self.user, limit=3, cursor=cursor)
+            seen += [n.id for n in page]
+            pages += 1
+            if cursor is None:
+                break
+
+        expected = list(
+            Notification.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 3)
+
+    def test_preview_and_status_filter(self):
+        Notification.objects.filter(id=self.rows[0].id).update(status='read', plain_text_body='')
+
+        page, cursor = self.service.get_notifications_page(self.user, status='read')
+
+        self.assertEqual([n.id for n in page], [self.rows[0].id])
+        self.assertEqual(page[0].preview, '<p>html</p>')
+        self.assertIsNone(cursor)
+
+    def test_view_rejects_invalid_cursor(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('notification-list')
+
+        first = client.get(url, {'limit': 5}).json()
+        self.assertEqual(first['count'], 5)
+        self.assertTrue(first['has_more'])
+        second = client.get(url, {'limit': 5, 'cursor': first['next_cursor']}).json()
+        self.assertEqual(second['count'], 2)
+        self.assertFalse(second['has_more'])
+
+        self.assertEqual(client.get(url, {'cursor': '!!!'}).status_code, 400)
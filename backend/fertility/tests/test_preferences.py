@@ -0,0 +1,79 @@
+from datetime import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+
+from fertility.notifications.models import UserNotificationPreference
+from fertility.notifications.preferences import get_preferences, get_preferences_bulk, invalidate_preferences
+
+
+class PreferenceCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ibu', email='ibu@example.com')
+
+    def test_cached_after_first_read(self):
+        prefs = get_preferences(self.user)  # creates the row with defaults
+        self.assertEqual(prefs.preferred_time, time(9, 0))
+
+        with self.assertNumQueries(0):
+            cached = get_preferences(self.user)
+        self.assertEqual(cached.pk, prefs.pk)
+        self.assertEqual(cached.preferred_time, time(9, 0))
+
+    def test_save_invalidates(self):
+        prefs = get_preferences(self.user)
+        prefs.email_cycle_reminders = False
+        prefs.save()
+
+        self.assertFalse(get_preferences(self.user).email_cycle_reminders)
+        self.assertFalse(get_preferences_bulk([self.user.id])[self.user.id].email_cycle_reminders)
+
+    def test_delete_invalidates(self):
+        prefs = get_preferences(self.user)
+        prefs.email_enabled = False
+        prefs.save()
+        self.assertFalse(get_preferences(self.user).email_enabled)
+
+        UserNotificationPreference.objects.get(user=self.user).delete()
+
+        # Back to the defaults (the row is recreated on the next single read)
+        self.assertTrue(get_preferences_bulk([self.user.id])[self.user.id].email_enabled)
+        self.assertTrue(get_preferences(self.user).email_enabled)
+
+    def test_queryset_update_needs_explicit_invalidation(self):
+        get_preferences(self.user)
+        UserNotificationPreference.objects.filter(user=self.user).update(email_enabled=False)
+        self.assertTrue(get_preferences(self.user).email_enabled)  # stale: update() sends no signal
+
+        invalidate_preferences(self.user.id)
+        self.assertFalse(get_preferences(self.user).email_enabled)
+
+    def test_bulk_caches_missing_rows_without_creating_them(self):
+        other = User.objects.create_user('tanpa-preferensi', email='lain@example.com')
+        UserNotificationPreference.objects.create(user=self.user, digest_mode=True)
+
+        prefs = get_preferences_bulk([self.user.id, other.id])
+
+        self.assertTrue(prefs[self.user.id].digest_mode)
+        self.assertIsNone(prefs[other.id].pk)
+        self.assertFalse(UserNotificationPreference.objects.filter(user=other).exists())
+        with self.assertNumQueries(0):
+            again = get_preferences_bulk([self.user.id, other.id])
+        self.assertTrue(again[self.user.id].digest_mode)
+        self.assertEqual(again[other.id].preferred_time, time(9, 0))
+
+        # Creating the row later invalidates the cached "no row" marker
+        UserNotificationPreference.objects.create(user=other, email_enabled=False)
+        self.assertFalse(get_preferences_bulk([other.id])[other.id].email_enabled)
+
+    def test_cached_instance_saves_as_update(self):
+        get_preferences(self.user)
+        prefs = get_preferences(self.user)  # loaded from the cache
+        prefs.digest_mode = True
+        prefs.save()
+
+        self.assertEqual(UserNotificationPreference.objects.filter(user=self.user).count(), 1)
+        self.assertTrue(get_preferences(self.user).digest_mode)
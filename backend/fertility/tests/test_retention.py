@@ -0,0 +1,120 @@
+import gzip
+import json
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from fertility.notifications.models import Notification, UnreadNotificationCounter
+from fertility.notifications.retention import archive_notifications
+
+
+class ArchiveNotificationsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ibu', email='ibu@example.com')
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.archive_dir = Path(tmp.name)
+
+    def notification(self, status='read', days_old=400, **fields):
+        notification = Notification.objects.create(
+            user=self.user, subject=f'{status} {days_old}', body='<p>isi</p>', plain_text_body='isi',
+            status=status, **fields,
+        )
+        Notification.objects.filter(pk=notification.pk).update(created_at=timezone.now() - timedelta(days=days_old))
+        return notification
+
+    def archive(self, **kwargs):
+        kwargs.setdefault('older_than_days', 180)
+        kwargs.setdefault('archive_dir', self.archive_dir)
+        kwargs.setdefault('pause', 0)
+        return archive_notifications(**kwargs)
+
+    def archived_rows(self, stats):
+        with gzip.open(stats['file'], 'rt', encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_batches_walk_the_table_by_id(self):
+        old = [self.notification() for _ in range(5)]
+        recent = self.notification(days_old=10)
+        pending = self.notification(status='pending')
+
+        stats = self.archive(batch_size=2)
+
+        self.assertEqual((stats['batches'], stats['archived'], stats['deleted']), (3, 5, 5))
+        self.assertEqual([row['id'] for row in self.archived_rows(stats)], [n.id for n in old])
+        self.assertEqual(set(Notification.objects.values_list('id', flat=True)), {recent.id, pending.id})
+
+    def test_max_batches(self):
+        for _ in range(5):
+            self.notification()
+
+        stats = self.archive(batch_size=2, max_batches=2)
+
+        self.assertEqual((stats['batches'], stats['deleted']), (2, 4))
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_archive_content(self):
+        notification = self.notification(status='sent', metadata={'trigger': 'test'})
+
+        rows = self.archived_rows(self.archive())
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['id'], notification.id)
+        self.assertEqual(rows[0]['user_id'], self.user.id)
+        self.assertEqual((rows[0]['status'], rows[0]['plain_text_body']), ('sent', 'isi'))
+        self.assertEqual(rows[0]['metadata'], {'trigger': 'test'})
+        self.assertNotIn('body', rows[0])
+
+        self.notification()
+        # Runs within the same second append to the same file
+        self.assertEqual(self.archived_rows(self.archive(keep_html=True))[-1]['body'], '<p>isi</p>')
+
+    def test_dry_run_deletes_nothing(self):
+        for _ in range(3):
+            self.notification()
+
+        stats = self.archive(dry_run=True)
+
+        self.assertEqual(stats['archived'], 3)
+        self.assertIsNone(stats['file'])
+        self.assertEqual(Notification.objects.count(), 3)
+        self.assertEqual(list(self.archive_dir.iterdir()), [])
+
+    def test_purge_writes_no_archive(self):
+        self.notification()
+
+        stats = self.archive(archive_dir=None)
+
+        self.assertEqual((stats['deleted'], stats['archived'], stats['file']), (1, 0, None))
+        self.assertFalse(Notification.objects.exists())
+
+    def test_unread_counter_adjusted_for_sent_rows(self):
+        self.notification(status='sent')
+        self.notification(status='read')
+        kept = self.notification(status='sent', days_old=10)
+        UnreadNotificationCounter.objects.create(user=self.user, count=2)
+
+        self.archive()
+
+        self.assertEqual(UnreadNotificationCounter.objects.get(user=self.user).count, 1)
+        self.assertTrue(Notification.objects.filter(pk=kept.pk).exists())
+
+    def test_failed_rows_only_once_retries_are_exhausted(self):
+        retryable = self.notification(status='failed', retry_count=1, max_retries=3)
+        exhausted = self.notification(status='failed', retry_count=3, max_retries=3)
+
+        out = StringIO()
+        call_command('archive_notifications', '--status', 'failed', '--purge', '--pause', '0', stdout=out)
+
+        self.assertIn('1 notifications removed', out.getvalue())
+        self.assertTrue(Notification.objects.filter(pk=retryable.pk).exists())
+        self.assertFalse(Notification.objects.filter(pk=exhausted.pk).exists())
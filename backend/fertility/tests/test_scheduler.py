@@ -0,0 +1,135 @@
+import os
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from fertility.notifications import scheduler as scheduler_module
+from fertility.notifications.models import UserNotificationPreference
+from fertility.notifications.scheduler import ReminderScheduler, start_in_process_scheduler
+
+
+def utc(hour, minute, day=(2026, 1, 15)):
+    return datetime(*day, hour, minute, tzinfo=dt_timezone.utc)
+
+
+# Europe/London 2026: clocks go 01:00 GMT -> 02:00 BST on 29 March, 02:00 BST -> 01:00 GMT on 25 October
+SPRING, AUTUMN = (2026, 3, 29), (2026, 10, 25)
+
+
+class UsersDueTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.jakarta = self.user('jakarta', timezone='Asia/Jakarta', preferred_time=time(7, 30))
+        self.jakarta_seconds = self.user('detik', timezone='Asia/Jakarta', preferred_time=time(7, 30, 45))
+        self.london = self.user('london', timezone='Europe/London', preferred_time=time(0, 30))
+        self.defaults = User.objects.create_user('default', email='default@example.com')
+        self.scheduler = ReminderScheduler(triggers=mock.Mock(), digests=mock.Mock())
+
+    def user(self, username, **prefs):
+        user = User.objects.create_user(username, email=f'{username}@example.com')
+        UserNotificationPreference.objects.create(user=user, **prefs)
+        return user
+
+    def test_windows_per_timezone(self):
+        windows = {name: (first, last) for name, first, last in self.scheduler.windows(utc(0, 30))}
+        self.assertEqual(windows, {
+            'Asia/Jakarta': (time(7, 30), time(7, 30, 59, 999999)),
+            'Europe/London': (time(0, 30), time(0, 30, 59, 999999)),
+        })
+
+    def test_matches_local_minute_in_each_timezone(self):
+        self.assertEqual(
+            set(self.scheduler.users_due(utc(0, 30))), {self.jakarta, self.jakarta_seconds, self.london},
+        )
+        self.assertEqual(set(self.scheduler.users_due(utc(0, 31))), set())
+
+    def test_users_without_preferences_use_the_defaults(self):
+        # Default preferred_time 09:00 Asia/Jakarta = 02:00 UTC
+        self.assertEqual(list(self.scheduler.users_due(utc(2, 0))), [self.defaults])
+        self.assertNotIn(self.defaults, self.scheduler.users_due(utc(0, 30)))
+
+    def test_unknown_timezone_is_skipped(self):
+        self.user('salah', timezone='Mars/Olympus', preferred_time=time(0, 30))
+        scheduler = ReminderScheduler(triggers=mock.Mock(), digests=mock.Mock())
+        self.assertNotIn('Mars/Olympus', [name for name, _, _ in scheduler.windows(utc(0, 30))])
+
+
+class DaylightSavingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.scheduler = ReminderScheduler(triggers=mock.Mock(), digests=mock.Mock())
+
+    def user(self, username, preferred_time):
+        user = User.objects.create_user(username, email=f'{username}@example.com')
+        UserNotificationPreference.objects.create(user=user, timezone='Europe/London', preferred_time=preferred_time)
+        return user
+
+    def firing_minutes(self, user, day):
+        """UTC minutes of `day` (up to 22:00, before the next local day in BST) at which `user` is due"""
+        start = utc(0, 0, day)
+        return [
+            start + timedelta(minutes=m) for m in range(22 * 60)
+            if self.scheduler.users_due(start + timedelta(minutes=m)).filter(pk=user.pk).exists()
+        ]
+
+    def test_time_skipped_by_spring_forward_fires_after_the_gap(self):
+        # 01:30 does not exist on 29 March; 02:00 BST = 01:00 UTC is the next valid minute
+        skipped = self.user('skipped', time(1, 30))
+        before = self.user('before', time(0, 59))
+
+        self.assertEqual(self.firing_minutes(skipped, SPRING), [utc(1, 0, SPRING)])
+        self.assertEqual(self.firing_minutes(before, SPRING), [utc(0, 59, SPRING)])
+        self.assertEqual([w for w in self.scheduler.windows(utc(1, 0, SPRING)) if w[0] == 'Europe/London'],
+                         [('Europe/London', time(1, 0), time(2, 0, 59, 999999))])
+
+    def test_repeated_time_on_fall_back_fires_once(self):
+        # 01:30 happens at 00:30 UTC (BST) and again at 01:30 UTC (GMT)
+        repeated = self.user('repeated', time(1, 30))
+        after = self.user('after', time(2, 0))
+
+        self.assertEqual(self.firing_minutes(repeated, AUTUMN), [utc(0, 30, AUTUMN)])
+        self.assertEqual(self.firing_minutes(after, AUTUMN), [utc(2, 0, AUTUMN)])
+
+
+class InProcessSchedulerTests(SimpleTestCase):
+
+    @mock.patch.dict(os.environ, {'PREGCARE_REMINDER_SCHEDULER': 'inprocess'})
+    @mock.patch.object(ReminderScheduler, 'start')
+    def test_refuses_to_start_without_a_shared_cache(self, start):
+        # settings_test uses LocMemCache: each web worker would claim every minute for itself
+        with self.assertLogs(scheduler_module.logger, 'WARNING'):
+            self.assertIsNone(start_in_process_scheduler())
+        start.assert_not_called()
+
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}), \
+                mock.patch.object(scheduler_module, 'ReminderScheduler') as scheduler_class:
+            self.assertIs(start_in_process_scheduler(), scheduler_class.return_value)
+        scheduler_class.return_value.start.assert_called_once_with()
+
+
+class TickTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.triggers = mock.Mock()
+        self.triggers.bulk_cycle_data_reminder.return_value = 2
+        self.digests = mock.Mock()
+        self.scheduler = ReminderScheduler(triggers=self.triggers, digests=self.digests, max_catch_up_minutes=5)
+
+    def test_each_minute_is_handled_once(self):
+        self.assertEqual(self.scheduler.tick(utc(0, 30)), 2)
+        self.assertEqual(self.scheduler.tick(utc(0, 30)), 0)
+        self.assertEqual(self.triggers.bulk_cycle_data_reminder.call_count, 1)
+        self.assertEqual(self.digests.send.call_count, 1)
+        self.assertEqual(self.triggers.bulk_cycle_data_reminder.call_args.kwargs['scheduled_at'], utc(0, 30))
+
+    def test_catch_up_is_bounded(self):
+        self.scheduler.tick(utc(0, 0))
+        self.scheduler.tick(utc(1, 0))
+        minutes = [c.kwargs['scheduled_at'] for c in self.triggers.bulk_cycle_data_reminder.call_args_list]
+        self.assertEqual(minutes, [utc(0, 0)] + [utc(0, m) for m in range(55, 60)] + [utc(1, 0)])
@@ -0,0 +1,129 @@
+from datetime import date
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from django.utils.safestring import mark_safe
+
+from fertility.notifications import template_engine
+from fertility.notifications.models import NotificationType
+from fertility.notifications.template_engine import (
+    CompiledTemplate, NotificationTemplate, TemplateRegistry, template_registry,
+)
+
+DEFAULTS = {
+    'cycle_reminder': {
+        'subject': "Pengingat untuk {name}",
+        'content': "<p>Halo {name},</p>\n<p>Catat siklus Anda.</p>",
+    },
+}
+
+
+class CompiledTemplateTests(SimpleTestCase):
+
+    def test_fields_and_format_specs(self):
+        template = CompiledTemplate("Masa subur {start:%d/%m/%Y}, {days!r} hari, {user.name}")
+        user = mock.Mock()
+        user.name = 'Sari'
+
+        self.assertEqual(template.render({'start': date(2026, 3, 9), 'days': 3, 'user': user}),
+                         "Masa subur 09/03/2026, 3 hari, Sari")
+
+    def test_escaping_unless_marked_safe(self):
+        template = CompiledTemplate("<p>{name}</p>{extra}", escape=True)
+
+        self.assertEqual(template.render({'name': '<b>Sari</b>', 'extra': mark_safe('<li>ok</li>')}),
+                         "<p>&lt;b&gt;Sari&lt;/b&gt;</p><li>ok</li>")
+        self.assertEqual(CompiledTemplate("{name}").render({'name': '<b>'}), '<b>')
+
+    def test_missing_placeholder_renders_empty_and_warns_once(self):
+        template = CompiledTemplate("Halo {name}{missing}")
+
+        with self.assertLogs(template_engine.logger, 'WARNING') as logs:
+            self.assertEqual(template.render({'name': 'Sari'}), "Halo Sari")
+            self.assertEqual(template.render({'name': 'Dewi'}), "Halo Dewi")
+        self.assertEqual(len(logs.output), 1)
+
+    def test_unbalanced_braces_fail_at_compile_time(self):
+        with self.assertRaises(ValueError):
+            CompiledTemplate("Halo {name")
+
+    def test_notification_template_render(self):
+        template = NotificationTemplate.compile(**DEFAULTS['cycle_reminder'])
+
+        subject, body, plain = template.render({'name': 'Sari & Budi'})
+
+        self.assertEqual(subject, "Pengingat untuk Sari & Budi")
+        self.assertIn("<p>Halo Sari &amp; Budi,</p>", body)
+        self.assertIn("PregCare", body)  # standard layout
+        # Plain text is derived from the HTML content: tags stripped, not escaped
+        self.assertEqual(plain, "Halo Sari & Budi,\nCatat siklus Anda.")
+
+
+class TemplateRegistryTests(TestCase):
+
+    def setUp(self):
+        self.registry = TemplateRegistry(defaults=DEFAULTS)
+
+    def create_type(self, name, subject, body, category='cycle_reminder', is_active=True):
+        return NotificationType.objects.create(
+            name=name, category=category, subject_template=subject, body_template=body, is_active=is_active,
+        )
+
+    def test_default_without_notification_type(self):
+        self.assertEqual(self.registry.render('cycle_reminder', {'name': 'Sari'})[0], "Pengingat untuk Sari")
+        self.assertIsNone(self.registry.notification_type('cycle_reminder'))
+        self.assertIsNone(self.registry.get('fertile_window'))
+        with self.assertRaises(KeyError):
+            self.registry.render('fertile_window', {})
+
+    def test_first_active_type_overrides_the_default(self):
+        self.create_type('nonaktif', "Nonaktif {name}", "<p>x</p>", is_active=False)
+        first = self.create_type('pertama', "Halo {name}", "<p>Isi untuk {name}</p>")
+        self.create_type('kedua', "Kedua {name}", "<p>y</p>")
+
+        subject, body, plain = self.registry.render('cycle_reminder', {'name': 'Sari'})
+
+        self.assertEqual(subject, "Halo Sari")
+        self.assertIn("<p>Isi untuk Sari</p>", body)
+        self.assertEqual(plain, "Isi untuk Sari")
+        self.assertEqual(self.registry.notification_type('cycle_reminder'), first)
+        self.assertEqual(self.registry.get('cycle_reminder').notification_type, first)
+
+    def test_invalid_override_keeps_the_default_with_its_type(self):
+        broken = self.create_type('rusak', "Halo {name", "<p>x</p>")
+
+        with self.assertLogs(template_engine.logger, 'ERROR'):
+            template = self.registry.get('cycle_reminder')
+
+        self.assertEqual(template.render({'name': 'Sari'})[0], "Pengingat untuk Sari")
+        self.assertEqual(template.notification_type, broken)
+
+    def test_loaded_once_per_ttl(self):
+        self.registry.get('cycle_reminder')
+        self.create_type('baru', "Baru {name}", "<p>x</p>")
+
+        with self.assertNumQueries(0):
+            # Still the cached load; save() signals only clear the global registry
+            self.assertEqual(self.registry.render('cycle_reminder', {'name': 'Sari'})[0], "Pengingat untuk Sari")
+
+        self.registry.invalidate()
+        self.assertEqual(self.registry.render('cycle_reminder', {'name': 'Sari'})[0], "Baru Sari")
+
+        with mock.patch.object(template_engine.time, 'monotonic', return_value=self.registry._loaded_at + 301):
+            with self.assertNumQueries(1):
+                self.registry.get('cycle_reminder')
+
+    def test_global_registry_invalidated_on_save_and_delete(self):
+        template_registry.invalidate()
+        self.addCleanup(template_registry.invalidate)
+        default_subject = template_registry.render('cycle_reminder', {'name': 'Sari'})[0]
+
+        notification_type = self.create_type('override', "Override {name}", "<p>x</p>")
+        self.assertEqual(template_registry.render('cycle_reminder', {'name': 'Sari'})[0], "Override Sari")
+
+        notification_type.subject_template = "Diubah {name}"
+        notification_type.save()
+        self.assertEqual(template_registry.render('cycle_reminder', {'name': 'Sari'})[0], "Diubah Sari")
+
+        notification_type.delete()
+        self.assertEqual(template_registry.render('cycle_reminder', {'name': 'Sari'})[0], default_subject)
@@ -0,0 +1,157 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from fertility.notifications import unread
+from fertility.notifications.models import Notification, UnreadNotificationCounter
+from fertility.notifications.retention import archive_notifications
+from fertility.notifications.services import NotificationService
+from fertility.notifications.unread import adjust_unread, get_unread_count, reconcile_unread_counts
+
+
+class UnreadCounterTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ibu', email='ibu@example.com')
+        self.service = NotificationService()
+
+    def notification(self, status='pending', **fields):
+        # Written directly (no counter adjustment), like rows that predate the counter
+        return Notification.objects.create(user=self.user, subject='s', body='<p>b</p>', status=status, **fields)
+
+    def counter(self, user=None):
+        return UnreadNotificationCounter.objects.get(user=user or self.user).count
+
+    def create(self):
+        return self.service.create_notification(
+            self.user, 'Halo', '<p>Halo</p>', scheduled_at=timezone.now(), send_immediately=False,
+        )
+
+
+class UnreadCounterTests(UnreadCounterTestCase):
+
+    def test_first_read_creates_the_counter_from_a_count(self):
+        self.notification()
+        self.notification(status='sent')
+        self.notification(status='read')
+
+        self.assertEqual(get_unread_count(self.user.id), 2)
+        self.assertEqual(self.counter(), 2)
+        with self.assertNumQueries(1):  # primary-key read afterwards, no COUNT
+            self.assertEqual(get_unread_count(self.user.id), 2)
+
+    def test_create_and_mark_read(self):
+        self.notification()  # before the counter existed
+        first = self.create()
+        # The first write created the counter, including its own row
+        self.assertEqual(self.counter(), 2)
+        self.create()
+        self.assertEqual(self.counter(), 3)
+
+        first.mark_as_read()
+        self.assertEqual(self.counter(), 2)
+        # Reading it again (stale instance, double click) does not decrement twice
+        Notification.objects.get(pk=first.pk).mark_as_read()
+        first.mark_as_read()
+        self.assertEqual(self.counter(), 2)
+        self.assertEqual(get_unread_count(self.user.id), 2)
+
+    def test_mark_all_read(self):
+        for _ in range(3):
+            self.create()
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.post(reverse('notification-mark-all-read'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.counter(), 0)
+        self.assertEqual(client.get(reverse('notification-unread-count')).data['unread_count'], 0)
+
+    def test_bulk_create(self):
+        other = User.objects.create_user('ibu2', email='ibu2@example.com')
+        adjust_unread(self.user.id, 0)  # no-op
+        self.assertFalse(UnreadNotificationCounter.objects.exists())
+        get_unread_count(other.id)  # existing counter (0)
+
+        created = self.service.bulk_create_notifications('system', lambda u: ('s', '<p>b</p>', 'b'))
+
+        self.assertEqual(created, 2)
+        self.assertEqual((self.counter(), self.counter(other)), (1, 1))
+
+    def test_counter_rolls_back_with_the_status_change(self):
+        notification = self.create()
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            notification.mark_as_read()
+            raise RuntimeError('boom')
+
+        self.assertEqual(self.counter(), 1)
+        self.assertEqual(Notification.objects.get(pk=notification.pk).status, 'pending')
+
+    def test_archive_adjusts_sent_rows(self):
+        self.create()
+        old_sent = self.notification(status='sent')
+        old_read = self.notification(status='read')
+        Notification.objects.filter(pk__in=[old_sent.pk, old_read.pk]).update(
+            created_at=timezone.now() - timedelta(days=400),
+        )
+        adjust_unread(self.user.id, 1)  # old_sent was counted when it was sent
+        self.assertEqual(self.counter(), 2)
+
+        stats = archive_notifications(older_than_days=180, archive_dir=None, pause=0)
+
+        self.assertEqual(stats['deleted'], 2)
+        self.assertEqual(self.counter(), 1)
+
+
+class ReconcileTests(UnreadCounterTestCase):
+
+    def test_fixes_drifted_counters_only(self):
+        other = User.objects.create_user('ibu2', email='ibu2@example.com')
+        self.create()
+        self.notification()  # bypassed the helpers: drift of one
+        get_unread_count(other.id)
+        no_counter = User.objects.create_user('ibu3', email='ibu3@example.com')
+
+        stats = reconcile_unread_counts()
+
+        self.assertEqual(stats, {'checked': 2, 'fixed': 1})
+        self.assertEqual(self.counter(), 2)
+        self.assertFalse(UnreadNotificationCounter.objects.filter(user=no_counter).exists())
+        self.assertEqual(reconcile_unread_counts([self.user.id], chunk_size=1), {'checked': 1, 'fixed': 0})
+
+
+@mock.patch.object(unread, 'is_shared_cache', return_value=True)
+class SharedCacheTests(UnreadCounterTestCase):
+
+    def test_read_through_and_dropped_on_commit(self, _):
+        with self.captureOnCommitCallbacks(execute=True):
+            notification = self.create()
+        self.assertEqual(get_unread_count(self.user.id), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.user.id), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notification.mark_as_read()
+
+        self.assertIsNone(cache.get(unread._KEY.format(self.user.id)))
+        self.assertEqual(get_unread_count(self.user.id), 0)
+
+    def test_reconcile_drops_fixed_entries(self, _):
+        self.create()
+        self.assertEqual(get_unread_count(self.user.id), 1)
+        self.notification()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reconcile_unread_counts()
+
+        self.assertEqual(get_unread_count(self.user.id), 2)
@@ -0,0 +1,31 @@
+"""Shared helpers for the notification tests"""
+from typing import Any, Callable, Dict, List, Optional
+
+
+class FakeEmailDispatcher:
+    """
+    Stands in for EmailDispatcher: records every submit() and, unless `hold`
+    is set, reports `result` to the callback right away.
+    """
+
+    def __init__(self, result: Optional[Dict[str, Any]] = None, hold: bool = False):
+        self.result = result or {'success': True, 'message': 'sent'}
+        self.hold = hold
+        self.sent: List[Dict[str, Any]] = []
+        self.callbacks: List[Callable[[Dict[str, Any]], None]] = []
+
+    def submit(self, to_email, subject, html_body, plain_text_body=None, callback=None, timeout=None,
+               notification=None):
+        self.sent.append({'to_email': to_email, 'subject': subject, 'plain_text_body': plain_text_body})
+        if callback is not None:
+            if self.hold:
+                self.callbacks.append(callback)
+            else:
+                callback(dict(self.result))
+        return True
+
+    def release(self, result: Optional[Dict[str, Any]] = None):
+        """Report held emails (as `result`, default self.result)"""
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback(dict(result or self.result))
@@ -0,0 +1,125 @@
+"""
+Import-time regression benchmark untuk modul RAG yang ringan.
+
+Menjalankan `python -X importtime -c "import <module>"` di subprocess baru,
+lalu memastikan:
+  * tidak ada package berat (torch, sentence_transformers, langchain, google.genai, dotenv)
+    yang ikut ter-import
+  * total waktu import (cumulative) di bawah budget
+
+Usage:
+    python scripts/bench_import_time.py
+    python scripts/bench_import_time.py --budget-ms 150 --runs 5
+Exit code 1 jika terjadi regresi (cocok untuk CI).
+"""
+import argparse
+import pathlib
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+SCRIPTS_DIR = pathlib.Path(__file__).resolve().parent
+
+# Modules that must stay importable without pulling in heavy dependencies
+LIGHT_MODULES = ["rag_pipeline", "semantic_cache", "cache_backends", "cache_thresholds", "fallback_responses"]
+
+# Top-level packages that must NOT appear in the import graph of LIGHT_MODULES
+HEAVY_PACKAGES = [
+    "torch",
+    "sentence_transformers",
+    "transformers",
+    "langchain_postgres",
+    "langchain_core",
+    "psycopg",
+    "google.genai",
+    "google.generativeai",
+    "dotenv",
+    "numpy",
+]
+
+DEFAULT_BUDGET_MS = 150.0
+
+
+def _run_importtime(module: str) -> Tuple[float, List[str]]:
+    """Import module in a fresh interpreter; return (cumulative ms, imported module names)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=str(SCRIPTS_DIR),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    imported = []
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        # format: "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        name = parts[2].strip()
+        imported.append(name)
+        if name == module:
+            total_us = int(parts[1].strip())
+    return total_us / 1000.0, imported
+
+
+def _heavy_hits(imported: List[str]) -> List[str]:
+    hits = []
+    for name in imported:
+        for heavy in HEAVY_PACKAGES:
+            if name == heavy or name.startswith(heavy + "."):
+                hits.append(name)
+                break
+    return hits
+
+
+def benchmark(modules: List[str], runs: int) -> Dict[str, Dict]:
+    results = {}
+    for module in modules:
+        timings = []
+        heavy = set()
+        for _ in range(runs):
+            ms, imported = _run_importtime(module)
+            timings.append(ms)
+            heavy.update(_heavy_hits(imported))
+        results[module] = {
+            "median_ms": statistics.median(timings),
+            "max_ms": max(timings),
+            "heavy_imports": sorted(heavy),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time regression benchmark")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="Maximum median cumulative import time per module (ms)")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreter runs per module")
+    parser.add_argument("modules", nargs="*", default=LIGHT_MODULES)
+    args = parser.parse_args()
+
+    results = benchmark(args.modules, args.runs)
+
+    failed = False
+    print(f"{'module':<22} {'median':>9} {'max':>9}  heavy imports")
+    for module, r in results.items():
+        status = "OK"
+        if r["heavy_imports"] or r["median_ms"] > args.budget_ms:
+            status = "REGRESSION"
+            failed = True
+        heavy = ", ".join(r["heavy_imports"]) or "-"
+        print(f"{module:<22} {r['median_ms']:>7.1f}ms {r['max_ms']:>7.1f}ms  {heavy}  [{status}]")
+
+    if failed:
+        print(f"\n[FAIL] Import-time budget ({args.budget_ms:.0f}ms) or heavy-import check failed")
+        sys.exit(1)
+    print(f"\n[SUCCESS] All modules import under {args.budget_ms:.0f}ms without heavy dependencies")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Shared storage backends untuk SemanticCache
+- CacheBackend: interface (lookup, upsert, invalidasi, TTL purge)
+- PgVectorCacheBackend: tabel Postgres/pgvector yang dipakai bersama semua
+  instance API (HNSW index untuk similarity, index timestamp untuk TTL,
+  upsert atomik lewat ON CONFLICT)
+
+SemanticCache tetap menjadi L1 kecil in-process di depan backend; miss di L1
+dicari di backend lalu dipromosikan ke L1. Pilih lewat env
+SEMANTIC_CACHE_BACKEND=local|pgvector atau create_cache_backend().
+"""
+import json
+import logging
+import os
+import re
+import threading
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TABLE = os.getenv("SEMANTIC_CACHE_TABLE", "semantic_cache")
+
+# Tag columns mirror semantic_cache.TAG_FIELDS
+TAG_COLUMNS = ("corpus_version", "prompt_hash", "model")
+
+
+def vector_literal(embedding) -> str:
+    """Tensor / array / list -> pgvector text literal '[x,y,...]'"""
+    values = embedding.tolist() if hasattr(embedding, "tolist") else list(embedding)
+    return "[" + ",".join(f"{float(v):.7g}" for v in values) + "]"
+
+
+class CacheBackend:
+    """
+    Base class for shared semantic-cache storage.
+    Rows are dicts with query_hash, original_query, answer, embedding,
+    response_time and meta (corpus_version, prompt_hash, model, doc_ids).
+    """
+    name = "base"
+
+    def ensure_schema(self, dim: int):
+        """Create storage for `dim`-sized embeddings if missing (idempotent)"""
+
+    def lookup(self, embeddings: Sequence, ttl: timedelta) -> List[Optional[Dict]]:
+        """Nearest live row per query embedding (row + "similarity"), or None"""
+        raise NotImplementedError
+
+    def upsert(self, rows: Sequence[Dict]) -> int:
+        raise NotImplementedError
+
+    def entries(self) -> Iterable[Dict]:
+        """All rows without embeddings (offline maintenance scans)"""
+        raise NotImplementedError
+
+    def delete_hashes(self, hashes: Set[str]) -> int:
+        raise NotImplementedError
+
+    def delete_docs(self, doc_ids: Iterable[str], corpus_version: Optional[str] = None) -> int:
+        raise NotImplementedError
+
+    def delete_tag(self, name: str, value: str) -> int:
+        raise NotImplementedError
+
+    def delete_stale(self, name: str, value: str) -> int:
+        """Delete rows tagged with another value (untagged rows are kept)"""
+        raise NotImplementedError
+
+    def tag_values(self, name: str) -> Set[str]:
+        raise NotImplementedError
+
+    def purge_expired(self, ttl: timedelta) -> int:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class PgVectorCacheBackend(CacheBackend):
+    """
+    One pgvector table shared by every API node. Lookups are a single round trip
+    per batch (LATERAL nearest-neighbour per query vector over the HNSW index).
+    """
+    name = "pgvector"
+
+    def __init__(self, dsn: str, table: str = DEFAULT_TABLE, ef_search: int = 40):
+        try:
+            import psycopg
+        except ImportError:
+            raise ImportError("psycopg required for the pgvector cache backend (pip install 'psycopg[binary]')")
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", table):
+            raise ValueError(f"Invalid cache table name: {table!r}")
+
+        self._psycopg = psycopg
+        self.dsn = dsn
+        self.table = table
+        self.ef_search = ef_search
+        self._conn = None
+        self._lock = threading.Lock()  # one autocommit connection, statements serialized
+
+    def _connection(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = self._psycopg.connect(self.dsn, autocommit=True)
+            try:
+                self._conn.execute(f"SET hnsw.ef_search = {int(self.ef_search)}")
+            except self._psycopg.Error:
+                pass  # pgvector without HNSW
+        return self._conn
+
+    def _execute(self, sql: str, params=None, fetch: bool = False, many: bool = False):
+        """Run one statement; reconnect once if the connection was dropped"""
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    with self._connection().cursor() as cur:
+                        if many:
+                            cur.executemany(sql, params)
+                        else:
+                            cur.execute(sql, params)
+                        return cur.fetchall() if fetch else cur.rowcount
+                except self._psycopg.OperationalError:
+                    self._conn = None
+                    if attempt:
+                        raise
+
+    def ensure_schema(self, dim: int):
+        t = self.table
+        self._execute("CREATE EXTENSION IF NOT EXISTS vector")
+        self._execute(f"""
+            CREATE TABLE IF NOT EXISTS {t} (
+                query_hash      TEXT PRIMARY KEY,
+                original_query  TEXT NOT NULL,
+                answer          TEXT NOT NULL,
+                embedding       vector({int(dim)}) NOT NULL,
+                created_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+                response_time   REAL NOT NULL DEFAULT 0,
+                corpus_version  TEXT,
+                prompt_hash     TEXT,
+                model           TEXT,
+                doc_ids         TEXT[] NOT NULL DEFAULT '{{}}'
+            )
+        """)
+        self._execute(f"CREATE INDEX IF NOT EXISTS {t}_created_at_idx ON {t} (created_at)")
+        self._execute(f"CREATE INDEX IF NOT EXISTS {t}_doc_ids_idx ON {t} USING gin (doc_ids)")
+        for column in TAG_COLUMNS:
+            self._execute(f"CREATE INDEX IF NOT EXISTS {t}_{column}_idx ON {t} ({column})")
+        try:
+            self._execute(
+                f"CREATE INDEX IF NOT EXISTS {t}_embedding_hnsw_idx ON {t} "
+                f"USING hnsw (embedding vector_cosine_ops)"
+            )
+        except self._psycopg.Error as e:
+            # pgvector < 0.5 has no HNSW; lookups still work, just as a sequential scan
+            logger.warning(f"⚠️  HNSW index unavailable on {t} ({e}); using exact scan")
+
+    def lookup(self, embeddings: Sequence, ttl: timedelta) -> List[Optional[Dict]]:
+        if len(embeddings) == 0:
+            return []
+        t = self.table
+        rows = self._execute(
+            f"""
+            SELECT q.i, c.query_hash, c.original_query, c.answer, c.embedding::text,
+                   c.response_time, c.corpus_version, c.prompt_hash, c.model, c.doc_ids,
+                   1 - c.distance
+            FROM unnest(%s::vector[]) WITH ORDINALITY AS q(v, i)
+            CROSS JOIN LATERAL (
+                SELECT *, embedding <=> q.v AS distance FROM {t}
+                WHERE created_at > now() - %s
+                ORDER BY embedding <=> q.v
+                LIMIT 1
+            ) c
+            """,
+            ([vector_literal(e) for e in embeddings], ttl),
+            fetch=True,
+        )
+        results: List[Optional[Dict]] = [None] * len(embeddings)
+        for (i, query_hash, query, answer, embedding, response_time,
+             corpus_version, prompt_hash, model, doc_ids, similarity) in rows:
+            results[i - 1] = {
+                "query_hash": query_hash,
+                "original_query": query,
+                "answer": answer,
+                "embedding": json.loads(embedding),
+                "response_time": response_time,
+                "meta": _meta_from_columns(corpus_version, prompt_hash, model, doc_ids),
+                "similarity": float(similarity),
+            }
+        return results
+
+    def upsert(self, rows: Sequence[Dict]) -> int:
+        if not rows:
+            return 0
+        # Concurrent nodes answering the same question: last writer wins, no duplicate rows
+        self._execute(
+            f"""
+            INSERT INTO {self.table} (query_hash, original_query, answer, embedding, created_at,
+                                      response_time, corpus_version, prompt_hash, model, doc_ids)
+            VALUES (%s, %s, %s, %s::vector, now(), %s, %s, %s, %s, %s)
+            ON CONFLICT (query_hash) DO UPDATE SET
+                original_query = EXCLUDED.original_query,
+                answer = EXCLUDED.answer,
+                embedding = EXCLUDED.embedding,
+                created_at = EXCLUDED.created_at,
+                response_time = EXCLUDED.response_time,
+                corpus_version = EXCLUDED.corpus_version,
+                prompt_hash = EXCLUDED.prompt_hash,
+                model = EXCLUDED.model,
+                doc_ids = EXCLUDED.doc_ids
+            """,
+            [
+                (
+                    r["query_hash"], r["original_query"], r["answer"], vector_literal(r["embedding"]),
+                    r.get("response_time", 0.0),
+                    *(_tag(r.get("meta", {}), c) for c in TAG_COLUMNS),
+                    list(r.get("meta", {}).get("doc_ids", [])),
+                )
+                for r in rows
+            ],
+            many=True,
+        )
+        return len(rows)
+
+    def entries(self) -> Iterable[Dict]:
+        rows = self._execute(
+            f"SELECT query_hash, original_query, answer, corpus_version, prompt_hash, model, doc_ids "
+            f"FROM {self.table}",
+            fetch=True,
+        )
+        for query_hash, query, answer, corpus_version, prompt_hash, model, doc_ids in rows:
+            yield {
+                "query_hash": query_hash,
+                "original_query": query,
+                "answer": answer,
+                "meta": _meta_from_columns(corpus_version, prompt_hash, model, doc_ids),
+            }
+
+    def delete_hashes(self, hashes: Set[str]) -> int:
+        if not hashes:
+            return 0
+        return self._execute(f"DELETE FROM {self.table} WHERE query_hash = ANY(%s)", (list(hashes),))
+
+    def delete_docs(self, doc_ids: Iterable[str], corpus_version: Optional[str] = None) -> int:
+        doc_ids = [str(d) for d in doc_ids]
+        if not doc_ids:
+            return 0
+        # doc_ids && array uses the GIN index
+        sql = f"DELETE FROM {self.table} WHERE doc_ids && %s::text[]"
+        params: list = [doc_ids]
+        if corpus_version is not None:
+            sql += " AND corpus_version = %s"
+            params.append(corpus_version)
+        return self._execute(sql, params)
+
+    def delete_tag(self, name: str, value: str) -> int:
+        return self._execute(f"DELETE FROM {self.table} WHERE {_column(name)} = %s", (str(value),))
+
+    def delete_stale(self, name: str, value: str) -> int:
+        column = _column(name)
+        return self._execute(
+            f"DELETE FROM {self.table} WHERE {column} IS NOT NULL AND {column} <> %s", (str(value),)
+        )
+
+    def tag_values(self, name: str) -> Set[str]:
+        column = _column(name)
+        rows = self._execute(
+            f"SELECT DISTINCT {column} FROM {self.table} WHERE {column} IS NOT NULL", fetch=True
+        )
+        return {r[0] for r in rows}
+
+    def purge_expired(self, ttl: timedelta) -> int:
+        # Range delete on the created_at index
+        return self._execute(f"DELETE FROM {self.table} WHERE created_at <= now() - %s", (ttl,))
+
+    def count(self) -> int:
+        return self._execute(f"SELECT count(*) FROM {self.table}", fetch=True)[0][0]
+
+    def clear(self):
+        self._execute(f"TRUNCATE {self.table}")
+
+
+def _column(name: str) -> str:
+    if name not in TAG_COLUMNS:
+        raise ValueError(f"Unknown cache tag: {name}")
+    return name
+
+
+def _tag(meta: Dict, name: str) -> Optional[str]:
+    value = meta.get(name)
+    return str(value) if value is not None else None
+
+
+def _meta_from_columns(corpus_version, prompt_hash, model, doc_ids) -> Dict:
+    meta = {"doc_ids": list(doc_ids or [])}
+    for name, value in zip(TAG_COLUMNS, (corpus_version, prompt_hash, model)):
+        if value is not None:
+            meta[name] = value
+    return meta
+
+
+def create_cache_backend(kind: Optional[str] = None, dsn: Optional[str] = None) -> Optional[CacheBackend]:
+    """
+    Backend from SEMANTIC_CACHE_BACKEND (local|pgvector); None means the
+    process-local SemanticCache only. dsn defaults to SEMANTIC_CACHE_DSN or DB_* vars.
+    """
+    kind = (kind or os.getenv("SEMANTIC_CACHE_BACKEND", "local")).lower()
+    if kind == "local":
+        return None
+    if kind == "pgvector":
+        dsn = dsn or os.getenv("SEMANTIC_CACHE_DSN") or (
+            f"postgresql://{os.getenv('DB_USER', 'pregcare_user')}:{os.getenv('DB_PASSWORD', 'pregcare_pwd')}"
+            f"@{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '5432')}/{os.getenv('DB_NAME', 'pregcare_db')}"
+        )
+        return PgVectorCacheBackend(dsn)
+    raise ValueError(f"Unknown cache backend: {kind}")
@@ -0,0 +1,129 @@
+"""
+Threshold similarity per topik untuk SemanticCache
+Pertanyaan pendek/generik sering mirip tinggi padahal maksudnya beda, sedangkan
+parafrase panjang sering miss di threshold global. ThresholdPolicy memetakan
+pertanyaan ke key "<topik>/<short|long>" (topik dari kata kunci di
+data/cache_thresholds.json) dan memakai threshold hasil kalibrasi untuk key itu;
+key yang belum dikalibrasi memakai threshold per panjang ("*/short", "*/long"),
+lalu threshold global.
+
+Kalibrasi offline: python scripts/calibrate_cache_thresholds.py
+"""
+import json
+import math
+import pathlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from topic_gate import KeywordMatcher
+
+THRESHOLDS_FILE = pathlib.Path(__file__).parents[1] / "data" / "cache_thresholds.json"
+
+GENERAL_TOPIC = "umum"
+THRESHOLD_FLOOR = 0.70    # calibration never goes below this
+THRESHOLD_CEILING = 0.99
+
+
+class ThresholdPolicy:
+    """Per-key similarity thresholds with the cache's global threshold as fallback"""
+
+    def __init__(
+        self,
+        topics: Dict[str, Iterable[str]],
+        thresholds: Optional[Dict[str, float]] = None,
+        short_max_words: int = 4,
+        suffixes: Iterable[str] = (),
+    ):
+        self.topics = {k: list(v) for k, v in topics.items()}
+        self.thresholds: Dict[str, float] = dict(thresholds or {})
+        self.short_max_words = short_max_words
+        self.suffixes = list(suffixes)
+        self._matcher = KeywordMatcher(self.topics, self.suffixes)
+
+    def key(self, question: str) -> str:
+        """'<topic>/<short|long>'; topic is the first listed topic with a keyword match"""
+        matched = self._matcher.match(question)
+        topic = next((t for t in self._matcher.categories if matched[t]), GENERAL_TOPIC)
+        bucket = "short" if len(question.split()) <= self.short_max_words else "long"
+        return f"{topic}/{bucket}"
+
+    def threshold_for(self, question: str, default: float) -> float:
+        """Calibrated '<topic>/<bucket>', else the pooled '*/<bucket>', else default"""
+        if not self.thresholds:
+            return default
+        key = self.key(question)
+        if key in self.thresholds:
+            return self.thresholds[key]
+        return self.thresholds.get("*/" + key.split("/")[1], default)
+
+    @classmethod
+    def from_file(cls, path: pathlib.Path = THRESHOLDS_FILE) -> "ThresholdPolicy":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            topics=data.get("topics", {}),
+            thresholds=data.get("thresholds", {}),
+            short_max_words=data.get("short_max_words", 4),
+            suffixes=data.get("suffixes", []),
+        )
+
+
+def load_threshold_policy(path: pathlib.Path = THRESHOLDS_FILE) -> Optional[ThresholdPolicy]:
+    """Policy from the thresholds file, or None (global threshold only) if missing/broken"""
+    if not path.exists():
+        return None
+    try:
+        return ThresholdPolicy.from_file(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[WARNING] Failed to load cache thresholds: {e}")
+        return None
+
+
+def precision_recall_at(scored: Sequence[Tuple[float, bool]], threshold: float) -> Tuple[float, float, int, int]:
+    """
+    For (similarity, same_meaning) pairs: precision of served hits, hit rate on
+    true paraphrases, and the counts of correct / wrong hits at `threshold`.
+    Precision is 1.0 when nothing is served (no wrong answers).
+    """
+    tp = sum(1 for s, same in scored if s >= threshold and same)
+    fp = sum(1 for s, same in scored if s >= threshold and not same)
+    positives = sum(1 for _, same in scored if same)
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    hit_rate = tp / positives if positives else 0.0
+    return precision, hit_rate, tp, fp
+
+
+def choose_threshold(
+    scored: Sequence[Tuple[float, bool]],
+    default: float,
+    target_precision: float = 0.95,
+) -> float:
+    """
+    Lowest threshold whose precision is at least the target AND at least the
+    precision of the global threshold, so calibration never raises the
+    wrong-answer rate seen on the labeled pairs. If the global threshold already
+    meets the target it is only ever lowered; otherwise it is raised until it does
+    (or, if no threshold does, to the most precise one).
+    """
+    default_precision = precision_recall_at(scored, default)[0]
+    required = max(target_precision, default_precision)
+    # Only observed similarities change the outcome; scan them in ascending order
+    # (rounded down, so the pair at the candidate itself still counts as a hit)
+    candidates = sorted({math.floor(s * 1e4) / 1e4 for s, _ in scored if THRESHOLD_FLOOR <= s <= THRESHOLD_CEILING})
+    if default_precision >= target_precision:
+        candidates = [t for t in candidates if t < default] + [default]
+    else:
+        candidates = [t for t in candidates if t > default] + [THRESHOLD_CEILING]
+    for t in candidates:
+        if precision_recall_at(scored, t)[0] >= required:
+            return t
+    # Target unreachable: the most precise candidate, the global threshold on ties
+    return max([default] + candidates, key=lambda t: precision_recall_at(scored, t)[0])
+
+
+def curve(scored: Sequence[Tuple[float, bool]], steps: Iterable[float]) -> List[Dict]:
+    """Precision / hit-rate curve over a threshold grid"""
+    rows = []
+    for t in steps:
+        precision, hit_rate, tp, fp = precision_recall_at(scored, t)
+        rows.append({"threshold": round(t, 3), "precision": precision, "hit_rate": hit_rate, "hits": tp, "wrong": fp})
+    return rows
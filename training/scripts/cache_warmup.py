@@ -0,0 +1,291 @@
+"""
+Cache warmup / precompute job untuk SemanticCache
+
+Menambang pertanyaan populer dari log (rag_pipeline.log) dan record chat (JSONL),
+mengelompokkan pertanyaan yang mirip, lalu men-generate jawaban untuk top-K cluster
+yang belum ada di cache (dibatasi quota LLM) dan memuatnya ke SemanticCache dengan
+satu batched encode + satu kali simpan ke file.
+
+Usage:
+    python scripts/cache_warmup.py --dry-run
+    python scripts/cache_warmup.py --top-k 30 --budget 20
+    python scripts/cache_warmup.py --log ../backend/app/API/rag_pipeline.log --records chats.jsonl
+    LLM_PROVIDER=stub python scripts/cache_warmup.py --cache-file /tmp/cache.json
+
+Records JSONL: satu object per baris dengan field "question" atau "message"
+(bentuk ChatRequest), field lain diabaikan.
+"""
+import argparse
+import json
+import os
+import pathlib
+import re
+import sys
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+import rag_pipeline as rp
+from cache_thresholds import load_threshold_policy
+from corpus_manifest import current_corpus_version
+from llm_providers import create_llm_provider, is_error_answer
+from topic_gate import get_topic_matcher
+
+SCRIPTS_DIR = pathlib.Path(__file__).resolve().parent
+API_LOG = SCRIPTS_DIR.parents[1] / "backend" / "app" / "API" / "rag_pipeline.log"
+
+# rag_pipeline log lines. Every request logs "Processing question" (truncated to 100
+# chars); questions that pass the topic gate also log the full text on an ACCEPTED line.
+_PROCESSING = re.compile(r"Processing question: (?P<q>.*?)\.\.\.$")
+_ACCEPTED = re.compile(r"Question ACCEPTED \(pregnancy-related\): (?P<q>.*?)(?: \(matched=.*\))?$")
+_TRUNCATE = 100
+# Batches and concurrent requests log several "Processing" lines before their ACCEPTED
+# lines, so pending questions are matched by their truncated text, not by position
+_MAX_PENDING = 1000
+
+
+def normalize_question(question: str) -> str:
+    """Collapse whitespace; casing and trailing punctuation only matter for counting"""
+    return " ".join(question.split())
+
+
+def _count_key(question: str) -> str:
+    return question.lower().rstrip("?!. ")
+
+
+def questions_from_log(path: pathlib.Path) -> Iterable[str]:
+    """One question per request, preferring the untruncated ACCEPTED text"""
+    pending: List[str] = []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            m = _PROCESSING.search(line)
+            if m:
+                pending.append(m.group("q"))
+                if len(pending) > _MAX_PENDING:
+                    yield pending.pop(0)
+                continue
+            m = _ACCEPTED.search(line)
+            if m:
+                question = m.group("q")
+                truncated = question[:_TRUNCATE]
+                for i, p in enumerate(pending):
+                    if p == truncated:
+                        del pending[i]
+                        break
+                yield question
+    yield from pending
+
+
+def questions_from_records(path: pathlib.Path) -> Iterable[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            question = record.get("question") or record.get("message")
+            if isinstance(question, str):
+                yield question
+
+
+def count_questions(sources: Iterable[Iterable[str]]) -> List[Tuple[str, int]]:
+    """(question, frequency), most frequent first; the most common spelling represents each key"""
+    counts: Counter = Counter()
+    spellings: Dict[str, Counter] = {}
+    for source in sources:
+        for raw in source:
+            question = normalize_question(raw)
+            if not question:
+                continue
+            key = _count_key(question)
+            counts[key] += 1
+            spellings.setdefault(key, Counter())[question] += 1
+    return [(spellings[k].most_common(1)[0][0], n) for k, n in counts.most_common()]
+
+
+def is_cacheable(question: str) -> bool:
+    """Skip questions the pipeline answers for free or refuses (fallback, safety, topic gate)"""
+    if rp.get_fallback_answer and rp.get_fallback_answer(question):
+        return False
+    if rp.safety_check(question):
+        return False
+    return bool(get_topic_matcher().match(question).get("pregnancy"))
+
+
+def cluster_questions(questions: List[Tuple[str, int]], embeddings, cos_sim, threshold: float) -> List[Dict]:
+    """
+    Greedy clustering in frequency order: the most frequent unassigned question
+    becomes a representative and absorbs every unassigned question within threshold.
+    """
+    if not questions:
+        return []
+    sims = cos_sim(embeddings, embeddings)
+    unassigned = [True] * len(questions)
+    clusters = []
+    for i, (question, count) in enumerate(questions):  # already sorted by frequency
+        if not unassigned[i]:
+            continue
+        row = sims[i].tolist()
+        members = [j for j in range(len(questions)) if unassigned[j] and row[j] >= threshold]
+        for j in members:
+            unassigned[j] = False
+        clusters.append({
+            "question": question,
+            "row": i,
+            "count": sum(questions[j][1] for j in members),
+            "variants": [questions[j][0] for j in members if j != i],
+        })
+    clusters.sort(key=lambda c: c["count"], reverse=True)
+    return clusters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm the semantic cache from query logs")
+    parser.add_argument("--log", action="append", type=pathlib.Path, default=None,
+                        help=f"rag_pipeline log file (repeatable, default: {API_LOG})")
+    parser.add_argument("--records", action="append", type=pathlib.Path, default=[],
+                        help="JSONL chat records with a question/message field (repeatable)")
+    parser.add_argument("--top-k", type=int, default=30, help="Most frequent clusters to consider")
+    parser.add_argument("--budget", type=int, default=20, help="Max LLM calls (quota budget)")
+    parser.add_argument("--min-count", type=int, default=1, help="Ignore clusters asked fewer times")
+    parser.add_argument("--batch-size", type=int, default=8, help="Questions per rag_answer_batch call")
+    parser.add_argument("--cache-file", type=pathlib.Path, default=rp.DATA_DIR / "semantic_cache.json")
+    parser.add_argument("--threshold", type=float, default=0.85,
+                        help="Similarity threshold (cache lookups and clustering; chat_api uses 0.85)")
+    parser.add_argument("--max-cache-size", type=int, default=100)
+    parser.add_argument("--seed-fallback", action="store_true",
+                        help="Also load the fallback sample questions into the cache")
+    parser.add_argument("--dry-run", action="store_true", help="Report clusters only; no LLM calls or writes")
+    args = parser.parse_args()
+
+    rp.setup_logging()
+    rp.load_env()
+
+    logs = args.log if args.log is not None else [API_LOG]
+    sources = [questions_from_log(p) for p in logs if p.exists()]
+    sources += [questions_from_records(p) for p in args.records if p.exists()]
+    missing = [str(p) for p in logs + args.records if not p.exists()]
+    if missing:
+        print(f"[WARNING] Not found, skipped: {', '.join(missing)}")
+
+    counted = count_questions(sources)
+    eligible = [(q, n) for q, n in counted if is_cacheable(q)]
+    print(f"[INFO] {sum(n for _, n in counted)} requests, {len(counted)} distinct questions, "
+          f"{len(eligible)} need the LLM path")
+    if not eligible:
+        return
+
+    try:
+        # Loading only reads the file; reconcile and set_many() below write it back
+        cache = rp.SemanticCache(
+            similarity_threshold=args.threshold,
+            max_cache_size=args.max_cache_size,
+            cache_file=args.cache_file,
+            threshold_policy=load_threshold_policy(),  # coverage check matches serving
+        )
+    except (ImportError, OSError) as e:
+        print(f"[ERROR] Semantic cache unavailable: {e}")
+        sys.exit(1)
+
+    if args.dry_run:
+        print("[DRY RUN] Cache not reconciled: entries from an older prompt/model/corpus count as cached below")
+    else:
+        # Before the coverage check, so stale entries are regenerated instead of counted as "cached"
+        removed = rp.reconcile_cache(cache, model=os.getenv("GENAI_MODEL") or os.getenv("MODEL_NAME") or rp.DEFAULT_MODEL)
+        if any(removed.values()):
+            print(f"[INFO] Reconciled cache: {removed['stale_tags']} stale prompt/model, "
+                  f"{removed['changed_docs']} changed-doc entries dropped")
+
+    t0 = time.perf_counter()
+    embeddings = cache.encode_batch([q for q, _ in eligible])
+    clusters = cluster_questions(eligible, embeddings, cache._cos_sim, args.threshold)
+    clusters = [c for c in clusters if c["count"] >= args.min_count][:args.top_k]
+    rep_embeddings = [embeddings[c["row"]] for c in clusters]
+    print(f"[INFO] {len(clusters)} clusters after top-k/min-count ({(time.perf_counter() - t0)*1000:.0f}ms encode+cluster)")
+
+    import torch  # loaded with sentence-transformers already
+    covered = cache.get_batch(
+        [c["question"] for c in clusters],
+        query_embeddings=torch.stack(rep_embeddings) if rep_embeddings else None,
+        record_stats=False,
+    )
+    todo = [
+        (c, emb) for c, emb, hit in zip(clusters, rep_embeddings, covered)
+        if not hit or is_error_answer(hit[0])
+    ]
+    over_budget = todo[args.budget:]
+    todo = todo[:args.budget]
+
+    print(f"\n{'count':>5}  {'status':<10} question")
+    planned = {id(c) for c, _ in todo}
+    skipped = {id(c) for c, _ in over_budget}
+    for c in clusters:
+        status = "generate" if id(c) in planned else ("budget" if id(c) in skipped else "cached")
+        variants = f"  (+{len(c['variants'])} variants)" if c["variants"] else ""
+        print(f"{c['count']:>5}  {status:<10} {c['question'][:70]}{variants}")
+    print()
+
+    if args.dry_run:
+        print(f"[DRY RUN] Would generate {len(todo)} answers ({len(over_budget)} over budget)")
+        return
+
+    # Cached apology/quota messages are not answers; drop them so they get regenerated
+    dropped = cache.remove_where(lambda entry: is_error_answer(entry["answer"]))
+    if dropped:
+        print(f"[INFO] Dropped {dropped} cached error messages")
+
+    if args.seed_fallback and rp.add_fallback_to_cache:
+        before = len(cache)
+        rp.add_fallback_to_cache(cache)
+        print(f"[INFO] Seeded {len(cache) - before} fallback questions")
+
+    if not todo:
+        print("[SUCCESS] Cache already covers the top clusters")
+        return
+
+    provider = os.getenv("LLM_PROVIDER", "gemini").lower()
+    api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY") or os.getenv("GENAI_API_KEY")
+    if provider == "gemini" and not api_key:
+        print("[ERROR] GOOGLE_API_KEY not set (or use LLM_PROVIDER=stub)")
+        sys.exit(1)
+    model_name = os.getenv("GENAI_MODEL") or os.getenv("MODEL_NAME") or rp.DEFAULT_MODEL
+    genai_client = create_llm_provider(provider, api_key=api_key, model=model_name)
+    retriever = rp.build_retriever_from_env()
+    local_docs = rp.load_docs_from_embedding_file(rp.EMB_FILE) if rp.EMB_FILE.exists() else []
+
+    entries, entry_embeddings, metas, failed = [], [], [], 0
+    corpus_version = current_corpus_version()
+    t0 = time.perf_counter()
+    for start in range(0, len(todo), args.batch_size):
+        chunk = todo[start:start + args.batch_size]
+        # cache=None: answers are bulk-loaded below instead of one set() + file write each
+        results = rp.rag_answer_batch(
+            [c["question"] for c, _ in chunk], retriever, genai_client, local_docs, cache=None
+        )
+        for (c, emb), result in zip(chunk, results):
+            if result.tier == "llm":
+                entries.append((c["question"], result.answer))
+                entry_embeddings.append(emb)
+                # Same tags rag_answer would write, so reconcile_cache can invalidate these too
+                metas.append({
+                    "corpus_version": corpus_version,
+                    "prompt_hash": rp.PROMPT_HASH,
+                    "model": getattr(genai_client, "model", None),
+                    "doc_ids": result.doc_ids,
+                })
+            else:
+                failed += 1
+                print(f"[WARNING] Not cached ({result.tier}): {c['question'][:60]}")
+    elapsed = time.perf_counter() - t0
+
+    added = cache.set_many(
+        entries, response_time=elapsed / max(len(todo), 1),
+        query_embeddings=entry_embeddings, metas=metas,
+    )
+    print(f"[SUCCESS] Generated {len(entries)} answers in {elapsed:.1f}s, cached {added} "
+          f"({failed} failed, {len(over_budget)} over budget) -> {args.cache_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Kalibrasi threshold SemanticCache per topik dari pasangan pertanyaan berlabel
+
+Input JSONL, satu pasangan per baris:
+    {"q1": "pertanyaan masuk", "q2": "pertanyaan yang sudah di-cache", "same": true}
+"same" = jawaban q2 benar untuk q1. Key topik diambil dari q1 (sisi query).
+
+Untuk tiap key "<topik>/<short|long>" (dan pooled "*/short", "*/long") dipilih
+threshold terendah yang presisinya >= --target-precision dan tidak lebih buruk
+dari threshold global, lalu dilaporkan kurva presisi / hit-rate.
+
+Usage:
+    python scripts/calibrate_cache_thresholds.py
+    python scripts/calibrate_cache_thresholds.py --pairs labeled.jsonl --target-precision 0.97
+    python scripts/calibrate_cache_thresholds.py --write       # update data/cache_thresholds.json
+    python scripts/calibrate_cache_thresholds.py --curve-json curve.json
+"""
+import argparse
+import json
+import pathlib
+import sys
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from cache_thresholds import (
+    THRESHOLDS_FILE, ThresholdPolicy, choose_threshold, curve, precision_recall_at,
+)
+
+DEFAULT_PAIRS = pathlib.Path(__file__).parents[1] / "data" / "cache_pairs.jsonl"
+GRID = [round(0.70 + 0.02 * i, 2) for i in range(15)]  # 0.70 .. 0.98
+
+
+def load_pairs(path: pathlib.Path) -> List[Tuple[str, str, bool]]:
+    pairs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                pairs.append((record["q1"], record["q2"], bool(record.get("same", record.get("label")))))
+            except (json.JSONDecodeError, KeyError) as e:
+                print(f"[WARNING] {path.name}:{line_no} skipped ({e})")
+    return pairs
+
+
+def score_pairs(pairs: List[Tuple[str, str, bool]], model_name: str) -> List[float]:
+    """Cosine similarity per pair with the cache's encoder (two batched encodes)"""
+    from sentence_transformers import SentenceTransformer, util
+
+    model = SentenceTransformer(model_name)
+    left = model.encode([p[0] for p in pairs], convert_to_tensor=True)
+    right = model.encode([p[1] for p in pairs], convert_to_tensor=True)
+    return util.cos_sim(left, right).diagonal().tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate per-topic semantic cache thresholds")
+    parser.add_argument("--pairs", type=pathlib.Path, default=DEFAULT_PAIRS)
+    parser.add_argument("--thresholds-file", type=pathlib.Path, default=THRESHOLDS_FILE)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--default-threshold", type=float, default=0.85,
+                        help="Global threshold the cache falls back to (chat_api uses 0.85)")
+    parser.add_argument("--target-precision", type=float, default=0.95)
+    parser.add_argument("--min-pairs", type=int, default=6,
+                        help="Labeled pairs a key needs before it gets its own threshold")
+    parser.add_argument("--write", action="store_true", help="Save thresholds to --thresholds-file")
+    parser.add_argument("--curve-json", type=pathlib.Path, help="Write per-key curves as JSON")
+    args = parser.parse_args()
+
+    if not args.pairs.exists():
+        print(f"[ERROR] Pairs file not found: {args.pairs}")
+        sys.exit(1)
+    pairs = load_pairs(args.pairs)
+    if not pairs:
+        print("[ERROR] No labeled pairs")
+        sys.exit(1)
+
+    policy = ThresholdPolicy.from_file(args.thresholds_file)
+    sims = score_pairs(pairs, args.model)
+
+    groups: Dict[str, List[Tuple[float, bool]]] = defaultdict(list)
+    for (q1, _, same), sim in zip(pairs, sims):
+        key = policy.key(q1)
+        groups[key].append((sim, same))
+        groups["*/" + key.split("/")[1]].append((sim, same))
+
+    thresholds: Dict[str, float] = {}
+    curves = {}
+    print(f"\n{'key':<20} {'pairs':>5} {'pos':>4}  {'thr':>5} {'prec':>6} {'hit':>6}  "
+          f"(global {args.default_threshold:.2f}: {'prec':>6} {'hit':>6})")
+    for key in sorted(groups, key=lambda k: (k.startswith("*"), k)):
+        scored = groups[key]
+        positives = sum(1 for _, same in scored if same)
+        base_precision, base_hit, _, _ = precision_recall_at(scored, args.default_threshold)
+        curves[key] = curve(scored, GRID)
+        if len(scored) < args.min_pairs:
+            print(f"{key:<20} {len(scored):>5} {positives:>4}  {'-':>5} {'':>6} {'':>6}  "
+                  f"({'':>13}{base_precision:>6.2f} {base_hit:>6.2f})  too few pairs")
+            continue
+        t = choose_threshold(scored, args.default_threshold, args.target_precision)
+        thresholds[key] = t
+        precision, hit_rate, _, _ = precision_recall_at(scored, t)
+        print(f"{key:<20} {len(scored):>5} {positives:>4}  {t:>5.3f} {precision:>6.2f} {hit_rate:>6.2f}  "
+              f"({'':>13}{base_precision:>6.2f} {base_hit:>6.2f})")
+
+    # Overall effect: every pair judged with the threshold the cache would now use
+    calibrated = ThresholdPolicy(policy.topics, thresholds, policy.short_max_words, policy.suffixes)
+    before = [(s, same) for (_, _, same), s in zip(pairs, sims)]
+    after_hits = [
+        (s >= calibrated.threshold_for(q1, args.default_threshold), same)
+        for (q1, _, same), s in zip(pairs, sims)
+    ]
+    b_prec, b_hit, b_tp, b_fp = precision_recall_at(before, args.default_threshold)
+    a_tp = sum(1 for hit, same in after_hits if hit and same)
+    a_fp = sum(1 for hit, same in after_hits if hit and not same)
+    positives = sum(1 for _, same in before if same)
+    a_prec = a_tp / (a_tp + a_fp) if a_tp + a_fp else 1.0
+    print(f"\n[RESULT] global {args.default_threshold:.2f}: precision={b_prec:.2f} hit_rate={b_hit:.2f} "
+          f"({b_tp} hits, {b_fp} wrong)")
+    print(f"[RESULT] per-topic:   precision={a_prec:.2f} hit_rate={a_tp / max(positives, 1):.2f} "
+          f"({a_tp} hits, {a_fp} wrong)")
+
+    print(f"\n{'threshold':>9} {'prec':>6} {'hit':>6} {'wrong':>6}   (all pairs)")
+    for row in curve(before, GRID):
+        print(f"{row['threshold']:>9.2f} {row['precision']:>6.2f} {row['hit_rate']:>6.2f} {row['wrong']:>6}")
+
+    if args.curve_json:
+        with open(args.curve_json, "w", encoding="utf-8") as f:
+            json.dump({"thresholds": thresholds, "curves": curves}, f, indent=2)
+        print(f"\n[SUCCESS] Curves written to {args.curve_json}")
+
+    if args.write:
+        with open(args.thresholds_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        data["thresholds"] = {k: round(v, 4) for k, v in sorted(thresholds.items())}
+        data["calibration"] = {
+            "pairs": len(pairs),
+            "source": args.pairs.name,
+            "model": args.model,
+            "default_threshold": args.default_threshold,
+            "target_precision": args.target_precision,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        with open(args.thresholds_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        print(f"\n[SUCCESS] {len(thresholds)} thresholds written to {args.thresholds_file}")
+
+
+if __name__ == "__main__":
+    main()
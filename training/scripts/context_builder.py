@@ -0,0 +1,143 @@
+"""
+Token-aware context builder untuk RAG prompt
+- Buang chunk yang hampir identik (near-duplicate)
+- Bagi token budget berdasarkan ranking relevansi (dokumen teratas dapat porsi terbesar)
+- Potong di batas kalimat, bukan di tengah kata / dari belakang
+"""
+import re
+from typing import List, Sequence, Set
+
+# Rough chars-per-token ratio for Gemini on Indonesian/English text.
+# Used instead of a real tokenizer to keep this module dependency-free.
+CHARS_PER_TOKEN = 4.0
+
+DOC_SEPARATOR = "\n\n---\n\n"
+DUPLICATE_JACCARD = 0.8   # shingle overlap above this = near-duplicate
+SHINGLE_SIZE = 3          # words per shingle
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+_WORD = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count for text"""
+    if not text:
+        return 0
+    return max(1, int(len(text) / CHARS_PER_TOKEN + 0.5))
+
+
+def _shingles(text: str) -> Set[int]:
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {hash(" ".join(words))} if words else set()
+    return {
+        hash(" ".join(words[i:i + SHINGLE_SIZE]))
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def deduplicate(texts: Sequence[str], threshold: float = DUPLICATE_JACCARD) -> List[str]:
+    """
+    Drop near-identical chunks, keeping the first (highest ranked) occurrence.
+    Similarity = Jaccard overlap of word shingles.
+    """
+    kept: List[str] = []
+    kept_shingles: List[Set[int]] = []
+    for text in texts:
+        sh = _shingles(text)
+        duplicate = False
+        for other in kept_shingles:
+            union = len(sh | other)
+            if union and len(sh & other) / union >= threshold:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(text)
+            kept_shingles.append(sh)
+    return kept
+
+
+def truncate_to_sentences(text: str, max_tokens: int) -> str:
+    """Keep whole sentences from the start of text until max_tokens is reached"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+
+    out: List[str] = []
+    used = 0
+    for sentence in _SENTENCE_SPLIT.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        cost = estimate_tokens(sentence) + 1
+        if used + cost > max_tokens:
+            break
+        out.append(sentence)
+        used += cost
+
+    if not out:
+        # First sentence alone is over budget: cut at a word boundary
+        max_chars = int(max_tokens * CHARS_PER_TOKEN)
+        cut = text[:max_chars].rsplit(" ", 1)[0]
+        return cut.rstrip() + " ..."
+    return " ".join(out)
+
+
+def allocate_budget(token_counts: Sequence[int], max_tokens: int) -> List[int]:
+    """
+    Split max_tokens across ranked documents.
+    Rank i gets a share proportional to 1/(i+1); whatever a document does not
+    need is handed on to the next ranks, so short top documents never waste budget.
+    """
+    n = len(token_counts)
+    if n == 0:
+        return []
+    weights = [1.0 / (i + 1) for i in range(n)]
+    remaining = max_tokens
+    allocation = []
+    for i, need in enumerate(token_counts):
+        share = int(remaining * weights[i] / sum(weights[i:]))
+        give = min(need, max(share, 0))
+        allocation.append(give)
+        remaining -= give
+    # Second pass: give leftover budget back in rank order
+    for i, need in enumerate(token_counts):
+        if remaining <= 0:
+            break
+        extra = min(need - allocation[i], remaining)
+        allocation[i] += extra
+        remaining -= extra
+    return allocation
+
+
+def build_context(
+    texts: Sequence[str],
+    max_tokens: int,
+    separator: str = DOC_SEPARATOR,
+    min_doc_tokens: int = 40,
+) -> str:
+    """
+    Assemble ranked chunks (most relevant first) into a context string that fits max_tokens.
+
+    Args:
+        texts: Chunk texts in relevance order
+        max_tokens: Token budget for the whole context (separators included)
+        min_doc_tokens: Skip documents whose allocation is too small to be useful
+    """
+    chunks = deduplicate([t.strip() for t in texts if t and t.strip()])
+    if not chunks:
+        return ""
+
+    sep_tokens = estimate_tokens(separator)
+    budget = max_tokens - sep_tokens * (len(chunks) - 1)
+    allocation = allocate_budget([estimate_tokens(c) for c in chunks], budget)
+
+    pieces = []
+    for chunk, tokens in zip(chunks, allocation):
+        if tokens < min(min_doc_tokens, estimate_tokens(chunk)):
+            continue
+        piece = truncate_to_sentences(chunk, tokens)
+        if piece:
+            pieces.append(piece)
+    return separator.join(pieces)
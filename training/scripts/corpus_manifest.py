@@ -0,0 +1,101 @@
+"""
+Corpus manifest untuk invalidasi semantic cache
+Setiap ingest_to_pgvector.py menulis hash konten per doc_id dan versi corpus.
+History menyimpan doc_id yang berubah per versi, sehingga cache bisa membuang
+hanya jawaban yang memakai dokumen yang berubah (bukan wipe semua).
+"""
+import hashlib
+import json
+import pathlib
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+MANIFEST_FILE = pathlib.Path(__file__).parents[1] / "data" / "metadata" / "corpus_manifest.json"
+MAX_HISTORY = 50  # versions kept for targeted invalidation; older caches are invalidated wholesale
+
+_cache: Dict[str, Tuple[float, Dict]] = {}  # path -> (mtime, manifest)
+
+
+def compute_doc_hashes(chunks: Iterable[Tuple[str, str]]) -> Dict[str, str]:
+    """(doc_id, chunk_text) pairs -> {doc_id: content hash over all its chunks, in order}"""
+    hashers: Dict[str, "hashlib._Hash"] = {}
+    for doc_id, text in chunks:
+        hashers.setdefault(str(doc_id), hashlib.sha1()).update(text.encode("utf-8"))
+    return {doc_id: h.hexdigest() for doc_id, h in hashers.items()}
+
+
+def load_manifest(path: pathlib.Path = MANIFEST_FILE) -> Dict:
+    """Manifest dict ({} if missing); re-read only when the file changes"""
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return {}
+    cached = _cache.get(str(path))
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"[WARNING] Failed to read corpus manifest: {e}")
+        return {}
+    _cache[str(path)] = (mtime, manifest)
+    return manifest
+
+
+def current_corpus_version(path: pathlib.Path = MANIFEST_FILE) -> Optional[str]:
+    return load_manifest(path).get("version")
+
+
+def changed_since(version: Optional[str], path: pathlib.Path = MANIFEST_FILE) -> Optional[Set[str]]:
+    """
+    doc_ids changed after `version` (empty set if it is the current version).
+    None means the version is unknown or too old: treat everything from it as stale.
+    """
+    manifest = load_manifest(path)
+    if not manifest or version == manifest.get("version"):
+        return set()
+    history = manifest.get("history", [])
+    versions = [h["version"] for h in history]
+    if version not in versions:
+        return None
+    # Version ids hash the corpus content, so a corpus that returns to an earlier
+    # state repeats an id; both occurrences are the same content, and diffing
+    # from the last one gives the changes relative to it.
+    start = len(versions) - 1 - versions[::-1].index(version)
+    changed: Set[str] = set()
+    for entry in history[start + 1:]:
+        changed.update(entry.get("changed", []))
+    return changed
+
+
+def update_manifest(doc_hashes: Dict[str, str], path: pathlib.Path = MANIFEST_FILE) -> Dict:
+    """
+    Record a new ingest. A new version is only created when some doc was added,
+    modified or removed. Returns {"version", "changed", "new_version"}.
+    """
+    previous = load_manifest(path)
+    old_hashes = previous.get("docs", {})
+    changed = sorted(
+        {d for d, h in doc_hashes.items() if old_hashes.get(d) != h}
+        | (set(old_hashes) - set(doc_hashes))
+    )
+    if previous and not changed:
+        return {"version": previous["version"], "changed": [], "new_version": False}
+
+    version = hashlib.sha1(
+        json.dumps(doc_hashes, sort_keys=True).encode("utf-8")
+    ).hexdigest()[:12]
+    history = previous.get("history", []) + [{
+        "version": version,
+        "created_at": datetime.now().isoformat(),
+        "changed": changed,
+    }]
+    manifest = {"version": version, "docs": doc_hashes, "history": history[-MAX_HISTORY:]}
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    tmp.replace(path)
+    return {"version": version, "changed": changed, "new_version": True}
@@ -530,61 +530,63 @@ def get_fallback_answer(question: str) -> str:
     # API akan memberikan jawaban yang lebih akurat dan spesifik
     return None
 
+# Sample phrasings per fallback topic, used to seed the semantic cache
+FALLBACK_SAMPLE_QUESTIONS = {
+    "tanda": [
+        "apa saja tanda-tanda kehamilan awal?",
+        "ciri-ciri hamil muda itu apa?",
+        "gejala hamil apa saja?"
+    ],
+    "makanan sehat": [
+        "makanan apa yang baik untuk ibu hamil?",
+        "menu sehat untuk bumil",
+        "makanan yang harus dihindari saat hamil"
+    ],
+    "mual muntah": [
+        "cara mengatasi mual saat hamil",
+        "morning sickness gimana ngatasinnya?",
+        "muntah terus saat hamil"
+    ],
+    "olahraga": [
+        "olahraga apa yang aman untuk ibu hamil?",
+        "boleh senam tidak saat hamil?",
+        "bumil boleh olahraga tidak?"
+    ],
+    "vitamin": [
+        "vitamin apa yang penting untuk ibu hamil?",
+        "suplemen apa yang perlu diminum bumil?",
+        "asam folat untuk apa?"
+    ],
+    "tidur posisi": [
+        "posisi tidur yang baik untuk ibu hamil",
+        "bumil tidur miring kiri atau kanan?",
+        "bolehkah ibu hamil tidur telentang?"
+    ],
+    "hubungan intim": [
+        "bolehkah berhubungan saat hamil?",
+        "aman tidak hubungan intim saat hamil?",
+        "posisi aman saat hamil"
+    ],
+    "kesuburan": [
+        "bagaimana cara meningkatkan kesuburan?",
+        "tips agar cepat hamil",
+        "program hamil yang benar"
+    ],
+    "kelahiran prematur": [
+        "apa yang menyebabkan kelahiran prematur?",
+        "pencegahan bayi lahir prematur",
+        "tanda-tanda persalinan dini"
+    ],
+}
+
 def add_fallback_to_cache(cache):
-    """Pre-populate cache with fallback answers"""
-    if not cache:
+    """Pre-populate cache with fallback answers (one batched encode, one save)"""
+    if cache is None:
         return
     
-    for topic, answer in FALLBACK_ANSWERS.items():
-        # Create sample questions for each topic
-        sample_questions = {
-            "tanda": [
-                "apa saja tanda-tanda kehamilan awal?",
-                "ciri-ciri hamil muda itu apa?",
-                "gejala hamil apa saja?"
-            ],
-            "makanan sehat": [
-                "makanan apa yang baik untuk ibu hamil?",
-                "menu sehat untuk bumil",
-                "makanan yang harus dihindari saat hamil"
-            ],
-            "mual muntah": [
-                "cara mengatasi mual saat hamil",
-                "morning sickness gimana ngatasinnya?",
-                "muntah terus saat hamil"
-            ],
-            "olahraga": [
-                "olahraga apa yang aman untuk ibu hamil?",
-                "boleh senam tidak saat hamil?",
-                "bumil boleh olahraga tidak?"
-            ],
-            "vitamin": [
-                "vitamin apa yang penting untuk ibu hamil?",
-                "suplemen apa yang perlu diminum bumil?",
-                "asam folat untuk apa?"
-            ],
-            "tidur posisi": [
-                "posisi tidur yang baik untuk ibu hamil",
-                "bumil tidur miring kiri atau kanan?",
-                "bolehkah ibu hamil tidur telentang?"
-            ],
-            "hubungan intim": [
-                "bolehkah berhubungan saat hamil?",
-                "aman tidak hubungan intim saat hamil?",
-                "posisi aman saat hamil"
-            ],
-            "kesuburan": [
-                "bagaimana cara meningkatkan kesuburan?",
-                "tips agar cepat hamil",
-                "program hamil yang benar"
-            ],
-            "kelahiran prematur": [
-                "apa yang menyebabkan kelahiran prematur?",
-                "pencegahan bayi lahir prematur",
-                "tanda-tanda persalinan dini"
-            ],
-        }
-        
-        if topic in sample_questions:
-            for q in sample_questions[topic]:
-                cache.set(q, answer.strip(), response_time=0.0)
+    entries = [
+        (q, answer.strip())
+        for topic, answer in FALLBACK_ANSWERS.items()
+        for q in FALLBACK_SAMPLE_QUESTIONS.get(topic, [])
+    ]
+    cache.set_many(entries, response_time=0.0)
@@ -19,6 +19,8 @@ except ImportError as e:
     print("Install dengan: pip install sentence-transformers langchain-postgres psycopg2-binary")
     sys.exit(1)
 
+from corpus_manifest import compute_doc_hashes, update_manifest
+
 # Load environment
 BASE_DIR = pathlib.Path(__file__).parents[1]
 load_dotenv(BASE_DIR / ".env")
@@ -206,6 +208,15 @@ def main():
         print("\n Ingestion failed. Please check the errors above.")
         sys.exit(1)
     
+    # Step 4b: Bump corpus version; cached answers built on changed docs get invalidated
+    manifest = update_manifest(compute_doc_hashes(
+        (doc.metadata.get("doc_id", doc.metadata.get("source")), doc.page_content) for doc in documents
+    ))
+    if manifest["new_version"]:
+        print(f"\n Corpus version {manifest['version']}: {len(manifest['changed'])} docs changed")
+    else:
+        print(f"\n Corpus unchanged (version {manifest['version']})")
+    
     # Step 5: Verify ingestion
     if verify_ingestion():
         print("\n" + "=" * 60)
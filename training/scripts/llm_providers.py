@@ -0,0 +1,377 @@
+"""
+LLM provider backends untuk RAG pipeline
+- LLMProvider: interface + retry/backoff logic bersama (429 & error lain)
+- GeminiProvider: google-genai Client (produksi)
+- StubLLMProvider: stub lokal deterministik untuk load test offline
+  (latency, error rate dan 429 bisa dikonfigurasi, tanpa memakai quota Gemini)
+
+Pilih backend lewat env LLM_PROVIDER=gemini|stub atau create_llm_provider().
+"""
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+import traceback
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Optional, Tuple
+
+from rag_metrics import LLM_CALL_SECONDS, LLM_ERRORS, LLM_RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = os.getenv("MODEL_NAME") or os.getenv("GENAI_MODEL", "gemini-2.0-flash")
+
+QUOTA_EXCEEDED_MESSAGE = "Maaf, quota API Gemini sudah mencapai limit. Silakan tunggu 5-10 menit atau coba lagi besok. Untuk penggunaan intensif, pertimbangkan upgrade ke Gemini Paid Tier. 🙏"
+
+
+# Prefixes of the apology strings generate() returns instead of raising
+ERROR_ANSWER_PREFIXES = (
+    "Maaf, quota API",
+    "Maaf, terjadi kesalahan teknis",
+    "Maaf, tidak dapat menghasilkan jawaban",
+    "Maaf, sistem sedang sibuk",
+    "ERROR",
+)
+
+
+def is_error_answer(answer: str) -> bool:
+    """True if answer is a provider error / quota message rather than real content"""
+    return answer.startswith(ERROR_ANSWER_PREFIXES)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True if the exception looks like a provider 429 / quota error"""
+    error_msg = str(error)
+    return "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg
+
+
+# Joins a prompt_prefix and the per-call prompt when the prefix is not served from a provider cache
+PROMPT_PREFIX_SEPARATOR = "\n\n---\n\n"
+
+
+def is_cache_too_small_error(error: Exception) -> bool:
+    """True if caches.create rejected the prefix as below the model's minimum cacheable size"""
+    error_msg = str(error).lower()
+    return "too small" in error_msg or "min_total_token_count" in error_msg
+
+
+class LLMProvider(ABC):
+    """
+    Base class for LLM backends.
+    Subclasses implement `_generate_once`; `generate` adds retry with
+    exponential backoff on 429 and a single retry on other errors.
+    """
+    name = "base"
+
+    def __init__(self, model: str, max_retries: int = 2, base_delay: float = 1.0):
+        self.model = model
+        self.max_retries = max_retries  # Reduced from 3 to 2
+        self.base_delay = base_delay    # Reduced from 2s to 1s
+        self.stats = {"calls": 0, "rate_limited": 0, "errors": 0}
+
+    @abstractmethod
+    def _generate_once(
+        self,
+        prompt: str,
+        temperature: float,
+        max_output_tokens: int,
+        prompt_prefix: Optional[str],
+    ) -> str:
+        """One provider call without retries; raise on failure (429s are retried by generate)"""
+
+    def generate(
+        self,
+        prompt: str,
+        temperature: float = 0.2,
+        max_output_tokens: int = 512,
+        prompt_prefix: Optional[str] = None,
+    ) -> str:
+        """
+        Generate text with retry logic for rate limiting
+
+        Args:
+            prompt_prefix: Static text the model sees before `prompt` (providers may cache it)
+        """
+        max_retries = self.max_retries
+        base_delay = self.base_delay
+
+        for attempt in range(max_retries):
+            t0 = time.perf_counter()
+            try:
+                self.stats["calls"] += 1
+                return self._generate_once(prompt, temperature, max_output_tokens, prompt_prefix)
+
+            except Exception as e:
+                error_msg = str(e)
+
+                # Handle 429 rate limit error
+                if is_rate_limit_error(e):
+                    self.stats["rate_limited"] += 1
+                    LLM_RATE_LIMITED.labels(self.name).inc()
+                    if attempt < max_retries - 1:
+                        wait_time = base_delay * (2 ** attempt)  # Exponential backoff
+                        logger.warning(f"⚠️  Rate limit reached (429). Retrying in {wait_time}s... (Attempt {attempt+1}/{max_retries})")
+                        time.sleep(wait_time)
+                        continue
+                    else:
+                        logger.error(f"❌ Rate limit exceeded after {max_retries} attempts")
+                        return QUOTA_EXCEEDED_MESSAGE
+
+                # Handle other errors
+                self.stats["errors"] += 1
+                LLM_ERRORS.labels(self.name).inc()
+                logger.error(f"❌ {self.name} API call failed: {e}")
+                logger.debug(traceback.format_exc())
+
+                if attempt < max_retries - 1:
+                    wait_time = base_delay
+                    logger.warning(f"⚠️  Retrying in {wait_time}s... (Attempt {attempt+1}/{max_retries})")
+                    time.sleep(wait_time)
+                    continue
+                else:
+                    return f"Maaf, terjadi kesalahan teknis. Silakan coba lagi nanti. ({error_msg[:100]})"
+            finally:
+                LLM_CALL_SECONDS.labels(self.name).observe(time.perf_counter() - t0)
+
+        return "Maaf, tidak dapat menghasilkan jawaban setelah beberapa percobaan. Silakan coba lagi."
+
+
+# -------------------------
+# Gemini (google-genai)
+# -------------------------
+class GeminiProvider(LLMProvider):
+    """Wrapper for google.genai Client"""
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str], model: str = DEFAULT_MODEL, context_cache_ttl: Optional[int] = None):
+        super().__init__(model=model)
+        self.api_key = api_key
+
+        try:
+            import google.genai as genai_new
+            from google.genai import types as genai_types
+        except ImportError:
+            raise RuntimeError("google-genai package not installed. Run: pip install google-genai")
+
+        # Initialize client
+        self.client = genai_new.Client(api_key=api_key)
+        self._types = genai_types
+
+        # Provider-side context caching for the static prompt prefix.
+        # GENAI_CONTEXT_CACHE_TTL=0 disables it; the prefix is then sent inline every call.
+        if context_cache_ttl is None:
+            context_cache_ttl = int(os.getenv("GENAI_CONTEXT_CACHE_TTL", "3600"))
+        self.context_cache_ttl = context_cache_ttl
+        self._cached_prefixes: Dict[str, Tuple[str, float]] = {}  # prefix hash -> (cache name, expires_at)
+        # A prefix below the minimum cacheable size never becomes cacheable: stop trying.
+        # Other failures (network, 5xx, quota) are retried after a cooldown.
+        self._context_cache_unsupported = False
+        self._context_cache_retry_at = 0.0
+        self.context_cache_retry_seconds = float(os.getenv("GENAI_CONTEXT_CACHE_RETRY", "300"))
+        logger.info(f"✅ GenAI client initialized with model: {model}")
+
+    def _get_cached_prefix(self, prompt_prefix: str) -> Optional[str]:
+        """
+        Return the name of a provider-side cached content holding prompt_prefix,
+        creating it on first use. Returns None when caching is disabled or unsupported
+        (e.g. prefix below the model's minimum cacheable size).
+        """
+        if self.context_cache_ttl <= 0 or self._context_cache_unsupported:
+            return None
+
+        key = hashlib.sha256(prompt_prefix.encode("utf-8")).hexdigest()
+        cached = self._cached_prefixes.get(key)
+        # Refresh a minute before expiry so in-flight calls never hit a dead cache
+        if cached and cached[1] - 60 > time.time():
+            return cached[0]
+        if time.time() < self._context_cache_retry_at:
+            return None
+
+        try:
+            cache = self.client.caches.create(
+                model=self.model,
+                config=self._types.CreateCachedContentConfig(
+                    # Cached as the opening user content (not a system instruction), so the
+                    # model reads prefix + prompt exactly as when both are sent inline
+                    contents=[self._types.Content(
+                        role="user",
+                        parts=[self._types.Part(text=prompt_prefix + PROMPT_PREFIX_SEPARATOR)],
+                    )],
+                    display_name=f"pregnibot-prefix-{key[:12]}",
+                    ttl=f"{self.context_cache_ttl}s",
+                ),
+            )
+            self._cached_prefixes[key] = (cache.name, time.time() + self.context_cache_ttl)
+            logger.info(f"💾 Prompt prefix cached on provider: {cache.name}")
+            return cache.name
+        except Exception as e:
+            if is_cache_too_small_error(e):
+                self._context_cache_unsupported = True
+                logger.warning(f"⚠️  Prompt prefix too small for context caching, sending it inline: {e}")
+            else:
+                self._context_cache_retry_at = time.time() + self.context_cache_retry_seconds
+                logger.warning(f"⚠️  Context caching failed, sending prefix inline; retrying in "
+                               f"{self.context_cache_retry_seconds:.0f}s: {e}")
+            return None
+
+    def _generate_once(self, prompt, temperature, max_output_tokens, prompt_prefix) -> str:
+        # temperature / max_output_tokens are part of the provider interface but, as before,
+        # not forwarded: answers keep the model's default generation settings
+        contents, config = prompt, None
+        if prompt_prefix:
+            cache_name = self._get_cached_prefix(prompt_prefix)
+            if cache_name:
+                config = self._types.GenerateContentConfig(cached_content=cache_name)
+            else:
+                contents = prompt_prefix + PROMPT_PREFIX_SEPARATOR + prompt
+
+        # Call API with correct parameters for google-genai 1.52.0
+        response = self.client.models.generate_content(
+            model=self.model,
+            contents=contents,
+            config=config,
+        )
+
+        # Extract text from response
+        if hasattr(response, 'text') and response.text:
+            return response.text.strip()
+
+        # Try alternative extraction paths
+        if hasattr(response, 'candidates') and response.candidates:
+            candidate = response.candidates[0]
+            if hasattr(candidate, 'content'):
+                if hasattr(candidate.content, 'parts'):
+                    parts = candidate.content.parts
+                    if parts and hasattr(parts[0], 'text'):
+                        return parts[0].text.strip()
+
+        # If no text found
+        logger.error(f"⚠️  Response has no extractable text: {response}")
+        return "Maaf, tidak dapat menghasilkan jawaban. Silakan coba lagi."
+
+
+# -------------------------
+# Local stub (offline load testing)
+# -------------------------
+class StubLLMError(Exception):
+    """Error raised by StubLLMProvider (message mimics the real provider)"""
+
+
+class StubLLMProvider(LLMProvider):
+    """
+    Deterministic local LLM stub.
+    Sleeps for a sampled latency, then returns a canned answer derived from the
+    prompt hash, or raises an injected 429 / 500 error. With the same seed and
+    the same call order, latencies and injected failures are reproducible.
+    """
+    name = "stub"
+
+    LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+    def __init__(
+        self,
+        model: str = "stub-llm",
+        latency_ms: float = 800.0,
+        latency_dist: str = "lognormal",
+        latency_spread: float = 0.35,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        seed: int = 42,
+        base_delay: float = 1.0,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """
+        Args:
+            latency_ms: Mean latency (fixed value for "fixed")
+            latency_dist: "fixed", "uniform" (mean +/- spread*mean) or "lognormal" (sigma=spread)
+            latency_spread: Relative spread of the latency distribution
+            error_rate: Probability of a generic 500 error per call
+            rate_limit_rate: Probability of a 429 RESOURCE_EXHAUSTED per call
+            seed: RNG seed for reproducible runs
+            base_delay: Retry backoff base (seconds), lower it for fast load tests
+            sleep: Sleep function (injectable for tests / simulated time)
+        """
+        super().__init__(model=model, base_delay=base_delay)
+        if latency_dist not in self.LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency_dist must be one of {self.LATENCY_DISTRIBUTIONS}")
+        self.latency_ms = latency_ms
+        self.latency_dist = latency_dist
+        self.latency_spread = latency_spread
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._sleep = sleep
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        logger.info(
+            f"✅ Stub LLM initialized (latency={latency_ms}ms {latency_dist}, "
+            f"error_rate={error_rate}, 429_rate={rate_limit_rate})"
+        )
+
+    def _sample(self) -> Tuple[float, float]:
+        """Return (latency seconds, uniform draw for failure injection)"""
+        with self._lock:
+            if self.latency_dist == "fixed":
+                latency = self.latency_ms
+            elif self.latency_dist == "uniform":
+                spread = self.latency_ms * self.latency_spread
+                latency = self._rng.uniform(self.latency_ms - spread, self.latency_ms + spread)
+            else:
+                # lognormal with the requested mean
+                mu = 0.0 - (self.latency_spread ** 2) / 2
+                latency = self.latency_ms * self._rng.lognormvariate(mu, self.latency_spread)
+            draw = self._rng.random()
+        return max(latency, 0.0) / 1000.0, draw
+
+    def _generate_once(self, prompt, temperature, max_output_tokens, prompt_prefix) -> str:
+        latency, draw = self._sample()
+        self._sleep(latency)
+
+        if draw < self.rate_limit_rate:
+            raise StubLLMError("429 RESOURCE_EXHAUSTED (stub)")
+        if draw < self.rate_limit_rate + self.error_rate:
+            raise StubLLMError("500 INTERNAL (stub)")
+
+        digest = hashlib.md5(prompt.encode("utf-8")).hexdigest()[:8]
+        return (
+            f"Jawaban Stub {digest}\n\n"
+            "Ini jawaban dummy dari stub LLM lokal untuk load testing. "
+            "Isi jawaban ditentukan oleh hash prompt sehingga hasilnya deterministik."
+        )
+
+    @classmethod
+    def from_env(cls) -> "StubLLMProvider":
+        """Build stub from LLM_STUB_* environment variables"""
+        return cls(
+            latency_ms=float(os.getenv("LLM_STUB_LATENCY_MS", "800")),
+            latency_dist=os.getenv("LLM_STUB_LATENCY_DIST", "lognormal"),
+            latency_spread=float(os.getenv("LLM_STUB_LATENCY_SPREAD", "0.35")),
+            error_rate=float(os.getenv("LLM_STUB_ERROR_RATE", "0")),
+            rate_limit_rate=float(os.getenv("LLM_STUB_429_RATE", "0")),
+            seed=int(os.getenv("LLM_STUB_SEED", "42")),
+            base_delay=float(os.getenv("LLM_STUB_RETRY_DELAY", "1.0")),
+        )
+
+
+def create_llm_provider(
+    provider: Optional[str] = None,
+    api_key: Optional[str] = None,
+    model: Optional[str] = None,
+) -> LLMProvider:
+    """
+    Factory for LLM backends.
+
+    Args:
+        provider: "gemini" or "stub" (default: LLM_PROVIDER env, else "gemini")
+        api_key: Gemini API key (ignored for stub)
+        model: Model name (default: MODEL_NAME / GENAI_MODEL env)
+    """
+    provider = (provider or os.getenv("LLM_PROVIDER", "gemini")).lower()
+    if provider == "stub":
+        return StubLLMProvider.from_env()
+    if provider == "gemini":
+        if not api_key:
+            raise ValueError("Gemini API key required (set GEMINI_API_KEY / GOOGLE_API_KEY)")
+        return GeminiProvider(api_key=api_key, model=model or DEFAULT_MODEL)
+    raise ValueError(f"Unknown LLM provider: {provider}")
@@ -0,0 +1,276 @@
+"""
+Minimal in-process metrics (Prometheus text exposition format)
+Counter, Gauge dan Histogram sederhana tanpa dependency tambahan,
+dipakai oleh rag_pipeline dan di-expose oleh chat_api di /metrics.
+
+Hot-path cost is one dict lookup plus a short locked update per observation.
+"""
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds (5ms .. 60s), covers string gates up to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + body + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values):
+        """Get the child metric for a label set (children are cached)"""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _default(self):
+        """Child for metrics without labels"""
+        return self.labels()
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(child.samples(self.name, self.labelnames, key))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def samples(self, name, labelnames, key):
+        return [f"{name}_total{_format_labels(labelnames, key)} {_format_value(self._value)}"]
+
+
+class Counter(_Metric):
+    """Monotonic counter (exported with a _total suffix)"""
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._value = 0.0
+        self._fn: Optional[Callable[[], float]] = None
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        self._value = value
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set_function(self, fn: Callable[[], float]):
+        """Compute the value lazily at scrape time"""
+        self._fn = fn
+
+    @property
+    def value(self) -> float:
+        if self._fn is not None:
+            try:
+                return float(self._fn())
+            except Exception:
+                return float("nan")
+        return self._value
+
+    def samples(self, name, labelnames, key):
+        return [f"{name}{_format_labels(labelnames, key)} {_format_value(self.value)}"]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be computed at scrape time"""
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+
+    def set_function(self, fn: Callable[[], float]):
+        self._default().set_function(fn)
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)  # last slot = +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def samples(self, name, labelnames, key):
+        lines = []
+        cumulative = 0
+        bounds = list(self._buckets) + [float("inf")]
+        for bound, count in zip(bounds, self._counts):
+            cumulative += count
+            labels = _format_labels(labelnames, key, ("le", _format_value(bound)))
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        plain = _format_labels(labelnames, key)
+        lines.append(f"{name}_sum{plain} {_format_value(self._sum)}")
+        lines.append(f"{name}_count{plain} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram"""
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+# -------------------------
+# RAG metrics
+# -------------------------
+# Retriever and embedding latency are the "retrieval" / "embedding" series of this histogram
+RAG_SPAN_SECONDS = Histogram(
+    "pregcare_rag_span_seconds",
+    "Time spent per rag_answer span (fallback, gating, embedding, cache_lookup, retrieval, ...)",
+    labelnames=("span",),
+)
+
+RAG_REQUESTS = Counter(
+    "pregcare_rag_requests",
+    "rag_answer calls by outcome (fallback, cache, reject, safety, llm, error)",
+    labelnames=("outcome",),
+)
+
+LLM_CALL_SECONDS = Histogram(
+    "pregcare_llm_call_seconds",
+    "Latency of a single LLM provider attempt (retries are observed separately)",
+    labelnames=("provider",),
+)
+
+LLM_RATE_LIMITED = Counter(
+    "pregcare_llm_rate_limited",
+    "LLM attempts rejected with 429 / RESOURCE_EXHAUSTED",
+    labelnames=("provider",),
+)
+
+LLM_ERRORS = Counter(
+    "pregcare_llm_errors",
+    "LLM attempts that failed with a non-429 error",
+    labelnames=("provider",),
+)
+
+RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "pregcare_rate_limit_wait_seconds",
+    "Time spent sleeping in RateLimiter.wait_if_needed",
+    buckets=(0.0, 0.01, 0.1, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0),
+)
+
+# Gauges below are computed at scrape time (set_function) by the process that owns the objects
+CACHE_ENTRIES = Gauge("pregcare_semantic_cache_entries", "Entries in the semantic cache")
+CACHE_BYTES = Gauge("pregcare_semantic_cache_bytes", "Approximate memory held by semantic cache entries and embeddings")
+CONVERSATION_USERS = Gauge("pregcare_conversation_users", "Users with an in-memory conversation history")
+CONVERSATION_EXCHANGES = Gauge("pregcare_conversation_exchanges", "Q&A exchanges held across all conversation histories")
@@ -1,5 +1,5 @@
 # rag_pipeline.py — FINAL CLEAN (compatible & robust genai)
-# - Uses: sentence-transformers, langchain-postgres (PGVector), google-genai / google.generativeai fallback
+# - Uses: sentence-transformers, langchain-postgres (PGVector), google-genai (all imported lazily)
 # - Features:
 #   * retriever.invoke(question) usage (avoids internal _get_relevant_documents)
 #   * robust genai wrapper with multiple fallbacks
@@ -8,15 +8,22 @@
 #   * interactive chat mode (realtime QA)
 #   * clear error handling & informative logs
 
+from __future__ import annotations
+
 import os
+import hashlib
 import json
 import pathlib
+import re
 import time
 import sys
 import textwrap
 import logging
+import threading
 import traceback
-from typing import List, Optional, Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Dict, Tuple, TYPE_CHECKING
+from dataclasses import dataclass, field
 from datetime import datetime
 
 # Semantic cache
@@ -25,6 +32,20 @@ try:
 except ImportError:
     SemanticCache = None
 
+from topic_gate import get_topic_matcher
+from context_builder import build_context
+from llm_providers import (
+    PROMPT_PREFIX_SEPARATOR, GeminiProvider, LLMProvider, create_llm_provider, is_error_answer,
+)
+from tracing import RequestTrace
+from rag_metrics import RAG_REQUESTS, RATE_LIMIT_WAIT_SECONDS
+from corpus_manifest import changed_since, current_corpus_version
+from cache_thresholds import load_threshold_policy
+from staged_pipeline import (
+    COST_ENCODE, COST_FREE, COST_IO, COST_LLM,
+    PipelineState, Stage, StagedPipeline,
+)
+
 # Fallback responses for common questions
 try:
     from fallback_responses import get_fallback_answer, add_fallback_to_cache
@@ -32,55 +53,35 @@ except ImportError:
     get_fallback_answer = None
     add_fallback_to_cache = None
 
-# third-party
-try:
-    from dotenv import load_dotenv
-except Exception:
-    load_dotenv = None
-
-try:
-    from sentence_transformers import SentenceTransformer
-except Exception:
-    SentenceTransformer = None
-
-# langchain components (light usage)
-try:
-    from langchain_postgres import PGVector
+# Heavy third-party packages (sentence-transformers, langchain, google-genai,
+# dotenv) are imported lazily inside the functions that need them, so that
+# importing this module for light helpers like safety_check stays cheap.
+# Guard with: python scripts/bench_import_time.py
+if TYPE_CHECKING:
     from langchain_core.documents import Document
-    from langchain_core.prompts import PromptTemplate
-except Exception:     
-    PGVector = None
-    Document = None
-    PromptTemplate = None
-
-# try genai packages (we'll handle multiple possibilities)
-GENAI_MODULE = None
-GENAI_OLD = None
-try:
-    import google.genai as genai_new  # newer package (google-genai)
-    GENAI_MODULE = "genai_new"
-except Exception:
-    genai_new = None
-
-try:
-    import google.generativeai as genai_old  # older package (google-generativeai)
-    GENAI_OLD = "genai_old"
-except Exception:
-    genai_old = None
 
 # -------------------------
 # LOGGING SETUP
 # -------------------------
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('rag_pipeline.log', encoding='utf-8')
-    ]
-)
 logger = logging.getLogger(__name__)
 
+_logging_configured = False
+
+def setup_logging(log_file: str = "rag_pipeline.log"):
+    """Configure console + file logging once (opens the log file on first call)."""
+    global _logging_configured
+    if _logging_configured:
+        return
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(),
+            logging.FileHandler(log_file, encoding='utf-8')
+        ]
+    )
+    _logging_configured = True
+
 # -------------------------
 # PATH + ENV
 # -------------------------
@@ -88,7 +89,19 @@ ROOT = pathlib.Path(__file__).resolve().parents[1]
 sys.path.append(str(ROOT))
 
 BASE_DIR = pathlib.Path(__file__).parents[1]
-if load_dotenv:
+
+_env_loaded = False
+
+def load_env():
+    """Load training/.env once (python-dotenv is optional)."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    _env_loaded = True
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
     load_dotenv(BASE_DIR / ".env")
 
 DATA_DIR = BASE_DIR / "data"
@@ -98,7 +111,6 @@ EMB_FILE = DATA_DIR / "embeddings" / "embeddings.jsonl"
 # CONFIG
 # -------------------------
 DEFAULT_MODEL = os.getenv("MODEL_NAME") or os.getenv("GENAI_MODEL", "gemini-2.0-flash")
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY") or os.getenv("GENAI_API_KEY") or os.getenv("API_KEY")
 PG_CONN_TEMPLATE = "postgresql://{user}:{password}@{host}:{port}/{dbname}"
 
 # safety: simple list (extend as needed)
@@ -111,7 +123,11 @@ SAFETY_BLOCKLIST = [
     # add more phrases you want to block
 ]
 
-MAX_CONTEXT_CHARS = 18000  # trim context if too long
+# Token budget for retrieved context (approximate tokens, see context_builder.estimate_tokens).
+# 4500 ~= the previous 18000-character cap at CHARS_PER_TOKEN=4; lower it to trade context for quota.
+MAX_CONTEXT_TOKENS = int(os.getenv("RAG_MAX_CONTEXT_TOKENS", "4500"))
+# Max concurrent LLM calls for rag_answer_batch (spacing is still enforced by api_rate_limiter)
+LLM_BATCH_CONCURRENCY = int(os.getenv("RAG_LLM_BATCH_CONCURRENCY", "4"))
 
 # -------------------------
 # EMBEDDING WRAPPER
@@ -119,7 +135,9 @@ MAX_CONTEXT_CHARS = 18000  # trim context if too long
 class SimpleEmbeddingsWrapper:
     """Thin wrapper for SentenceTransformer used by PGVector"""
     def __init__(self, model_name="all-MiniLM-L6-v2"):
-        if SentenceTransformer is None:
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
             raise RuntimeError("sentence-transformers not installed in this environment.")
         self._model = SentenceTransformer(model_name)
 
@@ -148,40 +166,50 @@ def safety_check(user_text: str) -> Optional[str]:
 # Conversation History Manager
 # -------------------------
 class ConversationHistory:
-    """Manage conversation history for context-aware responses"""
+    """Manage conversation history for context-aware responses (thread-safe: the API serves requests from a threadpool)"""
     def __init__(self, max_history: int = 5):
         self.history: List[Dict[str, str]] = []
         self.max_history = max_history
+        self._lock = threading.Lock()
         logger.info(f"ConversationHistory initialized with max_history={max_history}")
     
     def add_exchange(self, question: str, answer: str):
         """Add Q&A pair to history"""
-        self.history.append({
-            "question": question,
-            "answer": answer,
-            "timestamp": datetime.now().isoformat()
-        })
-        # Keep only last N exchanges
-        if len(self.history) > self.max_history:
-            self.history = self.history[-self.max_history:]
+        with self._lock:
+            self.history.append({
+                "question": question,
+                "answer": answer,
+                "timestamp": datetime.now().isoformat()
+            })
+            # Keep only last N exchanges
+            if len(self.history) > self.max_history:
+                self.history = self.history[-self.max_history:]
         logger.debug(f"Added exchange to history. Total exchanges: {len(self.history)}")
     
     def get_context(self) -> str:
         """Get conversation history as formatted string"""
-        if not self.history:
+        with self._lock:
+            recent = self.history[-2:]
+        if not recent:
             return ""
         
         context_parts = ["\n=== RIWAYAT PERCAKAPAN ==="]
-        for i, exchange in enumerate(self.history[-2:], 1):  # Last 2 exchanges
+        for i, exchange in enumerate(recent, 1):  # Last 2 exchanges
             context_parts.append(f"\nQ{i}: {exchange['question']}")
             context_parts.append(f"A{i}: {exchange['answer'][:150]}...")  # Truncate for brevity
         context_parts.append("\n=== AKHIR RIWAYAT ===\n")
         
         return "\n".join(context_parts)
     
+    def get_history(self) -> List[Dict[str, str]]:
+        """Get a copy of the stored exchanges (oldest first)"""
+        with self._lock:
+            return list(self.history)
+    
     def clear(self):
         """Clear conversation history"""
-        self.history.clear()
+        with self._lock:
+            self.history.clear()
         logger.info("Conversation history cleared")
 
 # -------------------------
@@ -192,98 +220,36 @@ class RateLimiter:
     def __init__(self, min_interval: float = 4.0):
         self.min_interval = min_interval  # Minimum seconds between requests
         self.last_request_time = 0
+        self._lock = threading.Lock()
         logger.info(f"RateLimiter initialized with {min_interval}s minimum interval")
     
-    def wait_if_needed(self):
-        """Wait if needed to respect rate limits"""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
+    def wait_if_needed(self) -> float:
+        """
+        Wait if needed to respect rate limits. Returns seconds waited.
+        Thread-safe: each caller reserves the next free slot under the lock and
+        sleeps outside it, so concurrent callers are spaced min_interval apart.
+        """
+        with self._lock:
+            current_time = time.time()
+            slot = max(current_time, self.last_request_time + self.min_interval)
+            self.last_request_time = slot
+        wait_time = slot - current_time
         
-        if time_since_last < self.min_interval:
-            wait_time = self.min_interval - time_since_last
+        if wait_time > 0:
             logger.info(f"⏳ Rate limiting: waiting {wait_time:.1f}s before next API call")
             time.sleep(wait_time)
         
-        self.last_request_time = time.time()
+        RATE_LIMIT_WAIT_SECONDS.observe(wait_time)
+        return wait_time
 
 # Global rate limiter instance
 api_rate_limiter = RateLimiter(min_interval=8.0)  # Safer: ~7-8 RPM to avoid rate limits
 
 # -------------------------
-# GenAI call wrapper (simplified and working)
+# LLM backends (see llm_providers.py)
 # -------------------------
-class GenAIClientWrapper:
-    """Simple wrapper for google.genai Client"""
-    def __init__(self, api_key: Optional[str], model: str = DEFAULT_MODEL):
-        self.api_key = api_key
-        self.model = model
-        
-        if genai_new is None:
-            raise RuntimeError("google-genai package not installed. Run: pip install google-genai")
-        
-        # Initialize client
-        self.client = genai_new.Client(api_key=api_key)
-        logger.info(f"✅ GenAI client initialized with model: {model}")
-
-    def generate(self, prompt: str, temperature: float = 0.2, max_output_tokens: int = 512) -> str:
-        """
-        Generate text using Gemini API with retry logic for rate limiting
-        """
-        max_retries = 2  # Reduced from 3 to 2
-        base_delay = 1  # Reduced from 2s to 1s
-        
-        for attempt in range(max_retries):
-            try:
-                # Call API with correct parameters for google-genai 1.52.0
-                response = self.client.models.generate_content(
-                    model=self.model,
-                    contents=prompt
-                )
-                
-                # Extract text from response
-                if hasattr(response, 'text') and response.text:
-                    return response.text.strip()
-                
-                # Try alternative extraction paths
-                if hasattr(response, 'candidates') and response.candidates:
-                    candidate = response.candidates[0]
-                    if hasattr(candidate, 'content'):
-                        if hasattr(candidate.content, 'parts'):
-                            parts = candidate.content.parts
-                            if parts and hasattr(parts[0], 'text'):
-                                return parts[0].text.strip()
-                
-                # If no text found
-                logger.error(f"⚠️  Response has no extractable text: {response}")
-                return "Maaf, tidak dapat menghasilkan jawaban. Silakan coba lagi."
-                
-            except Exception as e:
-                error_msg = str(e)
-                
-                # Handle 429 rate limit error
-                if "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg:
-                    if attempt < max_retries - 1:
-                        wait_time = base_delay * (2 ** attempt)  # Exponential backoff
-                        logger.warning(f"⚠️  Rate limit reached (429). Retrying in {wait_time}s... (Attempt {attempt+1}/{max_retries})")
-                        time.sleep(wait_time)
-                        continue
-                    else:
-                        logger.error(f"❌ Rate limit exceeded after {max_retries} attempts")
-                        return "Maaf, quota API Gemini sudah mencapai limit. Silakan tunggu 5-10 menit atau coba lagi besok. Untuk penggunaan intensif, pertimbangkan upgrade ke Gemini Paid Tier. 🙏"
-                
-                # Handle other errors
-                logger.error(f"❌ GenAI API call failed: {e}")
-                logger.debug(traceback.format_exc())
-                
-                if attempt < max_retries - 1:
-                    wait_time = base_delay
-                    logger.warning(f"⚠️  Retrying in {wait_time}s... (Attempt {attempt+1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    return f"Maaf, terjadi kesalahan teknis. Silakan coba lagi nanti. ({error_msg[:100]})"
-        
-        return "Maaf, tidak dapat menghasilkan jawaban setelah beberapa percobaan. Silakan coba lagi."
+# Kept under the old name so existing imports keep working
+GenAIClientWrapper = GeminiProvider
 
 # -------------------------
 # Health Checks
@@ -332,7 +298,9 @@ def build_retriever(pg_conn: Optional[str], embeddings_wrapper: Optional[SimpleE
     """Build PGVector retriever with comprehensive error handling.
     Returns None if setup fails (caller should fallback to local docs).
     """
-    if PGVector is None:
+    try:
+        from langchain_postgres import PGVector
+    except ImportError:
         logger.warning("⚠ PGVector not installed; using fallback mode")
         return None
     
@@ -362,9 +330,15 @@ def build_retriever(pg_conn: Optional[str], embeddings_wrapper: Optional[SimpleE
         logger.debug(traceback.format_exc())
         return None
 
+def _document_cls():
+    """Import langchain's Document on first use."""
+    from langchain_core.documents import Document
+    return Document
+
 def load_docs_from_embedding_file(path: pathlib.Path) -> List:
     if not path.exists():
         return []
+    Document = _document_cls()
     docs = []
     with open(path, "r", encoding="utf-8") as f:
         for ln in f:
@@ -375,21 +349,19 @@ def load_docs_from_embedding_file(path: pathlib.Path) -> List:
                 continue
     return docs
 
-def prepare_context_from_retrieved(retrieved_docs: List[Document]) -> str:
-    # join and trim
+def prepare_context_from_retrieved(retrieved_docs: List[Document], max_tokens: int = MAX_CONTEXT_TOKENS) -> str:
+    """Dedupe retrieved docs and fit them into the token budget (most relevant first)"""
     pieces = []
     for d in retrieved_docs:
         content = getattr(d, "page_content", None) or (d.get("page_content") if isinstance(d, dict) else "")
         if content:
-            pieces.append(content.strip())
-    ctx = "\n\n---\n\n".join(pieces)
-    if len(ctx) > MAX_CONTEXT_CHARS:
-        # trim by characters - keep last parts
-        ctx = ctx[-MAX_CONTEXT_CHARS:]
-    return ctx
-
-# PregniBot - Emotional AI with mood-aware responses  
-PROMPT_TEMPLATE = textwrap.dedent("""
+            pieces.append(content)
+    return build_context(pieces, max_tokens=max_tokens)
+
+# PregniBot - Emotional AI with mood-aware responses
+# Static instruction prefix: identical on every call, passed as prompt_prefix so the
+# provider can cache it (see GeminiProvider._get_cached_prefix). Only PROMPT_QUERY_TEMPLATE varies.
+PROMPT_PREFIX = textwrap.dedent("""
 Anda adalah PregniBot - sahabat virtual yang peduli dan empati untuk ibu hamil. Jawab dengan SIMPLE, HANGAT, dan NATURAL.
 
 BATASAN TOPIK - HANYA JAWAB PERTANYAAN SEPUTAR:
@@ -451,9 +423,9 @@ Hormon lagi naik turun drastis, plus ada kekhawatiran soal masa depan. Sekitar 1
 Kamu Kuat Kok
 
 Luangin waktu buat diri sendiri. Jalan-jalan ringan, dengerin musik, atau istirahat. Kalau sedih terus ada lebih dari 2 minggu, konsul ke dokter ya. Minta bantuan itu ga ada yang salah. Aku yakin kamu bisa lewatin ini.
+""").strip()
 
----
-
+PROMPT_QUERY_TEMPLATE = textwrap.dedent("""
 CONTEXT:
 {context}
 
@@ -463,199 +435,241 @@ PERTANYAAN:
 JAWABAN (simple, hangat, max 150 kata, NO asterisk atau simbol):
 """).strip()
 
+# Full single-string prompt (prefix + query part), kept for callers that send one prompt
+PROMPT_TEMPLATE = PROMPT_PREFIX + PROMPT_PREFIX_SEPARATOR + PROMPT_QUERY_TEMPLATE
+
+# Tagged on cache entries: editing either prompt part invalidates answers built with the old one
+PROMPT_HASH = hashlib.sha256(PROMPT_TEMPLATE.encode("utf-8")).hexdigest()[:12]
+
 # -------------------------
-# Main RAG function
+# Main RAG function (staged)
 # -------------------------
-def rag_answer(
-    question: str, 
-    retriever, 
-    genai_client: GenAIClientWrapper, 
-    local_docs: List[Document],
-    conversation_history: Optional[ConversationHistory] = None,
-    cache: Optional[SemanticCache] = None
-) -> str:
-    """Generate answer using RAG with conversation context and caching"""
-    start_time = time.time()
-    logger.info(f"📝 Processing question: {question[:100]}...")
-    
-    # 1. FALLBACK ANSWERS FIRST (zero API calls, zero tokens!)
-    if get_fallback_answer:
-        fallback = get_fallback_answer(question)
-        if fallback:
-            elapsed = time.time() - start_time
-            logger.info(f"💡 Fallback answer used! Response time: {elapsed:.2f}s (0 tokens)")
-            if conversation_history:
-                conversation_history.add_exchange(question, fallback)
-            return fallback
-    
-    # 2. Check cache second (but skip if cached answer is an error message)
-    if cache:
-        cached_result = cache.get(question)
-        if cached_result:
-            answer, similarity = cached_result
-            # Skip cache if it's an error message
-            if not answer.startswith("Maaf, quota") and not answer.startswith("ERROR"):
-                logger.info(f"⚡ Cache hit! Similarity: {similarity:.3f}")
-                return answer
-            else:
-                logger.info(f"⚠️ Skipping cached error message, will generate fresh answer")
-    
-    # Safety
-    block_reason = safety_check(question)
+REJECT_MESSAGE = "Maaf ya, aku cuma bisa bantu pertanyaan seputar kehamilan dan kesehatan ibu hamil. Ada yang mau ditanyain soal kehamilanmu?"
+
+@dataclass
+class RagState(PipelineState):
+    """State for one rag_answer call"""
+    retriever: Any = None
+    genai_client: Any = None
+    local_docs: List = field(default_factory=list)
+    conversation_history: Optional[ConversationHistory] = None
+    cache: Any = None
+    retrieved_docs: List = field(default_factory=list)
+    context: str = ""
+    query_embedding: Any = None
+    similarity: Optional[float] = None  # best semantic-cache score on a cache hit
+    outcome: Optional[str] = None  # fallback / cache / reject / safety / llm / error
+    start_time: float = field(default_factory=time.time)
+    defer_history: bool = False  # batch: exchange recorded in question order after the LLM pool joins
+    pending_exchange: Optional[Tuple[str, str]] = None
+
+def _stage_fallback(state: RagState) -> Optional[str]:
+    """FALLBACK ANSWERS FIRST (zero API calls, zero tokens!)"""
+    if not get_fallback_answer:
+        return None
+    fallback = get_fallback_answer(state.question)
+    if fallback:
+        elapsed = time.time() - state.start_time
+        logger.info(f"💡 Fallback answer used! Response time: {elapsed:.2f}s (0 tokens)")
+        if state.conversation_history:
+            state.conversation_history.add_exchange(state.question, fallback)
+        return fallback
+    return None
+
+def _stage_safety(state: RagState) -> Optional[str]:
+    block_reason = safety_check(state.question)
     if block_reason:
         logger.warning(f"🚫 Question blocked: {block_reason}")
         return f"[SAFETY BLOCK] {block_reason}"
+    return None
 
-    # Retrieve
-    ctx = ""
-    retrieved_docs = []
-    try:
-        if retriever is not None:
-            # retriever is Runnable-like, call invoke
-            try:
-                logger.debug("🔍 Querying vector database...")
-                retrieved = retriever.invoke(question)
-                # retriever.invoke may return Documents or RunOutputs — normalize:
-                for r in retrieved:
-                    # r might be Document or dict
-                    if hasattr(r, "page_content"):
-                        retrieved_docs.append(r)
-                    elif isinstance(r, dict):
-                        retrieved_docs.append(Document(page_content=r.get("page_content", ""), metadata=r.get("metadata", {})))
-                    else:
-                        # try attribute text
-                        txt = getattr(r, "text", None) or getattr(r, "page_content", None)
-                        if txt:
-                            retrieved_docs.append(Document(page_content=txt))
-                
-                logger.info(f"✅ Retrieved {len(retrieved_docs)} documents from database")
-                print(f"   Retrieved {len(retrieved_docs)} documents from DB", flush=True)
-                
-                if len(retrieved_docs) == 0:
-                    # fallback to local docs
-                    logger.warning("⚠️  No docs from DB, using local fallback")
-                    retrieved_docs = local_docs[:5]
-                    print(f"   Fallback to {len(retrieved_docs)} local docs", flush=True)
-            except TypeError:
-                # older behavior: retriever.get_relevant_documents(question)
-                try:
-                    retrieved_docs = retriever.get_relevant_documents(question)
-                except Exception:
-                    retrieved_docs = local_docs[:5]
-        else:
-            retrieved_docs = local_docs[:5]
-        ctx = prepare_context_from_retrieved(retrieved_docs)
-    except Exception as e:
-        logger.error(f"❌ Retrieval error: {e}")
-        logger.debug(traceback.format_exc())
-        # fallback
-        retrieved_docs = local_docs[:5]
-        ctx = prepare_context_from_retrieved(retrieved_docs)
-
-    # STRICT PRE-CHECK: HANYA pertanyaan seputar kehamilan
-    # Define comprehensive pregnancy/health keywords
-    pregnancy_keywords = [
-        'hamil', 'kehamilan', 'bumil', 'ibu hamil', 'pregnant', 'pregnancy',
-        'janin', 'bayi', 'fetus', 'baby', 'anak', 'trimester',
-        'mual', 'muntah', 'morning sickness', 'ngidam', 'eneg',
-        'kontraksi', 'persalinan', 'melahirkan', 'lahir', 'kelahiran', 'partus',
-        'nutrisi', 'makanan', 'gizi', 'makan', 'minum', 'diet',
-        'vitamin', 'suplemen', 'asam folat', 'zat besi', 'kalsium', 'protein',
-        'anemia', 'diabetes', 'gestasional', 'preeklamsia', 'hipertensi', 'darah tinggi',
-        'usg', 'periksa', 'kontrol', 'kandungan', 'dokter kandungan', 'bidan', 'obgyn',
-        'susu', 'asi', 'menyusui', 'laktasi', 'post partum', 'nifas',
-        'keguguran', 'prematur', 'caesar', 'sectio', 'normal', 'episiotomi',
-        'gerakan', 'tendangan', 'detak jantung', 'denyut',
-        'mood', 'emosi', 'depresi', 'cemas', 'stress', 'khawatir', 'takut', 'sedih',
-        'rahim', 'plasenta', 'tali pusat', 'air ketuban', 'serviks', 'vagina',
-        'kontrasepsi', 'kb', 'program hamil', 'promil', 'subur', 'ovulasi', 'menstruasi', 'haid',
-        'pasangan', 'suami', 'hubungan', 'intim', 'sex', 'berhubungan',
-        'capek', 'lelah', 'lemas', 'pusing', 'sakit kepala', 'pegal', 'nyeri', 'kram',
-        'varises', 'wasir', 'ambeien', 'sembelit', 'konstipasi', 'sesak', 'heartburn',
-        'bengkak', 'edema', 'stretch mark', 'jerawat', 'kulit', 'gatal',
-        'olahraga', 'senam', 'yoga', 'jalan', 'exercise',
-        'tidur', 'istirahat', 'posisi', 'bantal',
-        'perut', 'pinggang', 'punggung', 'payudara', 'puting',
-        'berat badan', 'bb', 'berat', 'ukuran',
-        'tes kehamilan', 'test pack', 'testpack', 'hpht', 'hpl', 'usia kandungan',
-        'pemeriksaan', 'lab', 'tes darah', 'urine', 'hasil lab'
-    ]
+def _stage_topic_gate(state: RagState) -> Optional[str]:
+    """STRICT PRE-CHECK: HANYA pertanyaan seputar kehamilan"""
+    # Keyword lists live in data/topic_keywords.json; matcher is compiled once per process
+    topic_matches = get_topic_matcher().match(state.question)
+    pregnancy_terms = topic_matches.get("pregnancy", [])
+    forbidden_terms = topic_matches.get("forbidden", [])
     
-    question_lower = question.lower()
+    # REJECT jika tidak ada kata pregnancy sama sekali.
+    # Prioritas: Jika ada pregnancy keyword, terima dulu (false positive lebih baik daripada false negative),
+    # forbidden terms hanya dicatat di log.
+    if not pregnancy_terms:
+        logger.info(f"❌ Question REJECTED: '{state.question}' (no_pregnancy_keyword, forbidden={forbidden_terms})")
+        if state.conversation_history:
+            state.conversation_history.add_exchange(state.question, REJECT_MESSAGE)
+        return REJECT_MESSAGE
     
-    # STRICT: Harus ada minimal 1 keyword kehamilan
-    has_pregnancy_keyword = any(keyword in question_lower for keyword in pregnancy_keywords)
-    
-    # List kata kunci yang PASTI bukan tentang kehamilan
-    forbidden_keywords = [
-        'presiden', 'politik', 'pemerintah', 'pemilu', 'pilkada', 'jokowi', 'prabowo',
-        'game', 'mobile legend', 'ml', 'pubg', 'free fire', 'ff', 'minecraft', 'valorant',
-        'sepak bola', 'bola', 'liga', 'piala dunia', 'piala', 'pertandingan', 'main bola',
-        'film', 'drama korea', 'drakor', 'netflix', 'movie', 'bioskop', 'anime',
-        'resep masakan', 'cara masak', 'cara membuat', 'tumis', 'goreng', 'rebus',
-        'agama', 'islam', 'kristen', 'katolik', 'hindu', 'buddha', 'warna', 'indonesia',
-        'music', 'lagu', 'penyanyi', 'band', 'konser',
-        'mobil', 'motor', 'kendaraan', 'transportasi', 'kereta',
-        'hp', 'handphone', 'laptop', 'komputer', 'gadget', 'smartphone',
-        'pelajaran', 'sekolah', 'ujian', 'kuliah', 'kampus', 'matematika',
-        'wisata', 'liburan', 'jalan-jalan', 'travelling', 'pantai', 'gunung',
-        'cuaca', 'hujan', 'panas', 'mendung', 'banjir'
-    ]
+    logger.info(f"✅ Question ACCEPTED (pregnancy-related): {state.question} (matched={pregnancy_terms})")
+    return None
+
+def _stage_cache(state: RagState) -> Optional[str]:
+    """Semantic cache lookup (skip if cached answer is an error message)"""
+    if state.cache is None:
+        return None
+    # An empty L1 with a shared backend still needs the vector (backend lookup), and
+    # encoding here means the cache write after generation reuses it instead of re-encoding
+    if len(state.cache) or getattr(state.cache, "backend", None) is not None:
+        with state.trace.span("embedding"):
+            state.query_embedding = state.cache.encode(state.question)
+    with state.trace.span("cache_lookup"):
+        cached_result = state.cache.get(state.question, query_embedding=state.query_embedding)
+    return _apply_cache_result(state, cached_result)
+
+def _apply_cache_result(state: RagState, cached_result) -> Optional[str]:
+    if cached_result:
+        answer, similarity = cached_result
+        if not is_error_answer(answer):
+            logger.info(f"⚡ Cache hit! Similarity: {similarity:.3f}")
+            state.similarity = similarity
+            return answer
+        logger.info(f"⚠️ Skipping cached error message, will generate fresh answer")
+    return None
+
+def _stage_cache_batch(states: List[RagState]) -> List[Optional[str]]:
+    """One batched encode for all questions, then one vectorized similarity lookup"""
+    cache = states[0].cache
+    if cache is None:
+        return [None] * len(states)
+    questions = [s.question for s in states]
     
-    has_forbidden = any(keyword in question_lower for keyword in forbidden_keywords)
+    # Encode even when the cache is empty: the misses reuse these rows for their cache writes
+    t0 = time.perf_counter()
+    embeddings = cache.encode_batch(questions)
+    elapsed = time.perf_counter() - t0
+    for i, state in enumerate(states):
+        state.query_embedding = embeddings[i]
+        state.trace.add("embedding", elapsed, started=t0)
     
-    # REJECT jika:
-    # 1. Tidak ada kata pregnancy sama sekali
-    # 2. Ada kata forbidden DAN tidak ada kata pregnancy yang kuat
-    # Prioritas: Jika ada pregnancy keyword, terima dulu (false positive lebih baik daripada false negative)
-    if not has_pregnancy_keyword:
-        reject_msg = "Maaf ya, aku cuma bisa bantu pertanyaan seputar kehamilan dan kesehatan ibu hamil. Ada yang mau ditanyain soal kehamilanmu?"
-        logger.info(f"❌ Question REJECTED: '{question}' (no_pregnancy_keyword)")
-        
-        if conversation_history:
-            conversation_history.add_exchange(question, reject_msg)
-        
-        return reject_msg
-    
-    # Jika ada pregnancy keyword, lanjutkan (abaikan forbidden check untuk mengurangi false negative)
+    t0 = time.perf_counter()
+    results = cache.get_batch(questions, query_embeddings=embeddings)
+    elapsed = time.perf_counter() - t0
+    for state in states:
+        state.trace.add("cache_lookup", elapsed, started=t0)
+    return [_apply_cache_result(s, r) for s, r in zip(states, results)]
+
+def _normalize_retrieved(retrieved) -> List:
+    """retriever.invoke may return Documents or RunOutputs — normalize to Documents"""
+    Document = _document_cls()
+    docs = []
+    for r in retrieved:
+        # r might be Document or dict
+        if hasattr(r, "page_content"):
+            docs.append(r)
+        elif isinstance(r, dict):
+            docs.append(Document(page_content=r.get("page_content", ""), metadata=r.get("metadata", {})))
+        else:
+            # try attribute text
+            txt = getattr(r, "text", None) or getattr(r, "page_content", None)
+            if txt:
+                docs.append(Document(page_content=txt))
+    return docs
+
+def _db_docs_or_local(retrieved_docs: List, local_docs: List) -> List:
+    logger.info(f"✅ Retrieved {len(retrieved_docs)} documents from database")
+    print(f"   Retrieved {len(retrieved_docs)} documents from DB", flush=True)
     
-    logger.info(f"✅ Question ACCEPTED (pregnancy-related): {question}")
+    if len(retrieved_docs) == 0:
+        # fallback to local docs
+        logger.warning("⚠️  No docs from DB, using local fallback")
+        retrieved_docs = local_docs[:5]
+        print(f"   Fallback to {len(retrieved_docs)} local docs", flush=True)
+    return retrieved_docs
+
+def _retrieve_docs(retriever, question: str, local_docs: List) -> List:
+    if retriever is None:
+        return local_docs[:5]
+    # retriever is Runnable-like, call invoke
+    try:
+        logger.debug("🔍 Querying vector database...")
+        retrieved_docs = _normalize_retrieved(retriever.invoke(question))
+    except TypeError:
+        # older behavior: retriever.get_relevant_documents(question)
+        try:
+            return retriever.get_relevant_documents(question)
+        except Exception:
+            return local_docs[:5]
+    return _db_docs_or_local(retrieved_docs, local_docs)
+
+def _apply_retrieved(state: RagState, retrieved_docs: List):
+    state.retrieved_docs = retrieved_docs
+    state.context = prepare_context_from_retrieved(retrieved_docs)
+
+def _stage_retrieval(state: RagState) -> Optional[str]:
+    """Retrieve context documents; never answers by itself"""
+    try:
+        retrieved_docs = _retrieve_docs(state.retriever, state.question, state.local_docs)
+    except Exception as e:
+        logger.error(f"❌ Retrieval error: {e}")
+        logger.debug(traceback.format_exc())
+        # fallback
+        retrieved_docs = state.local_docs[:5]
+    _apply_retrieved(state, retrieved_docs)
+    return None
+
+def _stage_retrieval_batch(states: List[RagState]) -> List[Optional[str]]:
+    """All questions through retriever.batch() in one call; per-question fallback on failure"""
+    batch = getattr(states[0].retriever, "batch", None)
+    if batch is None or len(states) == 1:
+        return [_stage_retrieval(s) for s in states]
+    try:
+        logger.debug(f"🔍 Querying vector database for {len(states)} questions...")
+        results = batch([s.question for s in states])
+    except Exception as e:
+        logger.warning(f"⚠️  Batched retrieval failed ({e}), retrying per question")
+        return [_stage_retrieval(s) for s in states]
+    for state, retrieved in zip(states, results):
+        _apply_retrieved(state, _db_docs_or_local(_normalize_retrieved(retrieved), state.local_docs))
+    return [None] * len(states)
+
+def _stage_generate(state: RagState) -> Optional[str]:
+    """Build prompt, call the LLM, post-process and cache. Always answers."""
+    question = state.question
+    trace = state.trace
     
     # SKIP conversation history to save tokens (free tier optimization)
-    # history_context = ""
-    # if conversation_history and conversation_history.history:
-    #     history_context = conversation_history.get_context()
-    #     logger.debug(f"Added conversation history ({len(conversation_history.history)} exchanges)")
-    
     # Build prompt with context only (no history to save tokens)
-    full_context = (ctx or "Tidak ada konteks relevan.")
-    prompt_text = PROMPT_TEMPLATE.format(context=full_context, question=question)
+    with trace.span("prompt_build"):
+        full_context = (state.context or "Tidak ada konteks relevan.")
+        prompt_text = PROMPT_QUERY_TEMPLATE.format(context=full_context, question=question)
 
     # Call genai
     try:
         # Wait if needed to respect rate limits (auto-delay)
-        api_rate_limiter.wait_if_needed()
+        with trace.span("rate_limit_wait"):
+            api_rate_limiter.wait_if_needed()
         
         logger.debug("🤖 Generating answer with LLM...")
         # Ultra-optimized tokens for FREE tier efficiency (hemat 50%+ token)
-        answer = genai_client.generate(prompt_text, temperature=0.3, max_output_tokens=400)
+        with trace.span("llm_call"):
+            answer = state.genai_client.generate(
+                prompt_text, temperature=0.3, max_output_tokens=400, prompt_prefix=PROMPT_PREFIX
+            )
         
         # Post-processing: Remove ALL asterisks (single *, double **, triple ***, etc)
-        import re
-        answer = re.sub(r'\*+', '', answer)  # Remove all asterisk patterns
-        answer = answer.replace('•', '-')  # Replace bullets with dash
+        with trace.span("post_process"):
+            answer = re.sub(r'\*+', '', answer)  # Remove all asterisk patterns
+            answer = answer.replace('•', '-')  # Replace bullets with dash
         
         # Calculate response time
-        elapsed_time = time.time() - start_time
+        elapsed_time = time.time() - state.start_time
         logger.info(f"✅ Answer generated in {elapsed_time:.2f}s")
         
         # Add to conversation history
-        if conversation_history:
-            conversation_history.add_exchange(question, answer)
+        if state.conversation_history:
+            if state.defer_history:
+                state.pending_exchange = (question, answer)
+            else:
+                state.conversation_history.add_exchange(question, answer)
         
         # Cache the answer ONLY if it's not an error message
-        if cache and not answer.startswith("Maaf, sistem sedang sibuk") and not answer.startswith("ERROR"):
-            cache.set(question, answer, response_time=elapsed_time)
+        if is_error_answer(answer):
+            state.outcome = "error"
+        elif state.cache is not None:
+            with trace.span("cache_write"):
+                state.cache.set(
+                    question, answer, response_time=elapsed_time,
+                    query_embedding=state.query_embedding, meta=_cache_meta(state),
+                )
             logger.debug(f"💾 Answer cached")
         
         return answer
@@ -663,8 +677,220 @@ def rag_answer(
         # Log detailed error
         logger.error(f"❗ LLM generation failed: {e}")
         logger.debug(traceback.format_exc())
+        state.outcome = "error"
         return f"ERROR: Gagal menghasilkan jawaban. Detail: {str(e)[:100]}"
 
+def _stage_generate_batch(states: List[RagState]) -> List[Optional[str]]:
+    """Concurrent LLM calls; api_rate_limiter still spaces their start times"""
+    def generate(state: RagState) -> Optional[str]:
+        answer = _stage_generate(state)
+        state.answered_at = time.perf_counter()  # per-question latency, not batch end
+        return answer
+    
+    if len(states) == 1:
+        return [generate(states[0])]
+    for state in states:
+        state.defer_history = True
+    with ThreadPoolExecutor(max_workers=max(1, min(LLM_BATCH_CONCURRENCY, len(states)))) as pool:
+        answers = list(pool.map(generate, states))
+    # History is written here, after the pool, so exchanges keep the question order
+    for state in states:
+        if state.pending_exchange:
+            state.conversation_history.add_exchange(*state.pending_exchange)
+    return answers
+
+# Zero-cost string gates run before the cache encode, retrieval and LLM stages
+RAG_PIPELINE = StagedPipeline([
+    Stage("fallback", COST_FREE, _stage_fallback, span="fallback"),
+    Stage("safety", COST_FREE, _stage_safety, span="gating"),
+    Stage("topic_gate", COST_FREE, _stage_topic_gate, span="gating"),
+    Stage("cache", COST_ENCODE, _stage_cache, run_batch=_stage_cache_batch),
+    Stage("retrieval", COST_IO, _stage_retrieval, span="retrieval", run_batch=_stage_retrieval_batch),
+    Stage("generate", COST_LLM, _stage_generate, run_batch=_stage_generate_batch),
+])
+
+@dataclass
+class RagResult:
+    """Structured outcome of one rag_answer call"""
+    answer: str
+    tier: str                            # fallback / cache / llm / reject / safety / error
+    similarity: Optional[float] = None   # cache-hit similarity
+    doc_ids: List[str] = field(default_factory=list)  # retrieved docs that built the context
+    sources_count: int = 0               # retrieved docs (including ones without a doc_id)
+    timings: Dict[str, float] = field(default_factory=dict)  # span name -> seconds
+    latency: float = 0.0                 # trace start -> answer produced (per question in a batch)
+    request_id: Optional[str] = None
+
+    @property
+    def cached(self) -> bool:
+        return self.tier == "cache"
+
+    def __str__(self) -> str:
+        return self.answer
+
+def _doc_id(doc) -> Optional[str]:
+    metadata = getattr(doc, "metadata", None)
+    if metadata is None and isinstance(doc, dict):
+        metadata = doc.get("metadata")
+    doc_id = (metadata or {}).get("doc_id")
+    return str(doc_id) if doc_id is not None else None
+
+def _doc_ids(docs) -> List[str]:
+    # Several chunks can share one doc_id; keep first-seen (relevance) order
+    return list(dict.fromkeys(d for d in map(_doc_id, docs) if d is not None))
+
+def _cache_meta(state: RagState) -> Dict:
+    """Dependency tags for a cached answer (see reconcile_cache)"""
+    return {
+        "corpus_version": current_corpus_version(),
+        "prompt_hash": PROMPT_HASH,
+        "model": getattr(state.genai_client, "model", None),
+        "doc_ids": _doc_ids(state.retrieved_docs),
+    }
+
+def reconcile_cache(cache, model: Optional[str] = None) -> Dict[str, int]:
+    """
+    Targeted invalidation after a prompt edit, model switch or re-ingest:
+    only entries tagged with another prompt/model, or built on docs that changed
+    since their corpus version, are dropped. Each step is an index lookup.
+    """
+    removed = {"stale_tags": 0, "changed_docs": 0}
+    if cache is None:
+        return removed
+    removed["stale_tags"] = cache.invalidate_stale(prompt_hash=PROMPT_HASH, model=model)
+    current = current_corpus_version()
+    for version in cache.tag_values("corpus_version"):
+        if version == current:
+            continue
+        changed = changed_since(version)
+        if changed is None:
+            # Version fell out of the manifest history: nothing to diff against
+            removed["changed_docs"] += cache.invalidate_tag("corpus_version", version)
+        elif changed:
+            removed["changed_docs"] += cache.invalidate_docs(changed, corpus_version=version)
+    if any(removed.values()):
+        logger.info(f"🧹 Cache reconciled: {removed['stale_tags']} stale prompt/model, "
+                    f"{removed['changed_docs']} changed-doc entries dropped")
+    return removed
+
+# Stage that produced the answer -> request outcome (generate may override with "error")
+STAGE_OUTCOMES = {
+    "fallback": "fallback",
+    "safety": "safety",
+    "topic_gate": "reject",
+    "cache": "cache",
+    "generate": "llm",
+}
+
+def rag_answer(
+    question: str, 
+    retriever, 
+    genai_client: LLMProvider, 
+    local_docs: List[Document],
+    conversation_history: Optional[ConversationHistory] = None,
+    cache: Optional[SemanticCache] = None,
+    trace: Optional[RequestTrace] = None,
+) -> RagResult:
+    """
+    Generate answer using RAG with conversation context and caching.
+    Returns a RagResult (answer, tier, similarity, doc ids, span timings) so callers
+    never need a second cache lookup to learn how the question was answered.
+    
+    Args:
+        trace: Optional RequestTrace to collect per-stage spans into. The caller owns it
+            and must call trace.finish(); without one, a trace is created and finished here.
+    """
+    logger.info(f"📝 Processing question: {question[:100]}...")
+    owns_trace = trace is None
+    if owns_trace:
+        trace = RequestTrace()
+    state = RagState(
+        question=question,
+        retriever=retriever,
+        genai_client=genai_client,
+        local_docs=local_docs,
+        conversation_history=conversation_history,
+        cache=cache,
+        trace=trace,
+    )
+    try:
+        RAG_PIPELINE.run(state)
+    except Exception:
+        RAG_REQUESTS.labels("error").inc()
+        if owns_trace:
+            trace.finish()
+        raise
+    if owns_trace:
+        trace.finish()
+    return _result_from_state(state)
+
+def rag_answer_batch(
+    questions: List[str],
+    retriever,
+    genai_client: LLMProvider,
+    local_docs: List[Document],
+    conversation_history: Optional[ConversationHistory] = None,
+    cache: Optional[SemanticCache] = None,
+    traces: Optional[List[RequestTrace]] = None,
+) -> List[RagResult]:
+    """
+    Answer several questions in one pass: string gates per question, one batched
+    cache encode + lookup for everything left, one retriever.batch() call for the
+    misses, then concurrent LLM calls. Results are aligned with `questions`.
+    
+    Args:
+        traces: Optional RequestTrace per question (caller finishes them); created
+            and finished here when omitted.
+    """
+    logger.info(f"📝 Processing batch of {len(questions)} questions")
+    for question in questions:
+        # Same per-question line as rag_answer, so cache_warmup also counts batch traffic
+        logger.info(f"📝 Processing question: {question[:100]}...")
+    owns_traces = traces is None
+    if owns_traces:
+        traces = [RequestTrace() for _ in questions]
+    states = [
+        RagState(
+            question=q,
+            retriever=retriever,
+            genai_client=genai_client,
+            local_docs=local_docs,
+            conversation_history=conversation_history,
+            cache=cache,
+            trace=t,
+        )
+        for q, t in zip(questions, traces)
+    ]
+    try:
+        RAG_PIPELINE.run_batch(states)
+    except Exception:
+        RAG_REQUESTS.labels("error").inc(len(states))
+        if owns_traces:
+            for t in traces:
+                t.finish()
+        raise
+    if owns_traces:
+        for t in traces:
+            t.finish()
+    return [_result_from_state(s) for s in states]
+
+def _result_from_state(state: RagState) -> RagResult:
+    """Record the outcome metric and package the state for callers"""
+    trace = state.trace
+    state.outcome = state.outcome or STAGE_OUTCOMES.get(state.stopped_at, "error")
+    RAG_REQUESTS.labels(state.outcome).inc()
+    logger.info(f"⏱️  Answered by '{state.stopped_at}' stage [{trace.request_id}] {trace.summary()}")
+    return RagResult(
+        answer=state.answer,
+        tier=state.outcome,
+        similarity=state.similarity,
+        doc_ids=_doc_ids(state.retrieved_docs),
+        sources_count=len(state.retrieved_docs),
+        timings=trace.durations(),
+        latency=(state.answered_at or time.perf_counter()) - trace.start,
+        request_id=trace.request_id,
+    )
+
 # -------------------------
 # Chat / CLI helper
 # -------------------------
@@ -674,8 +900,7 @@ def interactive_chat(retriever, genai_client, local_docs, cache=None):
     print("Ketik 'help' untuk bantuan")
     print("Ketik 'clear' untuk reset percakapan")
     print("Ketik 'history' untuk lihat riwayat chat")
-    if cache:
-        print("Ketik 'stats' untuk lihat cache statistics")
+    print("Ketik 'stats' untuk lihat cache & pipeline statistics")
     print()
     
     # Initialize conversation history
@@ -713,22 +938,50 @@ def interactive_chat(retriever, genai_client, local_docs, cache=None):
                 print("📭 Belum ada riwayat percakapan")
             continue
         
-        if q.lower() == "stats" and cache:
-            cache.print_stats()
+        if q.lower() == "stats":
+            if cache is not None:
+                cache.print_stats()
+            RAG_PIPELINE.print_stats()
             continue
         
         if not q:
             continue
         
         print("🔎 Mencari di knowledge base...")
-        ans = rag_answer(q, retriever, genai_client, local_docs, conv_history, cache)
+        result = rag_answer(q, retriever, genai_client, local_docs, conv_history, cache)
         print("\n💡 Jawaban:")
-        print(ans)
+        print(result.answer)
 
 # -------------------------
 # Run pipeline orchestration
 # -------------------------
+def build_retriever_from_env():
+    """PGVector retriever from DB_* env vars, or None (callers fall back to local docs)"""
+    # Build embeddings wrapper (only if needed)
+    embeddings_wrapper = None
+    try:
+        embeddings_wrapper = SimpleEmbeddingsWrapper()
+    except Exception:
+        embeddings_wrapper = None
+
+    # Build PG retriever
+    pg_conn = None
+    if os.getenv("DB_USER"):
+        try:
+            pg_conn = PG_CONN_TEMPLATE.format(
+                user=os.getenv("DB_USER"),
+                password=os.getenv("DB_PASSWORD"),
+                host=os.getenv("DB_HOST"),
+                port=os.getenv("DB_PORT", "5432"),
+                dbname=os.getenv("DB_NAME"),
+            )
+        except Exception:
+            pg_conn = None
+    return build_retriever(pg_conn, embeddings_wrapper) if embeddings_wrapper else None
+
 def run_pipeline(interactive=True, use_cache=True):
+    setup_logging()
+    load_env()
     print("🚀 Memulai PregCare RAG pipeline...")
 
     # Load embeddings file docs (fallback local docs)
@@ -748,7 +1001,8 @@ def run_pipeline(interactive=True, use_cache=True):
                 similarity_threshold=0.85,
                 max_cache_size=100,
                 ttl_hours=24,
-                cache_file=cache_file
+                cache_file=cache_file,
+                threshold_policy=load_threshold_policy(),
             )
             logger.info("💾 Semantic cache initialized")
             print("💾 Semantic cache enabled (threshold: 0.85)")
@@ -756,40 +1010,25 @@ def run_pipeline(interactive=True, use_cache=True):
             logger.warning(f"⚠️  Cache initialization failed: {e}")
             cache = None
 
-    # Build embeddings wrapper (only if needed)
-    embeddings_wrapper = None
-    try:
-        embeddings_wrapper = SimpleEmbeddingsWrapper()
-    except Exception:
-        embeddings_wrapper = None
+    retriever = build_retriever_from_env()
 
-    # Build PG retriever
-    pg_conn = None
-    if os.getenv("DB_USER"):
-        try:
-            pg_conn = PG_CONN_TEMPLATE.format(
-                user=os.getenv("DB_USER"),
-                password=os.getenv("DB_PASSWORD"),
-                host=os.getenv("DB_HOST"),
-                port=os.getenv("DB_PORT", "5432"),
-                dbname=os.getenv("DB_NAME"),
-            )
-        except Exception:
-            pg_conn = None
-    retriever = build_retriever(pg_conn, embeddings_wrapper) if embeddings_wrapper else None
-
-    # Create GenAI client wrapper
-    if not GOOGLE_API_KEY:
+    # Create LLM client (LLM_PROVIDER=stub runs fully offline)
+    google_api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GENAI_API_KEY") or os.getenv("API_KEY")
+    model_name = os.getenv("GENAI_MODEL") or os.getenv("MODEL_NAME") or DEFAULT_MODEL
+    provider = os.getenv("LLM_PROVIDER", "gemini").lower()
+    if provider == "gemini" and not google_api_key:
         print("[WARNING] GOOGLE_API_KEY not set in environment. Set GOOGLE_API_KEY in .env or env vars.")
         return
 
     genai_client = None
     try:
-        genai_client = GenAIClientWrapper(api_key=GOOGLE_API_KEY, model=os.getenv("GENAI_MODEL", DEFAULT_MODEL))
+        genai_client = create_llm_provider(provider, api_key=google_api_key, model=model_name)
     except Exception as e:
         print("[ERROR] Failed to init GenAI client:", str(e))
         return
 
+    reconcile_cache(cache, model=getattr(genai_client, "model", None))
+
     # Quick smoke test (optional) - skip to avoid billing / quota
     logger.info(f"[SUCCESS] Setup complete. Local docs: {len(local_docs)}")
     print("[SUCCESS] Setup complete. Local docs:", len(local_docs))
@@ -802,7 +1041,7 @@ def run_pipeline(interactive=True, use_cache=True):
         conv_history = ConversationHistory()
         
         # Pre-populate cache with fallback answers to avoid API calls
-        if cache and add_fallback_to_cache:
+        if cache is not None and add_fallback_to_cache:
             logger.info("💾 Pre-populating cache with common Q&A...")
             add_fallback_to_cache(cache)
             logger.info(f"✅ Cache initialized with fallback answers")
@@ -814,12 +1053,13 @@ def run_pipeline(interactive=True, use_cache=True):
         ]
         for q in tests:
             print(f"\n❓ {q}")
-            ans = rag_answer(q, retriever, genai_client, local_docs, conv_history, cache)
-            print("💡", ans)
+            result = rag_answer(q, retriever, genai_client, local_docs, conv_history, cache)
+            print(f"💡 [{result.tier}]", result.answer)
         
-        # Print cache stats at end
-        if cache:
+        # Print cache + stage stats at end
+        if cache is not None:
             cache.print_stats()
+        RAG_PIPELINE.print_stats()
 
 # -------------------------
 # Entry point
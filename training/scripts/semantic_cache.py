@@ -1,21 +1,24 @@
 """
 Semantic Caching untuk RAG Pipeline
-Menyimpan jawaban berdasarkan similarity pertanyaan untuk mengurangi LLM calls
+Menyimpan jawaban berdasarkan similarity pertanyaan untuk mengurangi LLM calls.
+Dengan `backend` (lihat cache_backends.py) cache ini menjadi L1 kecil in-process
+di depan storage bersama (pgvector), sehingga semua instance API berbagi hit.
 """
 import hashlib
 import json
+import threading
 import time
-from typing import Optional, Dict, Tuple
+from typing import Optional, Dict, List, Sequence, Set, Tuple
 from datetime import datetime, timedelta
 import pathlib
 
-try:
-    from sentence_transformers import SentenceTransformer, util
-    import numpy as np
-except ImportError:
-    SentenceTransformer = None
-    util = None
-    np = None
+# sentence-transformers (and torch behind it) is imported in SemanticCache.__init__,
+# not at module import, so importing this module stays cheap.
+
+# Entry tags with a reverse index, for targeted invalidation (see invalidate_stale)
+TAG_FIELDS = ("corpus_version", "prompt_hash", "model")
+
+BACKEND_PURGE_INTERVAL = 600.0  # seconds between TTL purges of the shared backend
 
 
 class SemanticCache:
@@ -30,28 +33,53 @@ class SemanticCache:
         similarity_threshold: float = 0.90,  # Lowered from 0.85 to 0.90 for AGGRESSIVE caching
         max_cache_size: int = 100,
         ttl_hours: int = 24,
-        cache_file: Optional[pathlib.Path] = None
+        cache_file: Optional[pathlib.Path] = None,
+        backend=None,
+        l1_ttl_seconds: float = 300.0,
+        threshold_policy=None,
     ):
         """
         Args:
             model_name: Model untuk encode pertanyaan
             similarity_threshold: Threshold untuk match (0-1) - LOWER = more cache hits
-            max_cache_size: Maximum entries di cache
+            max_cache_size: Maximum entries di cache (L1 size when a backend is set)
             ttl_hours: Time-to-live untuk cache entries (jam)
             cache_file: File untuk persist cache (optional)
+            backend: Shared CacheBackend (optional); ttl_hours then applies to the backend
+            l1_ttl_seconds: With a backend, how long an entry stays in the local L1
+                (bounds staleness after another node invalidates it)
+            threshold_policy: Per-topic thresholds (cache_thresholds.ThresholdPolicy);
+                similarity_threshold stays the fallback for uncalibrated topics
         """
-        if SentenceTransformer is None:
+        try:
+            from sentence_transformers import SentenceTransformer, util
+        except ImportError:
             raise ImportError("sentence-transformers required for semantic caching")
         
         self.model = SentenceTransformer(model_name)
+        self._cos_sim = util.cos_sim
         self.similarity_threshold = similarity_threshold
+        self.threshold_policy = threshold_policy
         self.max_cache_size = max_cache_size
         self.ttl = timedelta(hours=ttl_hours)
         self.cache_file = cache_file
         
+        # Shared L2 storage; this object's own dicts act as the L1 in front of it
+        self.backend = backend
+        self.backend_ttl = self.ttl
+        self._last_backend_purge = 0.0
+        if backend is not None:
+            self.ttl = min(self.ttl, timedelta(seconds=l1_ttl_seconds))
+            backend.ensure_schema(self.model.get_sentence_embedding_dimension())
+        
         # Cache storage: {query_hash: {data}}
         self.cache: Dict[str, Dict] = {}
         self.query_embeddings = []  # List of (hash, embedding, timestamp)
+        self._write_lock = threading.RLock()  # set() may run from concurrent LLM workers (batch chat)
+        
+        # Reverse indexes over entry meta: invalidation touches only affected hashes
+        self._doc_index: Dict[str, Set[str]] = {}              # doc_id -> hashes
+        self._tag_index: Dict[Tuple[str, str], Set[str]] = {}  # (field, value) -> hashes
         
         # Statistics
         self.stats = {
@@ -59,40 +87,108 @@ class SemanticCache:
             "misses": 0,
             "total_queries": 0,
             "cache_size": 0,
-            "total_saved_time": 0.0  # estimated seconds saved
+            "total_saved_time": 0.0,  # estimated seconds saved
+            "backend_hits": 0,        # L1 misses answered by the shared backend
         }
         
         # Load cache from file if exists
         if cache_file and cache_file.exists():
             self._load_from_file()
     
+    def __len__(self) -> int:
+        return len(self.cache)
+    
+    def approx_bytes(self) -> int:
+        """Rough memory footprint of cached text plus query embeddings"""
+        total = 0
+        for entry in self.cache.values():
+            total += len(entry["original_query"].encode("utf-8")) + len(entry["answer"].encode("utf-8"))
+        for _, emb, _ in self.query_embeddings:
+            if hasattr(emb, "element_size"):  # torch tensor
+                total += emb.element_size() * emb.nelement()
+            else:
+                total += getattr(emb, "nbytes", 0)
+        return total
+    
+    def encode(self, query: str):
+        """Encode query to embedding (reusable for get() and set())"""
+        return self.model.encode(query, convert_to_tensor=True)
+    
+    def encode_batch(self, queries: List[str]):
+        """Encode many queries in one model call; row i belongs to queries[i]"""
+        return self.model.encode(list(queries), convert_to_tensor=True)
+    
     def _hash_query(self, query: str) -> str:
         """Generate hash untuk query"""
         return hashlib.md5(query.lower().strip().encode()).hexdigest()
     
+    def threshold_for(self, query: str) -> float:
+        """Similarity a match for this query needs (per-topic if calibrated)"""
+        if self.threshold_policy is None:
+            return self.similarity_threshold
+        return self.threshold_policy.threshold_for(query, self.similarity_threshold)
+    
     def _is_expired(self, timestamp: datetime) -> bool:
         """Check if cache entry is expired"""
         return datetime.now() - timestamp > self.ttl
     
+    def _index_add(self, query_hash: str, meta: Dict):
+        for doc_id in meta.get("doc_ids", ()):
+            self._doc_index.setdefault(doc_id, set()).add(query_hash)
+        for name in TAG_FIELDS:
+            if meta.get(name) is not None:
+                self._tag_index.setdefault((name, str(meta[name])), set()).add(query_hash)
+    
+    def _index_discard(self, query_hash: str, meta: Dict):
+        for doc_id in meta.get("doc_ids", ()):
+            hashes = self._doc_index.get(doc_id)
+            if hashes is not None:
+                hashes.discard(query_hash)
+                if not hashes:
+                    del self._doc_index[doc_id]
+        for name in TAG_FIELDS:
+            key = (name, str(meta.get(name)))
+            hashes = self._tag_index.get(key)
+            if hashes is not None:
+                hashes.discard(query_hash)
+                if not hashes:
+                    del self._tag_index[key]
+    
+    def _remove_hashes(self, hashes: Set[str]) -> int:
+        """Drop entries, their embeddings and index postings (caller persists)"""
+        hashes = {h for h in hashes if h in self.cache}
+        if not hashes:
+            return 0
+        for h in hashes:
+            self._index_discard(h, self.cache.pop(h).get("meta", {}))
+        self.query_embeddings = [e for e in self.query_embeddings if e[0] not in hashes]
+        self.stats["cache_size"] = len(self.cache)
+        return len(hashes)
+    
     def _evict_expired(self):
         """Remove expired entries"""
-        expired_hashes = []
-        current_time = datetime.now()
-        
-        for query_hash, entry in self.cache.items():
-            if self._is_expired(entry["timestamp"]):
-                expired_hashes.append(query_hash)
-        
-        for h in expired_hashes:
-            del self.cache[h]
-            # Remove from embeddings list
-            self.query_embeddings = [
-                (qh, emb, ts) for qh, emb, ts in self.query_embeddings 
-                if qh != h
-            ]
+        expired_hashes = [
+            query_hash for query_hash, entry in self.cache.items()
+            if self._is_expired(entry["timestamp"])
+        ]
+        with self._write_lock:
+            self._remove_hashes(set(expired_hashes))
         
         if expired_hashes:
             print(f"   [EVICT] Evicted {len(expired_hashes)} expired cache entries")
+        
+        # Lookups already filter on the indexed timestamp; this only reclaims space
+        if self.backend is not None and time.monotonic() - self._last_backend_purge > BACKEND_PURGE_INTERVAL:
+            self._last_backend_purge = time.monotonic()
+            self._backend_call("purge_expired", self.backend_ttl)
+    
+    def _backend_call(self, method: str, *args, default=None):
+        """Shared cache is best-effort: a backend outage degrades to L1-only, never fails a request"""
+        try:
+            return getattr(self.backend, method)(*args)
+        except Exception as e:
+            print(f"[WARNING] Cache backend {method} failed: {e}")
+            return default
     
     def _evict_oldest(self):
         """Remove oldest entry when cache is full"""
@@ -102,17 +198,23 @@ class SemanticCache:
                 self.cache.keys(), 
                 key=lambda h: self.cache[h]["timestamp"]
             )
-            del self.cache[oldest_hash]
-            self.query_embeddings = [
-                (qh, emb, ts) for qh, emb, ts in self.query_embeddings 
-                if qh != oldest_hash
-            ]
+            self._remove_hashes({oldest_hash})
     
-    def get(self, query: str) -> Optional[Tuple[str, float]]:
+    def get(self, query: str, query_embedding=None) -> Optional[Tuple[str, float]]:
         """
         Get cached answer for query if exists and similar enough.
+        
+        Args:
+            query_embedding: Precomputed embedding from encode() (skips re-encoding)
         Returns: (answer, similarity_score) or None
         """
+        if self.backend is not None:
+            # L1 + one backend round trip share the batch path
+            if query_embedding is None:
+                query_embedding = self.encode(query)
+            import torch  # already loaded by sentence-transformers
+            return self.get_batch([query], query_embeddings=torch.stack([query_embedding]))[0]
+        
         self.stats["total_queries"] += 1
         
         # Clean expired entries periodically
@@ -125,7 +227,8 @@ class SemanticCache:
             return None
         
         # Encode query
-        query_embedding = self.model.encode(query, convert_to_tensor=True)
+        if query_embedding is None:
+            query_embedding = self.encode(query)
         
         # Find most similar cached query
         best_match = None
@@ -135,27 +238,112 @@ class SemanticCache:
             if self._is_expired(timestamp):
                 continue
             
-            similarity = util.cos_sim(query_embedding, cached_emb).item()
+            similarity = self._cos_sim(query_embedding, cached_emb).item()
             
             if similarity > best_score:
                 best_score = similarity
                 best_match = query_hash
         
         # Check if similarity above threshold
-        if best_match and best_score >= self.similarity_threshold:
-            self.stats["hits"] += 1
-            self.stats["total_saved_time"] += 3.0  # Estimate 3s saved per cache hit
-            
-            cached_data = self.cache[best_match]
-            print(f"   [CACHE HIT] (similarity: {best_score:.3f})")
-            print(f"      Matched: '{cached_data['original_query'][:50]}...'")
-            
-            return (cached_data["answer"], best_score)
+        if best_match and best_score >= self.threshold_for(query):
+            return self._hit(self.cache[best_match], best_score)
         else:
             self.stats["misses"] += 1
             return None
     
-    def set(self, query: str, answer: str, response_time: float = 0.0):
+    def _hit(self, cached_data: Dict, score: float) -> Tuple[str, float]:
+        self.stats["hits"] += 1
+        self.stats["total_saved_time"] += 3.0  # Estimate 3s saved per cache hit
+        
+        print(f"   [CACHE HIT] (similarity: {score:.3f})")
+        print(f"      Matched: '{cached_data['original_query'][:50]}...'")
+        
+        return (cached_data["answer"], score)
+    
+    def get_batch(
+        self, queries: List[str], query_embeddings=None, record_stats: bool = True
+    ) -> List[Optional[Tuple[str, float]]]:
+        """
+        Vectorized get() for many queries: one (queries x entries) similarity
+        matrix instead of a Python loop per query and cached entry.
+        
+        Args:
+            query_embeddings: Precomputed rows from encode_batch() (skips re-encoding)
+            record_stats: False for offline coverage checks (warmup) that are not real traffic
+        Returns: list aligned with queries of (answer, similarity_score) or None
+        """
+        if not queries:
+            return []
+        if record_stats:
+            self.stats["total_queries"] += len(queries)
+        self._evict_expired()
+        
+        live = [(h, emb) for h, emb, ts in self.query_embeddings if h in self.cache]
+        if not live and self.backend is None:
+            if record_stats:
+                self.stats["misses"] += len(queries)
+            return [None] * len(queries)
+        
+        if query_embeddings is None:
+            query_embeddings = self.encode_batch(queries)
+        
+        import torch  # already loaded by sentence-transformers
+        thresholds = [self.threshold_for(q) for q in queries]
+        matches: List[Optional[Tuple[Dict, float]]] = [None] * len(queries)
+        if live:
+            scores = self._cos_sim(query_embeddings, torch.stack([emb for _, emb in live]))
+            best_scores, best_idx = scores.max(dim=1)
+            for i, (score, idx) in enumerate(zip(best_scores.tolist(), best_idx.tolist())):
+                if score >= thresholds[i]:
+                    matches[i] = (self.cache[live[idx][0]], score)
+        
+        if self.backend is not None:
+            missing = [i for i, m in enumerate(matches) if m is None]
+            if missing:
+                rows = self._backend_call(
+                    "lookup", [query_embeddings[i] for i in missing], self.backend_ttl,
+                    default=[None] * len(missing),
+                )
+                for i, row in zip(missing, rows):
+                    if row is not None and row["similarity"] >= thresholds[i]:
+                        matches[i] = (self._promote(row, torch), row["similarity"])
+                        if record_stats:
+                            self.stats["backend_hits"] += 1
+        
+        results: List[Optional[Tuple[str, float]]] = []
+        for match in matches:
+            if match is None:
+                if record_stats:
+                    self.stats["misses"] += 1
+                results.append(None)
+            elif record_stats:
+                results.append(self._hit(*match))
+            else:
+                results.append((match[0]["answer"], match[1]))
+        return results
+    
+    def _promote(self, row: Dict, torch) -> Dict:
+        """Copy a backend hit into the L1 (no write-back); returns the entry"""
+        embedding = torch.tensor(row["embedding"], dtype=torch.float32)
+        with self._write_lock:
+            self._insert(row["query_hash"], row["original_query"], row["answer"],
+                         row["response_time"], embedding, row["meta"])
+        return self.cache.get(row["query_hash"]) or {
+            "original_query": row["original_query"], "answer": row["answer"]
+        }
+    
+    def _backend_row(self, query_hash: str, query_embedding) -> Dict:
+        entry = self.cache[query_hash]
+        return {
+            "query_hash": query_hash,
+            "original_query": entry["original_query"],
+            "answer": entry["answer"],
+            "embedding": query_embedding,
+            "response_time": entry["response_time"],
+            "meta": entry["meta"],
+        }
+    
+    def set(self, query: str, answer: str, response_time: float = 0.0, query_embedding=None, meta: Optional[Dict] = None):
         """
         Cache the answer for this query.
         
@@ -163,6 +351,8 @@ class SemanticCache:
             query: Original query
             answer: Generated answer
             response_time: Time taken to generate (for stats)
+            query_embedding: Precomputed embedding from encode() (skips re-encoding)
+            meta: Dependency tags: corpus_version, prompt_hash, model, doc_ids
         """
         query_hash = self._hash_query(query)
         
@@ -170,12 +360,80 @@ class SemanticCache:
         if query_hash in self.cache:
             return
         
+        # Encode query (outside the lock, it is the slow part)
+        if query_embedding is None:
+            query_embedding = self.encode(query)
+        
+        with self._write_lock:
+            if not self._insert(query_hash, query, answer, response_time, query_embedding, meta):
+                return
+            row = self._backend_row(query_hash, query_embedding) if self.backend is not None else None
+            
+            # Persist to file if configured
+            if self.cache_file:
+                self._save_to_file()
+        
+        # Network write outside the lock
+        if row is not None:
+            self._backend_call("upsert", [row])
+    
+    def set_many(
+        self,
+        entries: Sequence[Tuple[str, str]],
+        response_time: float = 0.0,
+        query_embeddings=None,
+        metas: Optional[Sequence[Optional[Dict]]] = None,
+    ) -> int:
+        """
+        Bulk set(): one batched encode for all new queries and a single persist.
+        
+        Args:
+            entries: (query, answer) pairs
+            query_embeddings: Optional precomputed rows aligned with entries
+            metas: Optional dependency tags aligned with entries (see set())
+        Returns: number of entries added
+        """
+        new = []  # (row in entries, hash, query, answer)
+        seen = set()
+        for i, (query, answer) in enumerate(entries):
+            query_hash = self._hash_query(query)
+            if query_hash in self.cache or query_hash in seen:
+                continue
+            seen.add(query_hash)
+            new.append((i, query_hash, query, answer))
+        if not new:
+            return 0
+        
+        if query_embeddings is None:
+            encoded = self.encode_batch([q for _, _, q, _ in new])
+            embeddings = [encoded[k] for k in range(len(new))]
+        else:
+            embeddings = [query_embeddings[i] for i, _, _, _ in new]
+        
+        added = 0
+        rows = []
+        with self._write_lock:
+            for (i, query_hash, query, answer), emb in zip(new, embeddings):
+                meta = metas[i] if metas is not None else None
+                if self._insert(query_hash, query, answer, response_time, emb, meta):
+                    added += 1
+                    if self.backend is not None:
+                        rows.append(self._backend_row(query_hash, emb))
+            if added and self.cache_file:
+                self._save_to_file()
+        if rows:
+            self._backend_call("upsert", rows)
+        return added
+    
+    def _insert(self, query_hash: str, query: str, answer: str, response_time: float, query_embedding,
+                meta: Optional[Dict] = None) -> bool:
+        """Store one entry (caller holds _write_lock and decides when to persist)"""
+        if query_hash in self.cache:
+            return False
+        
         # Evict oldest if cache full
         self._evict_oldest()
         
-        # Encode query
-        query_embedding = self.model.encode(query, convert_to_tensor=True)
-        
         # Store in cache
         timestamp = datetime.now()
         self.cache[query_hash] = {
@@ -183,17 +441,88 @@ class SemanticCache:
             "answer": answer,
             "timestamp": timestamp,
             "response_time": response_time,
-            "hits": 0
+            "hits": 0,
+            "meta": dict(meta or {}),
         }
+        self._index_add(query_hash, self.cache[query_hash]["meta"])
         
         # Store embedding
         self.query_embeddings.append((query_hash, query_embedding, timestamp))
         
         self.stats["cache_size"] = len(self.cache)
-        
-        # Persist to file if configured
-        if self.cache_file:
-            self._save_to_file()
+        return True
+    
+    def remove_where(self, predicate) -> int:
+        """
+        Drop entries for which predicate(entry_dict) is true; persists once. Returns count removed.
+        With a backend this scans every shared row too (offline maintenance only); backend
+        rows carry original_query, answer and meta.
+        """
+        with self._write_lock:
+            doomed = {h for h, entry in self.cache.items() if predicate(entry)}
+            removed = self._remove_and_persist(doomed)
+        if self.backend is not None:
+            shared = {e["query_hash"] for e in self._backend_call("entries", default=[]) if predicate(e)}
+            return self._backend_call("delete_hashes", shared, default=removed)
+        return removed
+    
+    def _remove_and_persist(self, hashes: Set[str]) -> int:
+        with self._write_lock:
+            removed = self._remove_hashes(hashes)
+            if removed and self.cache_file:
+                self._save_to_file()
+        return removed
+    
+    def tag_values(self, name: str) -> Set[str]:
+        """Distinct values of a tag field across live entries"""
+        values = {value for field_name, value in self._tag_index if field_name == name}
+        if self.backend is not None:
+            values |= self._backend_call("tag_values", name, default=set())
+        return values
+    
+    def invalidate_docs(self, doc_ids, corpus_version: Optional[str] = None) -> int:
+        """
+        Drop entries whose answer used any of doc_ids (index lookup, no scan).
+        With corpus_version, only entries built against that version are considered.
+        """
+        doomed: Set[str] = set()
+        for doc_id in doc_ids:
+            doomed |= self._doc_index.get(str(doc_id), set())
+        if corpus_version is not None:
+            doomed &= self._tag_index.get(("corpus_version", corpus_version), set())
+        removed = self._remove_and_persist(doomed)
+        if self.backend is not None:
+            return self._backend_call("delete_docs", doc_ids, corpus_version, default=removed)
+        return removed
+    
+    def invalidate_tag(self, name: str, value: str) -> int:
+        """Drop every entry tagged name=value (e.g. an old prompt_hash)"""
+        removed = self._remove_and_persist(set(self._tag_index.get((name, str(value)), set())))
+        if self.backend is not None:
+            return self._backend_call("delete_tag", name, value, default=removed)
+        return removed
+    
+    def invalidate_stale(self, **current: str) -> int:
+        """
+        Drop entries whose tag differs from the current value, e.g.
+        invalidate_stale(prompt_hash=PROMPT_HASH, model="gemini-2.0-flash").
+        Untagged entries (fallback seeds, pre-tagging cache files) are left to the TTL.
+        """
+        doomed: Set[str] = set()
+        for name, value in current.items():
+            if value is None:
+                continue
+            for (field_name, tag_value), hashes in self._tag_index.items():
+                if field_name == name and tag_value != str(value):
+                    doomed |= hashes
+        removed = self._remove_and_persist(doomed)
+        if self.backend is not None:
+            # The backend count is authoritative (L1 holds a subset of it)
+            removed = sum(
+                self._backend_call("delete_stale", name, value, default=0)
+                for name, value in current.items() if value is not None
+            ) or removed
+        return removed
     
     def _save_to_file(self):
         """Save cache to file (without embeddings, too large)"""
@@ -205,7 +534,8 @@ class SemanticCache:
                         "answer": v["answer"],
                         "timestamp": v["timestamp"].isoformat(),
                         "response_time": v["response_time"],
-                        "hits": v["hits"]
+                        "hits": v["hits"],
+                        "meta": v.get("meta", {}),
                     }
                     for h, v in self.cache.items()
                 },
@@ -224,26 +554,28 @@ class SemanticCache:
                 cache_data = json.load(f)
             
             # Load cache entries (need to re-encode queries)
+            live = []
             for query_hash, entry in cache_data.get("cache", {}).items():
                 timestamp = datetime.fromisoformat(entry["timestamp"])
                 
                 # Skip if expired
                 if self._is_expired(timestamp):
                     continue
-                
-                # Re-encode query
-                query_embedding = self.model.encode(
-                    entry["original_query"], 
-                    convert_to_tensor=True
-                )
-                
+                live.append((query_hash, entry, timestamp))
+            
+            # Re-encode all queries in one batched call
+            embeddings = self.encode_batch([e["original_query"] for _, e, _ in live]) if live else []
+            
+            for (query_hash, entry, timestamp), query_embedding in zip(live, embeddings):
                 self.cache[query_hash] = {
                     "original_query": entry["original_query"],
                     "answer": entry["answer"],
                     "timestamp": timestamp,
                     "response_time": entry["response_time"],
-                    "hits": entry["hits"]
+                    "hits": entry["hits"],
+                    "meta": entry.get("meta", {}),
                 }
+                self._index_add(query_hash, self.cache[query_hash]["meta"])
                 
                 self.query_embeddings.append((query_hash, query_embedding, timestamp))
             
@@ -260,12 +592,17 @@ class SemanticCache:
         """Clear all cache"""
         self.cache.clear()
         self.query_embeddings.clear()
+        self._doc_index.clear()
+        self._tag_index.clear()
+        if self.backend is not None:
+            self._backend_call("clear")  # shared by every node
         self.stats = {
             "hits": 0,
             "misses": 0,
             "total_queries": 0,
             "cache_size": 0,
-            "total_saved_time": 0.0
+            "total_saved_time": 0.0,
+            "backend_hits": 0,
         }
         if self.cache_file and self.cache_file.exists():
             self.cache_file.unlink()
@@ -277,6 +614,7 @@ class SemanticCache:
         
         return {
             **self.stats,
+            "backend": self.backend.name if self.backend is not None else "local",
             "hit_rate": hit_rate,
             "estimated_cost_saved": self.stats["hits"] * 0.0001,  # Rough estimate
         }
@@ -292,6 +630,8 @@ class SemanticCache:
         print(f"Cache Misses: {stats['misses']}")
         print(f"Hit Rate: {stats['hit_rate']:.1f}%")
         print(f"Cache Size: {stats['cache_size']}/{self.max_cache_size}")
+        if self.backend is not None:
+            print(f"Backend ({stats['backend']}) Hits: {stats['backend_hits']}")
         print(f"Time Saved: ~{stats['total_saved_time']:.1f}s")
         print(f"Est. Cost Saved: ~${stats['estimated_cost_saved']:.4f}")
         print("="*50 + "\n")
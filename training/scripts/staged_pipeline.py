@@ -0,0 +1,163 @@
+"""
+Staged pipeline untuk rag_answer
+Setiap stage mendeklarasikan cost-nya; stage murah (string check) dijalankan
+lebih dulu sehingga pertanyaan yang ditolak tidak membayar encode embedding,
+query database, atau LLM call.
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from tracing import RequestTrace
+
+# Stage cost levels (relative, used only for ordering)
+COST_FREE = 0      # pure string work (fallback lookup, safety, keyword gate)
+COST_ENCODE = 1    # local model encode (semantic cache lookup)
+COST_IO = 2        # network / database round trip (vector retrieval)
+COST_LLM = 3       # paid LLM call
+
+
+@dataclass
+class PipelineState:
+    """Per-request state passed through every stage"""
+    question: str
+    answer: Optional[str] = None
+    stopped_at: Optional[str] = None  # name of the stage that produced the answer
+    timings: Dict[str, float] = field(default_factory=dict)  # stage name -> seconds
+    trace: Optional[RequestTrace] = None  # optional per-request span collector
+    answered_at: Optional[float] = None  # perf_counter() when a stage produced the answer (batch stages may stamp it per state)
+
+
+@dataclass
+class Stage:
+    """
+    A single pipeline step.
+    `run(state)` returns an answer string to short-circuit the pipeline,
+    or None to continue with the next stage.
+    If `span` is set, the whole stage is recorded under that name in state.trace;
+    stages with finer-grained spans of their own leave it None.
+    `run_batch(states)` is an optional vectorized variant used by
+    StagedPipeline.run_batch; it returns one answer-or-None per state.
+    """
+    name: str
+    cost: int
+    run: Callable[[Any], Optional[str]]
+    span: Optional[str] = None
+    run_batch: Optional[Callable[[List[Any]], List[Optional[str]]]] = None
+
+
+class StagedPipeline:
+    """Run stages in ascending cost order and stop at the first answer"""
+
+    def __init__(self, stages: List[Stage]):
+        # sorted() is stable: stages with equal cost keep their declared order
+        self.stages = sorted(stages, key=lambda s: s.cost)
+        self._reset_stats()
+
+    def _reset_stats(self):
+        names = [s.name for s in self.stages]
+        self.stats = {
+            "runs": 0,
+            "answered_by": {n: 0 for n in names},     # short-circuits per stage
+            "executed": {n: 0 for n in names},        # how often each stage ran
+            "skipped": {n: 0 for n in names},         # how often it was avoided
+            "total_time": {n: 0.0 for n in names},    # cumulative seconds
+        }
+
+    def _record(self, stage: Stage, state: PipelineState, elapsed: float, started: float, share: float):
+        """Book one stage execution; `share` is this state's part of the stage time for stats"""
+        state.timings[stage.name] = elapsed
+        if state.trace is not None and stage.span:
+            state.trace.add(stage.span, elapsed, started=started)
+        self.stats["executed"][stage.name] += 1
+        self.stats["total_time"][stage.name] += share
+
+    def _answered(self, i: int, state: PipelineState, answer: str):
+        stage = self.stages[i]
+        state.answer = answer
+        state.stopped_at = stage.name
+        state.answered_at = state.answered_at or time.perf_counter()
+        self.stats["answered_by"][stage.name] += 1
+        for skipped in self.stages[i + 1:]:
+            self.stats["skipped"][skipped.name] += 1
+
+    def run(self, state: PipelineState) -> PipelineState:
+        self.stats["runs"] += 1
+        for i, stage in enumerate(self.stages):
+            t0 = time.perf_counter()
+            try:
+                answer = stage.run(state)
+            finally:
+                elapsed = time.perf_counter() - t0
+                self._record(stage, state, elapsed, t0, elapsed)
+
+            if answer is not None:
+                self._answered(i, state, answer)
+                break
+        return state
+
+    def run_batch(self, states: List[PipelineState]) -> List[PipelineState]:
+        """
+        Run many states stage by stage. Each stage only sees the states that are
+        still unanswered; stages with `run_batch` handle them in one call (one
+        batched encode / retrieval / concurrent LLM fan-out), the rest run per state.
+        """
+        self.stats["runs"] += len(states)
+        for i, stage in enumerate(self.stages):
+            active = [s for s in states if s.answer is None]
+            if not active:
+                break
+
+            if stage.run_batch is not None:
+                t0 = time.perf_counter()
+                try:
+                    answers = stage.run_batch(active)
+                finally:
+                    # Every state waited for the whole batch; stats get the amortized share
+                    elapsed = time.perf_counter() - t0
+                    for state in active:
+                        self._record(stage, state, elapsed, t0, elapsed / len(active))
+            else:
+                answers = []
+                for state in active:
+                    t0 = time.perf_counter()
+                    try:
+                        answers.append(stage.run(state))
+                    finally:
+                        elapsed = time.perf_counter() - t0
+                        self._record(stage, state, elapsed, t0, elapsed)
+
+            for state, answer in zip(active, answers):
+                if answer is not None:
+                    self._answered(i, state, answer)
+        return states
+
+    def get_stats(self) -> Dict:
+        """
+        Stage statistics, including an estimate of the time saved by
+        short-circuiting (skipped runs x average stage time).
+        """
+        avg_time = {
+            n: (self.stats["total_time"][n] / c if c else 0.0)
+            for n, c in self.stats["executed"].items()
+        }
+        saved = sum(self.stats["skipped"][n] * avg_time[n] for n in avg_time)
+        return {
+            **self.stats,
+            "avg_time": avg_time,
+            "estimated_time_saved": saved,
+        }
+
+    def print_stats(self):
+        stats = self.get_stats()
+        print("\n" + "="*50)
+        print("[STATS] Pipeline Stages")
+        print("="*50)
+        print(f"Runs: {stats['runs']}")
+        for s in self.stages:
+            n = s.name
+            print(f"{n:<12} cost={s.cost} ran={stats['executed'][n]:<5} "
+                  f"answered={stats['answered_by'][n]:<5} skipped={stats['skipped'][n]:<5} "
+                  f"avg={stats['avg_time'][n]*1000:.1f}ms")
+        print(f"Est. time avoided by early exits: ~{stats['estimated_time_saved']:.1f}s")
+        print("="*50 + "\n")
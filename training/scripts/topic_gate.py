@@ -0,0 +1,130 @@
+"""
+Topic gate untuk rag_answer
+Mencocokkan pertanyaan dengan daftar kata kunci kehamilan / di luar topik
+menggunakan satu regex word-boundary yang dikompilasi sekali per proses.
+Kata kunci kehamilan juga cocok dalam bentuk berimbuhan (ber-/di-/ke-/me-/pe-, -an).
+
+Daftar term dibaca dari data/topic_keywords.json sehingga bisa diperluas
+tanpa mengubah kode.
+"""
+import json
+import pathlib
+import re
+from typing import Dict, Iterable, List, Optional
+
+TOPIC_KEYWORDS_FILE = pathlib.Path(__file__).parents[1] / "data" / "topic_keywords.json"
+
+
+class KeywordMatcher:
+    """
+    Multi-category keyword matcher.
+    Semua term digabung ke satu regex (term terpanjang dulu), sehingga
+    pertanyaan cukup di-scan satu kali dan hanya cocok pada batas kata
+    ("bb" tidak lagi cocok di dalam "hobby", "ml" tidak cocok di dalam "html").
+
+    Kategori yang punya entri di `affixes` juga menerima imbuhan di sekitar
+    term (mis. ke-/-an: "kelelahan" -> "lelah", di-: "diperiksa" -> "periksa"),
+    karena bentuk berimbuhan umum dipakai dalam pertanyaan berbahasa Indonesia.
+    Kategori lain (mis. forbidden dengan term pendek seperti "ml") tetap
+    dicocokkan per kata.
+    """
+
+    def __init__(
+        self,
+        categories: Dict[str, Iterable[str]],
+        suffixes: Iterable[str] = (),
+        affixes: Optional[Dict[str, Dict[str, Iterable[str]]]] = None,
+    ):
+        """
+        Args:
+            categories: {category: [term, ...]}
+            suffixes: Suffix opsional setelah term (mis. "nya" untuk "hamilnya")
+            affixes: {category: {"prefixes": [...], "suffixes": [...]}} imbuhan tambahan per kategori
+        """
+        self.term_category: Dict[str, str] = {}
+        for category, terms in categories.items():
+            for term in terms:
+                key = self._normalize(term)
+                if key:
+                    # First category wins if a term is listed twice
+                    self.term_category.setdefault(key, category)
+
+        self.categories = list(categories.keys())
+        affixes = affixes or {}
+        suffix_group = self._optional([s for s in suffixes if s])
+
+        # One alternative per category (named group g<i>) so a match maps back to its category
+        self._group_category: Dict[str, str] = {}
+        alternatives = []
+        for i, category in enumerate(self.categories):
+            terms = sorted((t for t, c in self.term_category.items() if c == category), key=len, reverse=True)
+            if not terms:
+                continue
+            group = f"g{i}"
+            self._group_category[group] = category
+            alternation = "|".join(re.escape(t).replace(r"\ ", r"\s+") for t in terms)
+            extra = affixes.get(category, {})
+            prefix_group = self._optional(extra.get("prefixes", []))
+            derivation_group = self._optional(extra.get("suffixes", []))
+            alternatives.append(f"{prefix_group}(?P<{group}>{alternation}){derivation_group}{suffix_group}")
+        pattern = "|".join(alternatives) or r"(?!)"
+        self.pattern = re.compile(rf"\b(?:{pattern})\b", re.IGNORECASE)
+
+    @staticmethod
+    def _optional(affixes: Iterable[str]) -> str:
+        """Optional non-capturing group for a list of affixes (longest first)"""
+        affixes = sorted({a.lower() for a in affixes if a}, key=len, reverse=True)
+        if not affixes:
+            return ""
+        return "(?:" + "|".join(re.escape(a) for a in affixes) + ")?"
+
+    @staticmethod
+    def _normalize(term: str) -> str:
+        return " ".join(term.lower().split())
+
+    def match(self, text: str) -> Dict[str, List[str]]:
+        """
+        Return matched terms per category (single pass over text).
+        Categories without matches map to an empty list.
+        """
+        found: Dict[str, List[str]] = {c: [] for c in self.categories}
+        for m in self.pattern.finditer(text):
+            category = self._group_category[m.lastgroup]
+            term = self._normalize(m.group(m.lastgroup))
+            if term not in found[category]:
+                found[category].append(term)
+        return found
+
+    @classmethod
+    def from_file(cls, path: pathlib.Path) -> "KeywordMatcher":
+        """
+        Build matcher from JSON file:
+        {"suffixes": [...], "affixes": {"<category>": {"prefixes": [...], "suffixes": [...]}}, "<category>": [terms]}
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        suffixes = data.get("suffixes", [])
+        categories = {
+            k: v for k, v in data.items()
+            if isinstance(v, list) and k != "suffixes" and not k.startswith("_")
+        }
+        return cls(categories, suffixes, data.get("affixes", {}))
+
+
+# Module-level matcher, compiled once on first use
+_topic_matcher: Optional[KeywordMatcher] = None
+
+
+def get_topic_matcher() -> KeywordMatcher:
+    """Get the shared topic matcher (loads data/topic_keywords.json once)"""
+    global _topic_matcher
+    if _topic_matcher is None:
+        _topic_matcher = KeywordMatcher.from_file(TOPIC_KEYWORDS_FILE)
+    return _topic_matcher
+
+
+def reload_topic_matcher() -> KeywordMatcher:
+    """Re-read the keyword file (e.g. after editing it in a running process)"""
+    global _topic_matcher
+    _topic_matcher = None
+    return get_topic_matcher()
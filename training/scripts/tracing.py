@@ -0,0 +1,79 @@
+"""
+Per-request tracing untuk rag_answer
+RequestTrace mengumpulkan span per tahap (fallback, gating, embedding,
+cache_lookup, retrieval, prompt_build, rate_limit_wait, llm_call,
+post_process, cache_write) sehingga terlihat ke mana waktu request habis.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from rag_metrics import RAG_SPAN_SECONDS
+
+
+class RequestTrace:
+    """Collects timed spans for one request"""
+
+    def __init__(self, request_id: Optional[str] = None):
+        self.request_id = request_id or uuid.uuid4().hex[:12]
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.spans: List[Dict] = []  # {"name", "start", "duration"} in seconds
+        self._finished = False
+
+    @contextmanager
+    def span(self, name: str):
+        """Time a block: `with trace.span("retrieval"): ...`"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0, started=t0)
+
+    def add(self, name: str, duration: float, started: Optional[float] = None):
+        """Record an already-measured span"""
+        if started is None:
+            started = time.perf_counter() - duration
+        self.spans.append({"name": name, "start": started - self.start, "duration": duration})
+
+    def durations(self) -> Dict[str, float]:
+        """Total seconds per span name (repeated spans are summed)"""
+        totals: Dict[str, float] = {}
+        for s in self.spans:
+            totals[s["name"]] = totals.get(s["name"], 0.0) + s["duration"]
+        return totals
+
+    @property
+    def total(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def finish(self):
+        """Close the trace and export span durations to the metrics histograms (once)"""
+        if self._finished:
+            return
+        self._finished = True
+        self.end = time.perf_counter()
+        for name, duration in self.durations().items():
+            RAG_SPAN_SECONDS.labels(name).observe(duration)
+
+    def to_dict(self) -> Dict:
+        """Millisecond summary for API responses / logs"""
+        return {
+            "request_id": self.request_id,
+            "total_ms": round(self.total * 1000, 2),
+            "spans_ms": {k: round(v * 1000, 2) for k, v in self.durations().items()},
+            "timeline": [
+                {
+                    "name": s["name"],
+                    "start_ms": round(s["start"] * 1000, 2),
+                    "duration_ms": round(s["duration"] * 1000, 2),
+                }
+                for s in self.spans
+            ],
+        }
+
+    def summary(self) -> str:
+        """One-line log summary"""
+        parts = ", ".join(f"{k}={v*1000:.0f}ms" for k, v in self.durations().items())
+        return f"total={self.total*1000:.0f}ms ({parts})"
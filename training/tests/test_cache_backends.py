@@ -0,0 +1,159 @@
+"""
+Tests for scripts/cache_backends.py
+psycopg is replaced by a fake module that records statements, so no Postgres is needed.
+
+Run from training/:
+    python -m unittest discover -s tests
+"""
+import os
+import pathlib
+import sys
+import types
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+sys.path.insert(0, str(pathlib.Path(__file__).parents[1] / "scripts"))
+
+import cache_backends  # noqa: E402
+from cache_backends import PgVectorCacheBackend, create_cache_backend, vector_literal  # noqa: E402
+
+
+class FakeCursor:
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append((" ".join(sql.split()), params))
+        failure = self.conn.fail.pop(0) if self.conn.fail else None
+        if failure is not None:
+            raise failure
+        self.rowcount = self.conn.rowcount
+
+    def executemany(self, sql, params):
+        self.execute(sql, list(params))
+
+    def fetchall(self):
+        return self.conn.results.pop(0)
+
+
+class FakePsycopg(types.ModuleType):
+    """The slice of psycopg PgVectorCacheBackend uses"""
+
+    class Error(Exception):
+        pass
+
+    class OperationalError(Error):
+        pass
+
+    def __init__(self):
+        super().__init__("psycopg")
+        self.connections = []
+        self.results = []  # fetchall() return values, in order
+        self.fail = []     # exceptions to raise on the next statements (None = succeed)
+
+    def connect(self, dsn, autocommit=False):
+        conn = types.SimpleNamespace(closed=False, statements=[], results=self.results, fail=self.fail, rowcount=1)
+        conn.cursor = lambda: FakeCursor(conn)
+        conn.execute = lambda sql: None
+        self.connections.append(conn)
+        return conn
+
+
+class PgVectorCacheBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.psycopg = FakePsycopg()
+        patcher = mock.patch.dict(sys.modules, {"psycopg": self.psycopg})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.backend = PgVectorCacheBackend("postgresql://test", table="cache_test")
+
+    def statements(self):
+        return [s for conn in self.psycopg.connections for s in conn.statements]
+
+    def test_lookup_filters_on_ttl_and_aligns_rows(self):
+        self.psycopg.results.append([
+            (2, "h2", "kram kaki", "jawaban", "[0.5,0.5]", 1.5, "v2", "p1", None, ["kram-01"], 0.93),
+        ])
+
+        rows = self.backend.lookup([[1.0, 0.0], [0.5, 0.5], [0.0, 1.0]], timedelta(hours=24))
+
+        sql, params = self.statements()[-1]
+        self.assertIn("WHERE created_at > now() - %s", sql)
+        self.assertEqual(params, (["[1,0]", "[0.5,0.5]", "[0,1]"], timedelta(hours=24)))
+        self.assertIsNone(rows[0])
+        self.assertIsNone(rows[2])
+        self.assertEqual(rows[1]["embedding"], [0.5, 0.5])
+        self.assertEqual(rows[1]["meta"], {"doc_ids": ["kram-01"], "corpus_version": "v2", "prompt_hash": "p1"})
+        self.assertEqual(rows[1]["similarity"], 0.93)
+        self.assertEqual(self.backend.lookup([], timedelta(hours=1)), [])
+
+    def test_purge_expired_is_the_complement_of_lookup(self):
+        self.backend.purge_expired(timedelta(hours=24))
+
+        self.assertEqual(self.statements()[-1],
+                         ("DELETE FROM cache_test WHERE created_at <= now() - %s", (timedelta(hours=24),)))
+
+    def test_upsert_tags_and_doc_ids(self):
+        rows = [{
+            "query_hash": "h1", "original_query": "q", "answer": "a", "embedding": [0.25, 1.0],
+            "response_time": 2.0, "meta": {"doc_ids": ["d1"], "prompt_hash": "p1"},
+        }]
+
+        self.assertEqual(self.backend.upsert(rows), 1)
+
+        sql, params = self.statements()[-1]
+        self.assertIn("ON CONFLICT (query_hash) DO UPDATE", sql)
+        self.assertEqual(params, [("h1", "q", "a", "[0.25,1]", 2.0, None, "p1", None, ["d1"])])
+
+    def test_reconnects_once_after_a_dropped_connection(self):
+        self.psycopg.fail.append(self.psycopg.OperationalError("server closed the connection"))
+
+        self.backend.delete_tag("prompt_hash", "old")
+
+        self.assertEqual(len(self.psycopg.connections), 2)
+        self.psycopg.fail.extend([self.psycopg.OperationalError("down")] * 2)
+        with self.assertRaises(self.psycopg.OperationalError):
+            self.backend.delete_tag("prompt_hash", "old")
+
+    def test_identifiers_are_validated(self):
+        with self.assertRaises(ValueError):
+            PgVectorCacheBackend("postgresql://test", table="cache; DROP TABLE users")
+        with self.assertRaises(ValueError):
+            self.backend.delete_tag("answer", "x")
+
+    def test_delete_stale_keeps_untagged_rows(self):
+        self.backend.delete_stale("model", "gemini-2.0-flash")
+
+        self.assertEqual(self.statements()[-1], (
+            "DELETE FROM cache_test WHERE model IS NOT NULL AND model <> %s", ("gemini-2.0-flash",)))
+
+
+class CreateCacheBackendTest(unittest.TestCase):
+
+    def test_kind_from_env(self):
+        with mock.patch.dict(os.environ, {"SEMANTIC_CACHE_BACKEND": "local"}):
+            self.assertIsNone(create_cache_backend())
+        with mock.patch.dict(sys.modules, {"psycopg": FakePsycopg()}), \
+                mock.patch.dict(os.environ, {"SEMANTIC_CACHE_BACKEND": "pgvector", "SEMANTIC_CACHE_DSN": "postgresql://x"}):
+            backend = create_cache_backend()
+        self.assertIsInstance(backend, PgVectorCacheBackend)
+        self.assertEqual((backend.dsn, backend.table), ("postgresql://x", cache_backends.DEFAULT_TABLE))
+        with self.assertRaises(ValueError):
+            create_cache_backend("redis")
+
+    def test_vector_literal(self):
+        self.assertEqual(vector_literal([1, 0.123456789, -2.5]), "[1,0.1234568,-2.5]")
+
+
+if __name__ == "__main__":
+    unittest.main()
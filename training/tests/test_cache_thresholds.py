@@ -0,0 +1,95 @@
+"""
+Tests for scripts/cache_thresholds.py
+
+Run from training/:
+    python -m unittest discover -s tests
+"""
+import pathlib
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parents[1] / "scripts"))
+
+from cache_thresholds import (  # noqa: E402
+    THRESHOLD_CEILING, ThresholdPolicy, choose_threshold, load_threshold_policy, precision_recall_at,
+)
+
+
+def precision(scored, threshold):
+    return precision_recall_at(scored, threshold)[0]
+
+
+class ChooseThresholdTest(unittest.TestCase):
+
+    def test_lowered_while_precision_holds(self):
+        scored = [(0.95, True), (0.9, True), (0.82, True), (0.78, False), (0.7, False)]
+
+        threshold = choose_threshold(scored, default=0.85, target_precision=0.95)
+
+        self.assertEqual(threshold, 0.82)
+        self.assertEqual(precision_recall_at(scored, threshold)[1], 1.0)
+
+    def test_raised_until_target_is_met(self):
+        scored = [(0.97, True), (0.93, True), (0.88, False), (0.86, True)]
+
+        threshold = choose_threshold(scored, default=0.85, target_precision=0.95)
+
+        self.assertEqual(threshold, 0.93)
+        self.assertEqual(precision(scored, threshold), 1.0)
+
+    def test_never_below_global_precision(self):
+        rng = random.Random(20240601)
+        for _ in range(500):
+            scored = [(round(rng.uniform(0.6, 1.0), 4), rng.random() < 0.6) for _ in range(rng.randint(1, 25))]
+            default = rng.choice([0.8, 0.85, 0.9])
+            target = rng.choice([0.9, 0.95, 1.0])
+            with self.subTest(scored=scored, default=default, target=target):
+                threshold = choose_threshold(scored, default, target)
+                self.assertGreaterEqual(precision(scored, threshold), precision(scored, default))
+                self.assertLessEqual(threshold, THRESHOLD_CEILING)
+
+    def test_unreachable_target_keeps_the_global_threshold(self):
+        # Regression: used to jump to the ceiling, where only the wrong pair remains
+        scored = [(0.995, False), (0.9, True), (0.9, False), (0.87, True)]
+
+        self.assertEqual(choose_threshold(scored, default=0.85, target_precision=0.95), 0.85)
+
+
+class ThresholdPolicyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = ThresholdPolicy(
+            topics={"nutrisi": ["makan", "kopi"], "gejala": ["mual", "pusing"]},
+            thresholds={"nutrisi/short": 0.93, "*/long": 0.8},
+            short_max_words=4,
+            suffixes=["nya"],
+        )
+
+    def test_key(self):
+        self.assertEqual(self.policy.key("Boleh minum kopi?"), "nutrisi/short")
+        # First listed topic wins when several match
+        self.assertEqual(self.policy.key("Mual setelah makannya, kenapa ya dok?"), "nutrisi/long")
+        self.assertEqual(self.policy.key("Kapan HPL saya?"), "umum/short")
+
+    def test_fallback_chain(self):
+        self.assertEqual(self.policy.threshold_for("Boleh minum kopi?", 0.85), 0.93)      # topic key
+        self.assertEqual(self.policy.threshold_for("Kenapa saya sering mual di pagi hari?", 0.85), 0.8)  # */long
+        self.assertEqual(self.policy.threshold_for("Sering pusing?", 0.85), 0.85)         # default
+        self.assertEqual(ThresholdPolicy({"nutrisi": ["kopi"]}).threshold_for("kopi?", 0.9), 0.9)
+
+    def test_load_threshold_policy(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = pathlib.Path(tmp) / "cache_thresholds.json"
+            self.assertIsNone(load_threshold_policy(path))
+            path.write_text("{not json", encoding="utf-8")
+            self.assertIsNone(load_threshold_policy(path))
+            path.write_text('{"topics": {"gejala": ["mual"]}, "thresholds": {"gejala/short": 0.9}}', encoding="utf-8")
+            self.assertEqual(load_threshold_policy(path).threshold_for("mual terus", 0.85), 0.9)
+
+        self.assertIsNotNone(load_threshold_policy())  # the shipped data/cache_thresholds.json
+
+
+if __name__ == "__main__":
+    unittest.main()
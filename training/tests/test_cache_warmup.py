@@ -0,0 +1,93 @@
+"""
+Tests for scripts/cache_warmup.py (log mining)
+
+Run from training/:
+    python -m unittest discover -s tests
+"""
+import logging
+import pathlib
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parents[1] / "scripts"))
+
+import cache_warmup  # noqa: E402
+import rag_pipeline  # noqa: E402
+from llm_providers import StubLLMProvider  # noqa: E402
+
+LOCAL_DOCS = [{"page_content": "Olahraga ringan aman selama kehamilan.", "metadata": {"doc_id": "olahraga-01"}}]
+LONG_QUESTION = "Apakah aman berolahraga saat hamil " + "dan bagaimana cara yang benar " * 5 + "?"
+
+
+class QuestionsFromLogTest(unittest.TestCase):
+
+    def setUp(self):
+        limiter = rag_pipeline.api_rate_limiter
+        self.addCleanup(setattr, limiter, "min_interval", limiter.min_interval)
+        limiter.min_interval = 0.0
+        self.llm = StubLLMProvider(latency_ms=0, latency_dist="fixed")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.log_path = pathlib.Path(tmp.name) / "rag_pipeline.log"
+
+    def write_log(self, run):
+        """Run the pipeline with a handler in setup_logging's format on the log file"""
+        handler = logging.FileHandler(self.log_path, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+        logger = rag_pipeline.logger
+        level = logger.level
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        try:
+            run()
+        finally:
+            logger.removeHandler(handler)
+            logger.setLevel(level)
+            handler.close()
+
+    def test_single_and_batch_requests(self):
+        single = "Bagaimana mencegah diabetes gestasional?"
+        batch = [
+            "Kenapa saya sering kelelahan saat hamil?",
+            "Siapa presiden Indonesia sekarang?",
+            LONG_QUESTION,
+            "Kapan sebaiknya diperiksa ke dokter kandungan?",
+        ]
+
+        def run():
+            rag_pipeline.rag_answer(single, None, self.llm, LOCAL_DOCS)
+            rag_pipeline.rag_answer_batch(batch, None, self.llm, LOCAL_DOCS)
+            rag_pipeline.rag_answer(single, None, self.llm, LOCAL_DOCS)
+
+        self.write_log(run)
+
+        questions = list(cache_warmup.questions_from_log(self.log_path))
+
+        # Every question once per request; the long one untruncated (from its ACCEPTED line)
+        self.assertEqual(sorted(questions), sorted([single, single] + batch))
+
+    def test_accepted_lines_are_matched_by_text(self):
+        # Concurrent requests: both "Processing" lines come before either ACCEPTED line
+        first, second = "Bolehkah ibu hamil minum kopi?", LONG_QUESTION
+        self.log_path.write_text(
+            f"x - INFO - 📝 Processing question: {first[:100]}...\n"
+            f"x - INFO - 📝 Processing question: {second[:100]}...\n"
+            f"x - INFO - ✅ Question ACCEPTED (pregnancy-related): {second} (matched=['hamil'])\n"
+            f"x - INFO - 📝 Processing question: Siapa juara liga?...\n"
+            f"x - INFO - ✅ Question ACCEPTED (pregnancy-related): {first} (matched=['ibu hamil'])\n",
+            encoding="utf-8",
+        )
+
+        questions = list(cache_warmup.questions_from_log(self.log_path))
+
+        self.assertEqual(sorted(questions), sorted([first, second, "Siapa juara liga?"]))
+
+    def test_count_questions(self):
+        counted = cache_warmup.count_questions([["Apa itu HPL?", "apa itu  HPL", "Apa itu HPL?"], ["USG kapan?"]])
+
+        self.assertEqual(counted, [("Apa itu HPL?", 3), ("USG kapan?", 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+Tests for scripts/context_builder.py
+
+Run from training/:
+    python -m unittest discover -s tests
+"""
+import pathlib
+import sys
+import unittest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parents[1] / "scripts"))
+
+from context_builder import (  # noqa: E402
+    DOC_SEPARATOR, allocate_budget, build_context, deduplicate, estimate_tokens, truncate_to_sentences,
+)
+
+
+def document(topic: str, sentences: int) -> str:
+    return " ".join(f"Kalimat {i} membahas {topic} selama kehamilan." for i in range(sentences))
+
+
+class DeduplicateTest(unittest.TestCase):
+
+    def test_drops_near_duplicates_keeping_the_first(self):
+        original = document("nutrisi", 10)
+        near_copy = original.replace("Kalimat 9", "Kalimat sembilan")
+        other = document("olahraga ringan", 10)
+
+        self.assertEqual(deduplicate([original, near_copy, other]), [original, other])
+
+    def test_keeps_distinct_chunks(self):
+        chunks = [document("nutrisi", 3), document("tidur", 3), "Minum air putih cukup."]
+        self.assertEqual(deduplicate(chunks), chunks)
+
+
+class BudgetTest(unittest.TestCase):
+
+    def test_allocation_favours_top_ranks_and_fits(self):
+        allocation = allocate_budget([1000, 1000, 1000], 600)
+        self.assertLessEqual(sum(allocation), 600)
+        self.assertEqual(allocation, sorted(allocation, reverse=True))
+
+    def test_unused_share_goes_to_later_ranks(self):
+        allocation = allocate_budget([10, 1000, 1000], 600)
+        self.assertEqual(allocation[0], 10)
+        self.assertEqual(sum(allocation), 600)
+
+    def test_truncate_keeps_whole_sentences(self):
+        text = document("nutrisi", 20)
+        cut = truncate_to_sentences(text, 50)
+        self.assertLessEqual(estimate_tokens(cut), 50)
+        self.assertTrue(text.startswith(cut))
+        self.assertTrue(cut.endswith("kehamilan."))
+
+
+class BuildContextTest(unittest.TestCase):
+
+    def test_respects_token_budget(self):
+        texts = [document(topic, 40) for topic in ("nutrisi", "tidur", "olahraga", "vitamin")]
+        for max_tokens in (200, 500, 1200):
+            context = build_context(texts, max_tokens)
+            self.assertLessEqual(estimate_tokens(context), max_tokens)
+            self.assertTrue(context.startswith("Kalimat 0 membahas nutrisi"))
+
+    def test_duplicates_do_not_use_budget(self):
+        top = document("nutrisi", 5)
+        context = build_context([top, top, document("tidur", 5)], 10_000)
+        self.assertEqual(context, DOC_SEPARATOR.join([top, document("tidur", 5)]))
+
+    def test_small_allocations_are_skipped(self):
+        texts = [document("nutrisi", 40), document("tidur", 40), document("vitamin", 40)]
+        context = build_context(texts, 120, min_doc_tokens=40)
+        self.assertNotIn("vitamin", context)
+
+    def test_empty_input(self):
+        self.assertEqual(build_context([], 100), "")
+        self.assertEqual(build_context(["", "   "], 100), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
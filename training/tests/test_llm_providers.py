@@ -0,0 +1,174 @@
+"""
+Tests for scripts/llm_providers.py
+
+Run from training/:
+    python -m unittest discover -s tests
+"""
+import os
+import pathlib
+import sys
+import types
+import unittest
+from unittest import mock
+
+sys.path.insert(0, str(pathlib.Path(__file__).parents[1] / "scripts"))
+
+from llm_providers import (  # noqa: E402
+    PROMPT_PREFIX_SEPARATOR, QUOTA_EXCEEDED_MESSAGE, GeminiProvider, LLMProvider, StubLLMProvider,
+    create_llm_provider, is_error_answer,
+)
+
+
+class _Record:
+    """Stand-in for google.genai.types classes: keeps the keyword arguments"""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class _FakeGenAIClient:
+
+    def __init__(self):
+        self.calls = []
+        self.created = []
+        self.models = types.SimpleNamespace(generate_content=self._generate_content)
+        self.caches = types.SimpleNamespace(create=self._create_cache)
+
+    def _generate_content(self, model, contents, config=None):
+        self.calls.append({"contents": contents, "config": config})
+        return types.SimpleNamespace(text=" jawaban ")
+
+    def _create_cache(self, model, config):
+        self.created.append(config)
+        return types.SimpleNamespace(name="cachedContents/prefix")
+
+
+def gemini_provider(context_cache_ttl: int) -> GeminiProvider:
+    """GeminiProvider wired to a fake client (google-genai is not needed)"""
+    provider = GeminiProvider.__new__(GeminiProvider)
+    provider.model = "gemini-test"
+    provider.max_retries = 1
+    provider.base_delay = 0
+    provider.stats = {"calls": 0, "rate_limited": 0, "errors": 0}
+    provider.client = _FakeGenAIClient()
+    provider._types = types.SimpleNamespace(
+        GenerateContentConfig=_Record, CreateCachedContentConfig=_Record, Content=_Record, Part=_Record,
+    )
+    provider.context_cache_ttl = context_cache_ttl
+    provider._cached_prefixes = {}
+    provider._context_cache_unsupported = False
+    provider._context_cache_retry_at = 0.0
+    provider.context_cache_retry_seconds = 300
+    return provider
+
+
+class GeminiPromptPrefixTest(unittest.TestCase):
+
+    def test_prefix_inline_without_context_cache(self):
+        provider = gemini_provider(context_cache_ttl=0)
+
+        answer = provider.generate("PERTANYAAN: x", temperature=0.3, max_output_tokens=400, prompt_prefix="ATURAN")
+
+        self.assertEqual(answer, "jawaban")
+        call = provider.client.calls[0]
+        # Same single prompt as before the prefix split; generation settings are not forwarded
+        self.assertEqual(call["contents"], "ATURAN" + PROMPT_PREFIX_SEPARATOR + "PERTANYAAN: x")
+        self.assertIsNone(call["config"])
+
+    def test_prefix_from_context_cache(self):
+        provider = gemini_provider(context_cache_ttl=3600)
+
+        provider.generate("q1", prompt_prefix="ATURAN")
+        provider.generate("q2", prompt_prefix="ATURAN")
+
+        self.assertEqual(len(provider.client.created), 1)
+        cached = provider.client.created[0]
+        self.assertFalse(hasattr(cached, "system_instruction"))
+        self.assertEqual(cached.contents[0].parts[0].text, "ATURAN" + PROMPT_PREFIX_SEPARATOR)
+        for call, question in zip(provider.client.calls, ("q1", "q2")):
+            self.assertEqual(call["contents"], question)
+            self.assertEqual(call["config"].cached_content, "cachedContents/prefix")
+
+
+class LLMProviderBaseTest(unittest.TestCase):
+
+    def test_base_class_is_abstract(self):
+        with self.assertRaises(TypeError):
+            LLMProvider(model="x")
+
+        class Incomplete(LLMProvider):
+            name = "incomplete"
+
+        with self.assertRaises(TypeError):
+            Incomplete(model="x")
+
+
+class StubLLMProviderTest(unittest.TestCase):
+
+    def stub(self, **kwargs):
+        sleeps = []
+        kwargs.setdefault("latency_ms", 100)
+        provider = StubLLMProvider(sleep=sleeps.append, base_delay=0, **kwargs)
+        return provider, sleeps
+
+    def test_answer_depends_only_on_the_prompt(self):
+        provider, _ = self.stub()
+        first = provider.generate("Apa itu HPL?")
+        self.assertEqual(first, provider.generate("Apa itu HPL?"))
+        self.assertNotEqual(first, provider.generate("Apa itu USG?"))
+        self.assertFalse(is_error_answer(first))
+
+    def test_same_seed_reproduces_latencies(self):
+        runs = []
+        for _ in range(2):
+            provider, sleeps = self.stub(latency_dist="lognormal", seed=7)
+            for i in range(20):
+                provider.generate(f"q{i}")
+            runs.append(sleeps)
+        self.assertEqual(runs[0], runs[1])
+        self.assertNotEqual(len(set(runs[0])), 1)
+
+    def test_latency_distributions(self):
+        provider, sleeps = self.stub(latency_dist="fixed", latency_ms=250)
+        provider.generate("q")
+        self.assertEqual(sleeps, [0.25])
+
+        provider, sleeps = self.stub(latency_dist="uniform", latency_ms=100, latency_spread=0.5)
+        for i in range(50):
+            provider.generate(f"q{i}")
+        self.assertTrue(all(0.05 <= s <= 0.15 for s in sleeps))
+
+        with self.assertRaises(ValueError):
+            StubLLMProvider(latency_dist="gamma")
+
+    def test_injected_rate_limits_are_retried_then_reported(self):
+        provider, _ = self.stub(latency_dist="fixed", rate_limit_rate=1.0)
+
+        self.assertEqual(provider.generate("q"), QUOTA_EXCEEDED_MESSAGE)
+        self.assertEqual(provider.stats["calls"], provider.max_retries)
+        self.assertEqual(provider.stats["rate_limited"], provider.max_retries)
+
+    def test_injected_errors(self):
+        provider, _ = self.stub(latency_dist="fixed", error_rate=1.0)
+
+        answer = provider.generate("q")
+
+        self.assertTrue(is_error_answer(answer))
+        self.assertIn("500 INTERNAL (stub)", answer)
+        self.assertEqual(provider.stats["errors"], provider.max_retries)
+
+    def test_factory_builds_stub_from_env(self):
+        env = {"LLM_STUB_LATENCY_MS": "5", "LLM_STUB_LATENCY_DIST": "fixed", "LLM_STUB_429_RATE": "0.25"}
+        with mock.patch.dict(os.environ, env):
+            provider = create_llm_provider("stub")
+        self.assertIsInstance(provider, StubLLMProvider)
+        self.assertEqual((provider.latency_ms, provider.latency_dist, provider.rate_limit_rate), (5.0, "fixed", 0.25))
+
+        with self.assertRaises(ValueError):
+            create_llm_provider("openai")
+        with self.assertRaises(ValueError):
+            create_llm_provider("gemini", api_key=None)
+
+
+if __name__ == "__main__":
+    unittest.main()
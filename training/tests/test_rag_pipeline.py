@@ -0,0 +1,245 @@
+"""
+Tests for the staged rag_answer pipeline (scripts/rag_pipeline.py)
+Offline: StubLLMProvider instead of Gemini, an in-memory cache double
+instead of SemanticCache, and local docs instead of PGVector.
+
+Run from training/:
+    python -m unittest discover -s tests
+"""
+import pathlib
+import sys
+import unittest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parents[1] / "scripts"))
+
+import rag_pipeline  # noqa: E402
+from llm_providers import StubLLMProvider  # noqa: E402
+from staged_pipeline import COST_FREE  # noqa: E402
+from tracing import RequestTrace  # noqa: E402
+
+ON_TOPIC = "Bagaimana mencegah diabetes gestasional?"
+OFF_TOPIC = "Siapa presiden Indonesia sekarang?"
+FALLBACK = "Apa saja tanda-tanda kehamilan awal?"
+LOCAL_DOCS = [
+    {"page_content": "Diabetes gestasional dicegah dengan pola makan seimbang dan olahraga ringan.",
+     "metadata": {"doc_id": "diabetes-01"}},
+    {"page_content": "Pemeriksaan gula darah dilakukan pada usia kehamilan 24 sampai 28 minggu.",
+     "metadata": {"doc_id": "diabetes-02"}},
+]
+
+
+class FakeCache:
+    """In-memory stand-in for SemanticCache: exact-match lookup, counts every call"""
+
+    backend = None
+
+    def __init__(self, answers=None):
+        self.answers = dict(answers or {})
+        self.calls = {"encode": 0, "encode_batch": [], "get": 0, "get_batch": 0, "set": 0}
+
+    def __len__(self):
+        return len(self.answers)
+
+    def encode(self, question):
+        self.calls["encode"] += 1
+        return [float(len(question))]
+
+    def encode_batch(self, questions):
+        self.calls["encode_batch"].append(list(questions))
+        return [[float(len(q))] for q in questions]
+
+    def get(self, question, query_embedding=None):
+        self.calls["get"] += 1
+        return (self.answers[question], 0.97) if question in self.answers else None
+
+    def get_batch(self, questions, query_embeddings=None):
+        self.calls["get_batch"] += 1
+        return [(self.answers[q], 0.97) if q in self.answers else None for q in questions]
+
+    def set(self, question, answer, response_time=None, query_embedding=None, meta=None):
+        self.calls["set"] += 1
+        self.answers[question] = answer
+
+
+class FakeRetriever:
+    """Runnable-like retriever over LOCAL_DOCS that records invoke/batch calls"""
+
+    def __init__(self):
+        self.invoked = []
+        self.batches = []
+
+    def invoke(self, question):
+        self.invoked.append(question)
+        return list(LOCAL_DOCS)
+
+    def batch(self, questions):
+        self.batches.append(list(questions))
+        return [list(LOCAL_DOCS) for _ in questions]
+
+
+class RagPipelineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # The global limiter spaces real Gemini calls 8s apart; the stub needs no spacing
+        limiter = rag_pipeline.api_rate_limiter
+        self.addCleanup(setattr, limiter, "min_interval", limiter.min_interval)
+        limiter.min_interval = 0.0
+        self.llm = StubLLMProvider(latency_ms=0, latency_dist="fixed")
+        self.cache = FakeCache()
+
+    def answer(self, question, **kwargs):
+        kwargs.setdefault("cache", self.cache)
+        return rag_pipeline.rag_answer(question, None, self.llm, LOCAL_DOCS, **kwargs)
+
+
+class StageOrderTest(RagPipelineTestCase):
+
+    def test_string_gates_run_before_paid_stages(self):
+        stages = rag_pipeline.RAG_PIPELINE.stages
+        self.assertEqual(
+            [s.name for s in stages], ["fallback", "safety", "topic_gate", "cache", "retrieval", "generate"],
+        )
+        self.assertEqual([s.cost for s in stages], sorted(s.cost for s in stages))
+        self.assertTrue(all(s.cost == COST_FREE for s in stages[:3]))
+
+    def test_off_topic_question_never_reaches_the_cache_or_llm(self):
+        self.cache.answers[OFF_TOPIC] = "jawaban lama dari cache"
+
+        result = self.answer(OFF_TOPIC)
+
+        self.assertEqual(result.answer, rag_pipeline.REJECT_MESSAGE)
+        self.assertEqual(self.cache.calls["encode"], 0)
+        self.assertEqual(self.cache.calls["get"], 0)
+        self.assertEqual(self.llm.stats["calls"], 0)
+
+    def test_safety_block_skips_the_cache(self):
+        result = self.answer("Cara membuat bomb saat hamil")
+
+        self.assertTrue(result.answer.startswith("[SAFETY BLOCK]"))
+        self.assertEqual(self.cache.calls["encode"], 0)
+        self.assertEqual(self.llm.stats["calls"], 0)
+
+    def test_fallback_answers_without_encoding(self):
+        result = self.answer(FALLBACK)
+
+        self.assertTrue(result.answer)
+        self.assertEqual(self.cache.calls["encode"], 0)
+        self.assertEqual(self.llm.stats["calls"], 0)
+
+    def test_on_topic_question_goes_through_cache_and_llm(self):
+        self.answer(ON_TOPIC)
+
+        self.assertEqual(self.cache.calls["get"], 1)
+        self.assertEqual(self.cache.calls["set"], 1)
+        self.assertEqual(self.llm.stats["calls"], 1)
+
+
+class RagResultTest(RagPipelineTestCase):
+
+    def test_llm_answer(self):
+        trace = RequestTrace()
+        result = self.answer(ON_TOPIC, trace=trace)
+
+        self.assertEqual(result.tier, "llm")
+        self.assertFalse(result.cached)
+        self.assertIsNone(result.similarity)
+        self.assertEqual(result.doc_ids, ["diabetes-01", "diabetes-02"])
+        self.assertEqual(result.sources_count, 2)
+        self.assertEqual(result.request_id, trace.request_id)
+        for span in ("fallback", "gating", "retrieval", "prompt_build", "llm_call", "cache_write"):
+            self.assertIn(span, result.timings)
+        self.assertGreater(result.latency, 0)
+        self.assertEqual(str(result), result.answer)
+
+    def test_cache_hit(self):
+        self.cache.answers[ON_TOPIC] = "jawaban dari cache"
+
+        result = self.answer(ON_TOPIC)
+
+        self.assertEqual((result.answer, result.tier, result.similarity), ("jawaban dari cache", "cache", 0.97))
+        self.assertTrue(result.cached)
+        self.assertEqual((result.doc_ids, result.sources_count), ([], 0))
+        self.assertIn("cache_lookup", result.timings)
+        self.assertNotIn("llm_call", result.timings)
+
+    def test_gate_tiers(self):
+        for question, tier in ((FALLBACK, "fallback"), (OFF_TOPIC, "reject"), ("Cara membuat bomb saat hamil", "safety")):
+            with self.subTest(question=question):
+                result = self.answer(question)
+                self.assertEqual(result.tier, tier)
+                self.assertFalse(result.cached)
+                self.assertIsNone(result.similarity)
+                self.assertEqual(result.sources_count, 0)
+                self.assertTrue(result.request_id)
+
+    def test_llm_error_is_not_cached(self):
+        self.llm = StubLLMProvider(latency_ms=0, latency_dist="fixed", error_rate=1.0, base_delay=0)
+
+        result = self.answer(ON_TOPIC)
+
+        self.assertEqual(result.tier, "error")
+        self.assertEqual(self.cache.calls["set"], 0)
+
+    def test_chunks_of_one_document_share_a_doc_id(self):
+        docs = LOCAL_DOCS + [
+            {"page_content": "Lanjutan dokumen diabetes pertama.", "metadata": {"doc_id": "diabetes-01"}},
+            {"page_content": "Potongan tanpa doc_id.", "metadata": {}},
+        ]
+
+        result = rag_pipeline.rag_answer(ON_TOPIC, None, self.llm, docs, cache=self.cache)
+
+        self.assertEqual(result.doc_ids, ["diabetes-01", "diabetes-02"])
+        self.assertEqual(result.sources_count, 4)
+
+
+class BatchTest(RagPipelineTestCase):
+
+    def test_results_stay_aligned_across_tiers(self):
+        cached_question = "Apa penyebab mual saat hamil muda?"
+        other_llm = "Berapa kali kontrol kehamilan yang dianjurkan?"
+        self.cache.answers[cached_question] = "jawaban dari cache"
+        questions = [ON_TOPIC, OFF_TOPIC, cached_question, FALLBACK, other_llm]
+        retriever = FakeRetriever()
+        history = rag_pipeline.ConversationHistory(max_history=10)
+
+        results = rag_pipeline.rag_answer_batch(
+            questions, retriever, self.llm, LOCAL_DOCS, conversation_history=history, cache=self.cache,
+        )
+
+        self.assertEqual([r.tier for r in results], ["llm", "reject", "cache", "fallback", "llm"])
+        self.assertEqual(results[1].answer, rag_pipeline.REJECT_MESSAGE)
+        self.assertEqual(results[2].answer, "jawaban dari cache")
+        self.assertEqual(len({r.request_id for r in results}), len(questions))
+        # Same answers as answering one by one (the stub answer is a hash of the prompt)
+        for i in (0, 4):
+            single = rag_pipeline.rag_answer(questions[i], None, self.llm, LOCAL_DOCS, cache=FakeCache())
+            self.assertEqual(results[i].answer, single.answer)
+        # Concurrent LLM answers are written to the history in question order
+        llm_exchanges = [e["question"] for e in history.history if e["question"] in (ON_TOPIC, other_llm)]
+        self.assertEqual(llm_exchanges, [ON_TOPIC, other_llm])
+
+    def test_one_encode_and_one_retrieval_for_the_misses(self):
+        questions = [ON_TOPIC, OFF_TOPIC, "Berapa kali kontrol kehamilan yang dianjurkan?"]
+        retriever = FakeRetriever()
+
+        rag_pipeline.rag_answer_batch(questions, retriever, self.llm, LOCAL_DOCS, cache=self.cache)
+
+        # The off-topic question is gated before the cache stage
+        self.assertEqual(self.cache.calls["encode_batch"], [[questions[0], questions[2]]])
+        self.assertEqual(self.cache.calls["encode"], 0)
+        self.assertEqual(self.cache.calls["get_batch"], 1)
+        self.assertEqual(retriever.batches, [[questions[0], questions[2]]])
+        self.assertEqual(retriever.invoked, [])
+        self.assertEqual(self.llm.stats["calls"], 2)
+        self.assertEqual(self.cache.calls["set"], 2)
+
+    def test_all_gated_batch_skips_paid_stages(self):
+        results = rag_pipeline.rag_answer_batch([OFF_TOPIC, FALLBACK], None, self.llm, LOCAL_DOCS, cache=self.cache)
+
+        self.assertEqual([r.tier for r in results], ["reject", "fallback"])
+        self.assertEqual(self.cache.calls["encode_batch"], [])
+        self.assertEqual(self.llm.stats["calls"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
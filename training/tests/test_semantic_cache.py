@@ -0,0 +1,246 @@
+"""
+Tests for scripts/semantic_cache.py
+SentenceTransformer is replaced by a small deterministic bag-of-words encoder,
+so no model download is needed; similarity still goes through util.cos_sim.
+
+Run from training/:
+    python -m unittest discover -s tests
+"""
+import hashlib
+import pathlib
+import sys
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import torch
+
+sys.path.insert(0, str(pathlib.Path(__file__).parents[1] / "scripts"))
+
+import rag_pipeline  # noqa: E402
+from cache_backends import CacheBackend  # noqa: E402
+from semantic_cache import SemanticCache  # noqa: E402
+
+DIM = 64
+OLD_PROMPT, NEW_PROMPT = "prompt-old", "prompt-new"
+
+
+class FakeEncoder:
+    """Stand-in for SentenceTransformer: hashed bag of words, L2-normalized"""
+
+    def __init__(self, model_name=None):
+        pass
+
+    def get_sentence_embedding_dimension(self):
+        return DIM
+
+    def _vector(self, text):
+        vec = torch.zeros(DIM)
+        for word in text.lower().replace("?", " ").split():
+            vec[int(hashlib.md5(word.encode()).hexdigest(), 16) % DIM] += 1.0
+        return vec / (vec.norm() or 1.0)
+
+    def encode(self, texts, convert_to_tensor=True):
+        if isinstance(texts, str):
+            return self._vector(texts)
+        return torch.stack([self._vector(t) for t in texts])
+
+
+class FakeBackend(CacheBackend):
+    """In-memory CacheBackend with the pgvector semantics (nearest live row, TTL on created_at)"""
+    name = "fake"
+
+    def __init__(self):
+        self.rows = {}
+        self.calls = []
+        self.down = False
+
+    def _call(self, method):
+        self.calls.append(method)
+        if self.down:
+            raise ConnectionError("backend unreachable")
+
+    def ensure_schema(self, dim):
+        self._call("ensure_schema")
+
+    def lookup(self, embeddings, ttl):
+        self._call("lookup")
+        results = []
+        for emb in embeddings:
+            live = [r for r in self.rows.values() if r["created_at"] > datetime.now() - ttl]
+            scored = [(float(torch.dot(emb, torch.tensor(r["embedding"]))), r) for r in live]
+            if not scored:
+                results.append(None)
+                continue
+            similarity, row = max(scored, key=lambda x: x[0])
+            results.append({**row, "similarity": similarity})
+        return results
+
+    def upsert(self, rows):
+        self._call("upsert")
+        for r in rows:
+            self.rows[r["query_hash"]] = {**r, "embedding": r["embedding"].tolist(), "created_at": datetime.now()}
+        return len(rows)
+
+    def purge_expired(self, ttl):
+        self._call("purge_expired")
+        return 0
+
+
+def make_cache(**kwargs):
+    kwargs.setdefault("similarity_threshold", 0.85)
+    with mock.patch("sentence_transformers.SentenceTransformer", FakeEncoder):
+        return SemanticCache(**kwargs)
+
+
+def meta(*doc_ids, prompt_hash=NEW_PROMPT, model="gemini-2.0-flash", corpus_version="v2"):
+    return {"doc_ids": list(doc_ids), "prompt_hash": prompt_hash, "model": model, "corpus_version": corpus_version}
+
+
+class SemanticCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = make_cache()
+
+    def questions(self):
+        return sorted(entry["original_query"] for entry in self.cache.cache.values())
+
+
+class InvalidationTest(SemanticCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache.set("anemia saat hamil", "a1", meta=meta("anemia-01", "gizi-01"))
+        self.cache.set("zat besi untuk bumil", "a2", meta=meta("gizi-01", corpus_version="v1"))
+        self.cache.set("mual pagi hari", "a3", meta=meta("mual-01", prompt_hash=OLD_PROMPT))
+        self.cache.set("kram kaki", "a4", meta=meta("kram-01", model="gemini-1.5-flash"))
+        self.cache.set("tanda kehamilan awal", "fallback seed")  # untagged
+
+    def test_reverse_indexes(self):
+        gizi = self.cache._doc_index["gizi-01"]
+        self.assertEqual(len(gizi), 2)
+        self.assertEqual(self.cache._tag_index[("prompt_hash", OLD_PROMPT)],
+                         {self.cache._hash_query("mual pagi hari")})
+        self.assertEqual(self.cache.tag_values("corpus_version"), {"v1", "v2"})
+
+    def test_invalidate_docs_only_touches_dependent_entries(self):
+        self.assertEqual(self.cache.invalidate_docs(["gizi-01"]), 2)
+
+        self.assertEqual(self.questions(), ["kram kaki", "mual pagi hari", "tanda kehamilan awal"])
+        self.assertNotIn("gizi-01", self.cache._doc_index)
+        # Postings of the removed entries are gone, not left as empty sets
+        self.assertNotIn("anemia-01", self.cache._doc_index)
+        self.assertNotIn(("corpus_version", "v1"), self.cache._tag_index)
+        self.assertEqual(len(self.cache.query_embeddings), 3)
+        self.assertIsNone(self.cache.get("anemia saat hamil"))
+
+    def test_invalidate_docs_for_one_corpus_version(self):
+        self.assertEqual(self.cache.invalidate_docs(["gizi-01"], corpus_version="v1"), 1)
+
+        self.assertIn("anemia saat hamil", self.questions())
+        self.assertNotIn("zat besi untuk bumil", self.questions())
+
+    def test_invalidate_tag(self):
+        self.assertEqual(self.cache.invalidate_tag("prompt_hash", OLD_PROMPT), 1)
+        self.assertEqual(self.cache.invalidate_tag("prompt_hash", OLD_PROMPT), 0)
+
+        self.assertNotIn("mual pagi hari", self.questions())
+        self.assertNotIn("mual-01", self.cache._doc_index)
+        self.assertEqual(len(self.cache), 4)
+
+    def test_invalidate_stale_keeps_current_and_untagged_entries(self):
+        removed = self.cache.invalidate_stale(prompt_hash=NEW_PROMPT, model="gemini-2.0-flash")
+
+        self.assertEqual(removed, 2)
+        self.assertEqual(self.questions(), ["anemia saat hamil", "tanda kehamilan awal", "zat besi untuk bumil"])
+        self.assertEqual(self.cache.get("tanda kehamilan awal")[0], "fallback seed")
+        self.assertEqual(self.cache.tag_values("model"), {"gemini-2.0-flash"})
+
+    def test_eviction_cleans_the_indexes(self):
+        cache = make_cache(max_cache_size=1)
+        cache.set("anemia saat hamil", "a1", meta=meta("anemia-01"))
+        cache.set("kram kaki", "a2", meta=meta("kram-01"))
+
+        self.assertEqual(set(cache._doc_index), {"kram-01"})
+        self.assertEqual(cache._tag_index[("model", "gemini-2.0-flash")], {cache._hash_query("kram kaki")})
+
+    def test_reconcile_cache(self):
+        with mock.patch.object(rag_pipeline, "PROMPT_HASH", NEW_PROMPT), \
+                mock.patch.object(rag_pipeline, "current_corpus_version", return_value="v2"), \
+                mock.patch.object(rag_pipeline, "changed_since", return_value={"gizi-01"}) as changed:
+            removed = rag_pipeline.reconcile_cache(self.cache, model="gemini-2.0-flash")
+
+        changed.assert_called_once_with("v1")
+        self.assertEqual(removed, {"stale_tags": 2, "changed_docs": 1})
+        # Built on v2, where gizi-01 is current
+        self.assertEqual(self.questions(), ["anemia saat hamil", "tanda kehamilan awal"])
+
+
+class SharedBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = FakeBackend()
+        self.node_a = make_cache(backend=self.backend)
+        self.node_b = make_cache(backend=self.backend)
+
+    def test_write_through_and_promotion(self):
+        self.node_a.set("anemia saat hamil", "jawaban", meta=meta("anemia-01"))
+        self.assertEqual(self.backend.calls.count("upsert"), 1)
+
+        # L1 miss on node B -> backend hit -> promoted into B's L1
+        self.assertEqual(self.node_b.get("anemia saat hamil")[0], "jawaban")
+        self.assertEqual(self.node_b.stats["backend_hits"], 1)
+        self.assertEqual(len(self.node_b), 1)
+        self.assertEqual(self.node_b._doc_index["anemia-01"], {self.node_b._hash_query("anemia saat hamil")})
+
+        lookups = self.backend.calls.count("lookup")
+        self.assertEqual(self.node_b.get("anemia saat hamil")[0], "jawaban")
+        self.assertEqual(self.backend.calls.count("lookup"), lookups)  # served by L1
+        # Promotion does not write back
+        self.assertEqual(self.backend.calls.count("upsert"), 1)
+
+    def test_batch_only_sends_l1_misses_to_backend(self):
+        self.node_a.set("anemia saat hamil", "a1")
+        self.node_b.set("kram kaki", "a2")
+        lookups = []
+        original = self.backend.lookup
+        self.backend.lookup = lambda embeddings, ttl: lookups.append(len(embeddings)) or original(embeddings, ttl)
+
+        results = self.node_b.get_batch(["kram kaki", "anemia saat hamil", "pusing kepala"])
+
+        self.assertEqual([r and r[0] for r in results], ["a2", "a1", None])
+        self.assertEqual(lookups, [2])
+
+    def test_backend_outage_degrades_to_l1(self):
+        self.node_b.set("kram kaki", "dari L1")
+        self.backend.down = True
+
+        self.node_b.set("anemia saat hamil", "tetap di L1")  # upsert fails, entry stays local
+        self.assertEqual(self.node_b.get("kram kaki")[0], "dari L1")
+        self.assertEqual(self.node_b.get("anemia saat hamil")[0], "tetap di L1")
+        self.assertIsNone(self.node_b.get("pusing kepala"))
+        self.assertEqual(self.node_b.get_batch(["pusing kepala", "kram kaki"])[1][0], "dari L1")
+
+    def test_ttl_filtering(self):
+        # The L1 only keeps entries for l1_ttl_seconds; the backend keeps ttl_hours
+        cache = make_cache(backend=self.backend, ttl_hours=24, l1_ttl_seconds=60)
+        self.assertEqual(cache.ttl, timedelta(seconds=60))
+        self.assertEqual(cache.backend_ttl, timedelta(hours=24))
+
+        cache.set("anemia saat hamil", "jawaban")
+        self.backend.rows[cache._hash_query("anemia saat hamil")]["created_at"] -= timedelta(minutes=5)
+        entry = cache.cache[cache._hash_query("anemia saat hamil")]
+        entry["timestamp"] -= timedelta(minutes=5)
+        cache.query_embeddings = [(h, e, ts - timedelta(minutes=5)) for h, e, ts in cache.query_embeddings]
+
+        # Expired from the L1, still live in the backend (and promoted again)
+        self.assertEqual(cache.get_batch(["anemia saat hamil"])[0][0], "jawaban")
+        self.assertEqual(cache.stats["backend_hits"], 1)
+
+        for row in self.backend.rows.values():
+            row["created_at"] -= timedelta(hours=24)
+        self.assertIsNone(make_cache(backend=self.backend).get("anemia saat hamil"))
+
+
+if __name__ == "__main__":
+    unittest.main()
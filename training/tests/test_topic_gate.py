@@ -0,0 +1,88 @@
+"""
+Tests for scripts/topic_gate.py
+
+Run from training/:
+    python -m unittest discover -s tests
+"""
+import pathlib
+import sys
+import unittest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parents[1] / "scripts"))
+
+from topic_gate import KeywordMatcher, get_topic_matcher  # noqa: E402
+
+
+class KeywordMatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.matcher = KeywordMatcher(
+            {"pregnancy": ["hamil", "ibu hamil", "bb"], "forbidden": ["ml", "game", "bb"]},
+            suffixes=["nya", "ku"],
+        )
+
+    def test_whole_words_only(self):
+        self.assertEqual(self.matcher.match("Hobby saya bikin html"), {"pregnancy": [], "forbidden": []})
+        self.assertEqual(self.matcher.match("main ML dan game")["forbidden"], ["ml", "game"])
+
+    def test_suffixes(self):
+        self.assertEqual(self.matcher.match("Hamilnya sudah 8 minggu")["pregnancy"], ["hamil"])
+        self.assertEqual(self.matcher.match("gameku rusak")["forbidden"], ["game"])
+        # Only the configured suffixes are accepted
+        self.assertEqual(self.matcher.match("hamilan")["pregnancy"], [])
+
+    def test_multi_word_terms_and_whitespace(self):
+        found = self.matcher.match("Apa saja pantangan IBU   hamil?")
+        self.assertEqual(found["pregnancy"], ["ibu hamil"])
+
+    def test_first_category_wins_and_terms_are_unique(self):
+        found = self.matcher.match("bb naik, bb turun")
+        self.assertEqual(found, {"pregnancy": ["bb"], "forbidden": []})
+
+    def test_affixes_only_for_configured_categories(self):
+        matcher = KeywordMatcher(
+            {"pregnancy": ["lelah", "periksa"], "forbidden": ["main"]},
+            suffixes=["nya"],
+            affixes={"pregnancy": {"prefixes": ["di", "ke"], "suffixes": ["an"]}},
+        )
+        self.assertEqual(matcher.match("kelelahannya")["pregnancy"], ["lelah"])
+        self.assertEqual(matcher.match("diperiksa")["pregnancy"], ["periksa"])
+        self.assertEqual(matcher.match("permainan")["forbidden"], [])
+
+
+class TopicKeywordsFileTest(unittest.TestCase):
+
+    def test_shared_matcher_from_keyword_file(self):
+        matcher = get_topic_matcher()
+        self.assertIs(matcher, get_topic_matcher())
+        self.assertIn("bumil", matcher.match("Apakah bumil boleh minum kopi?")["pregnancy"])
+        self.assertIn("presiden", matcher.match("Siapa presiden sekarang?")["forbidden"])
+        self.assertEqual(matcher.match("Tips belajar HTML")["forbidden"], [])
+
+    def test_affixed_pregnancy_questions_are_accepted(self):
+        # Regression: word-boundary matching without affixes refused these as off-topic
+        matcher = get_topic_matcher()
+        for question in (
+            "Apakah aman berolahraga saat mengandung?",
+            "Kenapa saya sering kelelahan?",
+            "Kapan sebaiknya diperiksa ke dokter?",
+            "Kenapa sering kepusingan",
+        ):
+            with self.subTest(question=question):
+                self.assertTrue(matcher.match(question)["pregnancy"])
+
+    def test_off_topic_questions_stay_rejected(self):
+        matcher = get_topic_matcher()
+        for question in (
+            "Siapa presiden Indonesia?",
+            "Kapan pemilu berikutnya?",
+            "Rekomendasi film drakor terbaru",
+            "Apa resep masakan rendang?",
+            "Main mobile legend sambil belajar html",
+        ):
+            with self.subTest(question=question):
+                self.assertEqual(matcher.match(question)["pregnancy"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()